@@ -14,6 +14,8 @@ from DIRAC import S_OK, S_ERROR, gConfig
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.Core.Utilities import List, ThreadSafe, Time, DEncode
 from DIRAC.AccountingSystem.private.TypeLoader import TypeLoader
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator, calculateBuckets, \
+                                                            calculateBucketLengthForTime
 from DIRAC.Core.Utilities.ThreadPool import ThreadPool
 
 gSynchro = ThreadSafe.Synchronizer()
@@ -536,12 +538,7 @@ class AccountingDB( DB ):
     """
     Get the expected bucket time for a moment in time
     """
-    for granuT in self.dbBucketsLength[ typeName ]:
-      nowBucketed = now - now % granuT[1]
-      dif = max( 0, nowBucketed - when )
-      if dif <= granuT[0]:
-        return granuT[1]
-    return self.maxBucketTime
+    return calculateBucketLengthForTime( self.dbBucketsLength[ typeName ], now, when, self.maxBucketTime )
 
   def calculateBuckets( self, typeName, startTime, endTime, nowEpoch = False ):
     """
@@ -550,24 +547,7 @@ class AccountingDB( DB ):
     """
     if not nowEpoch:
       nowEpoch = int( Time.toEpoch( Time.dateTime() ) )
-    bucketTimeLength = self.calculateBucketLengthForTime( typeName, nowEpoch, startTime )
-    currentBucketStart = startTime - startTime % bucketTimeLength
-    if startTime == endTime:
-      return [ ( currentBucketStart,
-                 1,
-                 bucketTimeLength ) ]
-    buckets = []
-    totalLength = endTime - startTime
-    while currentBucketStart < endTime:
-      start = max( currentBucketStart, startTime )
-      end = min( currentBucketStart + bucketTimeLength, endTime )
-      proportion = float( end - start ) / totalLength
-      buckets.append( ( currentBucketStart,
-                        proportion,
-                        bucketTimeLength ) )
-      currentBucketStart += bucketTimeLength
-      bucketTimeLength = self.calculateBucketLengthForTime( typeName, nowEpoch, currentBucketStart )
-    return buckets
+    return calculateBuckets( self.dbBucketsLength[ typeName ], startTime, endTime, nowEpoch, self.maxBucketTime )
 
   def __insertInQueueTable( self, typeName, startTime, endTime, valuesList ):
     sqlFields = [ 'id', 'taken', 'takenSince' ] + self.dbCatalog[ typeName ][ 'typeFields' ]
@@ -622,18 +602,121 @@ class AccountingDB( DB ):
     Do the real insert and delete from the in buffer table
     """
     self.log.verbose( "Received bundle to process", "of %s elements" % len( recordTuples ) )
+    #Group them by type, each group is inserted at once
+    recordsByType = {}
     for record in recordTuples:
-      iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
-      result = self.insertRecordDirectly( typeName, startTime, endTime, valuesList )
+      recordsByType.setdefault( record[1], [] ).append( record )
+    for typeName, records in recordsByType.items():
+      inTableName = _getTableName( "in", typeName )
+      idList = ", ".join( str( record[0] ) for record in records )
+      result = self.insertRecordBundleDirectly( typeName, [ record[2:5] for record in records ] )
       if not result[ 'OK' ]:
-        self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
-        self.log.error( "Can't insert row", result[ 'Message' ] )
+        self.log.error( "Can't insert bundle, inserting the records one by one", result[ 'Message' ] )
+        for record in records:
+          self.__insertRecordFromINTable( record )
         continue
-      result = self._update( "DELETE FROM `%s` WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
+      result = self._update( "DELETE FROM `%s` WHERE id in (%s)" % ( inTableName, idList ) )
       if not result[ 'OK' ]:
-        self.log.error( "Can't delete row from the IN table", result[ 'Message' ] )
-      gMonitor.addMark( "insertiontime", Time.toEpoch() - insertionEpoch )
+        self.log.error( "Can't delete rows from the IN table", result[ 'Message' ] )
+      insertedEpoch = Time.toEpoch()
+      for record in records:
+        gMonitor.addMark( "insertiontime", insertedEpoch - record[5] )
 
+  def __insertRecordFromINTable( self, record ):
+    """
+    Insert a single record and delete it from the in buffer table
+    """
+    iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
+    result = self.insertRecordDirectly( typeName, startTime, endTime, list( valuesList ) )
+    if not result[ 'OK' ]:
+      self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
+      self.log.error( "Can't insert row", result[ 'Message' ] )
+      return
+    result = self._update( "DELETE FROM `%s` WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
+    if not result[ 'OK' ]:
+      self.log.error( "Can't delete row from the IN table", result[ 'Message' ] )
+    gMonitor.addMark( "insertiontime", Time.toEpoch() - insertionEpoch )
+
+  def insertRecordBundleDirectly( self, typeName, recordsList ):
+    """
+    Add a bundle of entries of a type to its contents. The contributions of the entries to the
+    buckets are aggregated in memory and written with one upsert, all in one transaction
+    """
+    if self.__readOnly:
+      return S_ERROR( "ReadOnly mode enabled. No modification allowed" )
+    if not typeName in self.dbCatalog:
+      return S_ERROR( "Type %s has not been defined in the db" % typeName )
+    keyNames = self.dbCatalog[ typeName ][ 'keys' ]
+    numKeys = len( keyNames )
+    numFields = numKeys + len( self.dbCatalog[ typeName ][ 'values' ] )
+    nowEpoch = int( Time.toEpoch( Time.dateTime() ) )
+    aggregator = BucketAggregator( numFields - numKeys )
+    insertRows = []
+    for startTime, endTime, valuesList in recordsList:
+      if len( valuesList ) != numFields:
+        return S_ERROR( "Fields mismatch for record %s. %s fields and %s expected" % ( typeName,
+                                                                                       len( valuesList ),
+                                                                                       numFields ) )
+      #Discover key indexes, they are cached across records
+      keyValues = []
+      for keyPos in range( numKeys ):
+        retVal = self.__addKeyValue( typeName, keyNames[ keyPos ], valuesList[ keyPos ] )
+        if not retVal[ 'OK' ]:
+          return retVal
+        keyValues.append( retVal[ 'Value' ] )
+      retVal = self._escapeValues( keyValues + list( valuesList[ numKeys: ] ) + [ startTime, endTime ] )
+      if not retVal[ 'OK' ]:
+        return retVal
+      insertRows.append( "( %s )" % ", ".join( str( value ) for value in retVal[ 'Value' ] ) )
+      aggregator.addRecord( keyValues, self.calculateBuckets( typeName, startTime, endTime, nowEpoch ),
+                            valuesList[ numKeys: ] )
+    if not insertRows:
+      return S_OK( 0 )
+    self.log.info( "Adding records", "for type %s: %s records in %s buckets" % ( typeName, len( insertRows ),
+                                                                              len( aggregator ) ) )
+    insertCmds = []
+    for rowsChunk in List.breakListIntoChunks( insertRows, 1000 ):
+      insertCmds.append( "INSERT INTO `%s` ( %s ) VALUES %s" % ( _getTableName( "type", typeName ),
+                                                                 ", ".join( "`%s`" % field for field in
+                                                                            self.dbCatalog[ typeName ][ 'typeFields' ] ),
+                                                                 ", ".join( rowsChunk ) ) )
+    for bucketsChunk in List.breakListIntoChunks( aggregator.getBuckets(), 1000 ):
+      valuesGroups = []
+      for bStartTime, bLength, bKeyValues, bValues in bucketsChunk:
+        sqlValues = [ str( bStartTime ), str( bLength ), repr( bValues[-1] ) ]
+        sqlValues.extend( str( keyValue ) for keyValue in bKeyValues )
+        sqlValues.extend( repr( value ) for value in bValues[:-1] )
+        valuesGroups.append( "( %s )" % ",".join( sqlValues ) )
+      insertCmds.append( self.__getBucketsUpsertCmd( typeName, valuesGroups ) )
+
+    retVal = self._getConnection()
+    if not retVal[ 'OK' ]:
+      return retVal
+    connObj = retVal[ 'Value' ]
+    try:
+      #If the transaction is rolled back because of a dead lock, start it again
+      for _i in range( max( 1, self.__deadLockRetries ) ):
+        retVal = self.__startTransaction( connObj )
+        if not retVal[ 'OK' ]:
+          return retVal
+        for cmd in insertCmds:
+          retVal = self._update( cmd, conn = connObj )
+          if not retVal[ 'OK' ]:
+            break
+        if retVal[ 'OK' ]:
+          retVal = self.__commitTransaction( connObj )
+          if retVal[ 'OK' ]:
+            break
+        self.__rollbackTransaction( connObj )
+        if retVal[ 'Message' ].find( "try restarting transaction" ) == -1:
+          return retVal
+      if not retVal[ 'OK' ]:
+        return retVal
+    finally:
+      connObj.close()
+    gMonitor.addMark( "registeradded", len( insertRows ) )
+    gMonitor.addMark( "registeradded:%s" % typeName, len( insertRows ) )
+    return S_OK( len( insertRows ) )
 
   def insertRecordDirectly( self, typeName, startTime, endTime, valuesList ):
     """
@@ -861,11 +944,10 @@ class AccountingDB( DB ):
     return self._update( cmd, conn = connObj )
 
 
-  def __writeBuckets( self, typeName, buckets, keyValues, valuesList, connObj = False ):
-    """ Insert or update a bucket
+  def __getBucketsUpsertCmd( self, typeName, valuesGroups ):
+    """ Get the statement inserting or updating a list of buckets. Each group of values has the
+        start time, the length and the entries of the bucket, the key values and the values
     """
-#     tableName = _getTableName( "bucket", typeName )
-    #INSERT PART OF THE QUERY
     sqlFields = [ '`startTime`', '`bucketLength`', '`entriesInBucket`' ]
     for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
       sqlFields.append( "`%s`" % self.dbCatalog[ typeName ][ 'keys' ][ keyPos ] )
@@ -874,6 +956,14 @@ class AccountingDB( DB ):
       valueField = "`%s`" % self.dbCatalog[ typeName ][ 'values' ][ valPos ]
       sqlFields.append( valueField )
       sqlUpData.append( "%s=%s+VALUES(%s)" % ( valueField, valueField, valueField ) )
+    cmd = "INSERT INTO `%s` ( %s ) " % ( _getTableName( "bucket", typeName ), ", ".join( sqlFields ) )
+    cmd += "VALUES %s " % ", ".join( valuesGroups )
+    cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join( sqlUpData )
+    return cmd
+
+  def __writeBuckets( self, typeName, buckets, keyValues, valuesList, connObj = False ):
+    """ Insert or update a bucket
+    """
     valuesGroups = []
     for bucketInfo in buckets:
       bStartTime = bucketInfo[0]
@@ -883,13 +973,9 @@ class AccountingDB( DB ):
       for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
         sqlValues.append( keyValues[ keyPos ] )
       for valPos in range( len( self.dbCatalog[ typeName ][ 'values' ] ) ):
-#         value = valuesList[ valPos ]
         sqlValues.append( "(%s*%s)" % ( valuesList[ valPos ], bProportion ) )
       valuesGroups.append( "( %s )" % ",".join( str( val ) for val in sqlValues ) )
-
-    cmd = "INSERT INTO `%s` ( %s ) " % ( _getTableName( "bucket", typeName ), ", ".join( sqlFields ) )
-    cmd += "VALUES %s " % ", ".join( valuesGroups)
-    cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join( sqlUpData )
+    cmd = self.__getBucketsUpsertCmd( typeName, valuesGroups )
 
     for _i in range( max( 1, self.__deadLockRetries ) ):
       result = self._update( cmd, conn = connObj )
@@ -991,9 +1077,53 @@ class AccountingDB( DB ):
     gMonitor.addMark( "querytime", Time.toEpoch() - startQueryEpoch )
     return result
 
-  def __queryType( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, tableType, connObj = False ):
+  def getBucketsTimeRange( self, typeName, startTime, endTime ):
+    """
+    Get the start times of the first and last buckets retrieveBucketedData selects for a time range
+    """
+    if typeName not in self.dbCatalog:
+      return S_ERROR( "Type %s is not defined" % typeName )
+    nowEpoch = Time.toEpoch( Time.dateTime () )
+    bucketTimeLength = self.calculateBucketLengthForTime( typeName, nowEpoch , startTime )
+    startTime = startTime - startTime % bucketTimeLength
+    return S_OK( ( self.__getBucketStartForQuery( typeName, startTime ) if startTime else startTime,
+                   self.__getBucketStartForQuery( typeName, endTime ) if endTime else endTime ) )
+
+  def retrieveBucketsInTimeRange( self, typeName, firstBucketStart, lastBucketStart, selectFields, condDict,
+                                  groupFields, orderFields, connObj = False ):
+    """
+    Get data from the DB as retrieveBucketedData, for the buckets starting between two times, both included
+
+    Parameters:
+     - firstBucketStart & lastBucketStart -> int
+         epoch of the start of the buckets, as given by getBucketsTimeRange
+    """
+    if typeName not in self.dbCatalog:
+      return S_ERROR( "Type %s is not defined" % typeName )
+    startQueryEpoch = time.time()
+    if len( selectFields ) < 2:
+      return S_ERROR( "selectFields has to be a list containing a string and a list of fields" )
+    retVal = self.__checkIncomingFieldsForQuery( typeName, selectFields, condDict, groupFields, orderFields, "bucket" )
+    if not retVal[ 'OK' ]:
+      return retVal
+    result = self.__queryType( typeName, firstBucketStart, lastBucketStart, selectFields, condDict,
+                               groupFields, orderFields, "bucket", connObj = connObj, bucketTimes = True )
+    gMonitor.addMark( "querytime", Time.toEpoch() - startQueryEpoch )
+    return result
+
+  def __getBucketStartForQuery( self, typeName, epoch ):
+    """
+    Start of the bucket a query time stands for
+    """
+    #HACK because MySQL and UNIX do not start epoch at the same time
+    epoch = epoch + 3600
+    return self.calculateBuckets( typeName, epoch, epoch )[0][0]
+
+  def __queryType( self, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields, tableType,
+                   connObj = False, bucketTimes = False ):
     """
-    Execute a query over a main table
+    Execute a query over a main table. For the buckets, the times are converted to the
+    start of their buckets, unless they already are ( bucketTimes )
     """
 
     tableName = _getTableName( tableType, typeName )
@@ -1052,16 +1182,14 @@ class AccountingDB( DB ):
     #Calculate time conditions
     sqlTimeCond = []
     if startTime:
-      if tableType == 'bucket':
-        #HACK because MySQL and UNIX do not start epoch at the same time
-        startTime = startTime + 3600
-        startTime = self.calculateBuckets( typeName, startTime, startTime )[0][0]
+      if tableType == 'bucket' and not bucketTimes:
+        startTime = self.__getBucketStartForQuery( typeName, startTime )
       sqlTimeCond.append( "`%s`.`startTime` >= %s" % ( tableName, startTime ) )
     if endTime:
       if tableType == "bucket":
         endTimeSQLVar = "startTime"
-        endTime = endTime + 3600
-        endTime = self.calculateBuckets( typeName, endTime, endTime )[0][0]
+        if not bucketTimes:
+          endTime = self.__getBucketStartForQuery( typeName, endTime )
       else:
         endTimeSQLVar = "endTime"
       sqlTimeCond.append( "`%s`.`%s` <= %s" % ( tableName, endTimeSQLVar, endTime ) )
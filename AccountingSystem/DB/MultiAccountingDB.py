@@ -44,6 +44,7 @@ class MultiAccountingDB( object ):
     for methodName in ( 'registerType', 'changeBucketsLength', 'regenerateBuckets',
                         'deleteType', 'insertRecordThroughQueue',
                         'deleteRecord', 'getKeyValues', 'retrieveBucketedData',
+                        'getBucketsTimeRange', 'retrieveBucketsInTimeRange',
                         'calculateBuckets', 'calculateBucketLengthForTime' ):
       (lambda closure: setattr( self, closure, lambda *x: self.__mimeTypeMethod( closure, *x ) ))(methodName)
     for methodName in ( 'autoCompactDB', 'compactBuckets', 'markAllPendingRecordsAsNotTaken',
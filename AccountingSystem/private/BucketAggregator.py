@@ -0,0 +1,90 @@
+""" Aggregation in memory of the contributions of the accounting records to the buckets
+
+    A record spreads its values over the buckets its time span covers. The records of a bundle
+    mostly share their keys and fall in the same few buckets, so their contributions are summed
+    here first and each bucket is then written with a single row of the multi-row upsert.
+"""
+
+__RCSID__ = "$Id$"
+
+# Longest bucket, for the records older than all the bucket lengths of a type
+MAX_BUCKET_TIME = 604800
+
+def calculateBucketLengthForTime( bucketsLength, now, when, maxBucketTime = MAX_BUCKET_TIME ):
+  """ Get the expected bucket length for a moment in time
+
+  :param list bucketsLength: sorted list of ( time span, bucket length ) of the type
+  """
+  for granuT in bucketsLength:
+    nowBucketed = now - now % granuT[1]
+    dif = max( 0, nowBucketed - when )
+    if dif <= granuT[0]:
+      return granuT[1]
+  return maxBucketTime
+
+def calculateBuckets( bucketsLength, startTime, endTime, nowEpoch, maxBucketTime = MAX_BUCKET_TIME ):
+  """ Calculate the buckets between two times and the proportional part of each of them
+
+  :return: list of ( bucket start, proportion, bucket length )
+  """
+  bucketTimeLength = calculateBucketLengthForTime( bucketsLength, nowEpoch, startTime, maxBucketTime )
+  currentBucketStart = startTime - startTime % bucketTimeLength
+  if startTime == endTime:
+    return [ ( currentBucketStart,
+               1,
+               bucketTimeLength ) ]
+  buckets = []
+  totalLength = endTime - startTime
+  while currentBucketStart < endTime:
+    start = max( currentBucketStart, startTime )
+    end = min( currentBucketStart + bucketTimeLength, endTime )
+    proportion = float( end - start ) / totalLength
+    buckets.append( ( currentBucketStart,
+                      proportion,
+                      bucketTimeLength ) )
+    currentBucketStart += bucketTimeLength
+    bucketTimeLength = calculateBucketLengthForTime( bucketsLength, nowEpoch, currentBucketStart, maxBucketTime )
+  return buckets
+
+
+class BucketAggregator( object ):
+  """ Sum of the contributions of a bundle of records of one type to its buckets
+  """
+
+  def __init__( self, numValues ):
+    """
+    :param int numValues: number of value fields of the type, the entries are counted on top of them
+    """
+    self.numValues = numValues
+    self.records = 0
+    self.__buckets = {}
+
+  def __len__( self ):
+    return len( self.__buckets )
+
+  def addRecord( self, keyValues, buckets, valuesList ):
+    """ Add the contribution of a record
+
+    :param keyValues: ids of the key values of the record
+    :param list buckets: ( bucket start, proportion, bucket length ) as given by calculateBuckets
+    :param list valuesList: values of the record, without the key values
+    """
+    keyValues = tuple( keyValues )
+    valuesList = [ float( value ) for value in valuesList ] + [ 1.0 ]
+    for bucketStart, proportion, bucketLength in buckets:
+      bucketKey = ( bucketStart, bucketLength, keyValues )
+      bucketValues = self.__buckets.get( bucketKey )
+      if bucketValues is None:
+        self.__buckets[ bucketKey ] = [ value * proportion for value in valuesList ]
+      else:
+        for pos, value in enumerate( valuesList ):
+          bucketValues[ pos ] += value * proportion
+    self.records += 1
+
+  def getBuckets( self ):
+    """ Get the aggregated buckets, sorted so that concurrent upserts lock the rows in the same order
+
+    :return: list of ( bucket start, bucket length, key values, values + entries in bucket )
+    """
+    return [ ( bucketKey[0], bucketKey[1], bucketKey[2], self.__buckets[ bucketKey ] )
+             for bucketKey in sorted( self.__buckets ) ]
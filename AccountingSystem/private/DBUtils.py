@@ -1,6 +1,63 @@
 import types
+import numpy
 from DIRAC.Core.Utilities import Time
 
+def rebinBuckets( granularity, startTimes, bucketLengths, values, groups = None, nGroups = 1 ):
+  """
+  Spread accounting buckets over the bins of a granularity, splitting the values of each bucket
+  proportionally to its overlap with the bins. A bucket already of the granularity goes whole to
+  the bin starting at its start time, and so does an empty bucket to the bin containing it.
+  Parameters:
+    - startTimes, bucketLengths -> 1-D sequences of the start epoch and length of the buckets
+    - values -> 2-D sequence ( bucket x field ), None counting as 0
+    - groups -> 1-D sequence of the index of the group of each bucket, all in group 0 if None
+  Returns ( binTimes, binValues, proportions, filled ):
+    - binTimes -> 1-D array of the sorted start epochs of the bins having data
+    - binValues -> 3-D array ( group x bin x field ) of the summed values
+    - proportions -> 2-D array ( group x bin ) of the summed bucket proportions
+    - filled -> 2-D boolean array ( group x bin ), whether the group has data in the bin
+  """
+  startTimes = numpy.asarray( startTimes, dtype = numpy.int64 )
+  bucketLengths = numpy.asarray( bucketLengths, dtype = numpy.int64 )
+  values = numpy.array( values, dtype = float, ndmin = 2 )
+  values[ numpy.isnan( values ) ] = 0
+  if groups is None:
+    groups = numpy.zeros( len( startTimes ), dtype = numpy.int64 )
+  else:
+    groups = numpy.asarray( groups, dtype = numpy.int64 )
+  nFields = values.shape[1] if len( startTimes ) else 0
+  if not len( startTimes ):
+    return ( numpy.zeros( 0, dtype = numpy.int64 ), numpy.zeros( ( nGroups, 0, nFields ) ),
+             numpy.zeros( ( nGroups, 0 ) ), numpy.zeros( ( nGroups, 0 ), dtype = bool ) )
+
+  endTimes = startTimes + bucketLengths
+  firstBins = startTimes - startTimes % granularity
+  # Buckets going to a single bin
+  whole = ( bucketLengths == granularity ) | ( startTimes == endTimes )
+  nBins = numpy.where( whole, 1, ( endTimes - firstBins + granularity - 1 ) // granularity )
+  # One row per ( bucket, bin )
+  bucketIndexes = numpy.repeat( numpy.arange( len( startTimes ) ), nBins )
+  binOffsets = numpy.arange( len( bucketIndexes ) ) - numpy.repeat( numpy.cumsum( nBins ) - nBins, nBins )
+  binStarts = firstBins[ bucketIndexes ] + binOffsets * granularity
+  binStarts = numpy.where( bucketLengths[ bucketIndexes ] == granularity, startTimes[ bucketIndexes ], binStarts )
+  overlaps = numpy.minimum( binStarts + granularity, endTimes[ bucketIndexes ] ) - \
+             numpy.maximum( binStarts, startTimes[ bucketIndexes ] )
+  proportions = numpy.where( whole[ bucketIndexes ], 1.0,
+                             overlaps.astype( float ) / numpy.maximum( bucketLengths[ bucketIndexes ], 1 ) )
+
+  binTimes, binIndexes = numpy.unique( binStarts, return_inverse = True )
+  # Sums over the ( group, bin ) cells, in the order of the buckets
+  cellIndexes = groups[ bucketIndexes ] * len( binTimes ) + binIndexes
+  shape = ( nGroups, len( binTimes ) )
+  nCells = nGroups * len( binTimes )
+  binValues = numpy.empty( shape + ( nFields, ) )
+  for iField in range( nFields ):
+    binValues[ :, :, iField ] = numpy.bincount( cellIndexes, values[ bucketIndexes, iField ] * proportions,
+                                                nCells ).reshape( shape )
+  binProportions = numpy.bincount( cellIndexes, proportions, nCells ).reshape( shape )
+  filled = numpy.bincount( cellIndexes, None, nCells ).reshape( shape ) > 0
+  return binTimes, binValues, binProportions, filled
+
 class DBUtils:
 
   def __init__( self, db, setup ):
@@ -37,6 +94,26 @@ class DBUtils:
           validCondDict[ key ] = condDict[ key ]
     return self._acDB.retrieveBucketedData( self._setup, typeName, startTime, endTime, selectFields, condDict, groupFields, orderFields )
 
+  def _getBucketsTimeRange( self, typeName, startTime, endTime ):
+    """
+    Get the start times of the first and last buckets _retrieveBucketedData selects for a time range
+    """
+    return self._acDB.getBucketsTimeRange( self._setup, typeName, startTime, endTime )
+
+  def _retrieveBucketsInTimeRange( self,
+                                   typeName,
+                                   firstBucketStart,
+                                   lastBucketStart,
+                                   selectFields,
+                                   condDict = None,
+                                   groupFields = None,
+                                   orderFields = None ):
+    """
+    Get data from the DB as _retrieveBucketedData, for the buckets starting between two times, both included
+    """
+    return self._acDB.retrieveBucketsInTimeRange( self._setup, typeName, firstBucketStart, lastBucketStart,
+                                                  selectFields, condDict, groupFields, orderFields )
+
   def _getUniqueValues( self, typeName, startTime, endTime, condDict, fieldList ):
     stringList = [ "%s" for field in fieldList ]
     return self._retrieveBucketedData( typeName,
@@ -77,45 +154,9 @@ class DBUtils:
       - field 0: datetime
       - field 1: bucketLength
       - fields 2-n: numericalFields
+    Returns { binTime : [ field2, .., fieldn, proportion ] }
     """
-    normData = {}
-
-    def addToNormData( bucketDate, data, proportion = 1.0 ):
-      if bucketDate in normData:
-        for iP in range( len( data ) ):
-          val = data[ iP ]
-          if val == None:
-            val = 0
-          normData[ bucketDate ][iP] += float( val ) * proportion
-        normData[ bucketDate ][ -1 ] += proportion
-      else:
-        normData[ bucketDate ] = []
-        for fD in data:
-          if fD == None:
-            fD = 0
-          normData[ bucketDate ].append( float( fD ) * proportion )
-        normData[ bucketDate ].append( proportion )
-
-    for bucketData in bucketsData:
-      bucketDate = bucketData[0]
-      originalBucketLength = bucketData[1]
-      bucketValues = bucketData[2:]
-      if originalBucketLength == granularity:
-        addToNormData( bucketDate, bucketValues )
-      else:
-        startEpoch = bucketDate
-        endEpoch = bucketDate + originalBucketLength
-        newBucketEpoch = startEpoch - startEpoch % granularity
-        if startEpoch == endEpoch:
-          addToNormData( newBucketEpoch, bucketValues )
-        else:
-          while newBucketEpoch < endEpoch:
-            start = max( newBucketEpoch, startEpoch )
-            end = min( newBucketEpoch + granularity, endEpoch )
-            proportion = float( end - start ) / originalBucketLength
-            addToNormData( newBucketEpoch, bucketValues, proportion )
-            newBucketEpoch += granularity
-    return normData
+    return self._groupsToGranularity( granularity, { None : bucketsData }, 'span' ).get( None, {} )
 
   def _sumToGranularity( self, granularity, bucketsData ):
     """
@@ -124,10 +165,7 @@ class DBUtils:
       - field 1: bucketLength
       - fields 2-n: numericalFields
     """
-    normData = self._spanToGranularity( granularity, bucketsData )
-    for bDate in normData:
-      del( normData[ bDate ][-1] )
-    return normData
+    return self._groupsToGranularity( granularity, { None : bucketsData }, 'sum' ).get( None, {} )
 
   def _averageToGranularity( self, granularity, bucketsData ):
     """
@@ -136,11 +174,36 @@ class DBUtils:
       - field 1: bucketLength
       - fields 2-n: numericalFields
     """
-    normData = self._spanToGranularity( granularity, bucketsData )
-    for bDate in normData:
-      for iP in range( len( normData[ bDate ] ) ):
-        normData[ bDate ][iP] = float( normData[ bDate ][iP] ) / normData[ bDate ][-1]
-      del( normData[ bDate ][-1] )
+    return self._groupsToGranularity( granularity, { None : bucketsData }, 'average' ).get( None, {} )
+
+  def _groupsToGranularity( self, granularity, dataDict, function = 'sum' ):
+    """
+    Rebin the buckets of all the groups at once
+      - dataDict = { 'key' : bucketsData, 'key2'.. } with bucketsData as for _sumToGranularity
+      - function -> 'sum', 'average' or 'span' to get also the proportion as last field
+    Returns { 'key' : { binTime : [ field2, .., fieldn ] }, 'key2'.. }, without the keys with no buckets
+    """
+    keys = [ key for key in dataDict if dataDict[ key ] ]
+    rows = []
+    for key in keys:
+      rows.extend( dataDict[ key ] )
+    if not rows:
+      return {}
+    # Epochs and lengths are exact as floats
+    table = numpy.array( rows, dtype = float )
+    groups = numpy.repeat( numpy.arange( len( keys ) ), [ len( dataDict[ key ] ) for key in keys ] )
+    binTimes, binValues, proportions, filled = rebinBuckets( granularity, table[ :, 0 ], table[ :, 1 ], table[ :, 2: ],
+                                                             groups, len( keys ) )
+    if function == 'average':
+      with numpy.errstate( divide = 'ignore', invalid = 'ignore' ):
+        binValues = binValues / proportions[ :, :, None ]
+    elif function == 'span':
+      binValues = numpy.concatenate( ( binValues, proportions[ :, :, None ] ), axis = 2 )
+    binTimes = binTimes.tolist()
+    normData = {}
+    for iKey, key in enumerate( keys ):
+      keyBins = numpy.flatnonzero( filled[ iKey ] )
+      normData[ key ] = dict( zip( [ binTimes[ iBin ] for iBin in keyBins ], binValues[ iKey, keyBins ].tolist() ) )
     return normData
 
   def _convertNoneToZero( self, bucketsData ):
@@ -164,11 +227,10 @@ class DBUtils:
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
     startBucketEpoch = startEpoch - startEpoch % granularity
+    allBuckets = set( range( int( startBucketEpoch ), int( endEpoch ), granularity ) )
     for key in dataDict:
       currentDict = dataDict[ key ]
-      for timeEpoch in range( int( startBucketEpoch ), int( endEpoch ), granularity ):
-        if timeEpoch not in currentDict:
-          currentDict[ timeEpoch ] = 0
+      currentDict.update( dict.fromkeys( allBuckets.difference( currentDict ), 0 ) )
     return dataDict
 
   def _getAccumulationMaxValue( self, dataDict ):
@@ -224,13 +286,15 @@ class DBUtils:
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
     startBucketEpoch = startEpoch - startEpoch % granularity
-    for key in dataDict:
-      currentDict = dataDict[ key ]
-      lastValue = 0
-      for timeEpoch in range( startBucketEpoch, endEpoch, granularity ):
-        if timeEpoch in currentDict:
-          lastValue += currentDict[ timeEpoch ]
-        currentDict[ timeEpoch ] = lastValue
+    timeEpochs = range( int( startBucketEpoch ), int( endEpoch ), granularity )
+    if not timeEpochs or not dataDict:
+      return dataDict
+    keys = list( dataDict )
+    # ( key x time ) array of the values, accumulated along the time
+    values = numpy.array( [ [ dataDict[ key ].get( timeEpoch, 0 ) for timeEpoch in timeEpochs ] for key in keys ] )
+    values = numpy.cumsum( values, axis = 1 ).tolist()
+    for iKey, key in enumerate( keys ):
+      dataDict[ key ].update( zip( timeEpochs, values[ iKey ] ) )
     return dataDict
 
   def stripDataField( self, dataDict, fieldId ):
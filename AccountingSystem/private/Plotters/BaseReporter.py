@@ -35,6 +35,9 @@ class BaseReporter( DBUtils ):
              'files' : ( ( 'files', 1, 1000 ), ( 'kfiles', 10 ** 3, 1000 ), ( 'Mfiles', 10 ** 6, 1 ) )
            }
 
+  # Number of buckets of the coarsest granularity of a report in each time tile of the data cache
+  _TILE_BUCKETS = 6
+
   # To be defined in the derived classes
   _typeKeyFields = []
   _typeName = ''
@@ -146,32 +149,56 @@ class BaseReporter( DBUtils ):
         condDict[ keyword ] = preCondDict[ keyword ]
     #Query!
     timeGrouping = ( "%%s, %s" % groupingFields[0], [ 'startTime' ] + groupingFields[1] )
-    retVal = self._retrieveBucketedData( self._typeName,
-                                          startTime,
-                                          endTime,
-                                          selectFields,
-                                          condDict,
-                                          timeGrouping,
-                                          ( '%s', [ 'startTime' ] )
-                                          )
+    coarsestGranularity = self._getBucketLengthForTime( self._typeName, startTime )
+    retVal = self.__retrieveTiledBucketedData( startTime,
+                                               endTime,
+                                               selectFields,
+                                               condDict,
+                                               timeGrouping,
+                                               coarsestGranularity * self._TILE_BUCKETS )
     if not retVal[ 'OK' ]:
       return retVal
     dataDict = self._groupByField( 0, retVal[ 'Value' ] )
-    coarsestGranularity = self._getBucketLengthForTime( self._typeName, startTime )
     #Transform!
-    for keyField in dataDict:
-      if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+    if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+      for keyField in dataDict:
         dataDict[ keyField ] = self._convertNoneToZero( dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "average":
-        dataDict[ keyField ] = self._averageToGranularity( coarsestGranularity, dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "sum":
-        dataDict[ keyField ] = self._sumToGranularity( coarsestGranularity, dataDict[ keyField ] )
+    #All the groups are rebinned together
+    dataDict = self._groupsToGranularity( coarsestGranularity, dataDict,
+                                          metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] )
+    for keyField in dataDict:
       if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
         dataDict[ keyField ] = self._executeConsolidation( metadataDict[ self._PARAM_CONSOLIDATION_FUNCTION ], dataDict[ keyField ] )
     if metadataDict[ self._PARAM_CALCULATE_PROPORTIONAL_GAUGES ]:
       dataDict = self._calculateProportionalGauges( dataDict )
     return S_OK( ( dataDict, coarsestGranularity ) )
 
+  def __retrieveTiledBucketedData( self, startTime, endTime, selectFields, condDict, groupFields, tileLength ):
+    """
+    Retrieve the buckets of a time range grouped by start time through the time tiles of the data
+    cache, so that the reports of sliding time windows only query the buckets they do not share.
+    The start time has to be the second field of the rows, after the grouping
+    """
+    orderFields = ( '%s', [ 'startTime' ] )
+    retVal = self._getBucketsTimeRange( self._typeName, startTime, endTime )
+    if not retVal[ 'OK' ]:
+      return retVal
+    firstBucketStart, lastBucketStart = retVal[ 'Value' ]
+    if not firstBucketStart or not lastBucketStart:
+      return self._retrieveBucketedData( self._typeName, startTime, endTime, selectFields, condDict,
+                                         groupFields, orderFields )
+    tileKey = ( self._setup, self._typeName, repr( selectFields ), repr( sorted( condDict.items() ) ),
+                repr( groupFields ) )
+
+    def retrieveTiles( firstTime, lastTime ):
+      #The query modifies the fields it is given
+      return self._retrieveBucketsInTimeRange( self._typeName, firstTime, lastTime, copy.deepcopy( selectFields ),
+                                               copy.deepcopy( condDict ), copy.deepcopy( groupFields ),
+                                               copy.deepcopy( orderFields ) )
+
+    return gDataCache.getTiledData( tileKey, firstBucketStart, lastBucketStart, tileLength, retrieveTiles,
+                                    timeIndex = 1 )
+
   def _executeConsolidation( self, functor, dataDict ):
     for timeKey in dataDict:
       dataDict[ timeKey ] = [ functor( *dataDict[ timeKey ] ) ]
@@ -0,0 +1,41 @@
+""" Unit tests for the aggregation of the accounting records in the buckets
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator, calculateBuckets, \
+                                                            calculateBucketLengthForTime
+
+__RCSID__ = "$Id$"
+
+BUCKETS_LENGTH = [ ( 86400, 900 ), ( 86400 * 7, 3600 ) ]
+NOW = 86400 * 10
+
+class BucketAggregatorTestCase( unittest.TestCase ):
+
+  def test_buckets( self ):
+    self.assertEqual( calculateBucketLengthForTime( BUCKETS_LENGTH, NOW, NOW - 3600 ), 900 )
+    self.assertEqual( calculateBucketLengthForTime( BUCKETS_LENGTH, NOW, NOW - 86400 * 2 ), 3600 )
+    self.assertEqual( calculateBucketLengthForTime( BUCKETS_LENGTH, NOW, 0 ), 604800 )
+    self.assertEqual( calculateBuckets( BUCKETS_LENGTH, NOW - 1000, NOW - 1000, NOW ), [ ( NOW - 1800, 1, 900 ) ] )
+    self.assertEqual( calculateBuckets( BUCKETS_LENGTH, NOW - 1800, NOW - 450, NOW ),
+                      [ ( NOW - 1800, 900. / 1350, 900 ), ( NOW - 900, 450. / 1350, 900 ) ] )
+
+  def test_aggregation( self ):
+    aggregator = BucketAggregator( 2 )
+    aggregator.addRecord( [ 1, 2 ], [ ( 900, 0.5, 900 ), ( 1800, 0.5, 900 ) ], [ 10, 4 ] )
+    aggregator.addRecord( ( 1, 2 ), [ ( 1800, 1, 900 ) ], [ 6, 2 ] )
+    aggregator.addRecord( [ 1, 3 ], [ ( 0, 1, 900 ) ], [ 1, 1 ] )
+    self.assertEqual( aggregator.records, 3 )
+    self.assertEqual( len( aggregator ), 3 )
+    self.assertEqual( aggregator.getBuckets(), [ ( 0, 900, ( 1, 3 ), [ 1.0, 1.0, 1.0 ] ),
+                                                 ( 900, 900, ( 1, 2 ), [ 5.0, 2.0, 0.5 ] ),
+                                                 ( 1800, 900, ( 1, 2 ), [ 11.0, 4.0, 1.5 ] ) ] )
+    self.assertEqual( BucketAggregator( 1 ).getBuckets(), [] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( BucketAggregatorTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
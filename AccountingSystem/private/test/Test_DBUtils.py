@@ -0,0 +1,62 @@
+""" Unit tests for the rebinning of the accounting buckets
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import copy
+import unittest
+
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils, rebinBuckets
+
+__RCSID__ = "$Id$"
+
+# startTime, bucketLength, fields, as returned by the AccountingDB
+BUCKETS = [ [ 0, 3600, 10, 1 ], [ 3600, 3600, None, 2 ], [ 5400, 7200, 6, 4 ], [ 9000, 0, 1, 1 ], [ 14400, 900, 3, 0.5 ] ]
+TIMED_DATA = { 'A' : { 3600 : 1, 10800 : 2.5 }, 'B' : { 7200 : 4 } }
+
+# Results of the former implementation
+SPAN_3600 = { 0 : [ 10.0, 1.0, 1.0 ], 3600 : [ 1.5, 3.0, 1.25 ], 7200 : [ 4.0, 3.0, 1.5 ],
+              10800 : [ 1.5, 1.0, 0.25 ], 14400 : [ 3.0, 0.5, 1.0 ] }
+AVERAGE_3600 = { 0 : [ 10.0, 1.0 ], 3600 : [ 1.2, 2.4 ], 7200 : [ 2.6666666666666665, 2.0 ], 10800 : [ 6.0, 4.0 ],
+                 14400 : [ 3.0, 0.5 ] }
+SUM_7200 = { 0 : [ 10.0, 3.0 ], 5400 : [ 6.0, 4.0 ], 7200 : [ 1.0, 1.0 ], 14400 : [ 3.0, 0.5 ] }
+AVERAGE_7200 = { 0 : [ 5.0, 1.5 ], 5400 : [ 6.0, 4.0 ], 7200 : [ 1.0, 1.0 ], 14400 : [ 3.0, 0.5 ] }
+FILLED = { 'A' : { 0 : 0, 3600 : 1, 7200 : 0, 10800 : 2.5 }, 'B' : { 0 : 0, 3600 : 0, 7200 : 4, 10800 : 0 } }
+ACCUMULATED = { 'A' : { 0 : 0, 3600 : 1, 7200 : 1, 10800 : 3.5 }, 'B' : { 0 : 0, 3600 : 0, 7200 : 4, 10800 : 4 } }
+
+class DBUtilsTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.dbUtils = DBUtils( None, 'Test' )
+
+  def test_granularity( self ):
+    self.assertEqual( self.dbUtils._spanToGranularity( 3600, copy.deepcopy( BUCKETS ) ), SPAN_3600 )
+    self.assertEqual( self.dbUtils._sumToGranularity( 3600, copy.deepcopy( BUCKETS ) ),
+                      dict( ( key, value[:-1] ) for key, value in SPAN_3600.items() ) )
+    self.assertEqual( self.dbUtils._averageToGranularity( 3600, copy.deepcopy( BUCKETS ) ), AVERAGE_3600 )
+    # Buckets of the granularity go whole to the bin of their start time
+    self.assertEqual( self.dbUtils._sumToGranularity( 7200, copy.deepcopy( BUCKETS ) ), SUM_7200 )
+    self.assertEqual( self.dbUtils._averageToGranularity( 7200, copy.deepcopy( BUCKETS ) ), AVERAGE_7200 )
+    self.assertEqual( self.dbUtils._sumToGranularity( 3600, [] ), {} )
+
+  def test_groups( self ):
+    dataDict = { 'A' : copy.deepcopy( BUCKETS ), 'B' : copy.deepcopy( BUCKETS[3:] ), 'C' : [] }
+    result = self.dbUtils._groupsToGranularity( 7200, dataDict, 'average' )
+    self.assertEqual( result, { 'A' : AVERAGE_7200,
+                                'B' : self.dbUtils._averageToGranularity( 7200, copy.deepcopy( BUCKETS[3:] ) ) } )
+    binTimes, binValues, proportions, filled = rebinBuckets( 3600, [ 0, 1800, 3600 ], [ 3600, 3600, 3600 ],
+                                                             [ [ 1 ], [ 2 ], [ 3 ] ], [ 0, 1, 1 ], 2 )
+    self.assertEqual( binTimes.tolist(), [ 0, 1800, 3600 ] )
+    self.assertEqual( binValues[ :, :, 0 ].tolist(), [ [ 1, 0, 0 ], [ 0, 2, 3 ] ] )
+    self.assertEqual( proportions.tolist(), [ [ 1, 0, 0 ], [ 0, 1, 1 ] ] )
+    self.assertEqual( filled.tolist(), [ [ True, False, False ], [ False, True, True ] ] )
+
+  def test_timedData( self ):
+    self.assertEqual( self.dbUtils._fillWithZero( 3600, 100, 14400, copy.deepcopy( TIMED_DATA ) ), FILLED )
+    self.assertEqual( self.dbUtils._accumulate( 3600, 100, 14400, copy.deepcopy( TIMED_DATA ) ), ACCUMULATED )
+    self.assertEqual( self.dbUtils._accumulate( 3600, 100, 100, {} ), {} )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( DBUtilsTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,144 @@
+""" Unit tests for the indexed lookups of ConfigurationData
+"""
+
+import unittest
+
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+from DIRAC.ConfigurationSystem.private.Refresher import _updateFromRemoteLocation
+from DIRAC.Core.Utilities.CFG import CFG
+
+__RCSID__ = "$Id$"
+
+class TestConfigurationData( unittest.TestCase ):
+
+  def setUp( self ):
+    cfg = CFG()
+    cfg.loadFromBuffer( """
+    DIRAC
+    {
+      Setup = TestSetup
+      Configuration
+      {
+        Servers = dips://cs1:9135/Configuration/Server
+      }
+    }
+    Systems
+    {
+      WorkloadManagement
+      {
+        Production
+        {
+          Services
+          {
+            JobManager
+            {
+              Port = 9132
+            }
+            Matcher
+            {
+              Port = 9170
+            }
+          }
+        }
+      }
+    }
+    """ )
+    self.confData = ConfigurationData( loadDefaultCFG = False )
+    self.confData.setRemoteCFG( cfg )
+
+  def test_sameAsWalking( self ):
+    """ indexed lookups give what walking the merged CFG gives """
+    mergedCFG = self.confData.mergedCFG
+    for path in ( "/DIRAC/Setup", "DIRAC/Setup", "/DIRAC//Setup/", " /DIRAC / Setup", "/DIRAC", "/DIRAC/Missing",
+                  "/", "", "/Systems/WorkloadManagement/Production/Services/Matcher/Port" ):
+      self.assertEqual( self.confData.extractOptionFromCFG( path ),
+                        self.confData.extractOptionFromCFG( path, mergedCFG ) )
+    for path in ( "/", "", "/Systems/WorkloadManagement/Production/Services", "/DIRAC/Setup", "/Missing" ):
+      self.assertEqual( self.confData.getSectionsFromCFG( path ),
+                        self.confData.getSectionsFromCFG( path, mergedCFG, ordered = True ) )
+      self.assertEqual( self.confData.getOptionsFromCFG( path ),
+                        self.confData.getOptionsFromCFG( path, mergedCFG, ordered = True ) )
+    self.assertEqual( self.confData.getServers(), [ "dips://cs1:9135/Configuration/Server" ] )
+
+  def test_updates( self ):
+    """ changes are seen after the sync, and a replaced mergedCFG is never shadowed """
+    self.confData.setOptionInCFG( "/DIRAC/Setup", "OtherSetup" )
+    self.assertEqual( self.confData.extractOptionFromCFG( "/DIRAC/Setup" ), "OtherSetup" )
+    self.confData.mergedCFG = CFG()
+    self.assertEqual( self.confData.extractOptionFromCFG( "/DIRAC/Setup" ), None )
+    self.assertEqual( self.confData.getSectionsFromCFG( "/" ), [] )
+
+  def test_modifications( self ):
+    """ a client applying the modifications ends up with the configuration of the server """
+    serverData = self.confData
+    serverData.setVersion( "2017-01-01 00:00:00" )
+    clientData = ConfigurationData( loadDefaultCFG = False )
+    clientData.loadRemoteCFGFromCompressedMem( serverData.getCompressedData() )
+    localCFG = CFG()
+    localCFG.loadFromBuffer( "Systems\n{\n  WorkloadManagement\n  {\n    Production\n    {\n"
+                             "      Services\n      {\n        Matcher\n        {\n          Port = 1234\n"
+                             "        }\n      }\n    }\n  }\n}\n" )
+    clientData.mergeWithLocal( localCFG )
+    oldVersion = clientData.getVersion()
+    # The server keeps the versions it serves
+    self.assertTrue( serverData.getCompressedModifications( oldVersion )[ 'OK' ] )
+    self.assertFalse( serverData.getCompressedModifications( "2016-01-01 00:00:00" )[ 'OK' ] )
+
+    serverData.setOptionInCFG( "/Systems/WorkloadManagement/Production/Services/Matcher/MaxThreads", "20",
+                               serverData.remoteCFG )
+    serverData.setOptionInCFG( "/Systems/WorkloadManagement/Production/Services/JobManager/Port", "9999",
+                               serverData.remoteCFG )
+    serverData.setVersion( "2017-01-02 00:00:00" )
+    result = serverData.getCompressedModifications( oldVersion )
+    self.assertTrue( result[ 'OK' ], result.get( 'Message' ) )
+    newestVersion, modifications = result[ 'Value' ]
+    self.assertEqual( newestVersion, "2017-01-02 00:00:00" )
+
+    result = clientData.loadRemoteModificationsFromCompressedMem( modifications )
+    self.assertTrue( result[ 'OK' ], result.get( 'Message' ) )
+    self.assertEqual( str( clientData.remoteCFG ), str( serverData.remoteCFG ) )
+    self.assertEqual( clientData.getVersion(), newestVersion )
+    servicePath = "/Systems/WorkloadManagement/Production/Services"
+    self.assertEqual( clientData.extractOptionFromCFG( "%s/Matcher/Port" % servicePath ), "1234" )
+    self.assertEqual( clientData.extractOptionFromCFG( "%s/Matcher/MaxThreads" % servicePath ), "20" )
+    self.assertEqual( clientData.extractOptionFromCFG( "%s/JobManager/Port" % servicePath ), "9999" )
+    self.assertEqual( clientData.getOptionsFromCFG( "%s/Matcher" % servicePath ), [ "Port", "MaxThreads" ] )
+    self.assertEqual( str( clientData.mergedCFG ),
+                      str( clientData.remoteCFG.mergeWith( clientData.localCFG ) ) )
+
+class FailingConfigurationClient( object ):
+  """ Configuration service client whose calls all fail with the given message
+  """
+
+  serviceURL = "dips://cs1:9135/Configuration/Server"
+
+  def __init__( self, message ):
+    self.message = message
+    self.calls = []
+
+  def getCompressedDataIfNewer( self, *args ):
+    self.calls.append( args )
+    return { 'OK' : False, 'Message' : self.message }
+
+class TestRefresh( unittest.TestCase ):
+
+  def test_retryWithoutModifications( self ):
+    """ Old servers reject the extra argument, the call is repeated without it
+    """
+    client = FailingConfigurationClient( "Server error while serving getCompressedDataIfNewer: "
+                                         "export_getCompressedDataIfNewer() takes exactly 2 arguments (3 given)" )
+    self.assertFalse( _updateFromRemoteLocation( client )[ 'OK' ] )
+    self.assertEqual( [ len( args ) for args in client.calls ], [ 2, 1 ] )
+
+  def test_noRetryOnTimeout( self ):
+    """ An unreachable server is not asked twice
+    """
+    client = FailingConfigurationClient( "Connection timeout" )
+    self.assertFalse( _updateFromRemoteLocation( client )[ 'OK' ] )
+    self.assertEqual( len( client.calls ), 1 )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( TestConfigurationData )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestRefresh ) )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
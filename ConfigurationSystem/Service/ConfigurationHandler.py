@@ -28,10 +28,18 @@ class ConfigurationHandler( RequestHandler ):
     return S_OK( sData )
 
   types_getCompressedDataIfNewer = [ basestring ]
-  def export_getCompressedDataIfNewer( self, sClientVersion ):
+  def export_getCompressedDataIfNewer( self, sClientVersion, acceptModifications = False ):
+    """ Get the configuration if the client version is older. Clients that accept them get
+        only the modifications since their version when they are still known
+    """
     sVersion = gServiceInterface.getVersion()
     retDict = { 'newestVersion' : sVersion }
     if sClientVersion < sVersion:
+      if acceptModifications:
+        result = gServiceInterface.getCompressedModifications( sClientVersion )
+        if result[ 'OK' ]:
+          retDict[ 'newestVersion' ], retDict[ 'modifications' ] = result[ 'Value' ]
+          return S_OK( retDict )
       retDict[ 'data' ] = gServiceInterface.getCompressedConfigurationData()
     return S_OK( retDict )
 
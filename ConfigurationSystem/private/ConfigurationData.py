@@ -6,10 +6,11 @@ import zlib
 import zipfile
 import thread
 import time
+from collections import OrderedDict
 import DIRAC
 
 from DIRAC.Core.Utilities.File import mkDir
-from DIRAC.Core.Utilities import List, Time
+from DIRAC.Core.Utilities import List, Time, DEncode
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.Utilities.CFG import CFG
 from DIRAC.Core.Utilities.LockRing import LockRing
@@ -26,12 +27,18 @@ class ConfigurationData( object ):
     self.threadingLock = lr.getLock()
     self.runningThreadsNumber = 0
     self.__compressedConfigurationData = None
+    # Served versions of the remote configuration and the modifications between them
+    self.__versionHistory = OrderedDict()
+    self.__compressedModifications = {}
+    self.__historyLock = lr.getLock()
     self.configurationPath = "/DIRAC/Configuration"
     self.backupsDir = os.path.join( DIRAC.rootPath, "etc", "csbackup" )
     self._isService = False
     self.localCFG = CFG()
     self.remoteCFG = CFG()
     self.mergedCFG = CFG()
+    # ( mergedCFG, options index, sections index ) published by sync
+    self.__mergedSnapshot = ( None, {}, {} )
     self.remoteServerList = []
     if loadDefaultCFG:
       defaultCFGFile = os.path.join( DIRAC.rootPath, "etc", "dirac.cfg" )
@@ -47,6 +54,10 @@ class ConfigurationData( object ):
   def sync( self ):
     gLogger.debug( "Updating configuration internals" )
     self.mergedCFG = self.remoteCFG.mergeWith( self.localCFG )
+    self.__publishSnapshot( self.mergedCFG )
+    self.__syncServers()
+
+  def __syncServers( self ):
     self.remoteServerList = []
     localServers = self.extractOptionFromCFG( "%s/Servers" % self.configurationPath,
                                               self.localCFG,
@@ -61,6 +72,63 @@ class ConfigurationData( object ):
     self.remoteServerList = List.uniqueElements( self.remoteServerList )
     self.__compressedConfigurationData = None
 
+  def __publishSnapshot( self, cfg, sectionPaths = None ):
+    """ Index all the options and sections of the merged configuration by path, and publish
+        the indexes by replacing the previous ones in a single assignment. Readers of the
+        merged configuration look the indexes up without locking, the snapshot they got
+        does not change under them
+
+        :param sectionPaths: if given, only the entries under these sections are indexed again,
+                             the rest are taken from the previous snapshot
+    """
+    if sectionPaths is None:
+      optionsIndex = {}
+      sectionsIndex = {}
+      pending = [ ( "", cfg ) ]
+    else:
+      _prevCFG, prevOptionsIndex, prevSectionsIndex = self.__mergedSnapshot
+      prefixes = tuple( "%s/" % path for path in sectionPaths )
+      optionsIndex = dict( ( path, value ) for path, value in prevOptionsIndex.iteritems()
+                           if not path.startswith( prefixes ) )
+      sectionsIndex = dict( ( path, entries ) for path, entries in prevSectionsIndex.iteritems()
+                            if path not in sectionPaths and not path.startswith( prefixes ) )
+      pending = [ ( path, self.__getSectionCFG( cfg, path ) ) for path in sectionPaths ]
+    while pending:
+      path, sectionCFG = pending.pop()
+      options = sectionCFG.listOptions()
+      sections = sectionCFG.listSections()
+      sectionsIndex[ path or "/" ] = ( tuple( sections ), tuple( options ) )
+      for option in options:
+        optionsIndex[ "%s/%s" % ( path, option ) ] = sectionCFG[ option ]
+      for section in sections:
+        pending.append( ( "%s/%s" % ( path, section ), sectionCFG[ section ] ) )
+    self.__mergedSnapshot = ( cfg, optionsIndex, sectionsIndex )
+
+  @staticmethod
+  def __getSectionCFG( cfg, path ):
+    for section in List.fromChar( path, "/" ):
+      cfg = cfg[ section ]
+    return cfg
+
+  def __getMergedIndex( self, position, path ):
+    """ Look a path up in one of the indexes of the merged configuration
+
+        :return: ( True, indexed value ) or ( False, None ) if the indexes can't be used
+                 because mergedCFG has been replaced without a sync
+    """
+    snapshot = self.__mergedSnapshot
+    if snapshot[0] is not self.mergedCFG:
+      return ( False, None )
+    index = snapshot[ position ]
+    if path in index:
+      return ( True, index[ path ] )
+    # Not the canonical form of the path: no spaces, a leading slash and no trailing one
+    try:
+      levelList = [ level.strip() for level in path.split( "/" ) if level.strip() != "" ]
+    except AttributeError:
+      return ( True, None )
+    return ( True, index.get( "/" + "/".join( levelList ) ) )
+
   def loadFile( self, fileName ):
     try:
       fileCFG = CFG()
@@ -92,6 +160,86 @@ class ConfigurationData( object ):
     self.unlock()
     self.sync()
 
+  def loadRemoteModificationsFromCompressedMem( self, data ):
+    """ Apply to the remote configuration the modifications sent by a configuration
+        server, and merge again only the sections they touch
+
+        If it fails the remote configuration may be partially modified, and has to be
+        loaded again completely
+    """
+    try:
+      modList = DEncode.decode( zlib.decompress( data ) )[0]
+      modifiedPaths = self.__getModifiedSectionPaths( self.remoteCFG, modList )
+    except Exception as e:
+      return S_ERROR( "Cannot read configuration modifications: %s" % str( e ) )
+    if "" in modifiedPaths:
+      self.lock()
+      try:
+        result = self.remoteCFG.applyModifications( modList )
+      finally:
+        self.unlock()
+      if result[ 'OK' ]:
+        self.sync()
+      return result
+    self.lock()
+    try:
+      result = self.remoteCFG.applyModifications( modList )
+      if not result[ 'OK' ]:
+        return result
+      for path in modifiedPaths:
+        self.__mergeSection( path )
+    except Exception as e:
+      return S_ERROR( "Cannot apply configuration modifications: %s" % str( e ) )
+    finally:
+      self.unlock()
+    self.__publishSnapshot( self.mergedCFG, modifiedPaths )
+    self.__syncServers()
+    return S_OK()
+
+  def __getModifiedSectionPaths( self, cfg, modList, parentPath = "" ):
+    """ Find the deepest sections whose own entries are modified by a getModifications list.
+        These are the sections that have to be merged again with the local configuration
+
+        :return: set of section paths, "" for the root
+    """
+    paths = set()
+    for modAction in modList:
+      action = modAction[0]
+      key = modAction[1]
+      if action != 'modSec':
+        return set( [ parentPath ] )
+      # A section moved or with a new comment changes its parent
+      if cfg.listAll().index( key ) != modAction[2] or cfg.getComment( key ) != modAction[4]:
+        return set( [ parentPath ] )
+      paths.update( self.__getModifiedSectionPaths( cfg[ key ], modAction[3], "%s/%s" % ( parentPath, key ) ) )
+    return paths
+
+  def __mergeSection( self, path ):
+    """ Merge again one section of the remote configuration with the local one, and replace
+        it in the merged configuration keeping its position and comment
+    """
+    levelList = List.fromChar( path, "/" )
+    remoteSection = self.__getSectionCFG( self.remoteCFG, path )
+    try:
+      localSection = self.__getSectionCFG( self.localCFG, path )
+    except ( KeyError, TypeError ):
+      localSection = None
+    if localSection is not None and isinstance( localSection, CFG ):
+      mergedSection = remoteSection.mergeWith( localSection )
+    else:
+      mergedSection = remoteSection.clone()
+    mergedParent = self.__getSectionCFG( self.mergedCFG, "/".join( levelList[:-1] ) )
+    sectionName = levelList[-1]
+    entries = list( mergedParent.listAll() )
+    position = entries.index( sectionName )
+    comment = mergedParent.getComment( sectionName )
+    mergedParent.deleteKey( sectionName )
+    if position + 1 < len( entries ):
+      beforeKey = entries[ position + 1 ]
+    else:
+      beforeKey = ""
+    mergedParent.addKey( sectionName, mergedSection, comment, beforeKey )
+
   def loadConfigurationData( self, fileName = False ):
     name = self.getName()
     self.lock()
@@ -121,6 +269,11 @@ class ConfigurationData( object ):
 
   def getSectionsFromCFG( self, path, cfg = False, ordered = False ):
     if not cfg:
+      indexed, entries = self.__getMergedIndex( 2, path )
+      if indexed:
+        if entries is None:
+          return None
+        return list( entries[0] )
       cfg = self.mergedCFG
     self.dangerZoneStart()
     try:
@@ -134,6 +287,11 @@ class ConfigurationData( object ):
 
   def getOptionsFromCFG( self, path, cfg = False, ordered = False ):
     if not cfg:
+      indexed, entries = self.__getMergedIndex( 2, path )
+      if indexed:
+        if entries is None:
+          return None
+        return list( entries[1] )
       cfg = self.mergedCFG
     self.dangerZoneStart()
     try:
@@ -147,6 +305,9 @@ class ConfigurationData( object ):
 
   def extractOptionFromCFG( self, path, cfg = False, disableDangerZones = False ):
     if not cfg:
+      indexed, value = self.__getMergedIndex( 1, path )
+      if indexed:
+        return value
       cfg = self.mergedCFG
     if not disableDangerZones:
       self.dangerZoneStart()
@@ -229,6 +390,12 @@ class ConfigurationData( object ):
     except:
       return 300
 
+  def getModificationsHistorySize( self ):
+    try:
+      return int( self.extractOptionFromCFG( "%s/ModificationsHistorySize" % self.configurationPath, self.mergedCFG ) )
+    except:
+      return 10
+
   def getSlavesGraceTime( self ):
     try:
       return int( self.extractOptionFromCFG( "%s/SlavesGraceTime" % self.configurationPath, self.mergedCFG ) )
@@ -274,6 +441,37 @@ class ConfigurationData( object ):
       self.__compressedConfigurationData = zlib.compress( str( self.remoteCFG ), 9 )
     return self.__compressedConfigurationData
 
+  def getCompressedModifications( self, fromVersion ):
+    """ Get the modifications of the remote configuration since a previous version.
+        The versions that have been served are kept in a short history
+
+        :return: S_OK( ( newest version, compressed modifications ) ) or S_ERROR if the
+                 version is not in the history or the modifications are bigger than the
+                 whole configuration
+    """
+    currentCFG = self.remoteCFG
+    currentVersion = self.getVersion( currentCFG )
+    self.__historyLock.acquire()
+    try:
+      if currentVersion not in self.__versionHistory:
+        self.__versionHistory[ currentVersion ] = currentCFG.clone()
+        while len( self.__versionHistory ) > max( 1, self.getModificationsHistorySize() ):
+          oldVersion, _oldCFG = self.__versionHistory.popitem( last = False )
+          for versions in [ versions for versions in self.__compressedModifications if oldVersion in versions ]:
+            del self.__compressedModifications[ versions ]
+      if fromVersion not in self.__versionHistory:
+        return S_ERROR( "Version %s is not in the modifications history" % fromVersion )
+      versions = ( fromVersion, currentVersion )
+      if versions not in self.__compressedModifications:
+        modList = self.__versionHistory[ fromVersion ].getModifications( self.__versionHistory[ currentVersion ] )
+        self.__compressedModifications[ versions ] = zlib.compress( DEncode.encode( modList ), 9 )
+      data = self.__compressedModifications[ versions ]
+    finally:
+      self.__historyLock.release()
+    if len( data ) >= len( self.getCompressedData() ):
+      return S_ERROR( "Modifications since version %s are bigger than the configuration" % fromVersion )
+    return S_OK( ( currentVersion, data ) )
+
   def isMaster( self ):
     value = self.extractOptionFromCFG( "%s/Master" % self.configurationPath, self.localCFG )
     if value and value.lower() in ( "yes", "true", "y" ):
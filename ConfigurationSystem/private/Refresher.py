@@ -15,17 +15,47 @@ from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 def _updateFromRemoteLocation( serviceClient ):
   gLogger.debug( "", "Trying to refresh from %s" % serviceClient.serviceURL )
   localVersion = gConfigurationData.getVersion()
-  retVal = serviceClient.getCompressedDataIfNewer( localVersion )
+  retVal = serviceClient.getCompressedDataIfNewer( localVersion, True )
+  if not retVal[ 'OK' ] and _isArgumentMismatch( retVal[ 'Message' ] ):
+    # Old servers do not send modifications and do not accept the extra argument
+    retVal = serviceClient.getCompressedDataIfNewer( localVersion )
   if retVal[ 'OK' ]:
     dataDict = retVal[ 'Value' ]
     if localVersion < dataDict[ 'newestVersion' ] :
       gLogger.debug( "New version available", "Updating to version %s..." % dataDict[ 'newestVersion' ] )
-      gConfigurationData.loadRemoteCFGFromCompressedMem( dataDict[ 'data' ] )
+      if 'modifications' in dataDict:
+        result = _loadModifications( serviceClient, dataDict[ 'modifications' ], dataDict[ 'newestVersion' ] )
+        if not result[ 'OK' ]:
+          return result
+      else:
+        gConfigurationData.loadRemoteCFGFromCompressedMem( dataDict[ 'data' ] )
       gLogger.debug( "Updated to version %s" % gConfigurationData.getVersion() )
       gEventDispatcher.triggerEvent( "CSNewVersion", dataDict[ 'newestVersion' ], threaded = True )
     return S_OK()
   return retVal
 
+def _isArgumentMismatch( message ):
+  """ Whether the server failed because of the arguments of the call, e.g. a TypeError of an old
+      export_getCompressedDataIfNewer that does not take acceptModifications. Any other error,
+      like a timeout, would fail again
+  """
+  return "argument" in message
+
+def _loadModifications( serviceClient, modifications, newestVersion ):
+  """ Apply the modifications sent by the server, or get the whole configuration
+      if they don't lead to the newest version
+  """
+  result = gConfigurationData.loadRemoteModificationsFromCompressedMem( modifications )
+  if result[ 'OK' ] and gConfigurationData.getVersion() == newestVersion:
+    return result
+  gLogger.warn( "Could not apply configuration modifications, getting the whole configuration",
+                result.get( 'Message', "version mismatch" ) )
+  result = serviceClient.getCompressedData()
+  if not result[ 'OK' ]:
+    return result
+  gConfigurationData.loadRemoteCFGFromCompressedMem( result[ 'Value' ] )
+  return S_OK()
+
 
 class Refresher( threading.Thread ):
 
@@ -67,6 +97,9 @@ class Refresher( threading.Thread ):
   def refreshConfigurationIfNeeded( self ):
     if not self.__refreshEnabled or self.__automaticUpdate or not gConfigurationData.getServers():
       return
+    # Most of the calls come before the refresh time, they don't need the lock
+    if not self.__lastRefreshExpired():
+      return
     self.__triggeredRefreshLock.acquire()
     try:
       if not self.__lastRefreshExpired():
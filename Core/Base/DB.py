@@ -40,6 +40,7 @@ class DB( MySQL ):
     if not self._connected:
       raise RuntimeError( "Can not connect to DB '%s', exiting..." % self.dbName )
 
+    self.setSlowQueryTime( self.getCSOption( "SlowQueryTime", 1.0 ) )
 
     self.log.info( "==================================================" )
     self.log.info( "User:           " + self.dbUser )
@@ -28,7 +28,7 @@ class TransferClient( BaseClient ):
     trid, transport = retVal[ 'Value' ]
     try:
       #FFC -> File from Client
-      retVal = self._proposeAction( transport, ( "FileTransfer", actionName ) )
+      retVal = self._proposeAction( transport, ( "FileTransfer", actionName ), rawTransfer = True )
       if not retVal[ 'OK' ]:
         return retVal
       retVal = transport.sendData( S_OK( fileInfo ) )
@@ -150,7 +150,8 @@ class TransferClient( BaseClient ):
       retVal = fileHelper.bulkToNetwork( fileList, compress, onthefly )
       if not retVal[ 'OK' ]:
         return retVal
-      retVal = transport.receiveData()      return retVal
+      retVal = transport.receiveData()
+      return retVal
     finally:
       self._disconnect( trid )
 
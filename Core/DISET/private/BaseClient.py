@@ -9,12 +9,13 @@ import thread
 import DIRAC
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
-from DIRAC.Core.Utilities import List, Network
+from DIRAC.Core.Utilities import List, Network, DEncode
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURL, getServiceFailoverURL
 from DIRAC.Core.Security import CS
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.ConnectionPool import getGlobalConnectionPool
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
 
 
@@ -38,6 +39,7 @@ class BaseClient(object):
   KW_PROXY_CHAIN = "proxyChain"
   KW_SKIP_CA_CHECK = "skipCACheck"
   KW_KEEP_ALIVE_LAPSE = "keepAliveLapse"
+  KW_KEEP_CONNECTION = "keepConnection"
 
   __threadConfig = ThreadConfig()
 
@@ -57,6 +59,7 @@ class BaseClient(object):
       :param proxyChain: Specify the proxy chain
       :param skipCACheck: Do not check the CA
       :param keepAliveLapse: Duration for keepAliveLapse (heartbeat like)
+      :param keepConnection: Reuse connections to the service when it supports it (default True)
     """
 
 
@@ -413,13 +416,17 @@ and this is thread %s
       #raise Exception( msgTxt )
 
 
-  def _connect( self ):
+  def _connect( self, reuse = False ):
     """ Establish the connection.
         It uses the URL discovered in __discoverURL.
         In case the connection cannot be established, __discoverURL
         is called again, and _connect calls itself.
         We stop after trying self.__nbOfRetry * self.__nbOfUrls
 
+        :param reuse: take an idle connection with the same destination and credentials
+                      from the connection pool if there is one. The returned structure then
+                      has the 'reused' flag set.
+
     """
     # Check if the useServerCertificate configuration changed
     # Note: I am not really sure that  all this block makes
@@ -441,6 +448,17 @@ and this is thread %s
     if self.__enableThreadCheck:
       self.__checkThreadID()
 
+    connectionKey = self.__getConnectionKey()
+    if reuse and self.__keepConnection():
+      transport = getGlobalConnectionPool().get( connectionKey )
+      if transport:
+        gLogger.debug( "Reusing connection to: %s" % self.serviceURL )
+        trid = getGlobalTransportPool().add( transport )
+        getGlobalTransportPool().associateData( trid, 'connectionKey', connectionKey )
+        result = S_OK( ( trid, transport ) )
+        result[ 'reused' ] = True
+        return result
+
     gLogger.debug( "Connecting to: %s" % self.serviceURL )
     try:
       # Calls the transport method of the apropriate protocol.
@@ -476,7 +494,7 @@ and this is thread %s
           # rediscover the URL
           self.__discoverURL()
           # try to reconnect
-          return self._connect()
+          return self._connect( reuse )
         else:
           return retVal
     except Exception as e:
@@ -484,18 +502,44 @@ and this is thread %s
       return S_ERROR( "Can't connect to %s: %s" % ( self.serviceURL, repr( e ) ) )
     # We add the connection to the transport pool
     trid = getGlobalTransportPool().add( transport )
+    getGlobalTransportPool().associateData( trid, 'connectionKey', connectionKey )
 
     return S_OK( ( trid, transport ) )
 
-  def _disconnect( self, trid ):
+  def _disconnect( self, trid, keepConnection = False ):
     """ Disconnect the connection.
 
         :param trid: Transport ID in the transportPool
+        :param keepConnection: if True, the connection is not closed but given back
+                               to the connection pool to be reused by the next call
+    """
+    transportPool = getGlobalTransportPool()
+    if not keepConnection or not self.__keepConnection():
+      transportPool.close( trid )
+      return
+    transport = transportPool.get( trid )
+    connectionKey = transportPool.getAssociatedData( trid, 'connectionKey' )
+    transportPool.remove( trid )
+    if transport:
+      getGlobalConnectionPool().release( connectionKey, transport )
+
+  def __keepConnection( self ):
+    """ Connections are kept unless disabled by the client or by the pool configuration
+    """
+    keepConnection = self.kwargs.get( self.KW_KEEP_CONNECTION, True )
+    # It may come as a string from /DIRAC/ConnConf
+    if not keepConnection or str( keepConnection ).lower() in ( "false", "no", "0" ):
+      return False
+    return getGlobalConnectionPool().isEnabled()
+
+  def __getConnectionKey( self ):
+    """ Connections can only be reused by calls to the same URL with the same credentials.
+        The kwargs contain all the credentials and transport options
     """
-    getGlobalTransportPool().close( trid )
+    return ( self.serviceURL, str( self.__extraCredentials ), str( sorted( self.kwargs.items() ) ) )
 
 
-  def _proposeAction( self, transport, action ):
+  def _proposeAction( self, transport, action, keepConnection = False, negotiateCodec = False, rawTransfer = False ):
     """ Proposes an action by sending a tuple containing
 
           * System/Component
@@ -503,9 +547,21 @@ and this is thread %s
           * VO
           * action
           * extraCredentials
+          * options (only if keepConnection, negotiateCodec or rawTransfer are requested)
 
         It is kind of a handshake.
 
+        If keepConnection is requested, the server answers with the 'keepConnection'
+        flag set in the returned structure if it agrees to serve more proposals through
+        this connection. Old servers ignore the request.
+
+        If negotiateCodec is requested, the codecs known by the client are offered and
+        the server answers with the one to use for the following messages, if any.
+
+        If rawTransfer is requested for a file transfer, the server answers with the
+        'rawTransfer' flag set if it accepts to exchange the file data as raw bytes.
+        The flag is then set in the transport for the FileHelper.
+
         The server might ask for a delegation, in which case it is done here.
         The result of the delegation is then returned.
 
@@ -522,12 +578,27 @@ and this is thread %s
     stConnectionInfo = ( ( self.__URLTuple[3], self.setup, self.vo ),
                          action,
                          self.__extraCredentials )
+    options = {}
+    if keepConnection and self.__keepConnection():
+      options[ 'keepConnection' ] = True
+    if negotiateCodec:
+      options[ 'codecs' ] = DEncode.getCodecNames()
+    if rawTransfer:
+      options[ 'rawTransfer' ] = True
+    if options:
+      stConnectionInfo += ( options, )
 
     # Send the connection info and get the answer back
     retVal = transport.sendData( S_OK( stConnectionInfo ) )
     if not retVal[ 'OK' ]:
       return retVal
     serverReturn = transport.receiveData()
+    if serverReturn[ 'OK' ] and serverReturn.get( 'codec' ):
+      retVal = transport.setCodec( serverReturn[ 'codec' ] )
+      if not retVal[ 'OK' ]:
+        return retVal
+    if serverReturn[ 'OK' ]:
+      transport.setRawTransfer( bool( serverReturn.get( 'rawTransfer' ) ) )
 
     #TODO: Check if delegation is required. This seems to be used only for the GatewayService
     if serverReturn[ 'OK' ] and 'Value' in serverReturn and isinstance( serverReturn[ 'Value' ], dict ):
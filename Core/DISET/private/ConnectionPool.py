@@ -0,0 +1,167 @@
+""" Client side pool of established DISET connections
+
+    Connections are kept idle after an RPC has been served by a peer that agreed to keep
+    them open, and are reused for the next call with the same destination and credentials.
+    This avoids one full (SSL) handshake per call.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import select
+import threading
+
+from DIRAC import gLogger
+from DIRAC.ConfigurationSystem.Client.Config import gConfig
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
+
+class ConnectionPool( object ):
+  """ Per process, thread safe pool of idle client transports, keyed by
+      ( URL, credentials, extra credentials )
+  """
+
+  def __init__( self, maxPerEndpoint = 4, maxIdleTime = 60, logger = False ):
+    """
+      :param maxPerEndpoint: maximum number of idle transports kept for one key
+      :param maxIdleTime: seconds an idle transport can stay in the pool
+    """
+    if logger:
+      self.log = logger
+    else:
+      self.log = gLogger
+    self.__maxPerEndpoint = max( 0, maxPerEndpoint )
+    self.__maxIdleTime = max( 0, maxIdleTime )
+    self.__lock = threading.Lock()
+    self.__idle = {}
+    self.__stats = { 'hits' : 0, 'misses' : 0, 'evictions' : 0 }
+    result = gThreadScheduler.addPeriodicTask( self.__maxIdleTime, self.purgeIdle )
+    if not result[ 'OK' ]:
+      self.log.error( "Cannot add idle connection purge task", result[ 'Message' ] )
+
+  def isEnabled( self ):
+    return self.__maxPerEndpoint > 0 and self.__maxIdleTime > 0
+
+  def getStats( self ):
+    """ Counters of pool activity
+    """
+    self.__lock.acquire()
+    try:
+      stats = dict( self.__stats )
+      stats[ 'idle' ] = sum( [ len( idleList ) for idleList in self.__idle.values() ] )
+    finally:
+      self.__lock.release()
+    return stats
+
+  def get( self, key ):
+    """ Get an idle healthy transport for the key or None if there is none
+    """
+    while True:
+      self.__lock.acquire()
+      try:
+        idleList = self.__idle.get( key )
+        if not idleList:
+          self.__stats[ 'misses' ] += 1
+          return None
+        transport, releaseTime = idleList.pop()
+        if not idleList:
+          del self.__idle[ key ]
+      finally:
+        self.__lock.release()
+      if time.time() - releaseTime < self.__maxIdleTime and self.__isHealthy( transport ):
+        self.__increment( 'hits' )
+        return transport
+      self.__discard( transport )
+
+  def release( self, key, transport ):
+    """ Give back a transport to the pool. If the pool is full for that key it is closed
+    """
+    if not self.isEnabled():
+      self.__discard( transport )
+      return
+    self.__lock.acquire()
+    try:
+      idleList = self.__idle.setdefault( key, [] )
+      if len( idleList ) < self.__maxPerEndpoint:
+        idleList.append( ( transport, time.time() ) )
+        return
+    finally:
+      self.__lock.release()
+    self.__discard( transport )
+
+  def purgeIdle( self ):
+    """ Close the transports that have been idle for too long. The health of the
+        remaining ones is checked when they are taken out of the pool
+    """
+    toDiscard = []
+    now = time.time()
+    self.__lock.acquire()
+    try:
+      for key in list( self.__idle ):
+        keep = []
+        for transport, releaseTime in self.__idle[ key ]:
+          if now - releaseTime < self.__maxIdleTime:
+            keep.append( ( transport, releaseTime ) )
+          else:
+            toDiscard.append( transport )
+        if keep:
+          self.__idle[ key ] = keep
+        else:
+          del self.__idle[ key ]
+    finally:
+      self.__lock.release()
+    for transport in toDiscard:
+      self.__discard( transport )
+
+  def closeAll( self ):
+    self.__lock.acquire()
+    try:
+      idleTransports = [ idle[0] for idleList in self.__idle.values() for idle in idleList ]
+      self.__idle = {}
+    finally:
+      self.__lock.release()
+    for transport in idleTransports:
+      self.__discard( transport )
+
+  def __isHealthy( self, transport ):
+    """ An idle transport must not have anything to read. If it does, it is either
+        a keep alive from the peer, which is processed, or the peer closing the connection
+    """
+    try:
+      while True:
+        if transport.byteStream:
+          readable = True
+        else:
+          readable = select.select( [ transport.getSocket() ], [], [], 0 )[0]
+        if not readable:
+          return True
+        result = transport.receiveData( blockAfterKeepAlive = False )
+        if not result[ 'OK' ] or not result.get( 'keepAlive' ):
+          return False
+    except Exception:
+      return False
+
+  def __increment( self, counter ):
+    self.__lock.acquire()
+    try:
+      self.__stats[ counter ] += 1
+    finally:
+      self.__lock.release()
+
+  def __discard( self, transport ):
+    """ Close a transport, it must be called without holding the lock
+    """
+    self.__increment( 'evictions' )
+    try:
+      transport.close()
+    except Exception:
+      pass
+
+
+gConnectionPool = None
+
+def getGlobalConnectionPool():
+  global gConnectionPool
+  if not gConnectionPool:
+    gConnectionPool = ConnectionPool( maxPerEndpoint = gConfig.getValue( "/DIRAC/ConnectionPool/MaxPerEndpoint", 4 ),
+                                      maxIdleTime = gConfig.getValue( "/DIRAC/ConnectionPool/MaxIdleTime", 60 ) )
+  return gConnectionPool
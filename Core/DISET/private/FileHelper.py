@@ -1,7 +1,9 @@
 # $HeadURL$
 __RCSID__ = "$Id$"
 
+import io
 import os
+import stat
 try:
   import hashlib
   md5 = hashlib
@@ -18,20 +20,34 @@ from DIRAC.FrameworkSystem.Client.Logger import gLogger
 gLogger = gLogger.getSubLogger( "FileTransmissionHelper" )
 
 class FileHelper:
+  """ Sends and receives files, strings and tar bulks through a transport.
+
+      The data goes in chunks, each one a DEncoded message acknowledged by the receiver.
+      If both ends agreed on raw transfers when proposing the action, a chunk is instead a
+      raw block: a message with the number of bytes of the block followed by the bytes
+      themselves, received straight into a reusable buffer. Blocks can be much bigger than
+      packetSize, since they are streamed through the buffer and not held in memory.
+  """
 
   __validDirections = ( "toClient", "fromClient", 'receive', 'send' )
   __directionsMapping = { 'toClient' : 'send', 'fromClient' : 'receive' }
 
   def __init__( self, oTransport = None, checkSum = True ):
-    self.oTransport = oTransport
+    self.oTransport = None
     self.__checkMD5 = checkSum
     self.__oMD5 = md5.md5()
     self.bFinishedTransmission = False
     self.bReceivedEOF = False
     self.direction = False
     self.packetSize = 1048576
+    #Maximum size of a raw block, the receiver acknowledges each one
+    self.rawBlockSize = 16777216
+    self.__rawTransfer = False
+    self.__rawBuffer = None
     self.__fileBytes = 0
     self.__log = gLogger.getSubLogger( "FileHelper" )
+    if oTransport:
+      self.setTransport( oTransport )
 
   def disableCheckSum( self ):
     self.__checkMD5 = False
@@ -41,6 +57,17 @@ class FileHelper:
 
   def setTransport( self, oTransport ):
     self.oTransport = oTransport
+    self.__rawTransfer = oTransport.getRawTransfer()
+
+  def rawTransfer( self ):
+    return self.__rawTransfer
+
+  def __getRawBufferView( self ):
+    """ Buffer reused by all the raw blocks
+    """
+    if self.__rawBuffer is None:
+      self.__rawBuffer = bytearray( self.packetSize )
+    return memoryview( self.__rawBuffer )
 
   def setDirection( self, direction ):
     if direction in FileHelper.__validDirections:
@@ -56,6 +83,8 @@ class FileHelper:
     return self.__fileBytes
 
   def sendData( self, sBuffer ):
+    if self.__rawTransfer:
+      return self.__sendRawBlock( sBuffer )
     if self.__checkMD5:
       self.__oMD5.update( sBuffer )
     retVal = self.oTransport.sendData( S_OK( ( True, sBuffer ) ) )
@@ -65,7 +94,11 @@ class FileHelper:
     return retVal
 
   def sendEOF( self ):
-    retVal = self.oTransport.sendData( S_OK( ( False, self.__oMD5.hexdigest() ) ) )
+    fileHash = self.__oMD5.hexdigest()
+    if self.__rawTransfer and not self.__checkMD5:
+      #Tell the receiver there's nothing to check
+      fileHash = ""
+    retVal = self.oTransport.sendData( S_OK( ( False, fileHash ) ) )
     if not retVal[ 'OK' ]:
       return retVal
     self.__finishedTransmission()
@@ -89,24 +122,161 @@ class FileHelper:
       return retVal
     stBuffer = retVal[ 'Value' ]
     if stBuffer[0]:
-      if self.__checkMD5:
+      if self.__rawTransfer:
+        if maxBufferSize and stBuffer[1] > maxBufferSize:
+          return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+        sIO = cStringIO.StringIO()
+        retVal = self.__receiveRawBytes( stBuffer[1], sIO.write )
+        if not retVal[ 'OK' ]:
+          return retVal
+        stBuffer = ( True, sIO.getvalue() )
+      elif self.__checkMD5:
         self.__oMD5.update( stBuffer[1] )
       self.oTransport.sendData( S_OK() )
     else:
       self.bReceivedEOF = True
       if self.__checkMD5 and not self.__oMD5.hexdigest() == stBuffer[1]:
-        self.bErrorInMD5 = True
+        if stBuffer[1] or not self.__rawTransfer:
+          self.bErrorInMD5 = True
       self.__finishedTransmission()
       return S_OK( "" )
     return S_OK( stBuffer[1] )
 
+  def __sendRawBlock( self, data ):
+    """ Send a block held in memory: its size and then its bytes
+    """
+    retVal = self.oTransport.sendData( S_OK( ( True, len( data ) ) ) )
+    if not retVal[ 'OK' ]:
+      return retVal
+    retVal = self.__sendRawBytes( data )
+    if not retVal[ 'OK' ]:
+      return retVal
+    return self.oTransport.receiveData()
+
+  def __sendRawBytes( self, data ):
+    if self.__checkMD5:
+      self.__oMD5.update( data )
+    return self.oTransport.sendRaw( data )
+
+  def __receiveRawBytes( self, numBytes, writeFunction = None ):
+    """ Receive the bytes of a raw block through the buffer, passing them to writeFunction
+    """
+    bufView = self.__getRawBufferView()
+    while numBytes > 0:
+      retVal = self.oTransport.receiveRawInto( bufView[ :min( numBytes, len( bufView ) ) ] )
+      if not retVal[ 'OK' ]:
+        return retVal
+      readBytes = retVal[ 'Value' ]
+      if self.__checkMD5:
+        self.__oMD5.update( bufView[ :readBytes ] )
+      if writeFunction:
+        writeFunction( buffer( self.__rawBuffer, 0, readBytes ) )
+      numBytes -= readBytes
+    return S_OK()
+
+  def __rawSourceToNetwork( self, readInto, knownSize = 0 ):
+    """ Send the data of a source as raw blocks. While the number of bytes left in the
+        source is known, blocks are sent as they are read through the buffer. Afterwards
+        each block is what fits in the buffer.
+
+        :param readInto: function filling a memoryview, returns the number of bytes read, 0 at the end
+        :param int knownSize: number of bytes the source has for sure
+        :return: S_OK( sent bytes ), with the 'AbortTransfer' flag if the receiver aborted
+    """
+    bufView = self.__getRawBufferView()
+    sentBytes = 0
+    while True:
+      if knownSize > 0:
+        blockSize = min( knownSize, self.rawBlockSize )
+        knownSize -= blockSize
+        retVal = self.oTransport.sendData( S_OK( ( True, blockSize ) ) )
+        if not retVal[ 'OK' ]:
+          return retVal
+        pendingBytes = blockSize
+        while pendingBytes:
+          readBytes = readInto( bufView[ :min( pendingBytes, len( bufView ) ) ] )
+          if not readBytes:
+            return S_ERROR( "Data source ended %s bytes before its expected size" % pendingBytes )
+          retVal = self.__sendRawBytes( bufView[ :readBytes ] )
+          if not retVal[ 'OK' ]:
+            return retVal
+          pendingBytes -= readBytes
+      else:
+        blockSize = 0
+        while blockSize < len( bufView ):
+          readBytes = readInto( bufView[ blockSize: ] )
+          if not readBytes:
+            break
+          blockSize += readBytes
+        if not blockSize:
+          break
+        retVal = self.oTransport.sendData( S_OK( ( True, blockSize ) ) )
+        if not retVal[ 'OK' ]:
+          return retVal
+        retVal = self.__sendRawBytes( bufView[ :blockSize ] )
+        if not retVal[ 'OK' ]:
+          return retVal
+      sentBytes += blockSize
+      retVal = self.oTransport.receiveData()
+      if not retVal[ 'OK' ]:
+        return retVal
+      if 'AbortTransfer' in retVal and retVal[ 'AbortTransfer' ]:
+        result = S_OK( sentBytes )
+        result[ 'AbortTransfer' ] = True
+        return result
+    return S_OK( sentBytes )
+
+  def __rawStringToNetwork( self, stringVal ):
+    """ Send a string as raw blocks without copying it
+    """
+    stringView = memoryview( stringVal )
+    offset = 0
+    while offset < len( stringVal ):
+      retVal = self.__sendRawBlock( stringView[ offset : offset + self.rawBlockSize ] )
+      if not retVal[ 'OK' ]:
+        return retVal
+      if 'AbortTransfer' in retVal and retVal[ 'AbortTransfer' ]:
+        return retVal
+      offset += self.rawBlockSize
+    return S_OK( len( stringVal ) )
+
+  def __rawToNetwork( self, result ):
+    """ Finish a raw transfer with the result of sending the data
+    """
+    if not result[ 'OK' ]:
+      return result
+    if 'AbortTransfer' in result and result[ 'AbortTransfer' ]:
+      self.__log.verbose( "Transfer aborted" )
+      return S_OK()
+    self.__fileBytes = result[ 'Value' ]
+    return self.sendEOF()
+
+  @staticmethod
+  def __getRemainingSize( iFD, getPosition = None ):
+    """ Bytes left to read in a regular file, 0 if it's not one
+    """
+    try:
+      fdStat = os.fstat( iFD )
+      if not stat.S_ISREG( fdStat.st_mode ):
+        return 0
+      if getPosition:
+        position = getPosition()
+      else:
+        position = os.lseek( iFD, 0, os.SEEK_CUR )
+      return max( 0, fdStat.st_size - position )
+    except ( OSError, IOError ):
+      return 0
+
   def receivedEOF( self ):
     return self.bReceivedEOF
 
   def markAsTransferred( self ):
     if not self.bFinishedTransmission:
       if self.direction == "receive":
-        self.oTransport.receiveData()
+        retVal = self.oTransport.receiveData()
+        if self.__rawTransfer and retVal[ 'OK' ] and retVal[ 'Value' ] and retVal[ 'Value' ][0]:
+          #Skip the bytes of the block being sent
+          self.__receiveRawBytes( retVal[ 'Value' ][1] )
         abortTrans = S_OK()
         abortTrans[ 'AbortTransfer' ] = True
         self.oTransport.sendData( abortTrans )
@@ -154,6 +324,8 @@ class FileHelper:
     self.__oMD5 = md5.md5()
     self.bReceivedEOF = False
     self.bErrorInMD5 = False
+    if self.__rawTransfer:
+      return self.__rawNetworkToDataSink( dataSink, maxFileSize )
     receivedBytes = 0
     try:
       result = self.receiveData( maxBufferSize = maxFileSize )
@@ -180,9 +352,54 @@ class FileHelper:
     self.__fileBytes = receivedBytes
     return S_OK()
 
+  def __rawNetworkToDataSink( self, dataSink, maxFileSize ):
+    """ Receive raw blocks until the end of the transfer, writing them to the data sink
+    """
+    receivedBytes = 0
+    try:
+      while True:
+        retVal = self.oTransport.receiveData()
+        if 'AbortTransfer' in retVal and retVal[ 'AbortTransfer' ]:
+          self.oTransport.sendData( S_OK() )
+          self.__finishedTransmission()
+          self.bReceivedEOF = True
+          break
+        if not retVal[ 'OK' ]:
+          return retVal
+        isBlock, blockInfo = retVal[ 'Value' ]
+        if not isBlock:
+          self.bReceivedEOF = True
+          #An empty hash means the sender did not compute it
+          if self.__checkMD5 and blockInfo and self.__oMD5.hexdigest() != blockInfo:
+            self.bErrorInMD5 = True
+          self.__finishedTransmission()
+          break
+        if maxFileSize > 0 and receivedBytes + blockInfo > maxFileSize:
+          self.sendError( "Exceeded maximum file size" )
+          return S_ERROR( "Received file exceeded maximum size of %s bytes" % ( maxFileSize ) )
+        retVal = self.__receiveRawBytes( blockInfo, dataSink.write )
+        if not retVal[ 'OK' ]:
+          return retVal
+        receivedBytes += blockInfo
+        retVal = self.oTransport.sendData( S_OK() )
+        if not retVal[ 'OK' ]:
+          return retVal
+    except Exception as e:
+      return S_ERROR( "Error while receiving file, %s" % str( e ) )
+    if self.errorInTransmission():
+      return S_ERROR( "Error in the file CRC" )
+    self.__fileBytes = receivedBytes
+    return S_OK()
+
   def stringToNetwork( self, stringVal ):
     """ Send a given string to the DISET client over the network
     """
+    if self.__rawTransfer:
+      self.__oMD5 = md5.md5()
+      try:
+        return self.__rawToNetwork( self.__rawStringToNetwork( stringVal ) )
+      except Exception as e:
+        return S_ERROR( "Error while sending string: %s" % str( e ) )
 
     stringIO = cStringIO.StringIO( stringVal )
 
@@ -215,6 +432,13 @@ class FileHelper:
     iPacketSize = self.packetSize
     self.__fileBytes = 0
     sentBytes = 0
+    if self.__rawTransfer:
+      try:
+        fileIO = io.FileIO( iFD, closefd = False )
+        return self.__rawToNetwork( self.__rawSourceToNetwork( fileIO.readinto, self.__getRemainingSize( iFD ) ) )
+      except Exception as e:
+        gLogger.exception( "Error while sending file" )
+        return S_ERROR( "Error while sending file: %s" % str( e ) )
     try:
       sBuffer = os.read( iFD, iPacketSize )
       while len( sBuffer ) > 0:
@@ -234,6 +458,8 @@ class FileHelper:
     return S_OK()
 
   def BufferToNetwork( self, stringToSend ):
+    if self.__rawTransfer:
+      return self.stringToNetwork( stringToSend )
     sIO = cStringIO.StringIO( stringToSend )
     try:
       return self.DataSourceToNetwork( sIO )
@@ -247,6 +473,15 @@ class FileHelper:
     iPacketSize = self.packetSize
     self.__fileBytes = 0
     sentBytes = 0
+    if self.__rawTransfer:
+      knownSize = 0
+      try:
+        if isinstance( dataSource, file ):
+          knownSize = self.__getRemainingSize( dataSource.fileno(), dataSource.tell )
+        return self.__rawToNetwork( self.__rawSourceToNetwork( self.__getReadInto( dataSource ), knownSize ) )
+      except Exception as e:
+        gLogger.exception( "Error while sending file" )
+        return S_ERROR( "Error while sending file: %s" % str( e ) )
     try:
       sBuffer = dataSource.read( iPacketSize )
       while len( sBuffer ) > 0:
@@ -265,6 +500,19 @@ class FileHelper:
     self.__fileBytes = sentBytes
     return S_OK()
 
+  @staticmethod
+  def __getReadInto( dataSource ):
+    """ Function filling a memoryview with the data of the source
+    """
+    if "readinto" in dir( dataSource ):
+      return dataSource.readinto
+
+    def readInto( bufView ):
+      data = dataSource.read( len( bufView ) )
+      bufView[ :len( data ) ] = data
+      return len( data )
+    return readInto
+
   def getFileDescriptor( self, uFile, sFileMode ):
     closeAfter = True
     if isinstance( uFile, basestring ):
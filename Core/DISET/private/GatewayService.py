@@ -116,6 +116,16 @@ class GatewayService( Service ):
       self._transportPool.close( trid )
     return result
 
+  def _canKeepConnection( self, proposalTuple ):
+    """ The gateway serves one proposal per connection
+    """
+    return False
+
+  def _chooseCodec( self, proposalTuple ):
+    """ The gateway forwards the messages as they come, with DEncode
+    """
+    return None
+
   def _receiveAndCheckProposal( self, trid ):
     clientTransport = self._transportPool.get( trid )
     #Get the peer credentials
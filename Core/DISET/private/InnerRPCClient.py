@@ -10,11 +10,11 @@ from DIRAC.Core.Utilities.DErrno import cmpError, ENOAUTH
 class InnerRPCClient( BaseClient ):
   """ This class instruments the BaseClient to perform RPC calls.
       At every RPC call, this class:
-        * connects
+        * connects (or reuses a pooled connection)
         * proposes the action
         * sends the method parameters
         * retrieve the result
-        * disconnect
+        * disconnect (or gives the connection back to the pool)
   """
 
   # Number of times we retry the call.
@@ -23,6 +23,8 @@ class InnerRPCClient( BaseClient ):
 
   def executeRPC( self, functionName, args ):
     """ Perform the RPC call, connect before and disconnect after.
+        If the service agrees, the connection is given back to the connection pool
+        instead of being closed, and reused by the next call.
 
         :param functionName: name of the function
         :param args: arguments to the function
@@ -32,22 +34,28 @@ class InnerRPCClient( BaseClient ):
 
 
     """
-    retVal = self._connect()
+    retVal = self._connect( reuse = True )
 
     # Generate the stub which contains all the connection and call options
     stub = ( self._getBaseStub(), functionName, args )
     if not retVal[ 'OK' ]:
       retVal[ 'rpcStub' ] = stub
       return retVal
+    # Was the connection taken from the pool?
+    reused = retVal.get( 'reused', False )
     # Get the transport connection ID as well as the Transport object
     trid, transport = retVal[ 'Value' ]
+    keepConnection = False
     try:
       # Handshake to perform the RPC call for functionName
-      retVal = self._proposeAction( transport, ( "RPC", functionName ) )
+      retVal = self._proposeAction( transport, ( "RPC", functionName ),
+                                     keepConnection = True, negotiateCodec = True )
       if not retVal['OK']:
         if cmpError( retVal, ENOAUTH ):  # This query is unauthorized
           retVal[ 'rpcStub' ] = stub
           return retVal
+        if reused:  # The service closed the idle connection. Nothing was executed, try another one
+          return self.executeRPC( functionName, args )
         else:  # we have network problem or the service is not responding
           if self.__retry < 3:
             self.__retry += 1
@@ -55,16 +63,23 @@ class InnerRPCClient( BaseClient ):
           else:
             retVal[ 'rpcStub' ] = stub
             return retVal
+      # Old services do not keep the connection
+      keepConnection = retVal.get( 'keepConnection', False )
 
       # Send the arguments to the function
       retVal = transport.sendData( S_OK( args ) )
       if not retVal[ 'OK' ]:
+        keepConnection = False
         return retVal
 
       # Get the result of the call and append the stub to it
       receivedData = transport.receiveData()
       if isinstance( receivedData, dict ):
         receivedData[ 'rpcStub' ] = stub
+        # After a receive error the reply may still be on its way, the connection can not be reused
+        keepConnection = keepConnection and receivedData.get( 'OK', False )
+      else:
+        keepConnection = False
       return receivedData
     finally:
-      self._disconnect( trid )
+      self._disconnect( trid, keepConnection )
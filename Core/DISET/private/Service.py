@@ -4,13 +4,14 @@
 
 import os
 import time
+import select
 import threading
 
 import DIRAC
 from DIRAC import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.Core.Utilities.DErrno import ENOAUTH
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
-from DIRAC.Core.Utilities import Time, MemStat
+from DIRAC.Core.Utilities import Time, MemStat, DEncode
 from DIRAC.Core.DISET.private.LockManager import LockManager
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
 from DIRAC.Core.DISET.private.ServiceConfiguration import ServiceConfiguration
@@ -269,10 +270,6 @@ class Service( object ):
   def _processInThread( self, clientTransport ):
     self.__maxFD = max( self.__maxFD, clientTransport.oSocket.fileno() )
     self._lockManager.lockGlobal()
-    try:
-      monReport = self.__startReportToMonitoring()
-    except Exception:
-      monReport = False
     try:
       #Handshake
       try:
@@ -286,31 +283,76 @@ class Service( object ):
       trid = self._transportPool.add( clientTransport )
       if not trid:
         return
+      servedProposals = 0
+      while True:
+        result = self.__processOneProposal( trid )
+        if not result:
+          return
+        servedProposals += 1
+        #Close the connection if required
+        if result[ 'closeTransport' ] or not result[ 'OK' ]:
+          if not result[ 'OK' ]:
+            gLogger.error( "Error processing proposal", result[ 'Message' ] )
+          self._transportPool.close( trid )
+          return result
+        #The client may send another proposal through the same connection
+        if not result.get( 'keepConnection' ):
+          return result
+        if servedProposals >= self._cfg.getMaxRequestsPerConnection() or \
+           not self.__waitForNextProposal( clientTransport ):
+          self._transportPool.close( trid )
+          return result
+    finally:
+      self._lockManager.unlockGlobal()
+
+  def __processOneProposal( self, trid ):
+    """ Receive, authorize and execute one proposal coming through the transport
+
+        :return: the result of the proposal execution or None if the transport
+                 has already been dealt with
+    """
+    try:
+      monReport = self.__startReportToMonitoring()
+    except Exception:
+      monReport = False
+    try:
       #Receive and check proposal
       result = self._receiveAndCheckProposal( trid )
       if not result[ 'OK' ]:
         self._transportPool.sendAndClose( trid, result )
-        return
+        return None
       proposalTuple = result[ 'Value' ]
       #Instantiate handler
       result = self._instantiateHandler( trid, proposalTuple )
       if not result[ 'OK' ]:
         self._transportPool.sendAndClose( trid, result )
-        return
+        return None
       handlerObj = result[ 'Value' ]
       #Execute the action
-      result = self._processProposal( trid, proposalTuple, handlerObj )
-      #Close the connection if required
-      if result[ 'closeTransport' ] or not result[ 'OK' ]:
-        if not result[ 'OK' ]:
-          gLogger.error( "Error processing proposal", result[ 'Message' ] )
-        self._transportPool.close( trid )
-      return result
+      return self._processProposal( trid, proposalTuple, handlerObj )
     finally:
-      self._lockManager.unlockGlobal()
       if monReport:
         self.__endReportToMonitoring( *monReport )
 
+  def __waitForNextProposal( self, clientTransport ):
+    """ Wait for the client to send a new proposal through a kept connection.
+        Give up when the connection is idle for too long or when there are
+        connections waiting for a thread to serve them
+    """
+    if clientTransport.byteStream:
+      return True
+    endTime = time.time() + self._cfg.getConnectionIdleTimeout()
+    while time.time() < endTime:
+      if self._threadPool.pendingJobs():
+        return False
+      try:
+        inList = select.select( [ clientTransport.getSocket() ], [], [], 0.5 )[0]
+      except Exception:
+        return False
+      if inList:
+        return True
+    return False
+
 
   def _createIdentityString( self, credDict, clientTransport = None ):
     if 'username' in credDict:
@@ -437,10 +479,28 @@ class Service( object ):
     return S_OK( handlerInstance )
 
   def _processProposal( self, trid, proposalTuple, handlerObj ):
+    #Can the connection be kept open for more proposals once this one is done?
+    keepConnection = self._canKeepConnection( proposalTuple )
+    codecName = self._chooseCodec( proposalTuple )
+    rawTransfer = self._acceptRawTransfer( proposalTuple )
     #Notify the client we're ready to execute the action
-    retVal = self._transportPool.send( trid, S_OK() )
+    readyMsg = S_OK()
+    if keepConnection:
+      readyMsg[ 'keepConnection' ] = True
+    if codecName:
+      readyMsg[ 'codec' ] = codecName
+    if rawTransfer:
+      readyMsg[ 'rawTransfer' ] = True
+    retVal = self._transportPool.send( trid, readyMsg )
     if not retVal[ 'OK' ]:
       return retVal
+    #From now on both ends use the agreed codec
+    if codecName:
+      retVal = self._transportPool.get( trid ).setCodec( codecName )
+      if not retVal[ 'OK' ]:
+        return retVal
+    if rawTransfer:
+      self._transportPool.get( trid ).setRawTransfer( True )
 
     messageConnection = False
     if proposalTuple[1] == ( 'Connection', 'new' ):
@@ -466,9 +526,46 @@ class Service( object ):
       if not result[ 'OK' ]:
         self._msgBroker.removeTransport( trid )
 
-    result[ 'closeTransport' ] = not messageConnection or not result[ 'OK' ]
+    result[ 'closeTransport' ] = not ( messageConnection or keepConnection ) or not result[ 'OK' ]
+    if keepConnection:
+      result[ 'keepConnection' ] = True
     return result
 
+  def _canKeepConnection( self, proposalTuple ):
+    """ Only RPC connections are kept, and only if the client asked for it.
+        Old clients send a proposal without the options field.
+    """
+    if len( proposalTuple ) < 4 or not isinstance( proposalTuple[3], dict ):
+      return False
+    if not proposalTuple[3].get( 'keepConnection' ) or proposalTuple[1][0] != 'RPC':
+      return False
+    return self._cfg.getMaxRequestsPerConnection() > 1
+
+  def _chooseCodec( self, proposalTuple ):
+    """ Pick the codec preferred by the server among the ones the client offers
+        for the RPC messages. Old clients do not offer any and keep DEncode.
+        The preference order comes from the Codecs option of the service.
+    """
+    if len( proposalTuple ) < 4 or not isinstance( proposalTuple[3], dict ):
+      return None
+    if proposalTuple[1][0] != 'RPC':
+      return None
+    clientCodecs = proposalTuple[3].get( 'codecs', [] )
+    for codecName in self._cfg.getCodecs():
+      if codecName in clientCodecs and codecName in DEncode.getCodecNames():
+        return codecName
+    return None
+
+  def _acceptRawTransfer( self, proposalTuple ):
+    """ File transfers send the data as raw bytes if the client asks for it.
+        Old clients do not and keep sending DEncoded chunks.
+    """
+    if len( proposalTuple ) < 4 or not isinstance( proposalTuple[3], dict ):
+      return False
+    if proposalTuple[1][0] != 'FileTransfer':
+      return False
+    return bool( proposalTuple[3].get( 'rawTransfer' ) )
+
   def _mbConnect( self, trid, handlerObj = None ):
     if not handlerObj:
       result = self._instantiateHandler( trid )
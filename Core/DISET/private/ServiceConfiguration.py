@@ -1,7 +1,7 @@
 # $HeadURL$
 __RCSID__ = "$Id$"
 
-from DIRAC.Core.Utilities import Network, List
+from DIRAC.Core.Utilities import Network, List, DEncode
 from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.DISET.private.Protocols import gDefaultProtocol
@@ -74,6 +74,26 @@ class ServiceConfiguration:
     except:
       return 20
 
+  def getMaxRequestsPerConnection( self ):
+    try:
+      return int( self.getOption( "MaxRequestsPerConnection" ) )
+    except:
+      return 100
+
+  def getCodecs( self ):
+    """ Codecs the service accepts for the RPC messages, most preferred first
+    """
+    optionValue = self.getOption( "Codecs" )
+    if optionValue:
+      return List.fromChar( optionValue )
+    return DEncode.getCodecNames()
+
+  def getConnectionIdleTimeout( self ):
+    try:
+      return int( self.getOption( "ConnectionIdleTimeout" ) )
+    except:
+      return 10
+
   def getMaxThreadsForMethod( self, actionType, method ):
     try:
       return int( self.getOption( "ThreadLimit/%s/%s" % ( actionType, method ) ) )
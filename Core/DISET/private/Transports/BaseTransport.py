@@ -5,7 +5,7 @@ __RCSID__ = "$Id$"
 
 import time
 import select
-import cStringIO
+from itertools import imap
 from hashlib import md5
 
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
@@ -20,6 +20,8 @@ class BaseTransport( object ):
   iListenQueueSize = 5
   iReadTimeout = 600
   keepAliveMagic = "dka"
+  #Number of encoded pieces joined together when sending data
+  piecesPerGroup = 65536
 
   def __init__( self, stServerAddress, bServerMode = False, **kwargs ):
     self.bServerMode = bServerMode
@@ -44,6 +46,9 @@ class BaseTransport( object ):
         pass
     self.__lastActionTimestamp = time.time()
     self.__lastServerRenewTimestamp = self.__lastActionTimestamp
+    self.__codecName = DEncode.DEFAULT_CODEC
+    self.__codec = DEncode.getCodec( self.__codecName )
+    self.__rawTransfer = False
 
   def __updateLastActionTimestamp( self ):
     self.__lastActionTimestamp = time.time()
@@ -57,6 +62,29 @@ class BaseTransport( object ):
   def handshake( self ):
     return S_OK()
 
+  def setCodec( self, codecName ):
+    """ Encode and decode the following messages with another codec, as negotiated
+        with the peer when proposing an action
+    """
+    try:
+      self.__codec = DEncode.getCodec( codecName )
+    except KeyError:
+      return S_ERROR( "Unknown codec %s" % codecName )
+    self.__codecName = codecName
+    return S_OK()
+
+  def getCodecName( self ):
+    return self.__codecName
+
+  def setRawTransfer( self, rawTransfer ):
+    """ File transfers through this transport send the data as raw bytes, as negotiated
+        with the peer when proposing the transfer
+    """
+    self.__rawTransfer = rawTransfer
+
+  def getRawTransfer( self ):
+    return self.__rawTransfer
+
   def close( self ):
     self.oSocket.close()
 
@@ -112,34 +140,104 @@ class BaseTransport( object ):
     except Exception as e:
       return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
 
+  def _readInto( self, bufView ):
+    """ Read from the peer into a writable memoryview.
+        Transports whose socket can receive into a buffer should overwrite it.
+
+        :return: S_OK( number of bytes read )
+    """
+    retVal = self._read( len( bufView ), skipReadyCheck = True )
+    if not retVal[ 'OK' ]:
+      return retVal
+    data = retVal[ 'Value' ]
+    bufView[ : len( data ) ] = data
+    return S_OK( len( data ) )
+
   def _write( self, buffer ):
     return S_OK( self.oSocket.send( buffer ) )
 
   def sendData( self, uData, prefix = False ):
     self.__updateLastActionTimestamp()
-    sCodedData = DEncode.encode( uData )
+    encodedList = self.__codec.encodeToList( uData )
+    groupSizes = [ sum( imap( len, encodedList[ index : index + self.piecesPerGroup ] ) )
+                   for index in xrange( 0, len( encodedList ), self.piecesPerGroup ) ]
     if prefix:
-      dataToSend = "%s%s:%s" % ( prefix, len( sCodedData ), sCodedData )
+      header = "%s%s:" % ( prefix, sum( groupSizes ) )
     else:
-      dataToSend = "%s:%s" % ( len( sCodedData ), sCodedData )
-    for index in range( 0, len( dataToSend ), self.packetSize ):
-      bytesToSend = min( self.packetSize, len( dataToSend ) - index )
-      packSentBytes = 0
-      while packSentBytes < bytesToSend:
-        try:
-          result = self._write( dataToSend[ index + packSentBytes : index + bytesToSend ] )
-          if not result[ 'OK' ]:
-            return result
-          sentBytes = result[ 'Value' ]
-        except Exception as e:
-          return S_ERROR( "Exception while sending data: %s" % e )
-        if sentBytes == 0:
-          return S_ERROR( "Connection closed by peer" )
-        packSentBytes += sentBytes
-    del sCodedData
-    sCodedData=None
+      header = "%s:" % sum( groupSizes )
+    for packet in self.__packets( header, encodedList, groupSizes ):
+      result = self.__sendPacket( packet )
+      if not result[ 'OK' ]:
+        return result
+    del encodedList
+    encodedList = None
+    return S_OK()
+
+  def sendRaw( self, data ):
+    """ Send the bytes as they are, without any header. The peer must know how many to expect
+
+        :param data: string, bytearray or memoryview
+    """
+    self.__updateLastActionTimestamp()
+    return self.__sendPacket( data )
+
+  def __sendPacket( self, packet ):
+    bytesToSend = len( packet )
+    packSentBytes = 0
+    while packSentBytes < bytesToSend:
+      try:
+        if packSentBytes:
+          result = self._write( memoryview( packet )[ packSentBytes: ] )
+        else:
+          result = self._write( packet )
+        if not result[ 'OK' ]:
+          return result
+        sentBytes = result[ 'Value' ]
+      except Exception as e:
+        return S_ERROR( "Exception while sending data: %s" % e )
+      if sentBytes == 0:
+        return S_ERROR( "Connection closed by peer" )
+      packSentBytes += sentBytes
     return S_OK()
 
+  def __packets( self, header, encodedList, groupSizes ):
+    """ Split the header and the encoded pieces in packets without building the whole
+        encoded string. Pieces are joined group by group, the header with the first one
+        so small messages go in one write. Groups holding a piece bigger than a packet are
+        sent piece by piece, the big ones through memoryview slices so they are never copied.
+    """
+    for groupIndex, groupSize in enumerate( groupSizes ):
+      index = groupIndex * self.piecesPerGroup
+      group = encodedList[ index : index + self.piecesPerGroup ]
+      if not groupIndex:
+        group.insert( 0, header )
+      if groupSize <= 4 * self.packetSize:
+        for packet in self.__slices( "".join( group ) ):
+          yield packet
+        continue
+      smallPieces = []
+      for piece in group:
+        if len( piece ) <= self.packetSize:
+          smallPieces.append( piece )
+          continue
+        if smallPieces:
+          for packet in self.__slices( "".join( smallPieces ) ):
+            yield packet
+          smallPieces = []
+        for packet in self.__slices( piece ):
+          yield packet
+      if smallPieces:
+        for packet in self.__slices( "".join( smallPieces ) ):
+          yield packet
+
+  def __slices( self, data ):
+    if len( data ) <= self.packetSize:
+      yield data
+      return
+    dataView = memoryview( data )
+    for index in xrange( 0, len( data ), self.packetSize ):
+      yield dataView[ index : index + self.packetSize ]
+
 
   def receiveData( self, maxBufferSize = 0, blockAfterKeepAlive = True, idleReceive = False ):
     self.__updateLastActionTimestamp()
@@ -149,67 +247,21 @@ class BaseTransport( object ):
     maxBufferSize = max( maxBufferSize, 0 )
     try:
       #Look either for message length of keep alive magic string
-      iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
-      keepAliveMagicLen = len( BaseTransport.keepAliveMagic )
-      isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
-      #While not found the message length or the ka, keep receiving
-      while iSeparatorPosition == -1 and not isKeepAlive:
-        retVal = self._read( 16384 )
-        #If error return
-        if not retVal[ 'OK' ]:
-          return retVal
-        #If closed return error
-        if not retVal[ 'Value' ]:
-          return S_ERROR( "Peer closed connection" )
-        #New data!
-        self.byteStream += retVal[ 'Value' ]
-        #Look again for either message length of ka magic string
-        iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
-        isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
-        #Over the limit?
-        if maxBufferSize and len( self.byteStream ) > maxBufferSize and iSeparatorPosition == -1 :
-          return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+      result = self.__receiveHeader( maxBufferSize )
+      if not result[ 'OK' ]:
+        return result
+      pkgSize = result[ 'Value' ]
       #Keep alive magic!
-      if isKeepAlive:
+      if pkgSize is None:
         gLogger.debug( "Received keep alive header" )
-        #Remove the ka magic from the buffer and process the keep alive
-        self.byteStream = self.byteStream[ keepAliveMagicLen: ]
         return self.__processKeepAlive( maxBufferSize, blockAfterKeepAlive )
       #From here it must be a real message!
-      #Process the size and remove the msg length from the bytestream
-      pkgSize = int( self.byteStream[ :iSeparatorPosition ] )
-      pkgData = self.byteStream[ iSeparatorPosition + 1: ]
-      readSize = len( pkgData )
-      if readSize >= pkgSize:
-        #If we already have all the data we need
-        data = pkgData[ :pkgSize ]
-        self.byteStream = pkgData[ pkgSize: ]
-      else:
-        #If we still need to read stuff
-        pkgMem = cStringIO.StringIO()
-        pkgMem.write( pkgData )
-        #Receive while there's still data to be received
-        while readSize < pkgSize:
-          retVal = self._read( pkgSize - readSize, skipReadyCheck = True )
-          if not retVal[ 'OK' ]:
-            return retVal
-          if not retVal[ 'Value' ]:
-            return S_ERROR( "Peer closed connection" )
-          rcvData = retVal[ 'Value' ]
-          readSize += len( rcvData )
-          pkgMem.write( rcvData )
-          if maxBufferSize and readSize > maxBufferSize:
-            return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
-        #Data is here! take it out from the bytestream, dencode and return
-        if readSize == pkgSize:
-          data = pkgMem.getvalue()
-          self.byteStream = ""
-        else: #readSize > pkgSize:
-          pkgMem.seek( 0, 0 )
-          data = pkgMem.read( pkgSize )
-          self.byteStream = pkgMem.read()
+      result = self.__receiveBody( pkgSize, maxBufferSize )
+      if not result[ 'OK' ]:
+        return result
+      data = result[ 'Value' ]
       try:
-        data = DEncode.decode( data )[0]
+        data = self.__codec.decode( data )[0]
       except Exception as e:
         return S_ERROR( "Could not decode received data: %s" % str( e ) )
       if idleReceive:
@@ -220,6 +272,93 @@ class BaseTransport( object ):
       gLogger.exception( "Network error while receiving data" )
       return S_ERROR( "Network error while receiving data: %s" % str( e ) )
 
+  def __receiveHeader( self, maxBufferSize ):
+    """ Read until the message length or the keep alive magic string is found,
+        and remove it from the byte stream
+
+        :return: S_OK( message length ) or S_OK( None ) for a keep alive
+    """
+    iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
+    keepAliveMagicLen = len( BaseTransport.keepAliveMagic )
+    isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
+    #While not found the message length or the ka, keep receiving
+    while iSeparatorPosition == -1 and not isKeepAlive:
+      retVal = self._read( 16384 )
+      #If error return
+      if not retVal[ 'OK' ]:
+        return retVal
+      #If closed return error
+      if not retVal[ 'Value' ]:
+        return S_ERROR( "Peer closed connection" )
+      #New data!
+      self.byteStream += retVal[ 'Value' ]
+      #Look again for either message length of ka magic string
+      iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
+      isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
+      #Over the limit?
+      if maxBufferSize and len( self.byteStream ) > maxBufferSize and iSeparatorPosition == -1 :
+        return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+    if isKeepAlive:
+      #Remove the ka magic from the buffer
+      self.byteStream = self.byteStream[ keepAliveMagicLen: ]
+      return S_OK( None )
+    #Process the size and remove the msg length from the bytestream
+    pkgSize = int( self.byteStream[ :iSeparatorPosition ] )
+    self.byteStream = self.byteStream[ iSeparatorPosition + 1: ]
+    return S_OK( pkgSize )
+
+  def __receiveBody( self, pkgSize, maxBufferSize ):
+    """ Get a message of pkgSize bytes. What is already in the byte stream is used first,
+        the rest is read directly into a buffer allocated once with the announced size.
+        Nothing beyond the message is read from the socket.
+
+        :return: S_OK( message data ), a str or a bytearray that the codecs decode in place
+    """
+    readSize = len( self.byteStream )
+    if readSize >= pkgSize:
+      #If we already have all the data we need
+      data = self.byteStream[ :pkgSize ]
+      self.byteStream = self.byteStream[ pkgSize: ]
+      return S_OK( data )
+    if maxBufferSize and pkgSize > maxBufferSize:
+      return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+    pkgMem = bytearray( pkgSize )
+    pkgView = memoryview( pkgMem )
+    pkgView[ :readSize ] = self.byteStream
+    self.byteStream = ""
+    #Receive while there's still data to be received
+    while readSize < pkgSize:
+      retVal = self._readInto( pkgView[ readSize: ] )
+      if not retVal[ 'OK' ]:
+        return retVal
+      if not retVal[ 'Value' ]:
+        return S_ERROR( "Peer closed connection" )
+      readSize += retVal[ 'Value' ]
+    del pkgView
+    return S_OK( pkgMem )
+
+  def receiveRawInto( self, bufView ):
+    """ Receive raw bytes sent with sendRaw into a writable memoryview. The bytes already
+        read from the socket after the last message come first.
+
+        :return: S_OK( number of bytes received, up to the size of the view )
+    """
+    self.__updateLastActionTimestamp()
+    if self.byteStream:
+      readSize = min( len( bufView ), len( self.byteStream ) )
+      bufView[ :readSize ] = self.byteStream[ :readSize ]
+      self.byteStream = self.byteStream[ readSize: ]
+      return S_OK( readSize )
+    try:
+      retVal = self._readInto( bufView )
+    except Exception as e:
+      return S_ERROR( "Network error while receiving data: %s" % str( e ) )
+    if not retVal[ 'OK' ]:
+      return retVal
+    if not retVal[ 'Value' ]:
+      return S_ERROR( "Peer closed connection" )
+    return retVal
+
   def __processKeepAlive( self, maxBufferSize, blockAfterKeepAlive = True ):
     gLogger.debug( "Received Keep Alive" )
     #Next message down the stream will be the ka data
@@ -87,6 +87,25 @@ class PlainTransport( BaseTransport ):
       except Exception as e:
         return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
 
+  def _readInto( self, bufView ):
+    start = time.time()
+    timeout = False
+    if 'timeout' in self.extraArgsDict:
+      timeout = self.extraArgsDict[ 'timeout' ]
+    while True:
+      if timeout:
+        if time.time() - start > timeout:
+          return S_ERROR( "Socket read timeout exceeded" )
+      try:
+        return S_OK( self.oSocket.recv_into( bufView ) )
+      except socket.error, e:
+        if e[0] == 11:
+          time.sleep( 0.001 )
+        else:
+          return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+      except Exception as e:
+        return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+
   def _write( self, buffer ):
     sentBytes = 0
     timeout = False
@@ -94,6 +113,8 @@ class PlainTransport( BaseTransport ):
       timeout = self.extraArgsDict[ 'timeout' ]
     if timeout:
       start = time.time()
+    if not isinstance( buffer, memoryview ):
+      buffer = memoryview( buffer )
     while sentBytes < len( buffer ):
       try:
         if timeout:
@@ -163,6 +163,9 @@ class SSLTransport( BaseTransport ):
               return S_ERROR( "Renegotiation failed: %s" % str( e ) )
 
 
+      #The SSL socket needs a string. This copies at most one packet
+      if isinstance( buffer, memoryview ):
+        buffer = buffer.tobytes()
       sentBytes = 0
       timeout = self.oSocketInfo.infoDict[ 'timeout' ]
       if timeout:
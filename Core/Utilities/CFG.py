@@ -735,21 +735,26 @@ class CFG( object ):
     :return: A list of modifications
     """
     modList = []
+    #Positions and membership are looked up in dicts, sections can have thousands of entries
+    oldPositions = dict( ( key, iPos ) for iPos, key in enumerate( self.__orderedList ) )
+    newPositions = dict( ( key, iPos ) for iPos, key in enumerate( newerCfg.__orderedList ) )
     #Options
     oldOptions = self.listOptions( True )
     newOptions = newerCfg.listOptions( True )
+    oldOptionsSet = set( oldOptions )
+    newOptionsSet = set( newOptions )
     for newOption in newOptions:
-      iPos = newerCfg.__orderedList.index( newOption )
+      iPos = newPositions[ newOption ]
       newOptPath = "%s/%s" % ( parentPath, newOption )
       if ignoreMask and newOptPath in ignoreMask:
         continue
-      if newOption not in oldOptions:
+      if newOption not in oldOptionsSet:
         modList.append( ( 'addOpt', newOption, iPos,
                           newerCfg[ newOption ],
                           newerCfg.getComment( newOption ) ) )
       else:
         modified = False
-        if iPos != self.__orderedList.index( newOption ):
+        if iPos != oldPositions[ newOption ]:
           modified = True
         elif newerCfg[ newOption ] != self[ newOption ]:
           modified = True
@@ -763,23 +768,25 @@ class CFG( object ):
       oldOptPath = "%s/%s" % ( parentPath, oldOption )
       if ignoreMask and oldOptPath in ignoreMask:
         continue
-      if oldOption not in newOptions:
+      if oldOption not in newOptionsSet:
         modList.append( ( 'delOpt', oldOption, -1, '' ) )
     #Sections
     oldSections = self.listSections( True )
     newSections = newerCfg.listSections( True )
+    oldSectionsSet = set( oldSections )
+    newSectionsSet = set( newSections )
     for newSection in newSections:
-      iPos = newerCfg.__orderedList.index( newSection )
+      iPos = newPositions[ newSection ]
       newSecPath = "%s/%s" % ( parentPath, newSection )
       if ignoreMask and newSecPath in ignoreMask:
         continue
-      if newSection not in oldSections:
+      if newSection not in oldSectionsSet:
         modList.append( ( 'addSec', newSection, iPos,
                           str( newerCfg[ newSection ] ),
                           newerCfg.getComment( newSection ) ) )
       else:
         modified = False
-        if iPos != self.__orderedList.index( newSection ):
+        if iPos != oldPositions[ newSection ]:
           modified = True
         elif newerCfg.getComment( newSection ) != self.getComment( newSection ):
           modified = True
@@ -795,7 +802,7 @@ class CFG( object ):
       oldSecPath = "%s/%s" % ( parentPath, oldSection )
       if ignoreMask and oldSecPath in ignoreMask:
         continue
-      if oldSection not in newSections:
+      if oldSection not in newSectionsSet:
         modList.append( ( 'delSec', oldSection, -1, '' ) )
     return modList
 
@@ -14,6 +14,7 @@ Encoding and decoding for dirac, Ids:
 """
 __RCSID__ = "$Id$"
 
+import sys
 import types
 import datetime
 
@@ -21,6 +22,12 @@ _dateTimeObject = datetime.datetime.utcnow()
 _dateTimeType = type( _dateTimeObject )
 _dateType = type( _dateTimeObject.date() )
 _timeType = type( _dateTimeObject.time() )
+_stringType = types.StringType
+_intType = types.IntType
+_listType = types.ListType
+_tupleType = types.TupleType
+_dictType = types.DictType
+_containerTypes = frozenset( ( _listType, _tupleType, _dictType ) )
 
 g_dEncodeFunctions = {}
 g_dDecodeFunctions = {}
@@ -59,7 +66,7 @@ def encodeFloat( iValue, eList ):
 def decodeFloat( data, i ):
   i += 1
   end = data.index( 'e', i )
-  if end + 1 < len( data ) and data[end + 1] in ( '+', '-' ):
+  if end + 1 < len( data ) and data[end + 1:end + 2] in ( '+', '-' ):
     eI = end
     end = data.index( 'e', end + 1 )
     value = float( data[i:eI] ) * 10 ** int( data[eI + 1:end] )
@@ -112,7 +119,7 @@ def decodeUnicode( data, i ):
   value = int( data[ i : colon ] )
   colon += 1
   end = colon + value
-  return ( unicode( data[ colon : end], 'utf-8' ) , end )
+  return ( data[ colon : end].decode( 'utf-8' ) , end )
 
 g_dEncodeFunctions[ types.UnicodeType ] = encodeUnicode
 g_dDecodeFunctions[ "u" ] = decodeUnicode
@@ -169,12 +176,134 @@ def decodeNone( data, i ):
 g_dEncodeFunctions[ types.NoneType ] = encodeNone
 g_dDecodeFunctions[ 'n' ] = decodeNone
 
+def _encodeFlat( uObject, oType, eList ):
+  """ Encode inline a container that holds no other container, such as the attribute
+      dictionaries of a job or the replicas of a file. If a container is found inside,
+      what was encoded is removed from eList.
+
+      :return: True if the container was encoded
+  """
+  mark = len( eList )
+  extend = eList.extend
+  containerTypes = _containerTypes
+  if oType is _dictType:
+    eList.append( "d" )
+    for key in sorted( uObject ):
+      kType = type( key )
+      if kType is _stringType:
+        extend( ( 's', str( len( key ) ), ':', key ) )
+      elif kType in containerTypes:
+        del eList[ mark: ]
+        return False
+      else:
+        g_dEncodeFunctions[ kType ]( key, eList )
+      value = uObject[ key ]
+      vType = type( value )
+      if vType is _stringType:
+        extend( ( 's', str( len( value ) ), ':', value ) )
+      elif vType is _intType:
+        extend( ( "i", str( value ), "e" ) )
+      elif vType in containerTypes:
+        del eList[ mark: ]
+        return False
+      else:
+        g_dEncodeFunctions[ vType ]( value, eList )
+  else:
+    if oType is _listType:
+      eList.append( "l" )
+    else:
+      eList.append( "t" )
+    for value in uObject:
+      vType = type( value )
+      if vType is _stringType:
+        extend( ( 's', str( len( value ) ), ':', value ) )
+      elif vType is _intType:
+        extend( ( "i", str( value ), "e" ) )
+      elif vType in containerTypes:
+        del eList[ mark: ]
+        return False
+      else:
+        g_dEncodeFunctions[ vType ]( value, eList )
+  eList.append( "e" )
+  return True
+
+def _listItems( items, eList ):
+  """ Encode the items of a list or tuple, and yield the containers among them.
+      Strings and ints, which are most of what DIRAC sends, are encoded inline.
+  """
+  extend = eList.extend
+  for uObject in items:
+    oType = type( uObject )
+    if oType is _stringType:
+      extend( ( 's', str( len( uObject ) ), ':', uObject ) )
+    elif oType is _intType:
+      extend( ( "i", str( uObject ), "e" ) )
+    elif oType in _containerTypes:
+      if not _encodeFlat( uObject, oType, eList ):
+        yield uObject
+    else:
+      g_dEncodeFunctions[ oType ]( uObject, eList )
+
+def _dictItems( dValue, eList ):
+  """ Encode the keys and values of a dictionary sorted by key, and yield the containers
+      among them
+  """
+  extend = eList.extend
+  for key in sorted( dValue ):
+    kType = type( key )
+    if kType is _stringType:
+      extend( ( 's', str( len( key ) ), ':', key ) )
+    elif kType in _containerTypes:
+      yield key
+    else:
+      g_dEncodeFunctions[ kType ]( key, eList )
+    uObject = dValue[ key ]
+    oType = type( uObject )
+    if oType is _stringType:
+      extend( ( 's', str( len( uObject ) ), ':', uObject ) )
+    elif oType is _intType:
+      extend( ( "i", str( uObject ), "e" ) )
+    elif oType in _containerTypes:
+      if not _encodeFlat( uObject, oType, eList ):
+        yield uObject
+    else:
+      g_dEncodeFunctions[ oType ]( uObject, eList )
+
+def _encodeContainer( uObject, eList ):
+  """ Encode a list, tuple or dictionary and everything it holds without recursion.
+      The containers being encoded are kept as a stack of iterators on their items.
+  """
+  if _encodeFlat( uObject, type( uObject ), eList ):
+    return
+  append = eList.append
+  stack = []
+  while True:
+    oType = type( uObject )
+    if oType is _listType:
+      append( "l" )
+      stack.append( _listItems( uObject, eList ) )
+    elif oType is _tupleType:
+      append( "t" )
+      stack.append( _listItems( uObject, eList ) )
+    elif oType is _dictType:
+      append( "d" )
+      stack.append( _dictItems( uObject, eList ) )
+    else:
+      g_dEncodeFunctions[ oType ]( uObject, eList )
+    #Get the next object to encode, closing the containers that are done
+    while stack:
+      try:
+        uObject = next( stack[ -1 ] )
+        break
+      except StopIteration:
+        stack.pop()
+        append( "e" )
+    else:
+      return
+
 #Encode and decode a list
 def encodeList( lValue, eList ):
-  eList.append( "l" )
-  for uObject in lValue:
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-  eList.append( "e" )
+  _encodeContainer( lValue, eList )
 
 def decodeList( data, i ):
   oL = []
@@ -189,10 +318,7 @@ g_dDecodeFunctions[ "l" ] = decodeList
 
 #Encode and decode a tuple
 def encodeTuple( lValue, eList ):
-  eList.append( "t" )
-  for uObject in lValue:
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-  eList.append( "e" )
+  _encodeContainer( lValue, eList )
 
 def decodeTuple( data, i ):
   oL, i = decodeList( data, i )
@@ -203,11 +329,7 @@ g_dDecodeFunctions[ "t" ] = decodeTuple
 
 #Encode and decode a dictionary
 def encodeDict( dValue, eList ):
-  eList.append( "d" )
-  for key in sorted( dValue ):
-    g_dEncodeFunctions[ type( key ) ]( key, eList )
-    g_dEncodeFunctions[ type( dValue[key] ) ]( dValue[key], eList )
-  eList.append( "e" )
+  _encodeContainer( dValue, eList )
 
 def decodeDict( data, i ):
   oD = {}
@@ -220,26 +342,131 @@ def decodeDict( data, i ):
 g_dEncodeFunctions[ types.DictType ] = encodeDict
 g_dDecodeFunctions[ "d" ] = decodeDict
 
+#Iterative decoding of any object
+_noKey = object()
+
+def decodeIterative( data, i = 0 ):
+  """ Decode the object starting at position i without recursion. Containers being
+      filled are kept in a stack, and the common types are decoded inline.
+
+      The data can be a str or a bytearray, which is read in place.
+
+      :return: ( object, position after it )
+  """
+  source = data
+  index = data.index
+  if type( data ) is bytearray:
+    #Characters and slices are taken from a buffer on it, so that they are strings
+    data = buffer( data )
+  #Each entry is [ container, kind, dict key waiting for its value ]
+  stack = []
+  while True:
+    c = data[ i ]
+    if c == 's':
+      colon = index( ':', i + 1 )
+      end = colon + 1 + int( data[ i + 1 : colon ] )
+      value = data[ colon + 1 : end ]
+      i = end
+    elif c == 'i':
+      end = index( 'e', i + 1 )
+      value = int( data[ i + 1 : end ] )
+      i = end + 1
+    elif c == 'd':
+      stack.append( [ {}, 'd', _noKey ] )
+      i += 1
+      continue
+    elif c == 'l' or c == 't':
+      stack.append( [ [], c, None ] )
+      i += 1
+      continue
+    elif c == 'e':
+      value, kind, _key = stack.pop()
+      if kind == 't':
+        value = tuple( value )
+      i += 1
+    elif c == 'b':
+      value = data[ i + 1 ] != "0"
+      i += 2
+    elif c == 'n':
+      value = None
+      i += 1
+    elif c == 'z':
+      #The tuple that comes next holds the datetime fields
+      stack.append( [ None, 'z', data[ i + 1 ] ] )
+      i += 2
+      continue
+    else:
+      value, i = g_dDecodeFunctions[ c ]( source, i )
+    #Put the value in its container
+    while stack:
+      top = stack[ -1 ]
+      kind = top[1]
+      if kind == 'd':
+        if top[2] is _noKey:
+          top[2] = value
+        else:
+          top[0][ top[2] ] = value
+          top[2] = _noKey
+        break
+      elif kind != 'z':
+        top[0].append( value )
+        break
+      stack.pop()
+      value = _dateTimeBuilders[ top[2] ]( *value )
+    else:
+      return ( value, i )
+
+_dateTimeBuilders = { 'a' : datetime.datetime, 'd' : datetime.date, 't' : datetime.time }
+
 
 #Encode function
 def encode( uObject ):
   try:
-    eList = []
-    #print "ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ]
-    g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
-    return "".join( eList )
+    return "".join( encodeToList( uObject ) )
   except Exception:
     raise
 
+def encodeToList( uObject ):
+  """ Encode an object into a list of strings. Their concatenation is the encoded object.
+      Strings in the object are not copied, so the list can be written in pieces
+      without ever building the whole encoded string.
+  """
+  eList = []
+  #print "ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ]
+  g_dEncodeFunctions[ type( uObject ) ]( uObject, eList )
+  return eList
+
 def decode( data ):
   if not data:
     return data
   try:
-    #print "DECODE FUNCTION : %s" % g_dDecodeFunctions[ sStream [ iIndex ] ]
-    return g_dDecodeFunctions[ data[ 0 ] ]( data, 0 )
+    return decodeIterative( data, 0 )
   except Exception:
     raise
 
+#Codecs that DISET peers can negotiate, most preferred first. DEncode stays the default,
+#services can prefer another one with their Codecs option.
+#A codec is a module with the encode, encodeToList and decode functions of this one,
+#decode accepts a str or a bytearray
+DEFAULT_CODEC = "DEncode"
+g_codecNames = []
+g_codecs = {}
+
+def registerCodec( name, codec ):
+  if name not in g_codecs:
+    g_codecNames.append( name )
+  g_codecs[ name ] = codec
+
+def getCodecNames():
+  return list( g_codecNames )
+
+def getCodec( name = DEFAULT_CODEC ):
+  return g_codecs[ name ]
+
+registerCodec( DEFAULT_CODEC, sys.modules[ __name__ ] )
+from DIRAC.Core.Utilities import DEncodeBinary
+registerCodec( "DEncodeBinary", DEncodeBinary )
+
 
 if __name__ == "__main__":
   gObject = {2:"3", True : ( 3, None ), 2.0 * 10 ** 20 : 2.0 * 10 ** -10 }
@@ -0,0 +1,280 @@
+"""
+Compact binary encoding for DISET, an alternative to DEncode that peers can negotiate.
+It supports the same types. Ids:
+ i -> int, zigzag varint
+ I -> long, zigzag varint
+ f -> float, 8 bytes double
+ T, F -> bool
+ s -> string, varint length
+ u -> unicode string, varint length of the utf-8 encoding
+ K -> string dictionary key seen for the first time, varint length
+ k -> string dictionary key already seen, varint index in the order they were first seen
+ Z -> datetime, D -> date, M -> time, packed fields
+ n -> none
+ l -> list, varint number of items
+ t -> tuple, varint number of items
+ d -> dictionary, varint number of items
+"""
+__RCSID__ = "$Id$"
+
+import types
+import struct
+import datetime
+
+_dateTimeStruct = struct.Struct( "!HBBBBBI" )
+_dateStruct = struct.Struct( "!HBB" )
+_timeStruct = struct.Struct( "!BBBI" )
+_floatStruct = struct.Struct( "!d" )
+_smallVarints = [ chr( n ) for n in range( 128 ) ]
+
+def _varint( n ):
+  """ Unsigned varint, 7 bits per byte, least significant first
+  """
+  if n < 128:
+    return _smallVarints[ n ]
+  pieces = []
+  while n > 127:
+    pieces.append( chr( ( n & 127 ) | 128 ) )
+    n >>= 7
+  pieces.append( chr( n ) )
+  return "".join( pieces )
+
+def _readVarint( data, i ):
+  """ :return: ( value, position after it )
+  """
+  n = ord( data[ i ] )
+  i += 1
+  if n < 128:
+    return ( n, i )
+  n &= 127
+  shift = 7
+  while True:
+    b = ord( data[ i ] )
+    i += 1
+    n |= ( b & 127 ) << shift
+    if b < 128:
+      return ( n, i )
+    shift += 7
+
+def _zigzag( n ):
+  if n >= 0:
+    return _varint( n << 1 )
+  return _varint( ( ( -n ) << 1 ) - 1 )
+
+def _unzigzag( z ):
+  if z & 1:
+    return -( ( z + 1 ) >> 1 )
+  return z >> 1
+
+def encode( uObject ):
+  return "".join( encodeToList( uObject ) )
+
+def encodeToList( uObject ):
+  """ Encode an object into a list of strings. Their concatenation is the encoded object.
+  """
+  eList = []
+  append = eList.append
+  extend = eList.extend
+  keyIndex = {}
+  #Containers are encoded with an explicit stack of iterators instead of recursion
+  stack = [ iter( ( uObject, ) ) ]
+  while stack:
+    try:
+      uObject = next( stack[-1] )
+    except StopIteration:
+      stack.pop()
+      continue
+    oType = type( uObject )
+    if oType is types.StringType:
+      length = len( uObject )
+      if length < 128:
+        extend( ( 's', _smallVarints[ length ], uObject ) )
+      else:
+        extend( ( 's', _varint( length ), uObject ) )
+    elif oType is types.IntType:
+      extend( ( 'i', _zigzag( uObject ) ) )
+    elif oType is types.DictType:
+      extend( ( 'd', _varint( len( uObject ) ) ) )
+      stack.append( _dictItems( uObject, eList, keyIndex ) )
+    elif oType is types.ListType or oType is types.TupleType:
+      if oType is types.ListType:
+        extend( ( 'l', _varint( len( uObject ) ) ) )
+      else:
+        extend( ( 't', _varint( len( uObject ) ) ) )
+      stack.append( iter( uObject ) )
+    elif oType is types.BooleanType:
+      if uObject:
+        append( 'T' )
+      else:
+        append( 'F' )
+    elif oType is types.NoneType:
+      append( 'n' )
+    elif oType is types.FloatType:
+      extend( ( 'f', _floatStruct.pack( uObject ) ) )
+    elif oType is types.LongType:
+      extend( ( 'I', _zigzag( uObject ) ) )
+    elif oType is types.UnicodeType:
+      valueStr = uObject.encode( 'utf-8' )
+      extend( ( 'u', _varint( len( valueStr ) ), valueStr ) )
+    elif oType is datetime.datetime:
+      if uObject.tzinfo is not None:
+        raise Exception( "Cannot encode datetime objects with a time zone" )
+      extend( ( 'Z', _dateTimeStruct.pack( uObject.year, uObject.month, uObject.day, uObject.hour,
+                                           uObject.minute, uObject.second, uObject.microsecond ) ) )
+    elif oType is datetime.date:
+      extend( ( 'D', _dateStruct.pack( uObject.year, uObject.month, uObject.day ) ) )
+    elif oType is datetime.time:
+      if uObject.tzinfo is not None:
+        raise Exception( "Cannot encode time objects with a time zone" )
+      extend( ( 'M', _timeStruct.pack( uObject.hour, uObject.minute, uObject.second, uObject.microsecond ) ) )
+    else:
+      raise Exception( "Unexpected type %s while encoding" % str( oType ) )
+  return eList
+
+def _dictItems( dObject, eList, keyIndex ):
+  """ Yield the items of a dictionary that still have to be encoded, sorted by key.
+      String keys, interned by their position in keyIndex, strings, ints and flat
+      dictionaries of strings, which are most of what DIRAC sends, are put directly in eList
+  """
+  extend = eList.extend
+  stringType = types.StringType
+  for key in sorted( dObject ):
+    if type( key ) is stringType:
+      if key in keyIndex:
+        extend( ( 'k', _varint( keyIndex[ key ] ) ) )
+      else:
+        keyIndex[ key ] = len( keyIndex )
+        extend( ( 'K', _varint( len( key ) ), key ) )
+    else:
+      yield key
+    value = dObject[ key ]
+    vType = type( value )
+    if vType is stringType:
+      length = len( value )
+      if length < 128:
+        extend( ( 's', _smallVarints[ length ], value ) )
+      else:
+        extend( ( 's', _varint( length ), value ) )
+    elif vType is types.IntType:
+      extend( ( 'i', _zigzag( value ) ) )
+    elif vType is types.DictType and len( value ) < 8 and _isFlat( value ):
+      extend( ( 'd', _smallVarints[ len( value ) ] ) )
+      for valueKey in sorted( value ):
+        if valueKey in keyIndex:
+          extend( ( 'k', _varint( keyIndex[ valueKey ] ) ) )
+        else:
+          keyIndex[ valueKey ] = len( keyIndex )
+          extend( ( 'K', _varint( len( valueKey ) ), valueKey ) )
+        item = value[ valueKey ]
+        length = len( item )
+        if length < 128:
+          extend( ( 's', _smallVarints[ length ], item ) )
+        else:
+          extend( ( 's', _varint( length ), item ) )
+    else:
+      yield value
+
+def _isFlat( dObject ):
+  """ Whether a dictionary only has string keys and values
+  """
+  stringType = types.StringType
+  for key, value in dObject.iteritems():
+    if type( key ) is not stringType or type( value ) is not stringType:
+      return False
+  return True
+
+def decode( data, i = 0 ):
+  """ Decode the object starting at position i without recursion. The data can be a str
+      or a bytearray, which is read in place
+
+      :return: ( object, position after it )
+  """
+  if not data:
+    return data
+  if type( data ) is bytearray:
+    #Characters and slices are taken from a buffer on it, so that they are strings
+    data = buffer( data )
+  keyTable = []
+  #Each entry is [ container, kind, remaining items, dict key waiting for its value ]
+  stack = []
+  while True:
+    c = data[ i ]
+    i += 1
+    if c == 's' or c == 'K':
+      length = ord( data[ i ] )
+      if length < 128:
+        i += 1
+      else:
+        length, i = _readVarint( data, i )
+      value = data[ i : i + length ]
+      i += length
+      if c == 'K':
+        keyTable.append( value )
+    elif c == 'k':
+      keyPos = ord( data[ i ] )
+      if keyPos < 128:
+        i += 1
+      else:
+        keyPos, i = _readVarint( data, i )
+      value = keyTable[ keyPos ]
+    elif c == 'i' or c == 'I':
+      value, i = _readVarint( data, i )
+      value = _unzigzag( value )
+      if c == 'I':
+        value = long( value )
+    elif c == 'd' or c == 'l' or c == 't':
+      count, i = _readVarint( data, i )
+      if c == 'd':
+        container = {}
+        count *= 2
+      else:
+        container = []
+      if count:
+        stack.append( [ container, c, count, None ] )
+        continue
+      value = container
+      if c == 't':
+        value = ()
+    elif c == 'Z':
+      value = datetime.datetime( *_dateTimeStruct.unpack_from( data, i ) )
+      i += _dateTimeStruct.size
+    elif c == 'T':
+      value = True
+    elif c == 'F':
+      value = False
+    elif c == 'n':
+      value = None
+    elif c == 'f':
+      value = _floatStruct.unpack_from( data, i )[0]
+      i += _floatStruct.size
+    elif c == 'u':
+      length, i = _readVarint( data, i )
+      value = unicode( data[ i : i + length ], 'utf-8' )
+      i += length
+    elif c == 'D':
+      value = datetime.date( *_dateStruct.unpack_from( data, i ) )
+      i += _dateStruct.size
+    elif c == 'M':
+      value = datetime.time( *_timeStruct.unpack_from( data, i ) )
+      i += _timeStruct.size
+    else:
+      raise Exception( "Unexpected type %s while decoding" % c )
+    #Put the value in its container, and close the containers that are complete
+    while stack:
+      top = stack[-1]
+      top[2] -= 1
+      if top[1] == 'd':
+        if top[2] & 1:
+          top[3] = value
+        else:
+          top[0][ top[3] ] = value
+      else:
+        top[0].append( value )
+      if top[2]:
+        break
+      stack.pop()
+      value = top[0]
+      if top[1] == 't':
+        value = tuple( value )
+    else:
+      return ( value, i )
@@ -4,32 +4,133 @@
 __RCSID__ = "$Id$"
 
 import datetime
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
 # DIRAC
-from DIRAC.Core.Utilities.LockRing import LockRing
+from DIRAC.Core.Utilities.Time import monotonic
+
+class _CacheShard( object ):
+  """ Part of the cache with its own lock.
+      Records are [ expirationTime, value, size ] lists, and the heap holds
+      ( expirationTime, sequence, key, record ) so records can be purged by expiration time
+      without looking at the whole cache. A heap entry whose record is no longer the one in
+      the cache is just dropped when it is popped. totalSize is the sum of the sizes of the records
+  """
+  __slots__ = ( 'lock', 'cache', 'heap', 'totalSize', 'hits', 'misses', 'evictions', 'expirations' )
+
+  def __init__( self, lru ):
+    self.lock = threading.RLock()
+    if lru:
+      self.cache = OrderedDict()
+    else:
+      self.cache = {}
+    self.heap = []
+    self.totalSize = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
 
 class DictCache( object ):
   """
   .. class:: DictCache
 
   simple dict cache
+
+  Each instance has its own locks. Records expire using a monotonic clock, so changing the
+  system time does not affect them. Optionally the cache holds at most maxSize records, or
+  records whose sizes add up to at most maxSize, evicting the least recently used ones, and
+  can be split in shards, each with its own lock, for caches shared by many threads
   """
 
-  def __init__( self, deleteFunction = False ):
+  def __init__( self, deleteFunction = False, maxSize = 0, shards = 1, sizeFunction = None ):
     """
     Initialize the dict cache.
       If a delete function is specified it will be invoked when deleting a cached object
-    """
-    self.__lock = None
 
-    self.__cache = {}
+    :param deleteFunction: function called with the value of every record removed from the cache
+    :param maxSize: maximum number of records, or maximum total size if there is a sizeFunction,
+                    0 for no limit. When sharded, each shard holds at most its proportional part
+    :param shards: number of independently locked parts the records are spread over
+    :param sizeFunction: function giving the size of the value of a record, e.g. in bytes.
+                         A record bigger than the part of maxSize of its shard is not kept
+    """
     self.__deleteFunction = deleteFunction
+    self.__sizeFunction = sizeFunction
+    self.__shards = [ _CacheShard( maxSize > 0 ) for _i in range( max( 1, shards ) ) ]
+    self.__maxShardSize = 0
+    if maxSize > 0:
+      self.__maxShardSize = max( 1, ( maxSize + len( self.__shards ) - 1 ) / len( self.__shards ) )
+    self.__sequence = itertools.count()
 
   @property
   def lock( self ):
-    """ lock """
-    if not self.__lock:
-      self.__lock = LockRing().getLock( self.__class__.__name__, recursive = True )
-    return self.__lock
+    """ lock of the first shard, the only one unless the cache is sharded """
+    return self.__shards[0].lock
+
+  def __getShard( self, cKey ):
+    if len( self.__shards ) == 1:
+      return self.__shards[0]
+    return self.__shards[ hash( cKey ) % len( self.__shards ) ]
+
+  def __callDeleteFunction( self, values ):
+    """ The delete function is called without holding any lock, it may be slow
+    """
+    if not self.__deleteFunction:
+      return
+    for value in values:
+      self.__deleteFunction( value )
+
+  def __popExpired( self, shard, limitTime ):
+    """ Remove the records of the shard that expire before limitTime.
+        The shard lock must be held
+
+    :return: list with the values removed
+    """
+    values = []
+    heap = shard.heap
+    while heap and heap[0][0] < limitTime:
+      _expTime, _seq, cKey, record = heapq.heappop( heap )
+      if shard.cache.get( cKey ) is record:
+        del shard.cache[ cKey ]
+        shard.totalSize -= record[2]
+        shard.expirations += 1
+        values.append( record[1] )
+    return values
+
+  def __getValid( self, cKey, validSeconds, countAccess ):
+    """ Look for a record that is valid for the given number of seconds.
+        An expired record is deleted
+
+    :return: ( found, value )
+    """
+    shard = self.__getShard( cKey )
+    expiredValues = []
+    shard.lock.acquire()
+    try:
+      record = shard.cache.get( cKey )
+      if record is not None:
+        # If it's valid return it!
+        if record[0] > monotonic() + validSeconds:
+          if countAccess:
+            shard.hits += 1
+            if self.__maxShardSize:
+              # Most recently used records are at the end
+              del shard.cache[ cKey ]
+              shard.cache[ cKey ] = record
+          return ( True, record[1] )
+        # Delete expired
+        del shard.cache[ cKey ]
+        shard.totalSize -= record[2]
+        expiredValues.append( record[1] )
+      if countAccess:
+        shard.misses += 1
+    finally:
+      shard.lock.release()
+    self.__callDeleteFunction( expiredValues )
+    return ( False, None )
 
   def exists( self, cKey, validSeconds = 0 ):
     """
@@ -38,54 +139,64 @@ class DictCache( object ):
       :param cKey: identification key of the record
       :param validSeconds: The amount of seconds the key has to be valid for
     """
-    self.lock.acquire()
-    try:
-      # Is the key in the cache?
-      if cKey in self.__cache:
-        expTime = self.__cache[ cKey ][ 'expirationTime' ]
-        # If it's valid return True!
-        if expTime > datetime.datetime.now() + datetime.timedelta( seconds = validSeconds ):
-          return True
-        else:
-          # Delete expired
-          self.delete( cKey )
-      return False
-    finally:
-      self.lock.release()
+    return self.__getValid( cKey, validSeconds, False )[0]
 
   def delete( self, cKey ):
     """
     Delete a key from the cache
-      
+
     :param cKey: identification key of the record
     """
-    self.lock.acquire()
+    shard = self.__getShard( cKey )
+    shard.lock.acquire()
     try:
-      if cKey not in self.__cache:
-        return
-      if self.__deleteFunction:
-        self.__deleteFunction( self.__cache[ cKey ][ 'value' ] )
-      del( self.__cache[ cKey ] )
+      record = shard.cache.pop( cKey, None )
+      if record is not None:
+        shard.totalSize -= record[2]
     finally:
-      self.lock.release()
+      shard.lock.release()
+    if record is not None:
+      self.__callDeleteFunction( [ record[1] ] )
 
   def add( self, cKey, validSeconds, value = None ):
     """
     Add a record to the cache
-      
+
     :param cKey: identification key of the record
     :param validSeconds: valid seconds of this record
     :param value: value of the record
     """
     if max( 0, validSeconds ) == 0:
       return
-    self.lock.acquire()
+    size = 1
+    if self.__sizeFunction:
+      size = self.__sizeFunction( value )
+    shard = self.__getShard( cKey )
+    shard.lock.acquire()
     try:
-      vD = { 'expirationTime' : datetime.datetime.now() + datetime.timedelta( seconds = validSeconds ),
-             'value' : value }
-      self.__cache[ cKey ] = vD
+      now = monotonic()
+      record = [ now + validSeconds, value, size ]
+      oldRecord = shard.cache.pop( cKey, None )
+      if oldRecord is not None:
+        shard.totalSize -= oldRecord[2]
+      shard.cache[ cKey ] = record
+      shard.totalSize += size
+      heapq.heappush( shard.heap, ( record[0], next( self.__sequence ), cKey, record ) )
+      # Records that have expired meanwhile are purged as new ones come
+      removedValues = self.__popExpired( shard, now )
+      if self.__maxShardSize:
+        while shard.totalSize > self.__maxShardSize:
+          _lruKey, lruRecord = shard.cache.popitem( last = False )
+          shard.totalSize -= lruRecord[2]
+          shard.evictions += 1
+          removedValues.append( lruRecord[1] )
+      # Replaced records leave entries in the heap, drop them when they are too many
+      if len( shard.heap ) > 2 * len( shard.cache ) + 64:
+        shard.heap = [ entry for entry in shard.heap if shard.cache.get( entry[2] ) is entry[3] ]
+        heapq.heapify( shard.heap )
     finally:
-      self.lock.release()
+      shard.lock.release()
+    self.__callDeleteFunction( removedValues )
 
   def get( self, cKey, validSeconds = 0 ):
     """
@@ -94,86 +205,92 @@ class DictCache( object ):
     :param cKey: identification key of the record
     :param validSeconds: The amount of seconds the key has to be valid for
     """
-    self.lock.acquire()
-    try:
-      # Is the key in the cache?
-      if cKey in self.__cache:
-        expTime = self.__cache[ cKey ][ 'expirationTime' ]
-        # If it's valid return True!
-        if expTime > datetime.datetime.now() + datetime.timedelta( seconds = validSeconds ):
-          return self.__cache[ cKey ][ 'value' ]
-        else:
-          # Delete expired
-          self.delete( cKey )
-      return None
-    finally:
-      self.lock.release()
+    return self.__getValid( cKey, validSeconds, True )[1]
 
   def showContentsInString( self ):
     """
     Return a human readable string to represent the contents
     """
-    self.lock.acquire()
-    try:
-      data = []
-      for cKey in self.__cache:
-        data.append( "%s:" % str( cKey ) )
-        data.append( "\tExp: %s" % self.__cache[ cKey ][ 'expirationTime' ] )
-        if self.__cache[ cKey ][ 'value' ]:
-          data.append( "\tVal: %s" % self.__cache[ cKey ][ 'value' ] )
-      return "\n".join( data )
-    finally:
-      self.lock.release()
+    data = []
+    for shard in self.__shards:
+      shard.lock.acquire()
+      try:
+        now = monotonic()
+        for cKey, record in shard.cache.items():
+          data.append( "%s:" % str( cKey ) )
+          data.append( "\tExp: %s" % ( datetime.datetime.now() + datetime.timedelta( seconds = record[0] - now ) ) )
+          if record[1]:
+            data.append( "\tVal: %s" % record[1] )
+      finally:
+        shard.lock.release()
+    return "\n".join( data )
 
   def getKeys( self, validSeconds = 0 ):
     """
     Get keys for all contents
     """
-    self.lock.acquire()
-    try:
-      keys = []
-      limitTime = datetime.datetime.now() + datetime.timedelta( seconds = validSeconds )
-      for cKey in self.__cache:
-        if self.__cache[ cKey ][ 'expirationTime' ] > limitTime:
-          keys.append( cKey )
-      return keys
-    finally:
-      self.lock.release()
+    keys = []
+    for shard in self.__shards:
+      shard.lock.acquire()
+      try:
+        limitTime = monotonic() + validSeconds
+        for cKey, record in shard.cache.items():
+          if record[0] > limitTime:
+            keys.append( cKey )
+      finally:
+        shard.lock.release()
+    return keys
+
+  def getStats( self ):
+    """
+    Get the counters of the cache, for monitoring
+
+    :return: dictionary with the number of records, their total size, hits and misses of get,
+             records evicted because the cache was full and records removed because they expired
+    """
+    stats = dict( size = 0, totalSize = 0, hits = 0, misses = 0, evictions = 0, expirations = 0 )
+    for shard in self.__shards:
+      shard.lock.acquire()
+      try:
+        stats[ 'size' ] += len( shard.cache )
+        stats[ 'totalSize' ] += shard.totalSize
+        stats[ 'hits' ] += shard.hits
+        stats[ 'misses' ] += shard.misses
+        stats[ 'evictions' ] += shard.evictions
+        stats[ 'expirations' ] += shard.expirations
+      finally:
+        shard.lock.release()
+    return stats
 
   def purgeExpired( self, expiredInSeconds = 0 ):
     """
     Purge all entries that are expired or will be expired in <expiredInSeconds>
     """
-    self.lock.acquire()
-    try:
-      keys = []
-      limitTime = datetime.datetime.now() + datetime.timedelta( seconds = expiredInSeconds )
-      for cKey in self.__cache:
-        if self.__cache[ cKey ][ 'expirationTime' ] < limitTime:
-          keys.append( cKey )
-      for cKey in keys:
-        if self.__deleteFunction:
-          self.__deleteFunction( self.__cache[ cKey ][ 'value' ] )
-        del( self.__cache[ cKey ] )
-    finally:
-      self.lock.release()
+    for shard in self.__shards:
+      shard.lock.acquire()
+      try:
+        values = self.__popExpired( shard, monotonic() + expiredInSeconds )
+      finally:
+        shard.lock.release()
+      self.__callDeleteFunction( values )
 
   def purgeAll( self, useLock = True ):
     """
     Purge all entries
     CAUTION: useLock parameter should ALWAYS be True except when called from __del__
     """
-    if useLock:
-      self.lock.acquire()
-    try:
-      keys = self.__cache.keys()
-      for cKey in keys:
-        if self.__deleteFunction:
-          self.__deleteFunction( self.__cache[ cKey ][ 'value' ] )
-        del( self.__cache[ cKey ] )
-    finally:
+    for shard in self.__shards:
       if useLock:
-        self.lock.release()
+        shard.lock.acquire()
+      try:
+        values = [ record[1] for record in shard.cache.values() ]
+        shard.cache.clear()
+        shard.heap = []
+        shard.totalSize = 0
+      finally:
+        if useLock:
+          shard.lock.release()
+      self.__callDeleteFunction( values )
 
   def __del__( self ):
     """ When the DictCache is deleted, all the entries should be purged.
@@ -183,6 +300,4 @@ class DictCache( object ):
         (https://docs.python.org/2/reference/datamodel.html#object.__del__)
     """
     self.purgeAll( useLock = False )
-    del self.__lock
-    del self.__cache
-
+    del self.__shards
@@ -156,6 +156,7 @@ from DIRAC                      import gLogger
 from DIRAC                      import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time  import fromString
 from DIRAC.Core.Utilities       import DErrno
+from DIRAC.Core.Utilities.MySQLStatistics import MySQLStatistics
 
 # This is for proper initialization of embedded server, it should only be called once
 try:
@@ -228,6 +229,8 @@ class MySQL( object ):
       self.__maxSpares = 10
       self.__lastClean = 0
       self.__assigned = {}
+      self.__connectionsOpened = 0
+      self.__connectionsClosed = 0
 
     @property
     def __thid( self ):
@@ -240,6 +243,7 @@ class MySQL( object ):
                               passwd = self.__passwd )
 
       self.__execute( conn, "SET AUTOCOMMIT=1" )
+      self.__connectionsOpened += 1
       return conn
 
     def __execute( self, conn, cmd ):
@@ -323,6 +327,7 @@ class MySQL( object ):
           self.__spares.append( ( data[0], data[1] ) )
         else:
           data[ 0 ].close()
+          self.__connectionsClosed += 1
       except KeyError:
         pass
 
@@ -340,6 +345,12 @@ class MySQL( object ):
         if now - data[2] > self.__graceTime:
           self.__pop( thid )
 
+    def getStats( self ):
+      """ Number of connections in use by a thread, spare, opened and closed since the start
+      """
+      return dict( InUse = len( self.__assigned ), Spare = len( self.__spares ),
+                   Opened = self.__connectionsOpened, Closed = self.__connectionsClosed )
+
     def transactionStart( self, dbName ):
       result = self.get( dbName )
       if not result[ 'OK' ]:
@@ -400,6 +411,8 @@ class MySQL( object ):
     if cKey not in MySQL.__connectionPools:
       MySQL.__connectionPools[ cKey ] = MySQL.ConnectionPool( *cKey )
     self.__connectionPool = MySQL.__connectionPools[ cKey ]
+    self.__statistics = MySQLStatistics()
+    self.__monitoredActivities = False
 
     self.__initialized = True
     result = self._connect()
@@ -592,12 +605,15 @@ class MySQL( object ):
       return self._except( '_connect', x, 'Could not connect to DB.' )
 
 
-  def _query( self, cmd, conn = None, debug = False ):
+  def _query( self, cmd, conn = None, debug = False, args = None ):
     """
     execute MySQL query command
     return S_OK structure with fetchall result as tuple
     it returns an empty tuple if no matching rows are found
     return S_ERROR upon error
+
+    If args is given, cmd is a template with %s placeholders that MySQLdb fills with
+    the escaped args. The template is then used as it is for the query statistics
     """
     if debug:
       self.logger.debug( '_query: %s' % self._safeCmd( cmd ) )
@@ -607,20 +623,17 @@ class MySQL( object ):
       else:
         self.logger.verbose( '_query: %s' % self._safeCmd( cmd )[:min( len( cmd ) , 512 )] )
 
-    if gDebugFile:
-      start = time.time()
-
     retDict = self._getConnection()
     if not retDict['OK']:
       return retDict
     connection = retDict[ 'Value' ]
 
+    start = time.time()
+    res = ()
     try:
       cursor = connection.cursor()
-      if cursor.execute( cmd ):
+      if cursor.execute( cmd, args ):
         res = cursor.fetchall()
-      else:
-        res = ()
 
       # Log the result limiting it to just 10 records
       if len( res ) <= 10:
@@ -646,6 +659,8 @@ class MySQL( object ):
     except Exception:
       pass
 
+    self.__accountQuery( cmd, time.time() - start, len( res ), not retDict[ 'OK' ] )
+
     if gDebugFile:
       print >> gDebugFile, time.time() - start, cmd.replace( '\n', '' )
       gDebugFile.flush()
@@ -653,10 +668,12 @@ class MySQL( object ):
     return retDict
 
 
-  def _update( self, cmd, conn = None, debug = False ):
+  def _update( self, cmd, conn = None, debug = False, args = None ):
     """ execute MySQL update command
         return S_OK with number of updated registers upon success
         return S_ERROR upon error
+
+        args can be given as for _query
     """
     if debug:
       self.logger.debug( '_update: %s' % self._safeCmd( cmd ) )
@@ -666,17 +683,16 @@ class MySQL( object ):
       else:
         self.logger.verbose( '_update: %s' % self._safeCmd( cmd )[:min( len( cmd ) , 512 )] )
 
-    if gDebugFile:
-      start = time.time()
-
     retDict = self._getConnection()
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
+    start = time.time()
+    res = 0
     try:
       cursor = connection.cursor()
-      res = cursor.execute( cmd )
+      res = cursor.execute( cmd, args )
       # connection.commit()
       if debug:
         self.log.debug( '_update:', res )
@@ -694,12 +710,65 @@ class MySQL( object ):
     except Exception:
       pass
 
+    self.__accountQuery( cmd, time.time() - start, res or 0, not retDict[ 'OK' ] )
+
     if gDebugFile:
       print >> gDebugFile, time.time() - start, cmd.replace( '\n', '' )
       gDebugFile.flush()
 
     return retDict
 
+  def __accountQuery( self, cmd, queryTime, rows, error ):
+    """ Add the query to the statistics, report it if it was slow and publish
+        the statistics of the period when it is over
+    """
+    slowTemplate = self.__statistics.addQuery( cmd, queryTime, rows, error )
+    if slowTemplate:
+      self.log.warn( "Slow query", "%.3f s: %s" % ( queryTime, slowTemplate ) )
+    marks = self.__statistics.getPeriodMarks()
+    if marks:
+      self.__publishStatistics( marks )
+
+  def __publishStatistics( self, marks ):
+    """ Send the statistics of the last period to the monitoring, if it is running
+    """
+    # Imported here to avoid a circular import
+    from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+    poolStats = self.__connectionPool.getStats()
+    marks[ 'ConnectionsInUse' ] = poolStats[ 'InUse' ]
+    marks[ 'SpareConnections' ] = poolStats[ 'Spare' ]
+    if not self.__monitoredActivities:
+      for key, description, unit, operation in ( ( 'Queries', 'Queries', 'queries', gMonitor.OP_SUM ),
+                                                 ( 'Rows', 'Rows returned or updated', 'rows', gMonitor.OP_SUM ),
+                                                 ( 'Errors', 'Failed queries', 'queries', gMonitor.OP_SUM ),
+                                                 ( 'SlowQueries', 'Slow queries', 'queries', gMonitor.OP_SUM ),
+                                                 ( 'Checkouts', 'Connections taken', 'connections', gMonitor.OP_SUM ),
+                                                 ( 'QueryTime', 'Query time', 'ms', gMonitor.OP_MEAN ),
+                                                 ( 'CheckoutWait', 'Connection wait time', 'ms', gMonitor.OP_MEAN ),
+                                                 ( 'ConnectionsInUse', 'Connections in use', 'connections', gMonitor.OP_MEAN ),
+                                                 ( 'SpareConnections', 'Spare connections', 'connections', gMonitor.OP_MEAN ) ):
+        gMonitor.registerActivity( "%s%s" % ( self.__dbName, key ), "%s %s" % ( self.__dbName, description ),
+                                   "DB", unit, operation )
+      self.__monitoredActivities = True
+    for key in marks:
+      gMonitor.addMark( "%s%s" % ( self.__dbName, key ), marks[ key ] )
+
+  def getQueryStatistics( self, numTemplates = 0 ):
+    """ Get the statistics of the queries done and of the connection pool
+
+    :param int numTemplates: only return the query templates that took most time, 0 for all
+    :return: S_OK( dict ) as described in MySQLStatistics.getStatistics, with the connection
+             pool figures in 'ConnectionPool'
+    """
+    stats = self.__statistics.getStatistics( numTemplates )
+    stats[ 'ConnectionPool' ] = self.__connectionPool.getStats()
+    return S_OK( stats )
+
+  def setSlowQueryTime( self, slowQueryTime ):
+    """ Queries lasting more than the given seconds are logged as slow
+    """
+    self.__statistics.slowQueryTime = slowQueryTime
+
   def _transaction( self, cmdList, conn = None ):
     """ dummy transaction support
 
@@ -728,7 +797,7 @@ class MySQL( object ):
         cmdRet.append( ( cmd, cursor.execute( cmd ) ) )
       connection.commit()
     except Exception as error:
-      self.logger.execption( error )
+      self.logger.exception( error )
       # # rollback, put back connection to the pool
       connection.rollback()
       return S_ERROR( DErrno.EMYSQL, error )
@@ -992,7 +1061,11 @@ class MySQL( object ):
       gLogger.error( error )
       return S_ERROR( DErrno.EMYSQL, error )
 
-    return self.__connectionPool.get( self.__dbName )
+    start = time.time()
+    result = self.__connectionPool.get( self.__dbName )
+    if result[ 'OK' ]:
+      self.__statistics.addCheckout( time.time() - start )
+    return result
 
 ########################################################################################
 #
@@ -0,0 +1,186 @@
+""" Statistics of the queries done by a MySQL DB object
+
+    Queries are grouped by template: the SQL command with its literal values replaced by '?',
+    so that "SELECT * FROM Jobs WHERE JobID = 12" and "SELECT * FROM Jobs WHERE JobID = 13" are
+    counted together. For each template the number of queries, their latency histogram and the
+    number of rows are kept, as well as the time spent waiting for a connection.
+"""
+
+__RCSID__ = "$Id$"
+
+import re
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket has no bound
+LATENCY_BUCKETS = ( 0.001, 0.01, 0.1, 1., 10. )
+# Only the beginning of long commands (bulk inserts...) is used to build the template
+MAX_TEMPLATE_SOURCE = 2048
+
+_stringRE = re.compile( r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"" )
+_numberRE = re.compile( r"(?<![\w.`])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w`])" )
+_listRE = re.compile( r"\(\s*\?(?:\s*,\s*\?)*\s*\)" )
+_repeatedListRE = re.compile( r"\(\?\)(?:\s*,\s*\(\?\))+" )
+_spacesRE = re.compile( r"\s+" )
+
+def getQueryTemplate( cmd ):
+  """ Normalize a SQL command replacing the literal values by '?' and the lists of values by '(?)'
+
+  :param str cmd: SQL command
+  :return: str with the template
+  """
+  truncated = len( cmd ) > MAX_TEMPLATE_SOURCE
+  if truncated:
+    cmd = cmd[ :MAX_TEMPLATE_SOURCE ]
+    # Do not leave half a value at the end
+    cmd = cmd[ :cmd.rfind( ")" ) + 1 ] or cmd
+  template = _stringRE.sub( "?", cmd )
+  template = _numberRE.sub( "?", template )
+  template = _listRE.sub( "(?)", template )
+  template = _repeatedListRE.sub( "(?)", template )
+  template = _spacesRE.sub( " ", template ).strip()
+  if truncated:
+    template += " ..."
+  return template
+
+class MySQLStatistics( object ):
+  """ Counters of the queries of a DB and of the connections they used
+  """
+
+  def __init__( self, slowQueryTime = 1., publishPeriod = 60, maxTemplates = 500 ):
+    """
+    :param float slowQueryTime: queries lasting more seconds are reported as slow
+    :param int publishPeriod: seconds between the marks returned by getPeriodMarks
+    :param int maxTemplates: maximum number of templates kept, the others are counted together
+    """
+    self.slowQueryTime = slowQueryTime
+    self.__publishPeriod = publishPeriod
+    self.__maxTemplates = maxTemplates
+    self.__lock = threading.Lock()
+    # Template of the commands seen recently, most commands are repeated as they are
+    self.__templateCache = {}
+    self.__templates = {}
+    self.__totals = dict( Checkouts = 0, CheckoutWait = 0., Queries = 0, Errors = 0, SlowQueries = 0 )
+    self.__lastPublish = time.time()
+    self.__periodCounters = self.__newPeriodCounters()
+
+  @staticmethod
+  def __newPeriodCounters():
+    return dict( Checkouts = 0, CheckoutWait = 0., Queries = 0, QueryTime = 0., Rows = 0, Errors = 0, SlowQueries = 0 )
+
+  def __getTemplate( self, cmd ):
+    """ Must be called without holding the lock, so that the regular expressions of concurrent
+        queries do not wait for each other. The single get and set of the cache are atomic,
+        at worst two threads compute the same template
+    """
+    template = self.__templateCache.get( cmd )
+    if template is None:
+      template = getQueryTemplate( cmd )
+      if len( cmd ) <= MAX_TEMPLATE_SOURCE:
+        if len( self.__templateCache ) >= 10 * self.__maxTemplates:
+          self.__templateCache.clear()
+        self.__templateCache[ cmd ] = template
+    return template
+
+  def addCheckout( self, waitTime ):
+    """ Account a connection given to a query
+
+    :param float waitTime: seconds spent getting it
+    """
+    self.__lock.acquire()
+    try:
+      for counters in ( self.__totals, self.__periodCounters ):
+        counters[ 'Checkouts' ] += 1
+        counters[ 'CheckoutWait' ] += waitTime
+    finally:
+      self.__lock.release()
+
+  def addQuery( self, cmd, queryTime, rows = 0, error = False ):
+    """ Account a query
+
+    :param str cmd: SQL command
+    :param float queryTime: seconds it took
+    :param int rows: rows returned or affected
+    :param bool error: whether it failed
+    :return: the template of the command if the query was slow, None otherwise
+    """
+    template = self.__getTemplate( cmd )
+    self.__lock.acquire()
+    try:
+      if template not in self.__templates and len( self.__templates ) >= self.__maxTemplates:
+        template = "OTHER"
+      templateStats = self.__templates.get( template )
+      if templateStats is None:
+        templateStats = dict( Queries = 0, Time = 0., MaxTime = 0., Rows = 0, Errors = 0,
+                              Histogram = [ 0 ] * ( len( LATENCY_BUCKETS ) + 1 ) )
+        self.__templates[ template ] = templateStats
+      templateStats[ 'Queries' ] += 1
+      templateStats[ 'Time' ] += queryTime
+      templateStats[ 'MaxTime' ] = max( templateStats[ 'MaxTime' ], queryTime )
+      templateStats[ 'Rows' ] += rows
+      bucket = 0
+      while bucket < len( LATENCY_BUCKETS ) and queryTime > LATENCY_BUCKETS[ bucket ]:
+        bucket += 1
+      templateStats[ 'Histogram' ][ bucket ] += 1
+      slow = queryTime > self.slowQueryTime
+      for counters in ( self.__totals, self.__periodCounters ):
+        counters[ 'Queries' ] += 1
+        if error:
+          counters[ 'Errors' ] += 1
+        if slow:
+          counters[ 'SlowQueries' ] += 1
+      self.__periodCounters[ 'QueryTime' ] += queryTime
+      self.__periodCounters[ 'Rows' ] += rows
+      if error:
+        templateStats[ 'Errors' ] += 1
+    finally:
+      self.__lock.release()
+    if slow:
+      return template
+    return None
+
+  def getStatistics( self, numTemplates = 0 ):
+    """ Get the statistics since the object was created
+
+    :param int numTemplates: only return the templates that took most time, 0 for all
+    :return: dict with the totals and, in 'Templates', the statistics of each template.
+             The 'Histogram' of a template has the number of queries that lasted up to each
+             of the LATENCY_BUCKETS seconds, and more
+    """
+    self.__lock.acquire()
+    try:
+      stats = dict( self.__totals )
+      templates = [ ( template, dict( templateStats, Histogram = list( templateStats[ 'Histogram' ] ) ) )
+                    for template, templateStats in self.__templates.items() ]
+    finally:
+      self.__lock.release()
+    templates.sort( key = lambda templateData: templateData[1][ 'Time' ], reverse = True )
+    if numTemplates:
+      templates = templates[ :numTemplates ]
+    stats[ 'Templates' ] = dict( templates )
+    stats[ 'LatencyBuckets' ] = list( LATENCY_BUCKETS )
+    return stats
+
+  def getPeriodMarks( self, force = False ):
+    """ Get the values to publish for the last period, once every publishPeriod seconds
+
+    :return: None if the period is not over, or dict with the number of Queries, Rows, Errors,
+             SlowQueries and Checkouts, and the mean QueryTime and CheckoutWait in milliseconds
+    """
+    now = time.time()
+    if not force and now - self.__lastPublish < self.__publishPeriod:
+      return None
+    self.__lock.acquire()
+    try:
+      # Another thread may have got them meanwhile
+      if not force and now - self.__lastPublish < self.__publishPeriod:
+        return None
+      counters = self.__periodCounters
+      self.__periodCounters = self.__newPeriodCounters()
+      self.__lastPublish = now
+    finally:
+      self.__lock.release()
+    marks = dict( counters )
+    marks[ 'QueryTime' ] = 1000. * counters[ 'QueryTime' ] / max( 1, counters[ 'Queries' ] )
+    marks[ 'CheckoutWait' ] = 1000. * counters[ 'CheckoutWait' ] / max( 1, counters[ 'Checkouts' ] )
+    return marks
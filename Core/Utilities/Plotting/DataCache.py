@@ -4,16 +4,60 @@
 __RCSID__ = "$Id$"
 
 import os.path
+import sys
 import time
 import threading
+import numpy
 
 from DIRAC import S_OK, S_ERROR, gLogger, rootPath, gConfig
 from DIRAC.Core.Utilities.DictCache import DictCache
 
+def _toColumns( rows ):
+  """
+  Store rows by columns, the numeric ones as arrays
+  """
+  columns = []
+  for column in zip( *rows ):
+    if all( isinstance( value, ( int, long ) ) and not isinstance( value, bool ) for value in column ):
+      column = numpy.array( column, dtype = numpy.int64 )
+    else:
+      try:
+        if not any( value is None or isinstance( value, ( basestring, bool ) ) for value in column ):
+          column = numpy.array( column, dtype = float )
+      except ( TypeError, ValueError ):
+        pass
+    columns.append( column )
+  return ( len( rows ), columns )
+
+def _tileSize( tile ):
+  """
+  Estimated memory in bytes of a tile stored by columns, empty tiles also count
+  """
+  size = sys.getsizeof( tile[1] )
+  for column in tile[1]:
+    if isinstance( column, numpy.ndarray ):
+      size += column.nbytes
+    else:
+      size += sys.getsizeof( column ) + sum( sys.getsizeof( value ) for value in column )
+  return size
+
+def _fromColumns( tile ):
+  """
+  Rows of a tile stored by columns
+  """
+  numRows, columns = tile
+  if not numRows:
+    return []
+  return zip( *[ column.tolist() if isinstance( column, numpy.ndarray ) else column for column in columns ] )
+
 
 class DataCache( object ):
 
-  def __init__( self, dirName = 'accountingPlots' ):
+  def __init__( self, dirName = 'accountingPlots', tileCacheBytes = 256 * 1024 * 1024 ):
+    """
+    :param str dirName: directory of the plots, in the data directory of the instance
+    :param int tileCacheBytes: maximum estimated memory of the cached time tiles
+    """
     self.graphsLocation = os.path.join( gConfig.getValue( '/LocalSite/InstancePath', rootPath ), 'data', dirName )
     self.cachedGraphs = {}
     self.alive = True
@@ -24,6 +68,8 @@ class DataCache( object ):
     self.__graphCache = DictCache( deleteFunction = self._deleteGraph )
     self.__dataLifeTime = 600
     self.__graphLifeTime = 3600
+    self.__tileCache = DictCache( maxSize = tileCacheBytes, shards = 4, sizeFunction = _tileSize )
+    self.__tileRecentTime = 3600
 
   def setGraphsLocation( self, graphsDir ):
     self.graphsLocation = graphsDir
@@ -38,6 +84,7 @@ class DataCache( object ):
       time.sleep( 600 )
       self.__graphCache.purgeExpired()
       self.__dataCache.purgeExpired()
+      self.__tileCache.purgeExpired()
 
   def getReportData( self, reportRequest, reportHash, dataFunc ):
     """
@@ -52,6 +99,51 @@ class DataCache( object ):
       self.__dataCache.add( reportHash, self.__dataLifeTime, reportData )
     return S_OK( reportData )
 
+  def getTiledData( self, tileKey, firstTime, lastTime, tileLength, dataFunc, timeIndex = 0 ):
+    """
+    Get the rows of a time range from cached time tiles, querying only the missing ones. The
+    records of long jobs still add to old buckets, so the tiles live as long as the report data.
+    The tiles ending less than an hour ago change the most, they are always queried and not cached
+
+    :param tileKey: hashable description of the query, without its time range
+    :param int firstTime: time of the first rows, included
+    :param int lastTime: time of the last rows, included
+    :param int tileLength: length of the tiles, they start at multiples of it
+    :param dataFunc: function( firstTime, lastTime ) returning S_OK( rows ), both times included
+    :param int timeIndex: position of the time in the rows
+    """
+    now = time.time()
+    tileStarts = range( firstTime - firstTime % tileLength, lastTime + 1, tileLength )
+    tiles = {}
+    missingRanges = []
+    for tileStart in tileStarts:
+      tile = self.__tileCache.get( ( tileKey, tileLength, tileStart ) )
+      if tile is not None:
+        tiles[ tileStart ] = _fromColumns( tile )
+      elif missingRanges and missingRanges[-1][1] == tileStart - tileLength:
+        missingRanges[-1][1] = tileStart
+      else:
+        missingRanges.append( [ tileStart, tileStart ] )
+    #Consecutive missing tiles are retrieved at once
+    for firstTile, lastTile in missingRanges:
+      retVal = dataFunc( firstTile, lastTile + tileLength - 1 )
+      if not retVal[ 'OK' ]:
+        return retVal
+      for tileStart in range( firstTile, lastTile + 1, tileLength ):
+        tiles[ tileStart ] = []
+      for row in retVal[ 'Value' ]:
+        tileRows = tiles.get( row[ timeIndex ] - row[ timeIndex ] % tileLength )
+        if tileRows is not None:
+          tileRows.append( row )
+      for tileStart in range( firstTile, lastTile + 1, tileLength ):
+        if tileStart + tileLength <= now - self.__tileRecentTime:
+          self.__tileCache.add( ( tileKey, tileLength, tileStart ), self.__dataLifeTime,
+                                _toColumns( tiles[ tileStart ] ) )
+    rows = []
+    for tileStart in tileStarts:
+      rows.extend( row for row in tiles[ tileStart ] if firstTime <= row[ timeIndex ] <= lastTime )
+    return S_OK( rows )
+
   def getReportPlot( self, reportRequest, reportHash, reportData, plotFunc ):
     """
     Get report data from cache if exists, else generate it
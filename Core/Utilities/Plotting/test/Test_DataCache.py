@@ -0,0 +1,94 @@
+""" Unit tests for the time tiles of the data cache
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import time
+import unittest
+from decimal import Decimal
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.Plotting.DataCache import DataCache, _toColumns, _fromColumns, _tileSize
+
+__RCSID__ = "$Id$"
+
+# One row per group and hour of the last two days: group, startTime, bucketLength, value
+NOW = int( time.time() )
+START = NOW - NOW % 21600 - 2 * 86400
+ROWS = [ ( group, startTime, 3600, Decimal( startTime % 7 ) ) for startTime in range( START, NOW, 3600 )
+         for group in ( 'A', 'B' ) ]
+
+class DataCacheTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.dataCache = DataCache()
+    self.queries = []
+
+  def tearDown( self ):
+    self.dataCache.alive = False
+
+  def retrieve( self, firstTime, lastTime ):
+    self.queries.append( ( firstTime, lastTime ) )
+    return S_OK( [ row for row in ROWS if firstTime <= row[1] <= lastTime ] )
+
+  def getExpected( self, firstTime, lastTime ):
+    return [ ( row[0], row[1], row[2], float( row[3] ) ) for row in ROWS if firstTime <= row[1] <= lastTime ]
+
+  def test_columns( self ):
+    tile = _toColumns( ROWS[:4] )
+    self.assertEqual( tile[0], 4 )
+    self.assertEqual( tile[1][1].dtype.kind, 'i' )
+    self.assertEqual( tile[1][3].dtype.kind, 'f' )
+    self.assertEqual( _fromColumns( tile ), [ ( row[0], row[1], row[2], float( row[3] ) ) for row in ROWS[:4] ] )
+    self.assertEqual( _fromColumns( _toColumns( [ ( 'A', None ), ( 'B', 1 ) ] ) ), [ ( 'A', None ), ( 'B', 1 ) ] )
+    self.assertEqual( _fromColumns( _toColumns( [] ) ), [] )
+
+  def test_tileSize( self ):
+    numericTile = _toColumns( [ ( row[1], row[2] ) for row in ROWS ] )
+    self.assertTrue( _tileSize( numericTile ) >= 2 * 8 * len( ROWS ) )
+    self.assertTrue( _tileSize( _toColumns( ROWS ) ) > _tileSize( numericTile ) )
+    self.assertTrue( _tileSize( _toColumns( [] ) ) > 0 )
+    # Tiles that do not fit are not kept
+    dataCache = DataCache( tileCacheBytes = 1024 )
+    try:
+      for _i in range( 2 ):
+        result = dataCache.getTiledData( 'key', START, START + 86400, 6 * 3600, self.retrieve, timeIndex = 1 )
+        self.assertEqual( result[ 'Value' ], self.getExpected( START, START + 86400 ) )
+      self.assertEqual( len( self.queries ), 2 )
+    finally:
+      dataCache.alive = False
+
+  def test_tiles( self ):
+    tileLength = 6 * 3600
+    firstTime, lastTime = START + 7200, START + 86400 + 3600
+    result = self.dataCache.getTiledData( 'key', firstTime, lastTime, tileLength, self.retrieve, timeIndex = 1 )
+    self.assertTrue( result[ 'OK' ] )
+    self.assertEqual( [ tuple( row[:3] ) for row in result[ 'Value' ] ],
+                      [ row[:3] for row in self.getExpected( firstTime, lastTime ) ] )
+    # All the missing tiles are retrieved at once
+    self.assertEqual( self.queries, [ ( START, START + 30 * 3600 - 1 ) ] )
+    # The window slides by one hour, only the new tile is retrieved
+    self.queries = []
+    result = self.dataCache.getTiledData( 'key', firstTime + 3600, lastTime + 3600 * 6, tileLength, self.retrieve,
+                                          timeIndex = 1 )
+    self.assertEqual( result[ 'Value' ], self.getExpected( firstTime + 3600, lastTime + 3600 * 6 ) )
+    self.assertEqual( self.queries, [ ( START + 30 * 3600, START + 36 * 3600 - 1 ) ] )
+    # The recent tiles are always retrieved
+    self.queries = []
+    result = self.dataCache.getTiledData( 'key', NOW - 86400, NOW, tileLength, self.retrieve, timeIndex = 1 )
+    self.assertEqual( [ row[:3] for row in result[ 'Value' ] ],
+                      [ row[:3] for row in self.getExpected( NOW - 86400, NOW ) ] )
+    self.assertEqual( self.queries[-1][1], NOW - NOW % tileLength + tileLength - 1 )
+    self.queries = []
+    self.dataCache.getTiledData( 'key', NOW - 86400, NOW, tileLength, self.retrieve, timeIndex = 1 )
+    self.assertEqual( len( self.queries ), 1 )
+    self.assertTrue( self.queries[0][1] >= NOW - 3600 )
+    # Other queries do not share the tiles
+    self.queries = []
+    self.dataCache.getTiledData( 'other', firstTime, lastTime, tileLength, self.retrieve, timeIndex = 1 )
+    self.assertEqual( self.queries, [ ( START, START + 30 * 3600 - 1 ) ] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( DataCacheTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -27,6 +27,7 @@ if a give datetime is in the defined interval.
 """
 import time as nativetime
 import datetime
+import os
 from types import StringTypes
 import sys
 
@@ -128,6 +129,14 @@ def fromEpoch( epoch ):
   """
   return dt.fromtimestamp( epoch )
 
+def monotonic():
+  """
+  Get seconds since an arbitrary point, not affected by changes of the system clock.
+  Only the difference between two values is meaningful
+  """
+  # Elapsed real time since boot, with a resolution of one clock tick
+  return os.times()[4]
+
 def to2K( dateTimeObject = None ):
   """
   Get seconds, with microsecond precission, since 2K
@@ -0,0 +1,89 @@
+""".. module:: DEncodeTestCase
+
+Test cases for the DEncode and DEncodeBinary codecs.
+
+"""
+
+import datetime
+import unittest
+
+# sut
+from DIRAC.Core.Utilities import DEncode
+
+__RCSID__ = "$Id$"
+
+########################################################################
+class DEncodeTestCase( unittest.TestCase ):
+  """ py:class DEncodeTestCase
+      Every object must come back identical, with the same types, through every codec.
+  """
+
+  def setUp( self ):
+    now = datetime.datetime( 2017, 3, 14, 15, 9, 26, 535897 )
+    self.objects = [ '', 'a string', 'x' * 300, u'unicod\xe9', 0, 127, -128, 2 ** 40, -2 ** 40,
+                     long( 5 ), 2 ** 80, 1.5, -2.0e-10, True, False, None, [], (), {},
+                     now, now.date(), now.time(),
+                     [ 1, ( 'a', [ None, {} ] ), () ],
+                     { 1 : 'one', ( 1, 2 ) : [ 'tuple' ], 2.5 : None },
+                     { 'OK' : True, 'Value' : { 'Successful' : { '/lfn/1' : { 'SE1' : 'pfn1', 'SE2' : 'pfn2' },
+                                                                 '/lfn/2' : { 'SE1' : 'pfn3' } },
+                                                'Failed' : {} } },
+                     dict( ( 'key%d' % i, { 'key%d' % i : i } ) for i in range( 300 ) ) ]
+
+  def testRoundTrip( self ):
+    """ encode then decode """
+    for codecName in DEncode.getCodecNames():
+      codec = DEncode.getCodec( codecName )
+      for obj in self.objects:
+        encoded = codec.encode( obj )
+        self.assertEqual( "".join( codec.encodeToList( obj ) ), encoded )
+        decoded, length = codec.decode( encoded )
+        self.assertEqual( length, len( encoded ) )
+        self.assertEqual( decoded, obj, "%s: %r" % ( codecName, obj ) )
+        self.assertEqual( type( decoded ), type( obj ), "%s: %r" % ( codecName, obj ) )
+
+  def testDecodeBuffer( self ):
+    """ the received messages are decoded from the bytearray they were read into """
+    for codecName in DEncode.getCodecNames():
+      codec = DEncode.getCodec( codecName )
+      for obj in self.objects:
+        encoded = codec.encode( obj )
+        decoded, length = codec.decode( bytearray( encoded ) )
+        self.assertEqual( length, len( encoded ) )
+        self.assertEqual( decoded, obj, "%s: %r" % ( codecName, obj ) )
+        self.assertEqual( type( decoded ), type( obj ), "%s: %r" % ( codecName, obj ) )
+
+  def testClassicEncoding( self ):
+    """ the wire format of DEncode does not change """
+    self.assertEqual( DEncode.getCodec(), DEncode )
+    self.assertEqual( DEncode.getCodecNames()[0], DEncode.DEFAULT_CODEC )
+    self.assertEqual( DEncode.encode( { 'a' : [ 1, 'b' ], 2 : ( None, True ) } ), "di2etnb1es1:ali1es1:bee" )
+
+  def testDeepNesting( self ):
+    """ nesting deeper than the recursion limit """
+    nested = [ 'leaf' ]
+    for _ in range( 5000 ):
+      nested = [ { 'n' : ( nested, 1 ) } ]
+    for codecName in DEncode.getCodecNames():
+      codec = DEncode.getCodec( codecName )
+      encoded = codec.encode( nested )
+      #Comparing the objects would recurse, their encodings are compared instead
+      self.assertEqual( codec.encode( codec.decode( encoded )[0] ), encoded, codecName )
+
+  def testBinaryKeys( self ):
+    """ repeated dictionary keys are sent once """
+    binary = DEncode.getCodec( "DEncodeBinary" )
+    oneKey = len( binary.encode( [ { 'someLongKeyName' : 1 } ] ) )
+    twoKeys = len( binary.encode( [ { 'someLongKeyName' : 1 }, { 'someLongKeyName' : 1 } ] ) )
+    self.assertTrue( twoKeys - oneKey < len( 'someLongKeyName' ) )
+
+  def testUnknownCodec( self ):
+    """ only registered codecs can be used """
+    self.assertRaises( KeyError, DEncode.getCodec, "NoSuchCodec" )
+
+
+## test suite execution
+if __name__ == "__main__":
+  TESTLOADER = unittest.TestLoader()
+  SUITE = TESTLOADER.loadTestsFromTestCase( DEncodeTestCase )
+  unittest.TextTestRunner(verbosity=3).run( SUITE )
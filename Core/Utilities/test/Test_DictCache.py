@@ -0,0 +1,113 @@
+""".. module:: DictCacheTestCase
+
+Test cases for DIRAC.Core.Utilities.DictCache module.
+
+"""
+
+import unittest
+
+from mock import patch
+
+# sut
+from DIRAC.Core.Utilities.DictCache import DictCache
+
+__RCSID__ = "$Id$"
+
+class FakeClock( object ):
+  """ Monotonic clock moved by hand
+  """
+  def __init__( self ):
+    self.now = 1000.
+
+  def __call__( self ):
+    return self.now
+
+########################################################################
+class DictCacheTestCase( unittest.TestCase ):
+  """ py:class DictCacheTestCase
+      Test case for DIRAC.Core.Utilities.DictCache module.
+  """
+
+  def setUp( self ):
+    self.clock = FakeClock()
+    self.patcher = patch( 'DIRAC.Core.Utilities.DictCache.monotonic', new = self.clock )
+    self.patcher.start()
+    self.deleted = []
+
+  def tearDown( self ):
+    self.patcher.stop()
+
+  def testExpiration( self ):
+    """ records are valid for the given time """
+    cache = DictCache( self.deleted.append )
+    cache.add( 'a', 10, 'A' )
+    cache.add( 'b', 0, 'B' )
+    self.assertEqual( cache.get( 'a' ), 'A' )
+    self.assertEqual( cache.get( 'b' ), None )
+    self.assertTrue( cache.exists( 'a', 5 ) )
+    self.assertEqual( cache.getKeys(), [ 'a' ] )
+    self.clock.now += 11
+    self.assertEqual( cache.get( 'a' ), None )
+    self.assertEqual( self.deleted, [ 'A' ] )
+    stats = cache.getStats()
+    self.assertEqual( ( stats[ 'hits' ], stats[ 'misses' ], stats[ 'size' ] ), ( 1, 2, 0 ) )
+
+  def testPurgeExpired( self ):
+    """ only expired records are purged, including replaced ones """
+    cache = DictCache( self.deleted.append )
+    for i in range( 10 ):
+      cache.add( i, 10 + i, i )
+    cache.add( 0, 100, 'new0' )
+    cache.purgeExpired( 15 )
+    self.assertEqual( sorted( self.deleted ), [ 1, 2, 3, 4 ] )
+    self.assertEqual( sorted( cache.getKeys() ), [ 0, 5, 6, 7, 8, 9 ] )
+    self.clock.now += 50
+    cache.add( 'other', 10, 'O' )
+    self.assertEqual( sorted( cache.getKeys() ), [ 0, 'other' ] )
+    self.assertEqual( cache.getStats()[ 'expirations' ], 9 )
+    cache.delete( 0 )
+    self.assertEqual( self.deleted[-1], 'new0' )
+
+  def testMaxSize( self ):
+    """ least recently used records are evicted """
+    cache = DictCache( self.deleted.append, maxSize = 3 )
+    for key in 'abc':
+      cache.add( key, 10, key.upper() )
+    self.assertEqual( cache.get( 'a' ), 'A' )
+    cache.add( 'd', 10, 'D' )
+    self.assertEqual( self.deleted, [ 'B' ] )
+    self.assertEqual( sorted( cache.getKeys() ), [ 'a', 'c', 'd' ] )
+    self.assertEqual( cache.getStats()[ 'evictions' ], 1 )
+
+  def testMaxTotalSize( self ):
+    """ records are evicted by the sum of their sizes """
+    cache = DictCache( self.deleted.append, maxSize = 10, sizeFunction = len )
+    cache.add( 'a', 10, 'A' * 4 )
+    cache.add( 'b', 10, 'B' * 4 )
+    cache.add( 'a', 10, 'A' * 5 )
+    self.assertEqual( cache.getStats()[ 'totalSize' ], 9 )
+    cache.add( 'c', 10, 'C' * 3 )
+    self.assertEqual( self.deleted, [ 'B' * 4 ] )
+    self.assertEqual( sorted( cache.getKeys() ), [ 'a', 'c' ] )
+    # a record bigger than the cache is not kept
+    cache.add( 'd', 10, 'D' * 11 )
+    self.assertEqual( cache.getKeys(), [] )
+    self.assertEqual( cache.getStats()[ 'totalSize' ], 0 )
+
+  def testShards( self ):
+    """ a sharded cache behaves as a single one """
+    cache = DictCache( self.deleted.append, shards = 4 )
+    for i in range( 100 ):
+      cache.add( i, 10, i )
+    self.assertEqual( sorted( cache.getKeys() ), range( 100 ) )
+    self.assertEqual( cache.get( 42 ), 42 )
+    cache.purgeAll()
+    self.assertEqual( sorted( self.deleted ), range( 100 ) )
+    self.assertEqual( cache.getStats()[ 'size' ], 0 )
+
+
+## test suite execution
+if __name__ == "__main__":
+  TESTLOADER = unittest.TestLoader()
+  SUITE = TESTLOADER.loadTestsFromTestCase( DictCacheTestCase )
+  unittest.TextTestRunner(verbosity=3).run( SUITE )
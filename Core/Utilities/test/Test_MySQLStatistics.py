@@ -0,0 +1,68 @@
+""" Unit tests for the statistics of the MySQL queries
+"""
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from DIRAC.Core.Utilities.MySQLStatistics import MySQLStatistics, getQueryTemplate
+
+__RCSID__ = "$Id$"
+
+class MySQLStatisticsTestCase( unittest.TestCase ):
+
+  def test_getQueryTemplate( self ):
+    self.assertEqual( getQueryTemplate( "SELECT * FROM Jobs WHERE JobID = 12 AND Status='Done'" ),
+                      "SELECT * FROM Jobs WHERE JobID = ? AND Status=?" )
+    self.assertEqual( getQueryTemplate( "SELECT * FROM Jobs WHERE JobID = 13 AND Status=\"Failed\"" ),
+                      "SELECT * FROM Jobs WHERE JobID = ? AND Status=?" )
+    self.assertEqual( getQueryTemplate( "DELETE FROM t WHERE Id IN ( 1, 2,3 )" ),
+                      "DELETE FROM t WHERE Id IN (?)" )
+    self.assertEqual( getQueryTemplate( "INSERT INTO t ( a, b ) VALUES ( 1, 'x' ), ( 2, 'it\\'s' )" ),
+                      "INSERT INTO t ( a, b ) VALUES (?)" )
+    # Numbers in names are kept
+    self.assertEqual( getQueryTemplate( "SELECT `Col1` FROM tq_TQToSites2 WHERE t2.A = 1.5e3" ),
+                      "SELECT `Col1` FROM tq_TQToSites2 WHERE t2.A = ?" )
+    longInsert = "INSERT INTO t VALUES %s" % ",".join( [ "(%d,'abc')" % i for i in range( 1000 ) ] )
+    self.assertEqual( getQueryTemplate( longInsert ), "INSERT INTO t VALUES (?) ..." )
+
+  def test_statistics( self ):
+    stats = MySQLStatistics( slowQueryTime = 1., publishPeriod = 3600, maxTemplates = 2 )
+    self.assertEqual( stats.addQuery( "SELECT a FROM t WHERE b = 1", 0.005, rows = 3 ), None )
+    self.assertEqual( stats.addQuery( "SELECT a FROM t WHERE b = 2", 2., rows = 1 ), "SELECT a FROM t WHERE b = ?" )
+    stats.addQuery( "UPDATE t SET a = 1", 0.0005, rows = 5, error = True )
+    # Beyond maxTemplates they are all counted together
+    self.assertEqual( stats.addQuery( "DELETE FROM t", 0.05 ), None )
+    stats.addQuery( "DELETE FROM u", 0.05 )
+    stats.addCheckout( 0.5 )
+    stats.addCheckout( 1.5 )
+
+    result = stats.getStatistics()
+    self.assertEqual( result[ 'Queries' ], 5 )
+    self.assertEqual( result[ 'Errors' ], 1 )
+    self.assertEqual( result[ 'SlowQueries' ], 1 )
+    self.assertEqual( result[ 'Checkouts' ], 2 )
+    self.assertEqual( sorted( result[ 'Templates' ] ),
+                      [ "OTHER", "SELECT a FROM t WHERE b = ?", "UPDATE t SET a = ?" ] )
+    selectStats = result[ 'Templates' ][ "SELECT a FROM t WHERE b = ?" ]
+    self.assertEqual( selectStats[ 'Queries' ], 2 )
+    self.assertEqual( selectStats[ 'Rows' ], 4 )
+    self.assertEqual( selectStats[ 'MaxTime' ], 2. )
+    self.assertEqual( selectStats[ 'Histogram' ], [ 0, 1, 0, 0, 1, 0 ] )
+    self.assertEqual( result[ 'Templates' ][ "OTHER" ][ 'Histogram' ], [ 0, 0, 2, 0, 0, 0 ] )
+    self.assertEqual( list( stats.getStatistics( numTemplates = 1 )[ 'Templates' ] ),
+                      [ "SELECT a FROM t WHERE b = ?" ] )
+
+    self.assertEqual( stats.getPeriodMarks(), None )
+    marks = stats.getPeriodMarks( force = True )
+    self.assertEqual( marks[ 'Queries' ], 5 )
+    self.assertEqual( marks[ 'Rows' ], 9 )
+    self.assertAlmostEqual( marks[ 'CheckoutWait' ], 1000. )
+    self.assertAlmostEqual( marks[ 'QueryTime' ], 1000. * 2.1055 / 5 )
+    # A new period starts
+    self.assertEqual( stats.getPeriodMarks( force = True )[ 'Queries' ], 0 )
+    self.assertEqual( stats.getStatistics()[ 'Queries' ], 5 )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( MySQLStatisticsTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,88 @@
+""" Unit tests for the ProcessMonitor, on synthetic /proc trees
+"""
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from DIRAC.Core.Utilities.ProcessMonitor import ProcessMonitor, ProcessTable
+
+__RCSID__ = "$Id$"
+
+PAGE_SIZE = os.sysconf( 'SC_PAGESIZE' )
+CLOCK_TICKS = float( os.sysconf( 'SC_CLK_TCK' ) )
+
+def writeStat( procPath, pid, comm, ppid, ticks = ( 0, 0, 0, 0 ), vsize = 0, rss = 0 ):
+  """ Write /proc/PID/stat with the fields the monitor uses, the others are 0
+  """
+  fields = [ str( pid ), '(%s)' % comm, 'S', str( ppid ), str( pid ), str( pid ), '0', '-1', '4202752' ]
+  fields += [ '0' ] * 4 + [ str( tick ) for tick in ticks ]
+  fields += [ '20', '0', '1', '0', '12345', str( vsize ), str( rss ) ] + [ '0' ] * 20
+  os.makedirs( os.path.join( procPath, str( pid ) ) )
+  with open( os.path.join( procPath, str( pid ), 'stat' ), 'w' ) as statFile:
+    statFile.write( ' '.join( fields ) + '\n' )
+
+class ProcessMonitorTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.procPath = tempfile.mkdtemp()
+    writeStat( self.procPath, 1, 'init', 0, ( 500, 300, 9000, 1000 ), 20000000, 300 )
+    # The job wrapper, its payload with a child, and a short script
+    writeStat( self.procPath, 100, 'python', 1, ( 120, 30, 0, 0 ), 200000000, 5000 )
+    writeStat( self.procPath, 101, 'bash', 100, ( 1, 1, 40, 10 ), 10000000, 400 )
+    writeStat( self.procPath, 102, 'my app (v2)', 101, ( 2000, 200, 0, 0 ), 1500000000, 250000 )
+    writeStat( self.procPath, 103, 'sleep', 100, ( 0, 0, 0, 0 ), 5000000, 100 )
+    # Another job of the node
+    writeStat( self.procPath, 200, 'python', 1, ( 700, 70, 0, 0 ), 300000000, 8000 )
+    writeStat( self.procPath, 201, 'root.exe', 200, ( 9000, 100, 0, 0 ), 2000000000, 400000 )
+    # Not processes, or processes gone while scanning
+    os.makedirs( os.path.join( self.procPath, 'self' ) )
+    os.makedirs( os.path.join( self.procPath, '300' ) )
+    self.monitor = ProcessMonitor( procPath = self.procPath, scanLifeTime = 0 )
+
+  def tearDown( self ):
+    shutil.rmtree( self.procPath )
+
+  def test_processTable( self ):
+    processTable = ProcessTable( self.procPath )
+    self.assertEqual( sorted( processTable.processes ), [ 1, 100, 101, 102, 103, 200, 201 ] )
+    self.assertEqual( sorted( processTable.children[100] ), [ 101, 103 ] )
+    self.assertEqual( processTable.processes[102].fields[1], '(my app (v2))' )
+    self.assertEqual( processTable.processes[102].ppid, 101 )
+    self.assertEqual( sorted( processTable.getTree( 100 ) ), [ 100, 101, 102, 103 ] )
+    self.assertEqual( processTable.getTreeResources( 103 ), ( 0, 5000000, 100 ) )
+
+  def test_resourceConsumed( self ):
+    result = self.monitor.getResourceConsumedLinux( 100 )
+    self.assertTrue( result['OK'] )
+    self.assertAlmostEqual( result['Value']['CPU'], 2402 / CLOCK_TICKS )
+    self.assertEqual( result['Value']['Vsize'], 1715000000. )
+    self.assertEqual( result['Value']['RSS'], 255500. * PAGE_SIZE )
+    result = self.monitor.getCPUConsumedLinux( '200' )
+    self.assertTrue( result['OK'] )
+    self.assertAlmostEqual( result['Value'], 9870 / CLOCK_TICKS )
+    result = self.monitor.getMemoryConsumedLinux( 101 )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], { 'Vsize' : 1510000000., 'RSS' : 250400. * PAGE_SIZE } )
+    self.assertFalse( self.monitor.getResourceConsumedLinux( 300 )['OK'] )
+    self.assertFalse( self.monitor.getResourceConsumedLinux( 400 )['OK'] )
+
+  def test_sharedScan( self ):
+    monitor = ProcessMonitor( procPath = self.procPath, scanLifeTime = 3600 )
+    cpu = monitor.getCPUConsumedLinux( 100 )['Value']
+    shutil.rmtree( os.path.join( self.procPath, '103' ) )
+    writeStat( self.procPath, 103, 'sleep', 100, ( 100, 0, 0, 0 ) )
+    # The scan is reused by all the monitors until it expires
+    self.assertEqual( ProcessMonitor( procPath = self.procPath, scanLifeTime = 3600 ).getCPUConsumedLinux( 100 )['Value'],
+                      cpu )
+    self.assertAlmostEqual( self.monitor.getCPUConsumedLinux( 100 )['Value'], cpu + 100 / CLOCK_TICKS )
+    # New processes are always looked for
+    writeStat( self.procPath, 104, 'sleep', 1 )
+    self.assertTrue( monitor.getCPUConsumedLinux( 104 )['OK'] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ProcessMonitorTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
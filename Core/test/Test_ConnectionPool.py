@@ -0,0 +1,83 @@
+""" Unit tests for the DISET client connection pool
+"""
+
+import socket
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.DISET.private.ConnectionPool import ConnectionPool
+
+__RCSID__ = "$Id$"
+
+class FakeTransport( object ):
+  """ Minimal transport over one end of a socket pair
+  """
+
+  def __init__( self, oSocket ):
+    self.oSocket = oSocket
+    self.byteStream = ""
+    self.closed = False
+
+  def getSocket( self ):
+    return self.oSocket
+
+  def receiveData( self, maxBufferSize = 0, blockAfterKeepAlive = True, idleReceive = False ):
+    if not self.oSocket.recv( 1024 ):
+      return S_ERROR( "Connection closed by peer" )
+    return S_OK( "unexpected" )
+
+  def close( self ):
+    self.closed = True
+    self.oSocket.close()
+
+
+class ConnectionPoolTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.pool = ConnectionPool( maxPerEndpoint = 2, maxIdleTime = 60 )
+    self.sockets = []
+
+  def tearDown( self ):
+    for sock in self.sockets:
+      sock.close()
+
+  def _transport( self ):
+    local, remote = socket.socketpair()
+    self.sockets.append( remote )
+    return FakeTransport( local ), remote
+
+  def test_reuse( self ):
+    transport, _remote = self._transport()
+    self.assertEqual( self.pool.get( 'key' ), None )
+    self.pool.release( 'key', transport )
+    self.assertEqual( self.pool.get( 'otherKey' ), None )
+    self.assertEqual( self.pool.get( 'key' ), transport )
+    self.assertEqual( self.pool.get( 'key' ), None )
+    self.assertFalse( transport.closed )
+    self.assertEqual( self.pool.getStats()[ 'hits' ], 1 )
+
+  def test_maxPerEndpoint( self ):
+    transports = [ self._transport()[0] for _i in range( 3 ) ]
+    for transport in transports:
+      self.pool.release( 'key', transport )
+    self.assertTrue( transports[2].closed )
+    self.assertEqual( self.pool.getStats()[ 'idle' ], 2 )
+
+  def test_peerClosed( self ):
+    transport, remote = self._transport()
+    self.pool.release( 'key', transport )
+    remote.close()
+    self.assertEqual( self.pool.get( 'key' ), None )
+    self.assertTrue( transport.closed )
+
+  def test_idleTimeout( self ):
+    pool = ConnectionPool( maxPerEndpoint = 2, maxIdleTime = 0 )
+    self.assertFalse( pool.isEnabled() )
+    transport, _remote = self._transport()
+    pool.release( 'key', transport )
+    self.assertTrue( transport.closed )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ConnectionPoolTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -30,6 +30,7 @@ from DIRAC.AccountingSystem.Client.DataStoreClient import gDataStoreClient
 from DIRAC.AccountingSystem.Client.Types.DataOperation import DataOperation
 from DIRAC.DataManagementSystem.Utilities.DMSHelpers import DMSHelpers
 from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+from DIRAC.Resources.Catalog.Utilities import iterPages
 from DIRAC.Resources.Storage.StorageElement import StorageElement
 from DIRAC.ResourceStatusSystem.Client.ResourceStatus import ResourceStatus
 
@@ -229,22 +230,49 @@ class DataManager( object ):
     """
     log = self.log.getSubLogger( '__getCatalogDirectoryContents' )
     log.debug( 'Obtaining the catalog contents for %d directories:' % len( directories ) )
-    activeDirs = directories
     allFiles = {}
-    while len( activeDirs ) > 0:
-      currentDir = activeDirs[0]
-      res = returnSingleResult( self.fc.listDirectory( currentDir, verbose = True ) )
-      activeDirs.remove( currentDir )
+    for files in self.__iterCatalogDirectoryFiles( directories, log ):
+      allFiles.update( files )
 
-      if not res['OK']:
-        log.debug( "Problem getting the %s directory content" % currentDir, res['Message'] )
+    log.debug( "Found %d files" % len( allFiles ) )
+    return S_OK( allFiles )
+
+  def __iterCatalogDirectoryFiles( self, directories, log ):
+    """ ls recursively all files in directories, by pages of files with their metadata and replicas
+
+    :param list directories: folder names
+    :return: generator of { lfn : { 'MetaData' : ..., 'Replicas' : ... } }
+    """
+    activeDirs = list( directories )
+    # The client method list is static, a service without the paged listing is only detected
+    # when the first page of a directory fails and listDirectory succeeds for it
+    pagedListing = any( oCatalog.hasCatalogMethod( 'listDirectoryPaged' )
+                        for _catalogName, oCatalog, _master in self.fc.getReadCatalogs() )
+    while len( activeDirs ) > 0:
+      currentDir = activeDirs.pop( 0 )
+      if pagedListing:
+        # FileCatalog dispatches on the name of the last method obtained from it, so it is
+        # looked up again for each page
+        pages = iterPages( lambda path, **kwargs: self.fc.listDirectoryPaged( path, **kwargs ),
+                           currentDir, verbose = True )
+        firstPage = True
       else:
+        pages = [ returnSingleResult( self.fc.listDirectory( currentDir, verbose = True ) ) ]
+        firstPage = False
+      for res in pages:
+        if not res['OK'] and firstPage:
+          # FileCatalog does not forward the error of the catalogs, e.g. an unknown method
+          log.debug( "Paged listing failed for %s, trying listDirectory" % currentDir, res['Message'] )
+          res = returnSingleResult( self.fc.listDirectory( currentDir, verbose = True ) )
+          if res['OK']:
+            pagedListing = False
+        firstPage = False
+        if not res['OK']:
+          log.warn( "Problem getting the %s directory content" % currentDir, res['Message'] )
+          break
         dirContents = res['Value']
         activeDirs.extend( dirContents['SubDirs'] )
-        allFiles.update( dirContents['Files'] )
-
-    log.debug( "Found %d files" % len( allFiles ) )
-    return S_OK( allFiles )
+        yield dirContents['Files']
 
 
   def getReplicasFromDirectory( self, directory ):
@@ -257,10 +285,11 @@ class DataManager( object ):
       directories = [directory]
     else:
       directories = directory
-    res = self.__getCatalogDirectoryContents( directories )
-    if not res['OK']:
-      return res
-    allReplicas = dict( ( lfn, metadata['Replicas'] ) for lfn, metadata in res['Value'].iteritems() )
+    log = self.log.getSubLogger( 'getReplicasFromDirectory' )
+    allReplicas = {}
+    # Only the replicas of each page of files are kept
+    for files in self.__iterCatalogDirectoryFiles( directories, log ):
+      allReplicas.update( ( lfn, metadata.get( 'Replicas', {} ) ) for lfn, metadata in files.iteritems() )
     return S_OK( allReplicas )
 
   def getFilesFromDirectory( self, directory, days = 0, wildcard = '*' ):
@@ -9,6 +9,7 @@ import time
 import sys
 import getopt
 
+from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.ReturnValues import returnSingleResult
 from DIRAC.Core.Base.CLI import CLI
 from DIRAC.Core.Security.ProxyInfo import getProxyInfo
@@ -1150,56 +1151,72 @@ File Catalog Client $Revision: 1.17 $Date:
       dList.printListing(reverse,timeorder,sizeorder,humanread)
       return         
     
-    # Get directory contents now
+    # Get directory contents now, page by page when the catalog can do it
     try:
-      result =  self.fc.listDirectory(path,_long)                   
       dList = DirectoryListing()
-      if result['OK']:
-        if result['Value']['Successful']:
-          for entry in result['Value']['Successful'][path]['Files']:
-            fname = entry.split('/')[-1]
-            # print entry, fname
-            # fname = entry.replace(self.cwd,'').replace('/','')
-            if _long:
-              fileDict = result['Value']['Successful'][path]['Files'][entry]['MetaData']
-              repDict = result['Value']['Successful'][path]['Files'][entry].get( "Replicas", {} )
-              if fileDict:
-                dList.addFile(fname,fileDict,repDict,numericid)
-            else:  
-              dList.addSimpleFile(fname)
-          for entry in result['Value']['Successful'][path]['SubDirs']:
-            dname = entry.split('/')[-1]
-            # print entry, dname
-            # dname = entry.replace(self.cwd,'').replace('/','')  
+      for result in self.__iterDirectoryListing( path, _long ):
+        if not result['OK']:
+          print "Error:",result['Message']
+          return
+        pathDict = result['Value']
+        for entry in pathDict['Files']:
+          fname = entry.split('/')[-1]
+          # print entry, fname
+          # fname = entry.replace(self.cwd,'').replace('/','')
+          if _long:
+            fileDict = pathDict['Files'][entry]['MetaData']
+            repDict = pathDict['Files'][entry].get( "Replicas", {} )
+            if fileDict:
+              dList.addFile(fname,fileDict,repDict,numericid)
+          else:  
+            dList.addSimpleFile(fname)
+        for entry in pathDict['SubDirs']:
+          dname = entry.split('/')[-1]
+          # print entry, dname
+          # dname = entry.replace(self.cwd,'').replace('/','')  
+          if _long:
+            dirDict = pathDict['SubDirs'][entry]
+            if dirDict:
+              dList.addDirectory(dname,dirDict,numericid)
+          else:    
+            dList.addSimpleFile(dname)
+        
+        for entry in pathDict['Links']:
+          pass
+        
+        if 'Datasets' in pathDict:
+          for entry in pathDict['Datasets']:
+            dname = os.path.basename( entry )    
             if _long:
-              dirDict = result['Value']['Successful'][path]['SubDirs'][entry]
-              if dirDict:
-                dList.addDirectory(dname,dirDict,numericid)
+              dsDict = pathDict['Datasets'][entry]['Metadata']  
+              if dsDict:
+                dList.addDataset(dname,dsDict,numericid)
             else:    
               dList.addSimpleFile(dname)
-          
-          for entry in result['Value']['Successful'][path]['Links']:
-            pass
-          
-          if 'Datasets' in result['Value']['Successful'][path]:
-            for entry in result['Value']['Successful'][path]['Datasets']:
-              dname = os.path.basename( entry )    
-              if _long:
-                dsDict = result['Value']['Successful'][path]['Datasets'][entry]['Metadata']  
-                if dsDict:
-                  dList.addDataset(dname,dsDict,numericid)
-              else:    
-                dList.addSimpleFile(dname)
-              
-          if _long:
-            dList.printListing(reverse,timeorder,sizeorder,humanread)
-          else:
-            dList.printOrdered()
+            
+      if _long:
+        dList.printListing(reverse,timeorder,sizeorder,humanread)
       else:
-        print "Error:",result['Message']
+        dList.printOrdered()
     except Exception as x:
       print "Error:", str(x)
 
+  def __iterDirectoryListing( self, path, verbose ):
+    """ Iterate over the pages of the listing of a directory, the whole listing being
+        a single page with the catalogs that can not page it
+    """
+    if hasattr( self.fc, 'iterDirectoryListing' ):
+      for result in self.fc.iterDirectoryListing( path, verbose = verbose ):
+        yield result
+      return
+    result = self.fc.listDirectory( path, verbose )
+    if result['OK']:
+      if path in result['Value']['Successful']:
+        result = S_OK( result['Value']['Successful'][path] )
+      else:
+        result = S_ERROR( result['Value']['Failed'].get( path, 'Failed to list %s' % path ) )
+    yield result
+
   def complete_ls(self, text, line, begidx, endidx):
     result = []
     args = line.split()
@@ -13,6 +13,7 @@ __RCSID__ = "$Id$"
 from DIRAC import S_OK, S_ERROR
 import DIRAC.Core.Utilities.Time as Time
 
+import bisect
 import json
 
 FILE_STANDARD_METAKEYS = { 'SE': 'VARCHAR',
@@ -47,6 +48,31 @@ FILEINFO_TABLE_METAKEYS = { 'GUID': 'GUID',
                             'LastAccessDate': 'LastAccessDate' }
 
 
+def getTypedValue( value, mtype ):
+  """ Convert a metadata value to the type of the metadata field
+  """
+  if mtype[0:3].lower() == 'int':
+    return int( value )
+  elif mtype[0:5].lower() == 'float':
+    return float( value )
+  elif mtype[0:4].lower() == 'date':
+    return Time.fromString( value )
+  else:
+    return value
+
+def getOperands( value ):
+  """ Get the ( operation, operand ) list of the query of one metadata field
+  """
+  if isinstance( value, list ):
+    return [ ('in', value) ]
+  elif isinstance( value, dict ):
+    resultList = []
+    for operation, operand in value.items():
+      resultList.append( ( operation, operand ) )
+    return resultList
+  else:
+    return [ ("=", value) ]
+
 class MetaQuery( object ):
 
   def __init__( self, queryDict = None, typeDict = None ):
@@ -169,27 +195,6 @@ class MetaQuery( object ):
   def applyQuery( self, userMetaDict ):
     """  Return a list of tuples with tables and conditions to locate files for a given user Metadata
     """
-    def getOperands( value ):
-      if isinstance( value, list ):
-        return [ ('in', value) ]
-      elif isinstance( value, dict ):
-        resultList = []
-        for operation, operand in value.items():
-          resultList.append( ( operation, operand ) )
-        return resultList
-      else:
-        return [ ("=", value) ]
-
-    def getTypedValue( value, mtype ):
-      if mtype[0:3].lower() == 'int':
-        return int( value )
-      elif mtype[0:5].lower() == 'float':
-        return float( value )
-      elif mtype[0:4].lower() == 'date':
-        return Time.fromString( value )
-      else:
-        return value
-
     for meta, value in self.__metaQueryDict.items():
 
       # Check if user dict contains all the requested meta data
@@ -242,3 +247,192 @@ class MetaQuery( object ):
             return S_OK( False )
 
     return S_OK( True )
+
+class FieldQueries( object ):
+  """ Clauses of a set of queries on one metadata field, indexed by value
+  """
+
+  def __init__( self, mtype ):
+    self.mtype = mtype
+    # Queries matching when the file has the field, whatever its value
+    self.anyIDs = []
+    # Queries matching when the file does not have the field
+    self.missingIDs = []
+    # Queries only requiring a value of the right type
+    self.typedIDs = []
+    # value -> queries with an equality or membership operation matching that value
+    self.equalIDs = {}
+    # Queries with an inequality or exclusion operation, and the values excluding them
+    self.notEqualIDs = []
+    self.excludedIDs = {}
+    # operator -> ( sorted thresholds, query of each threshold )
+    self.ranges = {}
+    # Whether the values of the field have to be converted
+    self.typed = False
+
+  def convert( self, value ):
+    return getTypedValue( value, self.mtype )
+
+  def addOperation( self, queryID, operation, operand ):
+    """ Add one operation of a query clause
+
+    :return: S_OK( number of conditions added ) or S_ERROR for an illegal operand
+    """
+    try:
+      if isinstance( operand, list ):
+        typedValue = [ self.convert( x ) for x in operand ]
+      else:
+        typedValue = self.convert( operand )
+    except ValueError:
+      return S_ERROR( 'Illegal type for metadata %s in filter' % str( operand ) )
+
+    if operation in [ '>', '<', '>=', '<=' ]:
+      if isinstance( typedValue, list ):
+        return S_ERROR( 'Illegal query: list of values for comparison operation' )
+      self.ranges.setdefault( operation, [] ).append( ( typedValue, queryID ) )
+    elif operation in [ 'in', '=' ]:
+      for value in set( typedValue if isinstance( typedValue, list ) else [ typedValue ] ):
+        self.equalIDs.setdefault( value, [] ).append( queryID )
+    elif operation in [ 'nin', '!=' ]:
+      self.notEqualIDs.append( queryID )
+      for value in set( typedValue if isinstance( typedValue, list ) else [ typedValue ] ):
+        self.excludedIDs.setdefault( value, [] ).append( queryID )
+    else:
+      # Ignored as in MetaQuery.applyQuery
+      return S_OK( 0 )
+    return S_OK( 1 )
+
+  def update( self, fieldQueries ):
+    """ Add the clauses of another FieldQueries object
+    """
+    self.anyIDs += fieldQueries.anyIDs
+    self.missingIDs += fieldQueries.missingIDs
+    self.typedIDs += fieldQueries.typedIDs
+    self.notEqualIDs += fieldQueries.notEqualIDs
+    for value, queryIDs in fieldQueries.equalIDs.items():
+      self.equalIDs.setdefault( value, [] ).extend( queryIDs )
+    for value, queryIDs in fieldQueries.excludedIDs.items():
+      self.excludedIDs.setdefault( value, [] ).extend( queryIDs )
+    for operation, thresholds in fieldQueries.ranges.items():
+      self.ranges.setdefault( operation, [] ).extend( thresholds )
+
+  def finalize( self ):
+    """ Sort the range thresholds once all the clauses are added
+    """
+    for operation, thresholds in self.ranges.items():
+      thresholds.sort( key = lambda item: item[0] )
+      self.ranges[operation] = ( [ item[0] for item in thresholds ], [ item[1] for item in thresholds ] )
+    self.typed = bool( self.typedIDs or self.equalIDs or self.notEqualIDs or self.ranges )
+
+  def countMatches( self, value, counts ):
+    """ Add to counts one for every condition satisfied by the value of the field
+    """
+    for queryID in self.anyIDs:
+      counts[queryID] = counts.get( queryID, 0 ) + 1
+    if not self.typed:
+      return
+    try:
+      value = self.convert( value )
+      equalIDs = self.equalIDs.get( value, [] )
+      excludedIDs = self.excludedIDs.get( value, [] )
+    except ( ValueError, TypeError ):
+      return
+    for queryIDs in ( self.typedIDs, equalIDs, self.notEqualIDs ):
+      for queryID in queryIDs:
+        counts[queryID] = counts.get( queryID, 0 ) + 1
+    for queryID in excludedIDs:
+      counts[queryID] -= 1
+    for operation, ( thresholds, queryIDs ) in self.ranges.items():
+      try:
+        if operation == '>':
+          matching = queryIDs[:bisect.bisect_left( thresholds, value )]
+        elif operation == '>=':
+          matching = queryIDs[:bisect.bisect_right( thresholds, value )]
+        elif operation == '<':
+          matching = queryIDs[bisect.bisect_right( thresholds, value ):]
+        else:
+          matching = queryIDs[bisect.bisect_left( thresholds, value ):]
+      except TypeError:
+        continue
+      for queryID in matching:
+        counts[queryID] = counts.get( queryID, 0 ) + 1
+
+class MetaQuerySet( object ):
+  """ Set of metadata queries compiled to be applied together. A metadata dictionary is
+      checked against all the queries at once with lookups in per field indexes instead of
+      applying each query in turn, with the same result as MetaQuery.applyQuery.
+  """
+
+  def __init__( self, queryList, typeDict = None ):
+    """
+    :param queryList: list of ( queryID, queryDict )
+    :param dict typeDict: metadata field name -> type
+    """
+    self.typeDict = dict( typeDict ) if typeDict else {}
+    # queryID -> error message of the queries that can never match
+    self.errors = {}
+    # queryID -> number of conditions to satisfy
+    self.__required = {}
+    self.__alwaysIDs = []
+    self.__fields = {}
+    for queryID, queryDict in queryList:
+      self.__addQuery( queryID, queryDict )
+    for fieldQueries in self.__fields.values():
+      fieldQueries.finalize()
+    self.__missingFields = [ meta for meta, fieldQueries in self.__fields.items() if fieldQueries.missingIDs ]
+
+  def __addQuery( self, queryID, queryDict ):
+    """ Compile the clauses of one query, it is only added if they are all legal
+    """
+    required = 0
+    fields = {}
+    for meta, value in queryDict.items():
+      fieldQueries = FieldQueries( self.typeDict.get( meta, '' ) )
+      fields[meta] = fieldQueries
+      if str( value ).lower() == 'missing':
+        fieldQueries.missingIDs.append( queryID )
+        # When the file has the field, its value is compared with the clause as applyQuery does
+        try:
+          fieldQueries.equalIDs[fieldQueries.convert( value )] = [ queryID ]
+        except ValueError:
+          pass
+        required += 1
+      elif str( value ).lower() == 'any':
+        fieldQueries.anyIDs.append( queryID )
+        required += 1
+      else:
+        conditions = 0
+        for operation, operand in getOperands( value ):
+          result = fieldQueries.addOperation( queryID, operation, operand )
+          if not result['OK']:
+            self.errors[queryID] = '%s: %s' % ( meta, result['Message'] )
+            return
+          conditions += result['Value']
+        # The operations can only be satisfied by a value of the right type, otherwise it is the condition
+        if not conditions:
+          fieldQueries.typedIDs.append( queryID )
+          conditions = 1
+        required += conditions
+
+    if not required:
+      self.__alwaysIDs.append( queryID )
+      return
+    self.__required[queryID] = required
+    for meta, fieldQueries in fields.items():
+      self.__fields.setdefault( meta, FieldQueries( fieldQueries.mtype ) ).update( fieldQueries )
+
+  def getMatchingQueries( self, userMetaDict ):
+    """ Get the IDs of the queries satisfied by the metadata of a file
+
+    :return: list of query IDs
+    """
+    counts = {}
+    for meta, value in userMetaDict.items():
+      fieldQueries = self.__fields.get( meta )
+      if fieldQueries and value is not None:
+        fieldQueries.countMatches( value, counts )
+    for meta in self.__missingFields:
+      if userMetaDict.get( meta ) is None:
+        for queryID in self.__fields[meta].missingIDs:
+          counts[queryID] = counts.get( queryID, 0 ) + 1
+    return self.__alwaysIDs + [ queryID for queryID, count in counts.items() if count == self.__required[queryID] ]
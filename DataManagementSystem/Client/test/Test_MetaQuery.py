@@ -0,0 +1,73 @@
+""" Unit tests for the compiled set of metadata queries
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import random
+import unittest
+
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery, MetaQuerySet
+
+__RCSID__ = "$Id$"
+
+TYPES = { 'Run' : 'INT', 'Energy' : 'FLOAT', 'Type' : 'VARCHAR(64)', 'Tag' : 'VARCHAR(32)' }
+
+QUERIES = [ ( 1, { 'Run' : 10 } ),
+            ( 2, { 'Run' : { '>' : 10, '<=' : 20 }, 'Type' : 'Raw' } ),
+            ( 3, { 'Run' : [ 5, 10, '15' ] } ),
+            ( 4, { 'Run' : { '!=' : 10 }, 'Energy' : { '>=' : 1.5 } } ),
+            ( 5, { 'Type' : { 'nin' : [ 'Raw', 'MC' ] } } ),
+            ( 6, { 'Tag' : 'Missing' } ),
+            ( 7, { 'Tag' : 'Any', 'Type' : 'MC' } ),
+            ( 8, {} ),
+            ( 9, { 'Run' : { '>=' : 10, '<' : 12 }, 'Energy' : { 'in' : [ 1.5, 2.5 ] } } ),
+            ( 10, { 'Run' : { 'like' : 3 } } ) ]
+
+class MetaQuerySetTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.querySet = MetaQuerySet( QUERIES, TYPES )
+
+  def getExpected( self, metaDict ):
+    expected = []
+    for queryID, queryDict in QUERIES:
+      result = MetaQuery( queryDict, TYPES ).applyQuery( metaDict )
+      if result['OK'] and result['Value']:
+        expected.append( queryID )
+    return sorted( expected )
+
+  def test_match( self ):
+    self.assertEqual( sorted( self.querySet.getMatchingQueries( { 'Run' : 10, 'Type' : 'Raw' } ) ),
+                      [ 1, 3, 6, 8, 10 ] )
+    self.assertEqual( sorted( self.querySet.getMatchingQueries( { 'Run' : '11', 'Type' : 'Raw', 'Energy' : 2.5 } ) ),
+                      [ 2, 4, 6, 8, 9, 10 ] )
+    self.assertEqual( sorted( self.querySet.getMatchingQueries( { 'Type' : 'MC', 'Tag' : 'v1' } ) ), [ 7, 8 ] )
+    self.assertEqual( sorted( self.querySet.getMatchingQueries( {} ) ), [ 6, 8 ] )
+    # Values of the wrong type do not match
+    self.assertEqual( sorted( self.querySet.getMatchingQueries( { 'Run' : 'ten', 'Type' : 'Other' } ) ), [ 5, 6, 8 ] )
+
+  def test_errors( self ):
+    querySet = MetaQuerySet( [ ( 1, { 'Run' : { '>' : [ 1, 2 ] } } ), ( 2, { 'Run' : 'ten' } ), ( 3, { 'Run' : 1 } ) ],
+                             TYPES )
+    self.assertEqual( sorted( querySet.errors ), [ 1, 2 ] )
+    self.assertEqual( querySet.getMatchingQueries( { 'Run' : 1 } ), [ 3 ] )
+
+  def test_applyQuery( self ):
+    randomGenerator = random.Random( 1234 )
+    for _i in range( 500 ):
+      metaDict = {}
+      if randomGenerator.random() < 0.8:
+        metaDict['Run'] = randomGenerator.choice( [ 4, 5, 10, 11, 12, 15, 20, 21, '10' ] )
+      if randomGenerator.random() < 0.8:
+        metaDict['Energy'] = randomGenerator.choice( [ 1.0, 1.5, 2.5, 3 ] )
+      if randomGenerator.random() < 0.8:
+        metaDict['Type'] = randomGenerator.choice( [ 'Raw', 'MC', 'Other' ] )
+      if randomGenerator.random() < 0.5:
+        metaDict['Tag'] = randomGenerator.choice( [ 'v1', 'Missing' ] )
+      self.assertEqual( sorted( self.querySet.getMatchingQueries( metaDict ) ), self.getExpected( metaDict ),
+                        metaDict )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( MetaQuerySetTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,118 @@
+""" In-process cache of the directory tree of the FileCatalog
+
+    Directory paths are resolved for nearly every catalog operation, while the set of
+    directories in use is small and changes rarely. The cache keeps, for the most recently
+    used directories, the path to ID and level mapping, the ID to path mapping and the IDs
+    of the parent hierarchy of each path.
+
+    Only directories that exist are cached, so creating a directory never leaves stale
+    entries, and removing one drops it from the cache. The entries expire after a lifetime
+    so that directories removed through another FileCatalog service are not seen for longer
+    than that.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+
+from DIRAC.Core.Utilities.DictCache import DictCache
+
+class DirectoryCache( object ):
+  """ Bounded cache of the directories, with least recently used eviction
+  """
+
+  def __init__( self, maxSize = 0, lifeTime = 60 ):
+    """
+    :param int maxSize: maximum number of entries, 0 disables the cache
+    :param int lifeTime: seconds an entry is valid
+    """
+    self.maxSize = maxSize
+    self.lifeTime = lifeTime
+    # Shards limit the contention between the service threads, each holds a share of maxSize
+    shards = min( 8, max( 1, maxSize / 1000 ) )
+    self.__cache = DictCache( maxSize = maxSize, shards = shards ) if maxSize > 0 else None
+
+  @staticmethod
+  def __normPath( path ):
+    return os.path.normpath( path )
+
+  def getDir( self, path ):
+    """ Get the ( ID, level ) of a directory, level may be None if it is not known
+
+    :return: tuple or None if not cached
+    """
+    if not self.__cache:
+      return None
+    return self.__cache.get( ( 'Dir', self.__normPath( path ) ) )
+
+  def addDir( self, path, dirID, level = None ):
+    """ Add a directory that exists
+    """
+    if not self.__cache or not dirID:
+      return
+    path = self.__normPath( path )
+    # Do not lose the level of an entry already there
+    if level is not None or not self.__cache.exists( ( 'Dir', path ) ):
+      self.__cache.add( ( 'Dir', path ), self.lifeTime, ( dirID, level ) )
+    self.__cache.add( ( 'Path', dirID ), self.lifeTime, path )
+
+  def getPath( self, dirID ):
+    """ Get the path of a directory given by its ID
+
+    :return: str or None if not cached
+    """
+    if not self.__cache:
+      return None
+    return self.__cache.get( ( 'Path', dirID ) )
+
+  def getPathIDs( self, path ):
+    """ Get the IDs of the parent hierarchy of a directory
+
+    :return: list or None if not cached
+    """
+    if not self.__cache:
+      return None
+    pathIDs = self.__cache.get( ( 'PathIDs', self.__normPath( path ) ) )
+    if pathIDs is None:
+      return None
+    return list( pathIDs )
+
+  def addPathIDs( self, path, pathIDs ):
+    """ Add the IDs of the parent hierarchy of a directory
+    """
+    if not self.__cache:
+      return
+    self.__cache.add( ( 'PathIDs', self.__normPath( path ) ), self.lifeTime, tuple( pathIDs ) )
+
+  def removeDir( self, path, dirID = None ):
+    """ Forget a removed directory
+    """
+    if not self.__cache:
+      return
+    path = self.__normPath( path )
+    cached = self.__cache.get( ( 'Dir', path ) )
+    if cached:
+      self.__cache.delete( ( 'Path', cached[0] ) )
+    if dirID:
+      self.__cache.delete( ( 'Path', dirID ) )
+    self.__cache.delete( ( 'Dir', path ) )
+    self.__cache.delete( ( 'PathIDs', path ) )
+
+  def clear( self ):
+    """ Forget everything, when directory IDs or paths are changed
+    """
+    if self.__cache:
+      self.__cache.purgeAll()
+
+  def getStats( self ):
+    """ Get the number of entries, hits, misses and the hit rate in percent
+    """
+    if not self.__cache:
+      return { 'DirectoryCacheSize' : 0, 'DirectoryCacheHits' : 0, 'DirectoryCacheMisses' : 0,
+               'DirectoryCacheHitRate' : 0. }
+    stats = self.__cache.getStats()
+    lookups = stats[ 'hits' ] + stats[ 'misses' ]
+    return { 'DirectoryCacheSize' : stats[ 'size' ],
+             'DirectoryCacheHits' : stats[ 'hits' ],
+             'DirectoryCacheMisses' : stats[ 'misses' ],
+             'DirectoryCacheHitRate' : 100. * stats[ 'hits' ] / lookups if lookups else 0. }
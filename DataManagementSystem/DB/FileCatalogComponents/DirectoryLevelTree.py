@@ -34,6 +34,12 @@ class DirectoryLevelTree(DirectoryTreeBase):
     """
     
     dpath = os.path.normpath( path )    
+    cached = self.dirCache.getDir( dpath )
+    if cached and cached[1] is not None:
+      res = S_OK( cached[0] )
+      res['Level'] = cached[1]
+      return res
+
     req = "SELECT DirID,Level from FC_DirectoryLevelTree WHERE DirName='%s'" % dpath
     result = self.db._query(req,connection)
     if not result['OK']:
@@ -44,19 +50,32 @@ class DirectoryLevelTree(DirectoryTreeBase):
     
     res = S_OK( result['Value'][0][0] )
     res['Level'] = result['Value'][0][1]
+    self.dirCache.addDir( dpath, res['Value'], res['Level'] )
     return res
   
   def findDirs( self, paths, connection=False ):
     """ Find DirIDs for the given path list
     """
-    dpaths = ','.join( [ "'"+os.path.normpath( path )+"'" for path in paths ] )
+    dirDict = {}
+    missingPaths = []
+    for path in paths:
+      dpath = os.path.normpath( path )
+      cached = self.dirCache.getDir( dpath )
+      if cached:
+        dirDict[dpath] = cached[0]
+      else:
+        missingPaths.append( dpath )
+    if not missingPaths:
+      return S_OK( dirDict )
+
+    dpaths = ','.join( [ "'"+dpath+"'" for dpath in missingPaths ] )
     req = "SELECT DirName,DirID from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
     result = self.db._query(req,connection)
     if not result['OK']:
       return result
-    dirDict = {}
     for dirName, dirID in result['Value']:
       dirDict[dirName] = dirID
+      self.dirCache.addDir( dirName, dirID )
 
     return S_OK( dirDict )
   
@@ -73,6 +92,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
       return res
     
     dirID = result['Value']
+    self.dirCache.removeDir( path, dirID )
     req = "DELETE FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
     result = self.db._update(req)
     result['DirID'] = dirID
@@ -182,6 +202,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
     else:
       result = self.db._query( "ROLLBACK;", conn )
       
+    self.dirCache.addDir( path, dirID, level )
     result = S_OK(dirID)
     result['NewDirectory'] = True
     return result  
@@ -231,14 +252,21 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def getDirectoryPath(self,dirID):
     """ Get directory name by directory ID
     """
-    req = "SELECT DirName FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
+    dirID = int( dirID )
+    dirPath = self.dirCache.getPath( dirID )
+    if dirPath:
+      return S_OK( dirPath )
+
+    req = "SELECT DirName FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
     result = self.db._query(req)
     if not result['OK']:
       return result
     if not result['Value']:
-      return S_ERROR('Directory with id %d not found' % int(dirID) )
+      return S_ERROR('Directory with id %d not found' % dirID )
     
-    return S_OK(result['Value'][0][0])
+    dirPath = result['Value'][0][0]
+    self.dirCache.addDir( dirPath, dirID )
+    return S_OK( dirPath )
 
   def getDirectoryPaths(self,dirIDList):
     """ Get directory name by directory ID list
@@ -250,18 +278,29 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not dirs:
       return S_OK( {} )
       
-    dirListString = ','.join( [ str( d ) for d in dirs ] )
+    resultDict = {}
+    missingDirs = []
+    for dirID in dirs:
+      dirPath = self.dirCache.getPath( int( dirID ) )
+      if dirPath:
+        resultDict[int( dirID )] = dirPath
+      else:
+        missingDirs.append( dirID )
+    if not missingDirs:
+      return S_OK( resultDict )
+
+    dirListString = ','.join( [ str( d ) for d in missingDirs ] )
 
     req = "SELECT DirID,DirName FROM FC_DirectoryLevelTree WHERE DirID in ( %s )" % dirListString
     result = self.db._query(req)
     if not result['OK']:
       return result
-    if not result['Value']:
+    if not result['Value'] and not resultDict:
       return S_ERROR('Directories not found: %s' % dirListString )
 
-    resultDict = {}
     for row in result['Value']:
       resultDict[int(row[0])] = row[1]
+      self.dirCache.addDir( row[1], int( row[0] ) )
 
     return S_OK(resultDict) 
  
@@ -280,6 +319,10 @@ class DirectoryLevelTree(DirectoryTreeBase):
         specified by its path
     """    
     
+    pathIDs = self.dirCache.getPathIDs( path )
+    if pathIDs is not None:
+      return S_OK( pathIDs )
+
     elements = path.split('/')
     pelements = []
     dPath = ''
@@ -296,7 +339,11 @@ class DirectoryLevelTree(DirectoryTreeBase):
     if not result['Value']:
       return S_ERROR('Directory %s not found' % path)
        
-    return S_OK([ x[0] for x in result['Value'] ])
+    pathIDs = [ x[0] for x in result['Value'] ]
+    # Only complete hierarchies are cached, the missing directories may be created
+    if len( pathIDs ) == len( set( pelements ) ):
+      self.dirCache.addPathIDs( path, pathIDs )
+    return S_OK( pathIDs )
   
   def getPathIDsByID_old(self,dirID):
     """ Get IDs of all the directories in the parent hierarchy for a directory
@@ -461,6 +508,8 @@ class DirectoryLevelTree(DirectoryTreeBase):
   def recoverOrphanDirectories( self, credDict ):
     """ Recover orphan directories
     """
+    # Directory IDs are changed below
+    self.dirCache.clear()
     # Find out orphan directories
     treeTable = 'FC_DirectoryLevelTree'
     req = "SELECT DirID,Parent,Level FROM %s WHERE Parent NOT IN ( SELECT DirID from %s )" % (treeTable,treeTable)
@@ -531,6 +580,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
       result = self.__rebuildLevelIndexes( parentID, connection)
       resUnlock = self.db._query("UNLOCK TABLES", connection )       
       
+    self.dirCache.clear()
     return S_OK()
 
   def _getConnection( self, connection=False ):
@@ -10,15 +10,18 @@ __RCSID__ = "$Id$"
 import os, types
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import queryTime
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.MetadataIndex import MetadataIndex, getValueConverter
 
 class DirectoryMetadata:
 
   def __init__( self, database = None ):
 
     self.db = database
+    self.metaIndex = MetadataIndex( getattr( database, 'metadataIndexLifeTime', 0 ) )
 
   def setDatabase( self, database ):
     self.db = database
+    self.metaIndex = MetadataIndex( getattr( database, 'metadataIndexLifeTime', 0 ) )
 
 ##############################################################################
 #
@@ -70,6 +73,7 @@ class DirectoryMetadata:
 
     metadataID = result['lastRowId']
     result = self.__transformMetaParameterToData( pname )
+    self.metaIndex.removeField( pname )
     if not result['OK']:
       return result
 
@@ -81,6 +85,7 @@ class DirectoryMetadata:
 
     req = "DROP TABLE FC_Meta_%s" % pname
     result = self.db._update( req )
+    self.metaIndex.removeField( pname )
     error = ''
     if not result['OK']:
       error = result["Message"]
@@ -208,6 +213,7 @@ class DirectoryMetadata:
             return result
         else:
           return result
+      self.metaIndex.setDirValue( metaName, dirID, metaValue )
 
     return S_OK()
 
@@ -234,6 +240,8 @@ class DirectoryMetadata:
         result = self.db._update( req )
         if not result['OK']:
           failedMeta[meta] = result['Value']
+        else:
+          self.metaIndex.removeDirValue( meta, dirID )
       else:
         # Meta parameter case
         req = "DELETE FROM FC_DirMeta WHERE MetaKey='%s' AND DirID=%d" % ( meta, dirID )
@@ -405,6 +413,57 @@ class DirectoryMetadata:
 #
 ############################################################################################  
 
+  def __getFieldIndex( self, meta, metaType ):
+    """ Get the index of the given meta datum, loading it if needed
+
+        :return: S_OK( FieldIndex ) or S_OK( None ) if the meta datum is not indexed
+    """
+    if not self.metaIndex.isEnabled() or not getValueConverter( metaType ):
+      return S_OK( None )
+    fieldIndex = self.metaIndex.getField( meta )
+    if fieldIndex:
+      return S_OK( fieldIndex )
+    req = "SELECT DirID,Value FROM FC_Meta_%s" % meta
+    result = self.db._query( req )
+    if not result['OK']:
+      return result
+    return S_OK( self.metaIndex.loadField( meta, metaType, result['Value'] ) )
+
+  def __findIndexedDirs( self, meta, value, metaType, defining = False ):
+    """ Find with the index the directories having the given meta datum, defined by
+        themselves or by a parent directory, or only those defining it
+
+        :return: S_OK( set of directory IDs ) or S_OK( None ) if the query can not
+                 be served by the index
+    """
+    result = self.__getFieldIndex( meta, metaType )
+    if not result['OK'] or not result['Value']:
+      return result
+    fieldIndex = result['Value']
+    try:
+      keys = fieldIndex.selectValues( value )
+    except ( ValueError, TypeError ):
+      # Left to MySQL to convert or reject
+      return S_OK( None )
+    if defining:
+      dirIDs = set()
+      for key in keys:
+        dirIDs.update( fieldIndex.definingDirs.get( key, [] ) )
+      return S_OK( dirIDs )
+    return self.metaIndex.getInheritingDirs( meta, fieldIndex, keys, self.db.dtree.getAllSubdirectoriesByID )
+
+  def indexNewDirectory( self, path, dirID ):
+    """ Let a new directory inherit the indexed metadata of its parent
+    """
+    if not self.metaIndex.isEnabled() or path == '/':
+      return S_OK()
+    result = self.db.dtree.findDir( os.path.dirname( path ) )
+    if not result['OK']:
+      return result
+    if result['Value']:
+      self.metaIndex.addDirectory( dirID, int( result['Value'] ) )
+    return S_OK()
+
   def __createMetaSelection( self, meta, value, table = '' ):
 
     if type( value ) == types.DictType:
@@ -585,9 +644,27 @@ class DirectoryMetadata:
       return result
     metaDict = result['Value']
 
+    result = self.getMetadataFields( credDict )
+    if not result['OK']:
+      return result
+    metaTypeDict = result['Value']
+
     # Now check the meta data for the requested directory and its parents
     finalMetaDict = dict( metaDict )
+    indexedDirs = {}
     for meta in metaDict.keys():
+      if metaDict[meta] != "Missing":
+        result = self.__findIndexedDirs( meta, metaDict[meta], metaTypeDict[meta] )
+        if not result['OK']:
+          return result
+        if result['Value'] is not None:
+          # The directories found inherit the meta datum, the path is one of them
+          # if it is defined for the path or its parents
+          if pathDirID in result['Value']:
+            del finalMetaDict[meta]
+          else:
+            indexedDirs[meta] = result['Value']
+          continue
       result = self.__checkDirsForMetadata( meta, metaDict[meta], pathString )
       if not result['OK']:
         return result
@@ -598,30 +675,36 @@ class DirectoryMetadata:
 
     if finalMetaDict:
       pathSelection = ''
-      if pathDirID:
+      if pathDirID and len( indexedDirs ) < len( finalMetaDict ):
         result = self.db.dtree.getSubdirectoriesByID( pathDirID, includeParent = True, requestString = True )
         if not result['OK']:
           return result
         pathSelection = result['Value']
+      if pathDirID and indexedDirs:
+        # The directories found with the index are constrained to the path below
+        result = self.db.dtree.getSubdirectoriesByID( pathDirID, includeParent = True )
+        if not result['OK']:
+          return result
+        pathDirList = result['Value'].keys()
       dirList = []
       first = True
-      for meta, value in finalMetaDict.items():
-        if value == "Missing":
+      # Start with the smallest sets to keep the intersections cheap
+      for meta in sorted( finalMetaDict, key = lambda meta: len( indexedDirs.get( meta, [] ) ) ):
+        value = finalMetaDict[meta]
+        if meta in indexedDirs:
+          result = S_OK( indexedDirs[meta] )
+        elif value == "Missing":
           result = self.__findSubdirMissingMeta( meta, pathSelection )
         else:
           result = self.__findSubdirByMeta( meta, value, pathSelection )
         if not result['OK']:
           return result
-        mList = result['Value']
+        mSet = set( result['Value'] )
         if first:
-          dirList = mList
+          dirList = list( mSet )
           first = False
         else:
-          newList = []
-          for d in dirList:
-            if d in mList:
-              newList.append( d )
-          dirList = newList
+          dirList = [ d for d in dirList if d in mSet ]
     else:
       if pathDirID:
         result = self.db.dtree.getSubdirectoriesByID( pathDirID, includeParent = True )
@@ -711,7 +794,7 @@ class DirectoryMetadata:
 # metadata selectors 
 #
 ################################################################################################  
-  def __findCompatibleDirectories( self, meta, value, fromDirs ):
+  def __findCompatibleDirectories( self, meta, value, fromDirs, metaType ):
     """ Find directories compatible with the given meta datum.
         Optionally limit the list of compatible directories to only those in the
         fromDirs list 
@@ -723,17 +806,29 @@ class DirectoryMetadata:
     # - all the directories in the parent hierarchy of the above directory
 
     # Find directories defining the meta datum and their subdirectories
-    result = self.__findSubdirByMeta( meta, value, subdirFlag = False )
+    result = self.__findIndexedDirs( meta, value, metaType, defining = True )
     if not result['OK']:
       return result
-    selectedDirs = result['Value']
-    if not selectedDirs:
-      return S_OK( [] )
+    if result['Value'] is not None:
+      selectedDirs = list( result['Value'] )
+      if not selectedDirs:
+        return S_OK( [] )
+      result = self.__findIndexedDirs( meta, value, metaType )
+      if not result['OK']:
+        return result
+      subDirs = list( result['Value'] )
+    else:
+      result = self.__findSubdirByMeta( meta, value, subdirFlag = False )
+      if not result['OK']:
+        return result
+      selectedDirs = result['Value']
+      if not selectedDirs:
+        return S_OK( [] )
 
-    result = self.db.dtree.getAllSubdirectoriesByID( selectedDirs )
-    if not result['OK']:
-      return result
-    subDirs = result['Value']
+      result = self.db.dtree.getAllSubdirectoriesByID( selectedDirs )
+      if not result['OK']:
+        return result
+      subDirs = result['Value']
 
     # Find parent directories of the directories defining the meta datum
     parentDirs = []
@@ -750,7 +845,7 @@ class DirectoryMetadata:
 
     return S_OK( resDirs )
 
-  def __findDistinctMetadata( self, metaList, dList ):
+  def __findDistinctMetadata( self, metaList, dList, metaTypeDict ):
     """ Find distinct metadata values defined for the list of the input directories.
         Limit the search for only metadata in the input list
     """
@@ -761,6 +856,14 @@ class DirectoryMetadata:
       dString = None
     metaDict = {}
     for meta in metaList:
+      result = self.__getFieldIndex( meta, metaTypeDict[meta] )
+      if not result['OK']:
+        return result
+      if result['Value']:
+        values = result['Value'].getStoredValues( dList if dList else None )
+        if values:
+          metaDict[meta] = values
+        continue
       req = "SELECT DISTINCT(Value) FROM FC_Meta_%s" % meta
       if dString:
         req += " WHERE DirID in (%s)" % dString
@@ -821,7 +924,7 @@ class DirectoryMetadata:
     if metaDict:
       anyMeta = False
       for meta, value in metaDict.items():
-        result = self.__findCompatibleDirectories( meta, value, fromList )
+        result = self.__findCompatibleDirectories( meta, value, fromList, metaFields[meta] )
         if not result['OK']:
           return result
         cdirList = result['Value']
@@ -832,7 +935,7 @@ class DirectoryMetadata:
           break
 
     if anyMeta or fromList:
-      result = self.__findDistinctMetadata( comFields, fromList )
+      result = self.__findDistinctMetadata( comFields, fromList, metaFields )
     else:
       result = S_OK( {} )
     return result
@@ -855,6 +958,7 @@ class DirectoryMetadata:
       return result
     metaFields = result['Value']
 
+    self.metaIndex.removeDirectories( dirs )
     for meta in metaFields:
       req = "DELETE FROM FC_Meta_%s WHERE DirID in ( %s )" % ( meta, dirListString )
       result = self.db._query( req )
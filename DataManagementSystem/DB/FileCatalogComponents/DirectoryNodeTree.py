@@ -23,6 +23,10 @@ class DirectoryNodeTree( DirectoryTreeBase ):
   def findDir( self, path ):
     """ Find the identifier of a directory specified by its path
     """
+    cached = self.dirCache.getDir( path )
+    if cached:
+      return S_OK( cached[0] )
+
     dpath = path
     if path[0] == "/":
       dpath = path[1:]
@@ -43,6 +47,7 @@ class DirectoryNodeTree( DirectoryTreeBase ):
     if not result['Value']:
       return S_OK( 0 )
 
+    self.dirCache.addDir( path, result['Value'][0][0], len( elements ) )
     return S_OK( result['Value'][0][0] )
 
   def makeDir( self, path ):
@@ -72,6 +77,7 @@ class DirectoryNodeTree( DirectoryTreeBase ):
     result = self.db._insert( 'FC_DirectoryTreeM', names, values )
     if not result['OK']:
       return result
+    self.dirCache.addDir( path, result['lastRowId'], level )
     return S_OK( result['lastRowId'] )
 
   def existsDir( self, path ):
@@ -6,6 +6,7 @@
 __RCSID__ = "$Id$"
 
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities  import getIDSelectString
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryCache import DirectoryCache
 from DIRAC                                                          import S_OK, S_ERROR, gLogger
 import time, threading, os
 from types import StringTypes, ListType
@@ -20,6 +21,9 @@ class DirectoryTreeBase:
     self.db = database
     self.lock = threading.Lock()
     self.treeTable = ''
+    # Directories recently used, the database gives the size and lifetime of the cache
+    self.dirCache = DirectoryCache( getattr( database, 'directoryCacheSize', 0 ),
+                                    getattr( database, 'directoryCacheLifeTime', 60 ) )
 
 ############################################################################
 #
@@ -77,6 +81,20 @@ class DirectoryTreeBase:
     """ Get the string of the Directory Tree type
     """
     return self.treeTable
+
+  def _indexNewDirectory( self, path, dirID ):
+    """ Let a new directory inherit the indexed metadata of its parent
+    """
+    dmeta = getattr( self.db, 'dmeta', None )
+    if dmeta and hasattr( dmeta, 'indexNewDirectory' ):
+      result = dmeta.indexNewDirectory( path, dirID )
+      if not result['OK']:
+        gLogger.warn( "Failed to index the metadata of directory %s" % path, result['Message'] )
+
+  def getDirectoryCacheStats( self ):
+    """ Get the size, hits, misses and hit rate of the directory cache
+    """
+    return S_OK( self.dirCache.getStats() )
     
   def setDatabase(self,database):
     self.db = database  
@@ -120,6 +138,7 @@ class DirectoryTreeBase:
     if not dirDict:
       self.removeDir( path )
       return S_ERROR( 'Failed to create directory %s' % path )
+    self._indexNewDirectory( path, dirID )
     return S_OK( dirID )
 
 #####################################################################
@@ -640,9 +659,22 @@ class DirectoryTreeBase:
     if not result['OK']:
       return result
     directoryID = result['Value']
+    result = self.__getSubdirectoriesAndDatasets( path, directoryID, details )
+    if not result['OK']:
+      return result
+    directories, datasets = result['Value']
+    result = self.db.fileManager.getFilesInDirectory( directoryID, verbose = details )
+    if not result['OK']:
+      return result
+    files = result['Value']
+    pathDict = {'Files': files, 'SubDirs':directories, 'Links':{}, 'Datasets':datasets }
+
+    return S_OK( pathDict )
+
+  def __getSubdirectoriesAndDatasets( self, path, directoryID, details ):
+    """ Get the subdirectories and datasets of a directory for its listing
+    """
     directories = {}
-    files = {}
-    links = {}
     result = self.getChildren( path )
     if not result['OK']:
       return result
@@ -662,17 +694,10 @@ class DirectoryTreeBase:
           directories[dirName] = result['Value']
       else:
         directories[dirName] = True
-    result = self.db.fileManager.getFilesInDirectory( directoryID, verbose = details )
-    if not result['OK']:
-      return result
-    files = result['Value']
     result = self.db.datasetManager.getDatasetsInDirectory( directoryID, verbose = details )
     if not result['OK']:
       return result
-    datasets = result['Value']
-    pathDict = {'Files': files, 'SubDirs':directories, 'Links':links, 'Datasets':datasets }
-
-    return S_OK( pathDict )
+    return S_OK( ( directories, result['Value'] ) )
 
   def listDirectory( self, lfns, verbose = False ):
     """ Get the directory listing
@@ -688,7 +713,64 @@ class DirectoryTreeBase:
         successful[path] = result['Value']
 
     return S_OK( {'Successful':successful, 'Failed':failed} )
-  
+
+  def listDirectoryPaged( self, path, afterFileID = 0, limit = 1000, verbose = False ):
+    """ Get a page of the directory listing. The files come in the order of their FileID, the
+        subdirectories and datasets with the first page only
+
+        :param str path: directory path
+        :param int afterFileID: LastFileID of the previous page, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param bool verbose: whether the details of the entries are returned
+
+        :return: S_OK( { 'Files', 'SubDirs', 'Links', 'Datasets', 'LastFileID' } ), LastFileID
+                 is 0 on the last page
+    """
+    result = self.findDir( path )
+    if not result['OK']:
+      return result
+    directoryID = result['Value']
+    if not directoryID:
+      return S_ERROR( 'Directory %s not found' % path )
+    directories = {}
+    datasets = {}
+    if not afterFileID:
+      result = self.__getSubdirectoriesAndDatasets( path, directoryID, verbose )
+      if not result['OK']:
+        return result
+      directories, datasets = result['Value']
+    result = self.db.fileManager.getFilesInDirectoryPage( directoryID, afterFileID, limit, verbose = verbose )
+    if not result['OK']:
+      return result
+    files, lastFileID = result['Value']
+    return S_OK( { 'Files' : files, 'SubDirs' : directories, 'Links' : {}, 'Datasets' : datasets,
+                   'LastFileID' : lastFileID } )
+
+  def getDirectoryReplicasPaged( self, path, afterFileID = 0, limit = 1000, allStatus = False ):
+    """ Get a page of the replicas of the files in a directory, in the order of their FileID
+
+        :return: S_OK( { 'Files' : { fileName : { se : pfn } }, 'LastFileID' } ), LastFileID
+                 is 0 on the last page
+    """
+    result = self.findDir( path )
+    if not result['OK']:
+      return result
+    directoryID = result['Value']
+    if not directoryID:
+      return S_ERROR( 'Directory %s not found' % path )
+    result = self.db.fileManager.getDirectoryReplicasPage( directoryID, afterFileID, limit, allStatus = allStatus )
+    if not result['OK']:
+      return result
+    files, lastFileID = result['Value']
+    result = S_OK( { 'Files' : files, 'LastFileID' : lastFileID } )
+    if self.db.lfnPfnConvention:
+      sePrefixDict = {}
+      resSE = self.db.seManager.getSEPrefixes()
+      if resSE['OK']:
+        sePrefixDict = resSE['Value']
+      result['Value']['SEPrefixes'] = sePrefixDict
+    return result
+
   def getDirectoryReplicas( self, lfns, allStatus = False ):
     """ Get replicas for files in the given directories
     """
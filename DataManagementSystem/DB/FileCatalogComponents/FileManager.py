@@ -413,6 +413,7 @@ class FileManager( FileManagerBase ):
     successful = {}
     insertTuples = []
     fileIDLFNs = {}
+    seIDs = {}
     res = self._getStatusInt('AprioriGood')
     statusID = 0
     if res['OK']:
@@ -428,7 +429,10 @@ class FileManager( FileManagerBase ):
       else:
         return S_ERROR('Illegal type of SE list: %s' % str( type( seName ) ) )
       for seName in seList:
-        res = self.db.seManager.findSE(seName)
+        # Bulk registrations use few SEs, look each of them up once
+        if seName not in seIDs:
+          seIDs[seName] = self.db.seManager.findSE(seName)
+        res = seIDs[seName]
         if not res['OK']:
           failed[lfn] = res['Message']
           lfns.pop( lfn )
@@ -14,6 +14,9 @@ from DIRAC.Core.Utilities.Pfn               import pfnparse, pfnunparse
 import os
 import stat
 
+# Maximum number of FC_DirectoryUsage rows updated by one statement
+USAGE_CHUNK_SIZE = 1000
+
 class FileManagerBase( object ):
 
   def __init__( self, database = None ):
@@ -274,8 +277,17 @@ class FileManagerBase( object ):
     if masterLfns:
       # Create the directories for the supplied files and store their IDs
       directories = self._getFileDirectories( masterLfns.keys() )
+      # Resolve all the existing directories at once, only the missing ones are created
+      existingDirs = {}
+      res = self.db.dtree.findDirs( directories.keys(), connection = connection )
+      if res['OK']:
+        existingDirs = res['Value']
       for directory, fileNames in directories.items():
-        res = self.db.dtree.makeDirectories( directory, credDict )
+        dirID = existingDirs.get( os.path.normpath( directory ) )
+        if dirID:
+          res = S_OK( dirID )
+        else:
+          res = self.db.dtree.makeDirectories( directory, credDict )
         if not res['OK']:
           for fileName in fileNames:
             lfn = os.path.join( directory, fileName )
@@ -379,30 +391,40 @@ class FileManagerBase( object ):
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
   def _updateDirectoryUsage( self, directorySEDict, change, connection = False ):
+    """ Apply the size and number of files changes of the given directories and SEs to them
+        and all their parents. The changes are summed up per directory and SE first, so that
+        each FC_DirectoryUsage row is touched once whatever the number of files
+
+        :param dict directorySEDict: { dirID : { seID : { 'Files' : n, 'Size' : size } } }
+        :param str change: '+' or '-'
+    """
     connection = self._getConnection( connection )
-    for directoryID in directorySEDict.keys():
+    usageDict = {}
+    for directoryID, dirDict in directorySEDict.items():
       result = self.db.dtree.getPathIDsByID( directoryID )
       if not result['OK']:
         return result
-      parentIDs = result['Value']
-      dirDict = directorySEDict[directoryID]
-      for seID in dirDict.keys() :
-        seDict = dirDict[seID]
-        files = seDict['Files']
-        size = seDict['Size']
-        insertTuples = []
-        for dirID in parentIDs:
-          insertTuples.append( '(%d,%d,%d,%d,UTC_TIMESTAMP())' % ( dirID, seID, size, files ) )
-    
-        req = "INSERT INTO FC_DirectoryUsage (DirID,SEID,SESize,SEFiles,LastUpdate) "
-        req += "VALUES %s" % ','.join( insertTuples )
-        req += " ON DUPLICATE KEY UPDATE SESize=SESize%s%d, SEFiles=SEFiles%s%d, LastUpdate=UTC_TIMESTAMP() " \
-                                                           % ( change, size, change, files )
-        res = self.db._update( req )
-        if not res['OK']:
-          gLogger.warn( "Failed to update FC_DirectoryUsage", res['Message'] )
+      for dirID in result['Value']:
+        for seID, seDict in dirDict.items():
+          usage = usageDict.setdefault( ( dirID, seID ), [0, 0] )
+          usage[0] += seDict['Size']
+          usage[1] += seDict['Files']
+    if not usageDict:
+      return S_OK()
+
+    insertTuples = [ '(%d,%d,%d,%d,UTC_TIMESTAMP())' % ( dirID, seID, size, files )
+                     for ( dirID, seID ), ( size, files ) in sorted( usageDict.items() ) ]
+    # The rows are sorted so that concurrent updates lock them in the same order
+    for start in xrange( 0, len( insertTuples ), USAGE_CHUNK_SIZE ):
+      req = "INSERT INTO FC_DirectoryUsage (DirID,SEID,SESize,SEFiles,LastUpdate) "
+      req += "VALUES %s" % ','.join( insertTuples[start:start + USAGE_CHUNK_SIZE] )
+      req += " ON DUPLICATE KEY UPDATE SESize=SESize%sVALUES(SESize), SEFiles=SEFiles%sVALUES(SEFiles), " \
+             "LastUpdate=UTC_TIMESTAMP() " % ( change, change )
+      res = self.db._update( req, connection )
+      if not res['OK']:
+        gLogger.warn( "Failed to update FC_DirectoryUsage", res['Message'] )
     return S_OK()
-    
+
   def _populateFileAncestors( self, lfns, connection = False ):
     connection = self._getConnection( connection )
     successful = {}
@@ -1128,13 +1150,42 @@ class FileManagerBase( object ):
 
   def getFilesInDirectory( self, dirID, verbose = False, connection = False ):
     connection = self._getConnection( connection )
+    return self.__getFilesInDirectory( dirID, [], verbose, connection )
+
+  def getFilesInDirectoryPage( self, dirID, afterFileID = 0, limit = 1000, verbose = False, connection = False ):
+    """ Get the files of a directory by pages, in the order of their FileID
+
+        :param int dirID: ID of the directory
+        :param int afterFileID: FileID of the last file of the previous page, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param bool verbose: whether the replicas are returned too
+
+        :return: S_OK( ( files, lastFileID ) ), lastFileID is 0 when there are no more files
+    """
+    connection = self._getConnection( connection )
+    res = self._getDirectoryFilesPage( dirID, afterFileID, limit, connection = connection )
+    if not res['OK']:
+      return res
+    fileIDNames = res['Value']
+    if not fileIDNames:
+      return S_OK( ( {}, 0 ) )
+    lastFileID = fileIDNames[-1][0] if len( fileIDNames ) == limit else 0
+    res = self.__getFilesInDirectory( dirID, [ fileName for _fileID, fileName in fileIDNames ], verbose, connection )
+    if not res['OK']:
+      return res
+    return S_OK( ( res['Value'], lastFileID ) )
+
+  def __getFilesInDirectory( self, dirID, fileNames, verbose, connection ):
+    """ Get the metadata, and the replicas if verbose, of the given files of a directory,
+        all its files if fileNames is empty
+    """
     files = {}
-    res = self._getDirectoryFiles( dirID, [], ['FileID', 'Size', 'GUID',
-                                               'Checksum', 'ChecksumType',
-                                               'Type', 'UID',
-                                               'GID', 'CreationDate',
-                                               'ModificationDate', 'Mode',
-                                               'Status'], connection = connection )
+    res = self._getDirectoryFiles( dirID, fileNames, ['FileID', 'Size', 'GUID',
+                                                      'Checksum', 'ChecksumType',
+                                                      'Type', 'UID',
+                                                      'GID', 'CreationDate',
+                                                      'ModificationDate', 'Mode',
+                                                      'Status'], connection = connection )
     if not res['OK']:
       return res
     if not res['Value']:
@@ -1183,6 +1234,60 @@ class FileManagerBase( object ):
 
     return S_OK( resultDict )
 
+  def getDirectoryReplicasPage( self, dirID, afterFileID = 0, limit = 1000, allStatus = False, connection = False ):
+    """ Get the replicas of the Files in the given Directory by pages, in the order of their FileID
+
+        :param int dirID: ID of the directory
+        :param int afterFileID: FileID of the last file of the previous page, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param bool allStatus: whether all replicas and file status are considered
+
+        :return: S_OK( ( { fileName : { se : pfn } }, lastFileID ) ), lastFileID is 0 when there are no more files
+    """
+    connection = self._getConnection( connection )
+    res = self._getDirectoryFilesPage( dirID, afterFileID, limit, allStatus = allStatus, connection = connection )
+    if not res['OK']:
+      return res
+    fileIDNames = res['Value']
+    if not fileIDNames:
+      return S_OK( ( {}, 0 ) )
+    lastFileID = fileIDNames[-1][0] if len( fileIDNames ) == limit else 0
+    res = self._getFileReplicas( [ fileID for fileID, _fileName in fileIDNames ], ['PFN'],
+                                 allStatus = allStatus, connection = connection )
+    if not res['OK']:
+      return res
+    replicas = res['Value']
+    resultDict = {}
+    for fileID, fileName in fileIDNames:
+      seDict = replicas.get( fileID )
+      if seDict:
+        resultDict[fileName] = dict( ( se, repDict.get( 'PFN', '' ) ) for se, repDict in seDict.items() )
+
+    return S_OK( ( resultDict, lastFileID ) )
+
+  def _getDirectoryFilesPage( self, dirID, afterFileID, limit, allStatus = False, connection = False ):
+    """ Get the next files of a directory in the order of their FileID. All the file managers
+        keep the files in the FC_Files table, whose primary key is FileID, so that a page is an index
+        range scan whatever the size of the directory
+
+        :return: S_OK( [ ( FileID, FileName ) ] )
+    """
+    connection = self._getConnection( connection )
+    req = "SELECT FileID,FileName FROM FC_Files WHERE DirID=%d AND FileID>%d" % ( dirID, afterFileID )
+    if not allStatus:
+      statusIDs = []
+      for status in self.db.visibleFileStatus:
+        res = self._getStatusInt( status, connection = connection )
+        if res['OK']:
+          statusIDs.append( res['Value'] )
+      if statusIDs:
+        req += " AND Status IN (%s)" % intListToString( statusIDs )
+    req += " ORDER BY FileID LIMIT %d" % limit
+    res = self.db._query( req, connection )
+    if not res['OK']:
+      return res
+    return S_OK( list( res['Value'] ) )
+
   def _getFileDirectories( self, lfns ):
     """ For a list of lfn, returns a dictionary with key the directory, and value
         the files in that directory. It does not make any query, just splits the names
@@ -327,7 +327,7 @@ class FileManagerFlat( FileManagerBase ):
   # _getFileReplicas related methods
   #
 
-  def _getFileReplicas( self, fileIDs, fields = ['PFN'], connection = False ):
+  def _getFileReplicas( self, fileIDs, fields = ['PFN'], allStatus = False, connection = False ):
     connection = self._getConnection( connection )
     if not fileIDs:
       return S_ERROR( "No such file or directory" )
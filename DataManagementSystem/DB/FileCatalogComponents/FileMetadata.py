@@ -8,6 +8,7 @@
 
 __RCSID__ = "$Id$"
 
+import os
 from types import IntType, ListType, LongType, DictType, StringTypes, FloatType
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import queryTime
@@ -274,6 +275,39 @@ class FileMetadata:
     result['MetadataType'] = metaTypeDict
     return result
 
+  def getFileUserMetadataBulk( self, lfns, credDict ):
+    """ Get metadata for the given files, including the metadata of their directories
+    """
+    result = self.db.fileManager._findFiles( lfns, ['FileID'] )
+    if not result['OK']:
+      return result
+    failed = dict( result['Value']['Failed'] )
+    fileIDs = dict( ( lfn, fileDict['FileID'] ) for lfn, fileDict in result['Value']['Successful'].items() )
+    if not fileIDs:
+      return S_OK( { 'Successful' : {}, 'Failed' : failed } )
+
+    result = self._getFileUserMetadataByID( fileIDs.values(), credDict )
+    if not result['OK']:
+      return result
+    fileMetaDict = result['Value']
+
+    # The files of a bulk usually share a few directories
+    dirResults = {}
+    successful = {}
+    for lfn, fileID in fileIDs.items():
+      directory = os.path.dirname( lfn )
+      if directory not in dirResults:
+        dirResults[directory] = self.db.dmeta.getDirectoryMetadata( directory, credDict )
+      result = dirResults[directory]
+      if not result['OK']:
+        failed[lfn] = result['Message']
+        continue
+      metaDict = dict( fileMetaDict.get( fileID, {} ) )
+      metaDict.update( result['Value'] )
+      successful[lfn] = metaDict
+
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
   def __getFileMetaParameters( self, fileID, credDict ):
 
     req = "SELECT FileID,MetaKey,MetaValue from FC_FileMeta where FileID=%d " % fileID
@@ -0,0 +1,291 @@
+""" In-process inverted index of the directory metadata of the FileCatalog
+
+    For each indexed metadata field, the index maps every value to the sorted IDs of the
+    directories defining it and, once a query needed them, to the sorted IDs of all the
+    directories having that value, that is the defining directories and all their
+    subdirectories. Metadata queries are then answered with lookups, range scans over the
+    sorted values and set operations instead of one subtree expansion in SQL per query.
+
+    The index is kept up to date with the changes done through this service, and each field
+    is reloaded after a lifetime so that the changes done through another FileCatalog
+    service are not missed for longer than that.
+
+    Only the INT, FLOAT and VARCHAR fields are indexed. String values are compared ignoring
+    the case and the trailing spaces, as MySQL does.
+"""
+
+__RCSID__ = "$Id$"
+
+import bisect
+import threading
+import time
+from array import array
+
+from DIRAC import S_OK
+
+# Comparison operators served with range scans over the sorted values
+RANGE_OPERATORS = [ '>', '<', '>=', '<=' ]
+# Maximum number of values whose directories are materialized by one query
+MAX_EXPANSIONS = 20
+
+def getValueConverter( metaType ):
+  """ Get the function normalizing the values of a metadata type, None if it is not indexed
+  """
+  metaType = metaType.lower()
+  if metaType[:3] == 'int':
+    return int
+  if metaType == 'float':
+    return float
+  if metaType == 'string' or metaType.startswith( 'varchar' ):
+    return lambda value: str( value ).lower().rstrip( ' ' )
+  return None
+
+def sortedIDs( dirIDs ):
+  """ Compact sorted array of directory IDs
+  """
+  return array( 'l', sorted( set( dirIDs ) ) )
+
+def containsID( dirIDs, dirID ):
+  """ Check whether a sorted array contains a directory ID
+  """
+  position = bisect.bisect_left( dirIDs, dirID )
+  return position < len( dirIDs ) and dirIDs[position] == dirID
+
+class FieldIndex( object ):
+  """ Index of the values of one metadata field
+  """
+
+  def __init__( self, metaType, rows ):
+    """
+    :param str metaType: type of the field
+    :param rows: ( DirID, Value ) of the directories defining the field
+    """
+    self.convert = getValueConverter( metaType )
+    self.loadTime = time.time()
+    valueDirs = {}
+    self.dirValues = {}
+    # One of the values as stored for each normalized value
+    self.storedValues = {}
+    for dirID, value in rows:
+      if value is None:
+        continue
+      key = self.convert( value )
+      valueDirs.setdefault( key, [] ).append( dirID )
+      self.dirValues[dirID] = key
+      self.storedValues.setdefault( key, value )
+    self.definingDirs = dict( ( key, sortedIDs( dirIDs ) ) for key, dirIDs in valueDirs.items() )
+    self.values = sorted( self.definingDirs )
+    # Defining directories and their subdirectories, filled in when queried
+    self.inheritingDirs = {}
+
+  def selectValues( self, value ):
+    """ Get the values of the field matching a query clause
+
+    :return: list of values
+    :raise ValueError: if an operand cannot be compared with the values of the field
+    """
+    if isinstance( value, dict ):
+      selected = set( self.values )
+      for operation, operand in value.items():
+        if operation in RANGE_OPERATORS:
+          if isinstance( operand, list ):
+            raise ValueError( 'List of values for comparison operation' )
+          selected &= set( self.__scanRange( operation, self.convert( operand ) ) )
+        elif operation in [ 'in', '=' ]:
+          selected &= set( self.__convertList( operand ) )
+        elif operation in [ 'nin', '!=' ]:
+          selected -= set( self.__convertList( operand ) )
+        else:
+          raise ValueError( 'Unknown operation %s' % operation )
+      return sorted( selected )
+    if isinstance( value, list ):
+      return [ key for key in set( self.__convertList( value ) ) if key in self.definingDirs ]
+    if value == 'Any':
+      return list( self.values )
+    key = self.convert( value )
+    return [ key ] if key in self.definingDirs else []
+
+  def getStoredValues( self, dirIDs = None ):
+    """ Get the distinct values defined for the given directories, or for all of them
+    """
+    if dirIDs is None:
+      keys = self.values
+    else:
+      keys = set( self.dirValues[dirID] for dirID in dirIDs if dirID in self.dirValues )
+    return [ self.storedValues[key] for key in keys ]
+
+  def __convertList( self, operand ):
+    if not isinstance( operand, list ):
+      operand = [ operand ]
+    return [ self.convert( item ) for item in operand ]
+
+  def __scanRange( self, operation, operand ):
+    """ Values satisfying a comparison, using the order of the values
+    """
+    if operation == '>':
+      return self.values[bisect.bisect_right( self.values, operand ):]
+    if operation == '>=':
+      return self.values[bisect.bisect_left( self.values, operand ):]
+    if operation == '<':
+      return self.values[:bisect.bisect_left( self.values, operand )]
+    return self.values[:bisect.bisect_right( self.values, operand )]
+
+  def setDirValue( self, dirID, value ):
+    """ Record the value defined for a directory
+    """
+    self.removeDir( dirID )
+    key = self.convert( value )
+    dirIDs = self.definingDirs.get( key, array( 'l' ) )
+    bisect.insort( dirIDs, dirID )
+    if key not in self.definingDirs:
+      self.definingDirs[key] = dirIDs
+      bisect.insort( self.values, key )
+    self.dirValues[dirID] = key
+    self.storedValues.setdefault( key, value )
+    # The subdirectories of the directory are only known to the database
+    self.inheritingDirs.pop( key, None )
+
+  def removeDir( self, dirID ):
+    """ Forget the value defined for a directory
+    """
+    key = self.dirValues.pop( dirID, None )
+    if key is None:
+      return
+    dirIDs = self.definingDirs[key]
+    dirIDs.pop( bisect.bisect_left( dirIDs, dirID ) )
+    if not dirIDs:
+      del self.definingDirs[key]
+      del self.storedValues[key]
+      self.values.remove( key )
+    self.inheritingDirs.pop( key, None )
+
+class MetadataIndex( object ):
+  """ Indexes of all the metadata fields, shared by the service threads
+  """
+
+  def __init__( self, lifeTime = 0 ):
+    """
+    :param int lifeTime: seconds after which a field is reloaded, 0 disables the index
+    """
+    self.lifeTime = lifeTime
+    self.__fields = {}
+    self.__lock = threading.Lock()
+
+  def isEnabled( self ):
+    return self.lifeTime > 0
+
+  def getField( self, meta ):
+    """ Get the index of a field if it is still valid
+
+    :return: FieldIndex or None
+    """
+    fieldIndex = self.__fields.get( meta )
+    if fieldIndex and time.time() - fieldIndex.loadTime < self.lifeTime:
+      return fieldIndex
+    return None
+
+  def loadField( self, meta, metaType, rows ):
+    """ Index a field from the ( DirID, Value ) of the directories defining it
+
+    :return: FieldIndex or None if the type of the field is not indexed
+    """
+    if not self.isEnabled() or not getValueConverter( metaType ):
+      return None
+    fieldIndex = FieldIndex( metaType, rows )
+    with self.__lock:
+      self.__fields[meta] = fieldIndex
+    return fieldIndex
+
+  def getInheritingDirs( self, meta, fieldIndex, keys, subdirFunction ):
+    """ Get the directories having one of the given values of a field, defined by themselves
+        or by a parent
+
+    :param list keys: values as returned by FieldIndex.selectValues
+    :param subdirFunction: function returning S_OK( list of all subdirectory IDs ) for a list
+                           of directory IDs
+    :return: S_OK( set of IDs )
+    """
+    dirIDs = set()
+    missingKeys = []
+    for key in keys:
+      inheriting = fieldIndex.inheritingDirs.get( key )
+      if inheriting is None:
+        missingKeys.append( key )
+      else:
+        dirIDs.update( inheriting )
+
+    # Each query materializes a bounded number of values, the others are expanded together
+    for key in missingKeys[:MAX_EXPANSIONS]:
+      definingDirs = list( fieldIndex.definingDirs.get( key, [] ) )
+      subdirs = []
+      if definingDirs:
+        result = subdirFunction( definingDirs )
+        if not result['OK']:
+          return result
+        subdirs = list( result['Value'] )
+      inheriting = sortedIDs( definingDirs + subdirs )
+      with self.__lock:
+        # Only keep it if the field was not changed meanwhile
+        if self.__fields.get( meta ) is fieldIndex and \
+           list( fieldIndex.definingDirs.get( key, [] ) ) == definingDirs:
+          fieldIndex.inheritingDirs[key] = inheriting
+      dirIDs.update( inheriting )
+    definingDirs = []
+    for key in missingKeys[MAX_EXPANSIONS:]:
+      definingDirs += list( fieldIndex.definingDirs.get( key, [] ) )
+    if definingDirs:
+      result = subdirFunction( definingDirs )
+      if not result['OK']:
+        return result
+      dirIDs.update( definingDirs )
+      dirIDs.update( result['Value'] )
+    return S_OK( dirIDs )
+
+  def setDirValue( self, meta, dirID, value ):
+    """ Record a value set for a directory
+    """
+    with self.__lock:
+      fieldIndex = self.__fields.get( meta )
+      if fieldIndex:
+        try:
+          fieldIndex.setDirValue( dirID, value )
+        except ( ValueError, TypeError ):
+          # Stored as converted by MySQL, reload it
+          self.__fields.pop( meta )
+
+  def removeDirValue( self, meta, dirID ):
+    """ Record a value removed from a directory
+    """
+    with self.__lock:
+      fieldIndex = self.__fields.get( meta )
+      if fieldIndex:
+        fieldIndex.removeDir( dirID )
+
+  def addDirectory( self, dirID, parentID ):
+    """ Record a new directory, it inherits the values of its parent
+    """
+    with self.__lock:
+      for fieldIndex in self.__fields.values():
+        for dirIDs in fieldIndex.inheritingDirs.values():
+          if containsID( dirIDs, parentID ) and not containsID( dirIDs, dirID ):
+            bisect.insort( dirIDs, dirID )
+
+  def removeDirectories( self, dirIDs ):
+    """ Forget removed directories
+    """
+    with self.__lock:
+      for fieldIndex in self.__fields.values():
+        for dirID in dirIDs:
+          fieldIndex.removeDir( dirID )
+          for inheriting in fieldIndex.inheritingDirs.values():
+            if containsID( inheriting, dirID ):
+              inheriting.pop( bisect.bisect_left( inheriting, dirID ) )
+
+  def removeField( self, meta = None ):
+    """ Forget a field, or all of them
+    """
+    with self.__lock:
+      if meta is None:
+        self.__fields = {}
+      else:
+        self.__fields.pop( meta, None )
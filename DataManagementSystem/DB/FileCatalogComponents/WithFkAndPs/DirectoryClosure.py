@@ -40,6 +40,12 @@ class DirectoryClosure( DirectoryTreeBase ):
     """
 
     dpath = os.path.normpath( path )
+    cached = self.dirCache.getDir( dpath )
+    if cached and cached[1] is not None:
+      res = S_OK( cached[0] )
+      res['Level'] = cached[1]
+      return res
+
     result = self.db.executeStoredProcedure( 'ps_find_dir', ( dpath, 'ret1', 'ret2' ), outputIds = [1, 2] )
     if not result['OK']:
       return result
@@ -49,6 +55,7 @@ class DirectoryClosure( DirectoryTreeBase ):
 
     res = S_OK( result['Value'][0] )
     res['Level'] = result['Value'][1]
+    self.dirCache.addDir( dpath, res['Value'], res['Level'] )
     return res
 
 
@@ -63,12 +70,24 @@ class DirectoryClosure( DirectoryTreeBase ):
     dirDict = {}
     if not paths:
       return S_OK( dirDict )
-    dpaths = stringListToString( [os.path.normpath( path ) for path in paths ] )
+    missingPaths = []
+    for path in paths:
+      dpath = os.path.normpath( path )
+      cached = self.dirCache.getDir( dpath )
+      if cached:
+        dirDict[dpath] = cached[0]
+      else:
+        missingPaths.append( dpath )
+    if not missingPaths:
+      return S_OK( dirDict )
+
+    dpaths = stringListToString( missingPaths )
     result = self.db.executeStoredProcedureWithCursor( 'ps_find_dirs', ( dpaths, ) )
     if not result['OK']:
       return result
     for dirName, dirID in result['Value']:
       dirDict[dirName] = dirID
+      self.dirCache.addDir( dirName, dirID )
 
     return S_OK( dirDict )
 
@@ -94,6 +113,7 @@ class DirectoryClosure( DirectoryTreeBase ):
       return res
 
     dirId = result['Value']
+    self.dirCache.removeDir( path, dirId )
     result = self.db.executeStoredProcedure( 'ps_remove_dir', ( dirId, ), outputIds = [] )
     if not result['OK']:
       return result
@@ -130,6 +150,10 @@ class DirectoryClosure( DirectoryTreeBase ):
 
     """
 
+    dirName = self.dirCache.getPath( int( dirID ) )
+    if dirName:
+      return S_OK( dirName )
+
     result = self.db.executeStoredProcedure( 'ps_get_dirName_from_id', ( dirID, 'out' ), outputIds = [1] )
     if not result['OK']:
       return result
@@ -139,6 +163,7 @@ class DirectoryClosure( DirectoryTreeBase ):
     if not dirName:
       return S_ERROR( 'Directory with id %d not found' % int( dirID ) )
 
+    self.dirCache.addDir( dirName, int( dirID ) )
     return S_OK( dirName )
 
   def getDirectoryPaths( self, dirIDList ):
@@ -153,15 +178,25 @@ class DirectoryClosure( DirectoryTreeBase ):
 
 
     dirDict = {}
+    missingDirs = []
+    for dirId in dirs:
+      dirName = self.dirCache.getPath( int( dirId ) )
+      if dirName:
+        dirDict[int( dirId )] = dirName
+      else:
+        missingDirs.append( dirId )
+    if not missingDirs:
+      return S_OK( dirDict )
 
     # Format the list
-    dIds = intListToString( dirs )
+    dIds = intListToString( missingDirs )
     result = self.db.executeStoredProcedureWithCursor( 'ps_get_dirNames_from_ids', ( dIds, ) )
     if not result['OK']:
       return result
 
     for dirId, dirName in result['Value']:
       dirDict[dirId] = dirName
+      self.dirCache.addDir( dirName, int( dirId ) )
 
     return S_OK( dirDict )
 
@@ -176,6 +211,10 @@ class DirectoryClosure( DirectoryTreeBase ):
         :returns: S_OK( list of ids ), S_ERROR if not found
     """
 
+    pathIDs = self.dirCache.getPathIDs( path )
+    if pathIDs is not None:
+      return S_OK( pathIDs )
+
     result = self.findDir( path )
     if not result['OK']:
       return result
@@ -184,7 +223,10 @@ class DirectoryClosure( DirectoryTreeBase ):
 
     dirID = result['Value']
 
-    return self.getPathIDsByID(dirID)
+    result = self.getPathIDsByID( dirID )
+    if result['OK']:
+      self.dirCache.addPathIDs( path, result['Value'] )
+    return result
 
 
 
@@ -391,6 +433,8 @@ class DirectoryClosure( DirectoryTreeBase ):
         return result
 
       dirId = result['Value'][0][0]
+      self.dirCache.addDir( dpath, dirId )
+      self._indexNewDirectory( dpath, dirId )
 
       result = S_OK( dirId )
       result['NewDirectory'] = True
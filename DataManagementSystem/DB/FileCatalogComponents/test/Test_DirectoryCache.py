@@ -0,0 +1,100 @@
+""" Unit tests for the cache of the directory tree of the FileCatalog
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryCache import DirectoryCache
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryLevelTree import DirectoryLevelTree
+
+__RCSID__ = "$Id$"
+
+class FakeDB( object ):
+  """ Database answering the queries of the DirectoryLevelTree on a fixed tree
+  """
+  directoryCacheSize = 100
+  directoryCacheLifeTime = 60
+
+  def __init__( self ):
+    self.dirs = { '/' : ( 1, 0 ), '/vo' : ( 2, 1 ), '/vo/data' : ( 3, 2 ) }
+    self.queries = []
+
+  def _query( self, req, _connection = False ):
+    self.queries.append( req )
+    if req.startswith( 'SELECT DirID,Level' ):
+      path = req.split( "'" )[1]
+      return S_OK( [ self.dirs[path] ] if path in self.dirs else [] )
+    if req.startswith( 'SELECT DirName FROM' ):
+      dirID = int( req.split( '=' )[-1] )
+      return S_OK( [ ( path, ) for path, ( dID, _level ) in self.dirs.items() if dID == dirID ] )
+    if req.startswith( 'SELECT DirID FROM' ):
+      return S_OK( sorted( [ ( dID, ) for path, ( dID, _level ) in self.dirs.items() if "'%s'" % path in req ] ) )
+    raise AssertionError( 'Unexpected query %s' % req )
+
+  def _update( self, req, _connection = False ):
+    self.queries.append( req )
+    dirID = int( req.split( '=' )[-1] )
+    for path, ( dID, _level ) in self.dirs.items():
+      if dID == dirID:
+        del self.dirs[path]
+    return S_OK()
+
+class DirectoryCacheTestCase( unittest.TestCase ):
+
+  def test_cache( self ):
+    cache = DirectoryCache( maxSize = 4, lifeTime = 60 )
+    self.assertEqual( cache.getDir( '/vo' ), None )
+    cache.addDir( '/vo/', 2, 1 )
+    self.assertEqual( cache.getDir( '/vo' ), ( 2, 1 ) )
+    self.assertEqual( cache.getPath( 2 ), '/vo' )
+    # The level is kept when it is not given
+    cache.addDir( '/vo', 2 )
+    self.assertEqual( cache.getDir( '/vo' ), ( 2, 1 ) )
+    cache.addPathIDs( '/vo', [ 1, 2 ] )
+    self.assertEqual( cache.getPathIDs( '/vo' ), [ 1, 2 ] )
+    cache.removeDir( '/vo' )
+    self.assertEqual( cache.getDir( '/vo' ), None )
+    self.assertEqual( cache.getPath( 2 ), None )
+    self.assertEqual( cache.getPathIDs( '/vo' ), None )
+    # Bounded
+    for dirID in range( 10 ):
+      cache.addDir( '/vo/%d' % dirID, dirID + 10, 2 )
+    stats = cache.getStats()
+    self.assertTrue( stats['DirectoryCacheSize'] <= 4 )
+    self.assertEqual( stats['DirectoryCacheHits'], 5 )
+    self.assertEqual( stats['DirectoryCacheMisses'], 4 )
+    self.assertAlmostEqual( stats['DirectoryCacheHitRate'], 500. / 9 )
+
+  def test_disabled( self ):
+    cache = DirectoryCache( maxSize = 0 )
+    cache.addDir( '/vo', 2, 1 )
+    self.assertEqual( cache.getDir( '/vo' ), None )
+    self.assertEqual( cache.getStats()['DirectoryCacheSize'], 0 )
+
+  def test_levelTree( self ):
+    db = FakeDB()
+    dtree = DirectoryLevelTree( db )
+    result = dtree.findDir( '/vo/data' )
+    self.assertEqual( ( result['Value'], result['Level'] ), ( 3, 2 ) )
+    result = dtree.findDir( '/vo/data/' )
+    self.assertEqual( ( result['Value'], result['Level'] ), ( 3, 2 ) )
+    self.assertEqual( dtree.getDirectoryPath( 3 )['Value'], '/vo/data' )
+    self.assertEqual( dtree.getPathIDs( '/vo/data' )['Value'], [ 1, 2, 3 ] )
+    self.assertEqual( dtree.getPathIDs( '/vo/data' )['Value'], [ 1, 2, 3 ] )
+    self.assertEqual( len( db.queries ), 2 )
+    # Missing directories are not cached
+    self.assertEqual( dtree.findDir( '/vo/mc' )['Value'], '' )
+    db.dirs['/vo/mc'] = ( 4, 2 )
+    self.assertEqual( dtree.findDir( '/vo/mc' )['Value'], 4 )
+    # Removed directories are forgotten
+    self.assertTrue( dtree.removeDir( '/vo/data' )['OK'] )
+    self.assertEqual( dtree.findDir( '/vo/data' )['Value'], '' )
+    self.assertFalse( dtree.getDirectoryPath( 3 )['OK'] )
+    self.assertTrue( dtree.getDirectoryCacheStats()['Value']['DirectoryCacheHits'] > 0 )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( DirectoryCacheTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,111 @@
+""" Unit tests for the index of the directory metadata of the FileCatalog
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from DIRAC import S_OK
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.MetadataIndex import MetadataIndex
+
+__RCSID__ = "$Id$"
+
+# Directory tree: 1 -> 2 -> ( 3, 4 ), 1 -> 5 -> 6
+CHILDREN = { 1 : [ 2, 5 ], 2 : [ 3, 4 ], 5 : [ 6 ] }
+
+class SubdirFunction( object ):
+  """ getAllSubdirectoriesByID on the tree above, counting the calls
+  """
+
+  def __init__( self ):
+    self.calls = 0
+
+  def __call__( self, dirList ):
+    self.calls += 1
+    subdirs = []
+    parents = list( dirList )
+    while parents:
+      children = []
+      for parent in parents:
+        children += CHILDREN.get( parent, [] )
+      subdirs += children
+      parents = children
+    return S_OK( subdirs )
+
+class MetadataIndexTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.index = MetadataIndex( lifeTime = 60 )
+    self.subdirs = SubdirFunction()
+
+  def getDirs( self, meta, value ):
+    fieldIndex = self.index.getField( meta )
+    keys = fieldIndex.selectValues( value )
+    result = self.index.getInheritingDirs( meta, fieldIndex, keys, self.subdirs )
+    self.assertTrue( result['OK'] )
+    return sorted( result['Value'] )
+
+  def test_query( self ):
+    self.index.loadField( 'Run', 'INT', [ ( 2, 10 ), ( 5, 20 ), ( 6, None ) ] )
+    self.assertEqual( self.getDirs( 'Run', 10 ), [ 2, 3, 4 ] )
+    self.assertEqual( self.getDirs( 'Run', '20' ), [ 5, 6 ] )
+    self.assertEqual( self.getDirs( 'Run', [ '10', 30 ] ), [ 2, 3, 4 ] )
+    self.assertEqual( self.getDirs( 'Run', { '>' : 10 } ), [ 5, 6 ] )
+    self.assertEqual( self.getDirs( 'Run', { '>=' : 10, '<' : 20 } ), [ 2, 3, 4 ] )
+    self.assertEqual( self.getDirs( 'Run', { '!=' : 10 } ), [ 5, 6 ] )
+    self.assertEqual( self.getDirs( 'Run', { 'in' : [ 10, 20 ] } ), [ 2, 3, 4, 5, 6 ] )
+    self.assertEqual( self.getDirs( 'Run', 'Any' ), [ 2, 3, 4, 5, 6 ] )
+    # Each value is expanded once
+    self.assertEqual( self.subdirs.calls, 2 )
+    self.assertRaises( ValueError, self.index.getField( 'Run' ).selectValues, { '>' : 'ten' } )
+    self.assertRaises( ValueError, self.index.getField( 'Run' ).selectValues, { '<' : [ 1, 2 ] } )
+
+  def test_strings( self ):
+    self.index.loadField( 'Type', 'VARCHAR(128)', [ ( 2, 'Raw' ), ( 5, 'MC ' ) ] )
+    self.assertEqual( self.getDirs( 'Type', 'raw' ), [ 2, 3, 4 ] )
+    self.assertEqual( self.getDirs( 'Type', 'MC' ), [ 5, 6 ] )
+    self.assertEqual( sorted( self.index.getField( 'Type' ).getStoredValues() ), [ 'MC ', 'Raw' ] )
+    self.assertEqual( self.index.getField( 'Type' ).getStoredValues( [ 3, 5 ] ), [ 'MC ' ] )
+    # Not indexed
+    self.assertEqual( self.index.loadField( 'Date', 'DATETIME', [] ), None )
+    self.assertEqual( self.index.getField( 'Date' ), None )
+
+  def test_updates( self ):
+    self.index.loadField( 'Run', 'int', [ ( 2, 10 ) ] )
+    self.assertEqual( self.getDirs( 'Run', 10 ), [ 2, 3, 4 ] )
+    # New directories inherit the values of their parent
+    CHILDREN[4] = [ 7 ]
+    try:
+      self.index.addDirectory( 7, 4 )
+      self.assertEqual( self.getDirs( 'Run', 10 ), [ 2, 3, 4, 7 ] )
+      self.index.addDirectory( 8, 5 )
+      self.assertEqual( self.getDirs( 'Run', 10 ), [ 2, 3, 4, 7 ] )
+      self.assertEqual( self.subdirs.calls, 1 )
+      # Changed values
+      self.index.setDirValue( 'Run', 5, 10 )
+      self.assertEqual( self.getDirs( 'Run', 10 ), [ 2, 3, 4, 5, 6, 7 ] )
+      self.index.setDirValue( 'Run', 2, 30 )
+      self.assertEqual( self.getDirs( 'Run', 10 ), [ 5, 6 ] )
+      self.assertEqual( self.getDirs( 'Run', { '>' : 20 } ), [ 2, 3, 4, 7 ] )
+      self.index.removeDirValue( 'Run', 5 )
+      self.assertEqual( self.getDirs( 'Run', 10 ), [] )
+      self.assertEqual( self.index.getField( 'Run' ).values, [ 30 ] )
+      # Removed directories
+      self.index.removeDirectories( [ 7 ] )
+      self.assertEqual( self.getDirs( 'Run', 30 ), [ 2, 3, 4 ] )
+      self.index.removeDirectories( [ 2 ] )
+      self.assertEqual( self.getDirs( 'Run', 'Any' ), [] )
+    finally:
+      del CHILDREN[4]
+    self.index.removeField( 'Run' )
+    self.assertEqual( self.index.getField( 'Run' ), None )
+
+  def test_disabled( self ):
+    index = MetadataIndex()
+    self.assertFalse( index.isEnabled() )
+    self.assertEqual( index.loadField( 'Run', 'INT', [ ( 2, 10 ) ] ), None )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( MetadataIndexTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
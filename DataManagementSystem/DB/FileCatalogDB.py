@@ -59,6 +59,11 @@ class FileCatalogDB( DB ):
     self.validReplicaStatus = databaseConfig['ValidReplicaStatus']
     self.visibleFileStatus = databaseConfig['VisibleFileStatus']
     self.visibleReplicaStatus = databaseConfig['VisibleReplicaStatus']
+    # Directories kept in memory by the directory manager, 0 to disable the cache
+    self.directoryCacheSize = databaseConfig.get( 'DirectoryCacheSize', 0 )
+    self.directoryCacheLifeTime = databaseConfig.get( 'DirectoryCacheLifeTime', 60 )
+    # Lifetime of the index of the directory metadata, 0 to disable it
+    self.metadataIndexLifeTime = databaseConfig.get( 'MetadataIndexLifeTime', 0 )
 
     try:
       # Obtain the plugins to be used for DB interaction
@@ -917,6 +922,25 @@ class FileCatalogDB( DB ):
     successful = res['Value']['Successful']
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
+  def listDirectoryPaged( self, path, afterFileID, limit, credDict, verbose = False ):
+    """
+        List a directory by pages of files, for directories too large to be listed at once
+
+        :param str path: directory path
+        :param int afterFileID: LastFileID of the previous page, 0 for the first page
+        :param int limit: maximum number of files in the page
+        :param creDict: credential
+
+        :return: dictionary indexed "Files", "Datasets", "SubDirs", "Links" and "LastFileID",
+                 which is 0 on the last page
+    """
+    res = self._checkPathPermissions( 'listDirectory', [path], credDict )
+    if not res['OK']:
+      return res
+    if path in res['Value']['Failed']:
+      return S_ERROR( res['Value']['Failed'][path] )
+    return self.dtree.listDirectoryPaged( path, afterFileID, limit, verbose = verbose )
+
   def isDirectory( self, lfns, credDict ):
     """
         Checks whether a list of LFNS are directories or not
@@ -962,6 +986,20 @@ class FileCatalogDB( DB ):
     successful = res['Value']['Successful']
     return S_OK( { 'Successful':successful, 'Failed':failed, 'SEPrefixes': res['Value'].get( 'SEPrefixes', {} )} )
 
+  def getDirectoryReplicasPaged( self, path, afterFileID, limit, allStatus, credDict ):
+    """
+        Get the replicas of the files of a directory by pages
+
+        :return: dictionary indexed "Files", "LastFileID", which is 0 on the last page, and
+                 "SEPrefixes" with the LFN-PFN convention
+    """
+    res = self._checkPathPermissions( 'getDirectoryReplicas', [path], credDict )
+    if not res['OK']:
+      return res
+    if path in res['Value']['Failed']:
+      return S_ERROR( res['Value']['Failed'][path] )
+    return self.dtree.getDirectoryReplicasPaged( path, afterFileID, limit, allStatus = allStatus )
+
   def getDirectorySize( self, lfns, longOutput, fromFiles, credDict ):
     """
         Get the sizes of a list of directories
@@ -1138,6 +1176,10 @@ class FileCatalogDB( DB ):
     if not res['OK']:
       return res
     counterDict.update( res['Value'] )
+    res = self.dtree.getDirectoryCacheStats()
+    if not res['OK']:
+      return res
+    counterDict.update( res['Value'] )
     return S_OK( counterDict )
 
   ########################################################################
@@ -22,6 +22,8 @@ from DIRAC.DataManagementSystem.DB.FileCatalogDB import FileCatalogDB
 
 # This is a global instance of the FileCatalogDB class
 gFileCatalogDB = None
+# Maximum number of files returned in a page of the paged directory methods
+gMaxPageSize = 10000
 
 def initializeFileCatalogHandler( serviceInfo ):
   """ handler initialisation """
@@ -58,7 +60,10 @@ def initializeFileCatalogHandler( serviceInfo ):
                     'ValidFileStatus'     : ['AprioriGood','Trash','Removing','Probing'],
                     'ValidReplicaStatus'  : ['AprioriGood','Trash','Removing','Probing'],
                     'VisibleFileStatus'   : ['AprioriGood'],
-                    'VisibleReplicaStatus': ['AprioriGood']}
+                    'VisibleReplicaStatus': ['AprioriGood'],
+                    'DirectoryCacheSize'  : 10000,
+                    'DirectoryCacheLifeTime' : 60,
+                    'MetadataIndexLifeTime' : 60 }
   for configKey in sorted( defaultConfig.keys() ):
     defaultValue = defaultConfig[configKey]
     configValue = getServiceOption( serviceInfo, configKey, defaultValue )
@@ -66,6 +71,9 @@ def initializeFileCatalogHandler( serviceInfo ):
     databaseConfig[configKey] = configValue
   res = gFileCatalogDB.setConfig( databaseConfig )
 
+  global gMaxPageSize
+  gMaxPageSize = getServiceOption( serviceInfo, 'MaxPageSize', gMaxPageSize )
+
   gMonitor.registerActivity( "AddFile", "Amount of addFile calls",
                                "FileCatalogHandler", "calls/min", gMonitor.OP_SUM )
   gMonitor.registerActivity( "AddFileSuccessful", "Files successfully added",
@@ -372,6 +380,15 @@ class FileCatalogHandler( RequestHandler ):
     gMonitor.addMark( 'ListDirectory', 1 )
     return gFileCatalogDB.listDirectory( lfns, self.getRemoteCredentials(), verbose = verbose )
 
+  types_listDirectoryPaged = [ StringTypes, [ IntType, LongType ], [ IntType, LongType ], BooleanType ]
+  def export_listDirectoryPaged( self, path, afterFileID, limit, verbose ):
+    """ List the contents of a directory by pages of at most limit files, following the file
+        with ID afterFileID
+    """
+    gMonitor.addMark( 'ListDirectory', 1 )
+    limit = max( 1, min( limit, gMaxPageSize ) )
+    return gFileCatalogDB.listDirectoryPaged( path, afterFileID, limit, self.getRemoteCredentials(), verbose = verbose )
+
   types_isDirectory = [ [ ListType, DictType ] + list( StringTypes ) ]
   def export_isDirectory( self, lfns ):
     """ Determine whether supplied path is a directory """
@@ -392,6 +409,14 @@ class FileCatalogHandler( RequestHandler ):
     """ Get replicas for files in the supplied directory """
     return gFileCatalogDB.getDirectoryReplicas( lfns, allStatus, self.getRemoteCredentials() )
 
+  types_getDirectoryReplicasPaged = [ StringTypes, [ IntType, LongType ], [ IntType, LongType ], BooleanType ]
+  def export_getDirectoryReplicasPaged( self, path, afterFileID, limit, allStatus ):
+    """ Get the replicas of the files of a directory by pages of at most limit files, following
+        the file with ID afterFileID
+    """
+    limit = max( 1, min( limit, gMaxPageSize ) )
+    return gFileCatalogDB.getDirectoryReplicasPaged( path, afterFileID, limit, allStatus, self.getRemoteCredentials() )
+
   ########################################################################
   #
   # Administrative database operations
@@ -487,6 +512,12 @@ class FileCatalogHandler( RequestHandler ):
     """
     return gFileCatalogDB.fmeta.getFileUserMetadata( path, self.getRemoteCredentials() )
 
+  types_getFileUserMetadataBulk = [ [ ListType, DictType ] ]
+  def export_getFileUserMetadataBulk( self, lfns ):
+    """ Get all the metadata valid for the given files, including that of their directories
+    """
+    return gFileCatalogDB.fmeta.getFileUserMetadataBulk( list( lfns ), self.getRemoteCredentials() )
+
   types_findDirectoriesByMetadata = [ DictType ]
   def export_findDirectoriesByMetadata( self, metaDict, path = '/' ):
     """ Find all the directories satisfying the given metadata set
@@ -5,7 +5,7 @@ import os
 
 from DIRAC import S_OK, S_ERROR
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getVOMSAttributeForGroup, getDNForUsername
-from DIRAC.Resources.Catalog.Utilities                 import checkCatalogArguments
+from DIRAC.Resources.Catalog.Utilities                 import checkCatalogArguments, iterPages
 from DIRAC.Resources.Catalog.FileCatalogClientBase     import FileCatalogClientBase
 
 __RCSID__ = "$Id$"
@@ -24,7 +24,9 @@ class FileCatalogClient( FileCatalogClientBase ):
                    'findDirectoriesByMetadata','getReplicasByMetadata','findFilesByMetadataDetailed',
                    'findFilesByMetadataWeb','getCompatibleMetadata','getMetadataSet', 'getDatasets',
                    'getFileDescendents', 'getFileAncestors', 'getDirectoryUserMetadata', 'getFileUserMetadata',
-                   'checkDataset', 'getDatasetParameters', 'getDatasetFiles', 'getDatasetAnnotation']
+                   'getFileUserMetadataBulk',
+                   'checkDataset', 'getDatasetParameters', 'getDatasetFiles', 'getDatasetAnnotation',
+                   'listDirectoryPaged', 'getDirectoryReplicasPaged' ]
 
   WRITE_METHODS = ['createLink', 'removeLink', 'addFile', 'setFileStatus', 'addReplica', 'removeReplica',
                    'removeFile', 'setReplicaStatus', 'setReplicaHost', 'setReplicaProblematic', 'createDirectory',
@@ -38,7 +40,8 @@ class FileCatalogClient( FileCatalogClientBase ):
                     'setMetadataBulk','removeMetadata','getDirectoryUserMetadata','findDirectoriesByMetadata',
                     'getReplicasByMetadata','findFilesByMetadataDetailed','findFilesByMetadataWeb',
                     'getCompatibleMetadata', 'addMetadataSet', 'getMetadataSet', 'getFileUserMetadata', 'getLFNForGUID',
-                    'addUser', 'deleteUser', 'addGroup', 'deleteGroup', 'repairCatalog', 'rebuildDirectoryUsage' ]
+                    'addUser', 'deleteUser', 'addGroup', 'deleteGroup', 'repairCatalog', 'rebuildDirectoryUsage',
+                    'listDirectoryPaged', 'getDirectoryReplicasPaged' ]
 
   ADMIN_METHODS = [ 'addUser', 'deleteUser', 'addGroup', 'deleteGroup', 'getUsers', 'getGroups',
                     'getCatalogCounters', 'repairCatalog', 'rebuildDirectoryUsage' ]
@@ -162,6 +165,57 @@ class FileCatalogClient( FileCatalogClientBase ):
           entryDict[lfn] = detailsDict
     return result
 
+  def listDirectoryPaged( self, path, afterFileID = 0, limit = 1000, verbose = False, timeout = 120 ):
+    """ List a page of the given directory's contents. The files come in the order of their
+        FileID, the subdirectories with the first page only. The LastFileID of the page is the
+        afterFileID of the next one, it is 0 on the last page
+    """
+    path = os.path.normpath( path )
+    rpcClient = self._getRPC( timeout = timeout )
+    result = rpcClient.listDirectoryPaged( path, afterFileID, limit, verbose )
+    if not result['OK']:
+      return result
+    # Force returned directory entries to be LFNs
+    for entryType in ['Files', 'SubDirs', 'Links']:
+      entryDict = result['Value'][entryType]
+      for fname in entryDict.keys():
+        entryDict[os.path.join( path, os.path.basename( fname ) )] = entryDict.pop( fname )
+    return result
+
+  def getDirectoryReplicasPaged( self, path, afterFileID = 0, limit = 1000, allStatus = False, timeout = 120 ):
+    """ Get the replicas of a page of the files of the given directory, in the order of their
+        FileID. The LastFileID of the page is the afterFileID of the next one, it is 0 on the last page
+    """
+    path = os.path.normpath( path )
+    rpcClient = self._getRPC( timeout = timeout )
+    result = rpcClient.getDirectoryReplicasPaged( path, afterFileID, limit, allStatus )
+    if not result['OK']:
+      return result
+    seDict = result['Value'].get( 'SEPrefixes', {} )
+    fileDict = result['Value']['Files']
+    for fname in fileDict.keys():
+      detailsDict = fileDict.pop( fname )
+      lfn = '%s/%s' % ( path.rstrip( '/' ), os.path.basename( fname ) )
+      for se in detailsDict:
+        if not detailsDict[se] and se in seDict:
+          detailsDict[se] = seDict[se] + lfn
+      fileDict[lfn] = detailsDict
+    return result
+
+  def iterDirectoryListing( self, path, verbose = False, pageSize = 1000 ):
+    """ Iterate over the pages of the listing of a directory, see listDirectoryPaged
+
+    :return: generator of S_OK( page ), or of a final S_ERROR
+    """
+    return iterPages( self.listDirectoryPaged, path, pageSize, verbose = verbose )
+
+  def iterDirectoryReplicas( self, path, allStatus = False, pageSize = 1000 ):
+    """ Iterate over the pages of the replicas of the files of a directory, see getDirectoryReplicasPaged
+
+    :return: generator of S_OK( page ), or of a final S_ERROR
+    """
+    return iterPages( self.getDirectoryReplicasPaged, path, pageSize, allStatus = allStatus )
+
   @checkCatalogArguments
   def getDirectoryMetadata( self, lfns, timeout = 120 ):
     ''' Get standard directory metadata
@@ -247,6 +301,14 @@ class FileCatalogClient( FileCatalogClientBase ):
 
     return S_OK(fmeta)
 
+  @checkCatalogArguments
+  def getFileUserMetadataBulk( self, lfns, timeout = 120 ):
+    """ Get the meta data attached to several files and to their directories,
+        in a single call
+    """
+    rpcClient = self._getRPC( timeout = timeout )
+    return rpcClient.getFileUserMetadataBulk( lfns.keys() )
+
   ########################################################################
   # Path operations (not updated)
   #
@@ -101,3 +101,23 @@ def checkCatalogArguments( f ):
     return result
 
   return processWithCheckingArguments
+
+def iterPages( pagedMethod, path, pageSize = 1000, **kwargs ):
+  """ Iterate over the pages of a paged directory method of a catalog, like listDirectoryPaged.
+      A page is only requested when the previous one has been consumed, so that whatever the
+      size of the directory, only one page at a time is in memory
+
+      :param pagedMethod: method( path, afterFileID = ..., limit = ..., **kwargs ) returning
+                          S_OK( page ), the page having the LastFileID of the keyset pagination
+      :param str path: directory path
+      :param int pageSize: maximum number of files per page
+
+      :return: generator of S_OK( page ), or of a final S_ERROR if a page could not be obtained
+  """
+  afterFileID = 0
+  while True:
+    result = pagedMethod( path, afterFileID = afterFileID, limit = pageSize, **kwargs )
+    yield result
+    if not result['OK'] or not result['Value'].get( 'LastFileID' ):
+      return
+    afterFileID = result['Value']['LastFileID']
@@ -0,0 +1,54 @@
+"""
+   Testing the paging over the directories of a catalog
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Resources.Catalog.Utilities import iterPages
+
+__RCSID__ = "$Id$"
+
+class PagedCatalog( object ):
+  """ Catalog of a directory whose files have the IDs 1 to nbFiles """
+
+  def __init__( self, nbFiles, failAfter = None ):
+    self.nbFiles = nbFiles
+    self.failAfter = failAfter
+    self.calls = []
+
+  def listDirectoryPaged( self, path, afterFileID = 0, limit = 1000, verbose = False ):
+    self.calls.append( ( path, afterFileID, limit, verbose ) )
+    if self.failAfter is not None and afterFileID >= self.failAfter:
+      return S_ERROR( 'Timeout' )
+    fileIDs = range( afterFileID + 1, min( self.nbFiles, afterFileID + limit ) + 1 )
+    lastFileID = fileIDs[-1] if len( fileIDs ) == limit else 0
+    return S_OK( { 'Files' : dict( ( '%s/f%d' % ( path, fileID ), {} ) for fileID in fileIDs ),
+                   'LastFileID' : lastFileID } )
+
+class IterPagesTestCase( unittest.TestCase ):
+
+  def test_pages( self ):
+    catalog = PagedCatalog( 5 )
+    pages = iterPages( catalog.listDirectoryPaged, '/vo/data', 2, verbose = True )
+    # Nothing is requested before the first page is consumed
+    self.assertEqual( catalog.calls, [] )
+    results = list( pages )
+    self.assertTrue( all( result['OK'] for result in results ) )
+    self.assertEqual( [ len( result['Value']['Files'] ) for result in results ], [ 2, 2, 1 ] )
+    self.assertEqual( catalog.calls, [ ( '/vo/data', 0, 2, True ), ( '/vo/data', 2, 2, True ),
+                                       ( '/vo/data', 4, 2, True ) ] )
+    # A full last page costs an empty one
+    self.assertEqual( len( list( iterPages( PagedCatalog( 4 ).listDirectoryPaged, '/vo', 2 ) ) ), 3 )
+
+  def test_error( self ):
+    catalog = PagedCatalog( 10, failAfter = 4 )
+    results = list( iterPages( catalog.listDirectoryPaged, '/vo', 2 ) )
+    self.assertEqual( [ result['OK'] for result in results ], [ True, True, False ] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( IterPagesTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -20,7 +20,7 @@ from DIRAC.Core.Utilities.SiteSEMapping import getSEsForSite
 from DIRAC.Core.Security.ProxyInfo import getVOfromProxyGroup
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Utilities.DictCache import DictCache
-from DIRAC.Resources.Storage.Utilities import checkArgumentFormat
+from DIRAC.Resources.Storage.Utilities import checkArgumentFormat, executeInChunks
 from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
 from DIRAC.Core.Security.ProxyInfo import getProxyInfo
 from DIRAC.AccountingSystem.Client.Types.DataOperation import DataOperation
@@ -100,6 +100,10 @@ class StorageElementItem( object ):
 
   __deprecatedArguments = ["singleFile", "singleDirectory"]  # Arguments that are now useless
 
+  # SE name : ( maxConcurrency, semaphore ) shared by the StorageElementItem of all the threads
+  __semaphores = {}
+  __semaphoresLock = threading.Lock()
+
   # Some methods have a different name in the StorageElement and the plugins...
   # We could avoid this static list in the __getattr__ by checking the storage plugin and so on
   # but fine... let's not be too smart, otherwise it becomes unreadable :-)
@@ -207,6 +211,19 @@ class StorageElementItem( object ):
       self.localWriteProtocolList = writeProto if writeProto else self.__dmsHelper.getWriteProtocols()
       self.log.debug( "localWriteProtocolList %s" % self.localWriteProtocolList )
 
+      # Number of lfns per plugin call and number of calls run at the same time by this process
+      # for the bulk methods. By default, each plugin is called once with all the lfns
+      try:
+        self.maxConcurrency = max( 1, int( self.options.get( 'MaxConcurrency' ) or 1 ) )
+        self.chunkSize = int( self.options.get( 'ChunkSize', 100 ) )
+        if self.chunkSize < 1:
+          raise ValueError( "ChunkSize must be at least 1" )
+      except ValueError:
+        self.log.warn( "Invalid MaxConcurrency or ChunkSize, the bulk calls are not split" )
+        self.maxConcurrency = 1
+        self.chunkSize = 0
+      self.log.debug( "maxConcurrency %s chunkSize %s" % ( self.maxConcurrency, self.chunkSize ) )
+
 
 
 
@@ -244,6 +261,13 @@ class StorageElementItem( object ):
                        'getTransportURL',
                        'isLocalSE' ]
 
+    # Bulk methods whose lfns can be split in chunks executed concurrently
+    self.chunkedMethods = self.checkMethods + self.removeMethods + [ 'prestageFile',
+                                                                     'prestageFileStatus',
+                                                                     'pinFile',
+                                                                     'releaseFile',
+                                                                     'getTransportURL' ]
+
     self.__fileCatalog = None
 
   def dump( self ):
@@ -777,21 +801,25 @@ class StorageElementItem( object ):
 
     urlDict = {}  # url : lfn
     failed = {}  # lfn : string with errors
-    for lfn in lfns:
-      if self.useCatalogURL:
-        # Is this self.name alias proof?
-        url = replicaDict.get( lfn, {} ).get( self.name, '' )
-        if url:
-          urlDict[url] = lfn
-          continue
+    if self.useCatalogURL:
+      # Is this self.name alias proof?
+      catalogURLs = dict( ( lfn, replicaDict.get( lfn, {} ).get( self.name, '' ) ) for lfn in lfns )
+      missingLFNs = [ lfn for lfn, url in catalogURLs.items() if not url ]
+      if missingLFNs:
+        # Get the replicas of all the lfns at once
+        fc = self.__getFileCatalog()
+        result = fc.getReplicas( missingLFNs )
+        if not result['OK']:
+          failed.update( dict.fromkeys( missingLFNs, result['Message'] ) )
         else:
-          fc = self.__getFileCatalog()
-          result = fc.getReplicas()
-          if not result['OK']:
-            failed[lfn] = result['Message']
-          url = result['Value']['Successful'].get( lfn, {} ).get( self.name, '' )
-
-        if not url:
+          for lfn in missingLFNs:
+            catalogURLs[lfn] = result['Value']['Successful'].get( lfn, {} ).get( self.name, '' )
+      for lfn, url in catalogURLs.items():
+        if lfn in failed:
+          continue
+        if lfn not in missingLFNs:
+          urlDict[url] = lfn
+        elif not url:
           failed[lfn] = 'Failed to get catalog replica'
         else:
           # Update the URL according to the current SE description
@@ -800,7 +828,8 @@ class StorageElementItem( object ):
             failed[lfn] = result['Message']
           else:
             urlDict[result['Value']] = lfn
-      else:
+    else:
+      for lfn in lfns:
         result = storage.constructURLFromLFN( lfn, withWSUrl = True )
         if not result['OK']:
           errStr = result['Message']
@@ -813,6 +842,18 @@ class StorageElementItem( object ):
 #     res['Failed'] = failed
     return res
 
+  @staticmethod
+  def __getSemaphore( seName, maxConcurrency ):
+    """ Get the semaphore bounding the number of concurrent calls to a SE from this process.
+        The StorageElementItem objects are per thread, the semaphores are shared by all of them
+    """
+    with StorageElementItem.__semaphoresLock:
+      semaphore = StorageElementItem.__semaphores.get( seName )
+      if not semaphore or semaphore[0] != maxConcurrency:
+        semaphore = ( maxConcurrency, threading.BoundedSemaphore( maxConcurrency ) )
+        StorageElementItem.__semaphores[seName] = semaphore
+      return semaphore[1]
+
   @staticmethod
   def __getIndexInList( x, l ):
     """ Return the index of the element x in the list l
@@ -1032,7 +1073,12 @@ class StorageElementItem( object ):
 
         startDate = datetime.datetime.utcnow()
         startTime = time.time()
-        res = fcn( urlsToUse, *args, **kwargs )
+        if self.methodName in self.chunkedMethods and self.maxConcurrency > 1:
+          res = executeInChunks( fcn, urlsToUse, args, kwargs, chunkSize = self.chunkSize,
+                                 maxConcurrency = self.maxConcurrency,
+                                 semaphore = self.__getSemaphore( self.name, self.maxConcurrency ) )
+        else:
+          res = fcn( urlsToUse, *args, **kwargs )
         elapsedTime = time.time() - startTime
 
 
@@ -4,6 +4,8 @@
 __RCSID__ = "$Id$"
 
 import errno
+import threading
+import Queue
 
 from DIRAC import S_OK, S_ERROR
 
@@ -19,4 +21,68 @@ def checkArgumentFormat( path ):
     returnDict = path.copy()
     return S_OK( returnDict )
   else:
-    return S_ERROR( errno.EINVAL, "Utils.checkArgumentFormat: Supplied path is not of the correct format." )
\ No newline at end of file
+    return S_ERROR( errno.EINVAL, "Utils.checkArgumentFormat: Supplied path is not of the correct format." )
+
+def executeInChunks( fcn, urls, args = (), kwargs = None, chunkSize = 0, maxConcurrency = 1, semaphore = None ):
+  """ Call a bulk storage plugin method on chunks of the given urls, several chunks at a time,
+      and merge the results of the chunks
+
+      :param fcn: plugin method, called as fcn( {url:value}, *args, **kwargs )
+      :param dict urls: { url : value }
+      :param int chunkSize: maximum number of urls per call, 0 to call fcn once
+      :param int maxConcurrency: maximum number of chunks executed at the same time by this call
+      :param semaphore: optional semaphore shared by the callers to bound the total number of calls
+                        running at the same time
+      :return: S_OK( { 'Successful' : { url : value }, 'Failed' : { url : error } } ), or the result
+               of the first chunk if all of them failed completely
+  """
+  if kwargs is None:
+    kwargs = {}
+  urlList = list( urls )
+  if chunkSize <= 0 or maxConcurrency <= 1 or len( urlList ) <= chunkSize:
+    return fcn( urls, *args, **kwargs )
+
+  chunks = Queue.Queue()
+  nbChunks = 0
+  for start in xrange( 0, len( urlList ), chunkSize ):
+    chunks.put( dict( ( url, urls[url] ) for url in urlList[start:start + chunkSize] ) )
+    nbChunks += 1
+  results = []
+
+  def __executeChunks():
+    while True:
+      try:
+        chunk = chunks.get_nowait()
+      except Queue.Empty:
+        return
+      if semaphore:
+        semaphore.acquire()
+      try:
+        res = fcn( chunk, *args, **kwargs )
+      except Exception as x:  # pylint: disable=broad-except
+        # Do not lose the chunk if the plugin raises in a thread
+        res = S_ERROR( "Exception while calling %s: %s" % ( getattr( fcn, '__name__', fcn ), repr( x ) ) )
+      finally:
+        if semaphore:
+          semaphore.release()
+      results.append( ( chunk, res ) )
+
+  threads = [ threading.Thread( target = __executeChunks ) for _ in xrange( min( maxConcurrency, nbChunks ) ) ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  successful = {}
+  failed = {}
+  errors = []
+  for chunk, res in results:
+    if not res['OK']:
+      errors.append( res )
+      failed.update( dict.fromkeys( chunk, res['Message'] ) )
+    else:
+      successful.update( res['Value']['Successful'] )
+      failed.update( res['Value']['Failed'] )
+  if len( errors ) == len( results ):
+    return errors[0]
+  return S_OK( { 'Successful' : successful, 'Failed' : failed } )
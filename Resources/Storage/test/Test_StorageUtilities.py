@@ -0,0 +1,87 @@
+""" Unit tests for the chunked execution of the bulk storage plugin methods
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import threading
+import time
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Resources.Storage.Utilities import executeInChunks
+
+__RCSID__ = "$Id$"
+
+class FakePlugin( object ):
+  """ Plugin whose exists fails for the urls containing 'bad', and completely for those containing 'down'
+  """
+
+  def __init__( self ):
+    self.calls = []
+    self.running = 0
+    self.maxRunning = 0
+    self.lock = threading.Lock()
+
+  def exists( self, urls, option = None ):
+    with self.lock:
+      self.calls.append( ( sorted( urls ), option ) )
+      self.running += 1
+      self.maxRunning = max( self.maxRunning, self.running )
+    time.sleep( 0.05 )
+    with self.lock:
+      self.running -= 1
+    if any( 'down' in url for url in urls ):
+      return S_ERROR( 'Endpoint down' )
+    if any( 'raise' in url for url in urls ):
+      raise RuntimeError( 'Plugin bug' )
+    return S_OK( { 'Successful' : dict( ( url, True ) for url in urls if 'bad' not in url ),
+                   'Failed' : dict( ( url, 'No such file' ) for url in urls if 'bad' in url ) } )
+
+class ExecuteInChunksTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.plugin = FakePlugin()
+    self.urls = dict( ( 'srm://se/vo/f%02d' % i, False ) for i in range( 10 ) )
+
+  def test_serial( self ):
+    res = executeInChunks( self.plugin.exists, self.urls, kwargs = { 'option' : 1 } )
+    self.assertTrue( res['OK'] )
+    self.assertEqual( len( self.plugin.calls ), 1 )
+    self.assertEqual( self.plugin.calls[0][1], 1 )
+    # A single chunk is not split either
+    executeInChunks( self.plugin.exists, self.urls, chunkSize = 10, maxConcurrency = 4 )
+    self.assertEqual( len( self.plugin.calls ), 2 )
+
+  def test_chunks( self ):
+    self.urls['srm://se/vo/bad'] = False
+    res = executeInChunks( self.plugin.exists, self.urls, ( 2, ), chunkSize = 3, maxConcurrency = 2 )
+    self.assertTrue( res['OK'] )
+    self.assertEqual( len( res['Value']['Successful'] ), 10 )
+    self.assertEqual( res['Value']['Failed'], { 'srm://se/vo/bad' : 'No such file' } )
+    self.assertEqual( len( self.plugin.calls ), 4 )
+    self.assertTrue( all( len( urls ) <= 3 and option == 2 for urls, option in self.plugin.calls ) )
+    self.assertEqual( sorted( url for urls, _option in self.plugin.calls for url in urls ), sorted( self.urls ) )
+    self.assertEqual( self.plugin.maxRunning, 2 )
+
+  def test_semaphore( self ):
+    semaphore = threading.BoundedSemaphore( 1 )
+    res = executeInChunks( self.plugin.exists, self.urls, chunkSize = 2, maxConcurrency = 5, semaphore = semaphore )
+    self.assertTrue( res['OK'] )
+    self.assertEqual( self.plugin.maxRunning, 1 )
+
+  def test_errors( self ):
+    urls = { 'srm://se/vo/down' : False, 'srm://se/vo/raise' : False, 'srm://se/vo/f' : False }
+    res = executeInChunks( self.plugin.exists, urls, chunkSize = 1, maxConcurrency = 3 )
+    self.assertTrue( res['OK'] )
+    self.assertEqual( res['Value']['Successful'], { 'srm://se/vo/f' : True } )
+    self.assertEqual( res['Value']['Failed']['srm://se/vo/down'], 'Endpoint down' )
+    self.assertTrue( 'Plugin bug' in res['Value']['Failed']['srm://se/vo/raise'] )
+    # Completely failed
+    res = executeInChunks( self.plugin.exists, { 'srm://se/vo/down1' : False, 'srm://se/vo/down2' : False },
+                           chunkSize = 1, maxConcurrency = 2 )
+    self.assertFalse( res['OK'] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ExecuteInChunksTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,119 @@
+""" On-disk cache of the replicas of the files of the transformations, used by the TransformationAgent
+
+    The replicas are stored in a SQLite database, one row per transformation and LFN with its
+    own expiration time, so that only the changed LFNs are written and nothing has to be loaded
+    in memory. The database is in WAL mode: the threads of an agent, and other agents given the
+    same file, read it concurrently while one of them writes.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from DIRAC.Core.Utilities.List import breakListIntoChunks
+
+__RCSID__ = "$Id$"
+
+# Maximum number of LFNs in one statement, SQLite has a limit of 999 parameters
+MAX_LFNS = 500
+
+class ReplicaCache( object ):
+  """ Replicas of the files of the transformations, with a lifetime per entry
+  """
+
+  def __init__( self, fileName, lifeTime = 2 * 86400, timeout = 60 ):
+    """
+    :param str fileName: path of the database file, created if needed
+    :param int lifeTime: default lifetime of the cached replicas in seconds
+    :param int timeout: seconds to wait for a lock held by another writer
+    """
+    self.fileName = fileName
+    self.lifeTime = lifeTime
+    self.timeout = timeout
+    self.__local = threading.local()
+    directory = os.path.dirname( fileName )
+    if directory and not os.path.isdir( directory ):
+      os.makedirs( directory )
+    with self.__getConnection() as conn:
+      conn.execute( "CREATE TABLE IF NOT EXISTS Replicas ( TransformationID INTEGER NOT NULL, LFN TEXT NOT NULL, "
+                    "SEs TEXT NOT NULL, ExpirationTime REAL NOT NULL, PRIMARY KEY ( TransformationID, LFN ) )" )
+
+  def __getConnection( self ):
+    """ One connection per thread, as SQLite connections cannot be shared between threads
+    """
+    conn = getattr( self.__local, 'conn', None )
+    if conn is None:
+      conn = sqlite3.connect( self.fileName, timeout = self.timeout )
+      conn.text_factory = str
+      conn.execute( "PRAGMA journal_mode=WAL" )
+      conn.execute( "PRAGMA synchronous=NORMAL" )
+      self.__local.conn = conn
+    return conn
+
+  def get( self, transID, lfns ):
+    """ Get the valid cached replicas of some files of a transformation
+
+    :return: dict { lfn : list of SEs } of the files found in the cache
+    """
+    conn = self.__getConnection()
+    now = time.time()
+    replicas = {}
+    for chunk in breakListIntoChunks( list( lfns ), MAX_LFNS ):
+      req = "SELECT LFN, SEs FROM Replicas WHERE TransformationID=? AND ExpirationTime>? AND LFN IN (%s)" % \
+            ','.join( '?' * len( chunk ) )
+      for lfn, ses in conn.execute( req, [ transID, now ] + chunk ):
+        replicas[lfn] = ses.split( ',' )
+    return replicas
+
+  def put( self, transID, replicas, lifeTime = None ):
+    """ Store the replicas of some files of a transformation
+
+    :param dict replicas: { lfn : list of SEs }, the files without replica are not stored
+    :param int lifeTime: lifetime of these replicas in seconds, the default one if None
+    """
+    expirationTime = time.time() + ( self.lifeTime if lifeTime is None else lifeTime )
+    rows = [ ( transID, lfn, ','.join( ses ), expirationTime ) for lfn, ses in replicas.iteritems() if ses ]
+    if rows:
+      with self.__getConnection() as conn:
+        conn.executemany( "INSERT OR REPLACE INTO Replicas ( TransformationID, LFN, SEs, ExpirationTime ) "
+                          "VALUES ( ?, ?, ?, ? )", rows )
+    return len( rows )
+
+  def remove( self, transID, lfns = None ):
+    """ Remove some files of a transformation from the cache, or all of them
+
+    :return: number of removed entries
+    """
+    removed = 0
+    with self.__getConnection() as conn:
+      if lfns is None:
+        removed = conn.execute( "DELETE FROM Replicas WHERE TransformationID=?", [ transID ] ).rowcount
+      else:
+        for chunk in breakListIntoChunks( list( lfns ), MAX_LFNS ):
+          req = "DELETE FROM Replicas WHERE TransformationID=? AND LFN IN (%s)" % ','.join( '?' * len( chunk ) )
+          removed += conn.execute( req, [ transID ] + chunk ).rowcount
+    return removed
+
+  def purge( self, transID = None ):
+    """ Remove the expired entries, of one transformation or of all of them
+
+    :return: number of removed entries
+    """
+    req = "DELETE FROM Replicas WHERE ExpirationTime<=?"
+    args = [ time.time() ]
+    if transID is not None:
+      req += " AND TransformationID=?"
+      args.append( transID )
+    with self.__getConnection() as conn:
+      return conn.execute( req, args ).rowcount
+
+  def count( self, transID = None ):
+    """ Number of valid entries, for one transformation or for all of them
+    """
+    req = "SELECT COUNT(*) FROM Replicas WHERE ExpirationTime>?"
+    args = [ time.time() ]
+    if transID is not None:
+      req += " AND TransformationID=?"
+      args.append( transID )
+    return self.__getConnection().execute( req, args ).fetchone()[0]
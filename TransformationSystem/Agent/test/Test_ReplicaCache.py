@@ -0,0 +1,78 @@
+""" Unit tests for the on-disk replica cache of the TransformationAgent
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from DIRAC.TransformationSystem.Agent.ReplicaCache import ReplicaCache
+
+__RCSID__ = "$Id$"
+
+class ReplicaCacheTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.directory = tempfile.mkdtemp()
+    self.fileName = os.path.join( self.directory, 'cache', 'ReplicaCache.db' )
+    self.cache = ReplicaCache( self.fileName, lifeTime = 60 )
+    self.replicas = dict( ( '/vo/f%04d' % i, [ 'SE-A', 'SE-B' ] ) for i in range( 1200 ) )
+
+  def tearDown( self ):
+    shutil.rmtree( self.directory )
+
+  def test_getPut( self ):
+    self.assertEqual( self.cache.put( 1, self.replicas ), 1200 )
+    self.assertEqual( self.cache.put( 2, { '/vo/f0000' : [ 'SE-C' ], '/vo/empty' : [] } ), 1 )
+    self.assertEqual( self.cache.get( 1, list( self.replicas ) + [ '/vo/other' ] ), self.replicas )
+    self.assertEqual( self.cache.get( 2, [ '/vo/f0000', '/vo/f0001', '/vo/empty' ] ), { '/vo/f0000' : [ 'SE-C' ] } )
+    # Incremental update of one entry
+    self.cache.put( 1, { '/vo/f0001' : [ 'SE-C' ] } )
+    self.assertEqual( self.cache.get( 1, [ '/vo/f0001' ] ), { '/vo/f0001' : [ 'SE-C' ] } )
+    self.assertEqual( self.cache.count( 1 ), 1200 )
+    self.assertEqual( self.cache.count(), 1201 )
+    # Another cache on the same file sees the entries
+    self.assertEqual( ReplicaCache( self.fileName ).count(), 1201 )
+
+  def test_expiration( self ):
+    self.cache.put( 1, self.replicas, lifeTime = -1 )
+    self.cache.put( 1, { '/vo/f0000' : [ 'SE-A' ] } )
+    self.assertEqual( self.cache.get( 1, self.replicas ), { '/vo/f0000' : [ 'SE-A' ] } )
+    self.assertEqual( self.cache.purge( 2 ), 0 )
+    self.assertEqual( self.cache.purge(), 1199 )
+    self.assertEqual( self.cache.count( 1 ), 1 )
+
+  def test_remove( self ):
+    self.cache.put( 1, self.replicas )
+    self.cache.put( 2, self.replicas )
+    self.assertEqual( self.cache.remove( 1, sorted( self.replicas )[:600] + [ '/vo/other' ] ), 600 )
+    self.assertEqual( self.cache.count( 1 ), 600 )
+    self.assertEqual( self.cache.remove( 2 ), 1200 )
+    self.assertEqual( self.cache.count(), 600 )
+
+  def test_threads( self ):
+    errors = []
+    def worker( transID ):
+      try:
+        for i in range( 20 ):
+          self.cache.put( transID, { '/vo/t%d' % i : [ 'SE-A' ] } )
+          self.cache.get( transID, self.replicas )
+          time.sleep( 0.001 )
+      except Exception as x: #pylint: disable=broad-except
+        errors.append( x )
+    threads = [ threading.Thread( target = worker, args = ( transID, ) ) for transID in range( 4 ) ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual( errors, [] )
+    self.assertEqual( self.cache.count(), 80 )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ReplicaCacheTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -19,7 +19,7 @@ from DIRAC.Core.Utilities.List                            import stringListToStr
 from DIRAC.Core.Utilities.Shifter                         import setupShifterProxyInEnv
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations  import Operations
 from DIRAC.Core.Utilities.Subprocess                      import pythonCall
-from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuerySet
 
 __RCSID__ = "$Id$"
 
@@ -46,6 +46,10 @@ class TransformationDB( DB ):
 
     self.lock = threading.Lock()
     self.filters = []
+    # Input data queries of the transformations compiled for the current metadata fields,
+    # recompiled when the filters version changes
+    self.filtersVersion = 0
+    self.querySet = None
     res = self.__updateFilters()
     if not res['OK']:
       gLogger.fatal( "Failed to create filters" )
@@ -177,6 +181,7 @@ class TransformationDB( DB ):
     # If the transformation has an input data specification
     if fileMask:
       self.filters.append( ( transID, json.loads( fileMask ) ) )
+      self.filtersVersion += 1
 
     if inheritedFrom:
       res = self._getTransformationID( inheritedFrom, connection = connection )
@@ -384,6 +389,7 @@ class TransformationDB( DB ):
       if mask:
         resultList.append( ( transID, json.loads( mask ) ) )
     self.filters = resultList
+    self.filtersVersion += 1
     return S_OK( resultList )
 
   def __filterFile( self, lfn, filters = None ):
@@ -1430,6 +1436,24 @@ class TransformationDB( DB ):
     resDict = {'Successful':successful, 'Failed':failed}
     return S_OK( resDict )
 
+  def __getFilesUserMetadata( self, catalog, lfns ):
+    """ Get the user metadata of the files with one bulk call, or file by file from the catalogs
+        that do not provide it
+    """
+    res = catalog.getFileUserMetadataBulk( lfns )
+    if res['OK']:
+      return res
+    gLogger.warn( "Failed to getFileUserMetadataBulk, getting the metadata file by file", res['Message'] )
+    successful = {}
+    failed = {}
+    for lfn in lfns:
+      res = catalog.getFileUserMetadata( lfn )
+      if res['OK']:
+        successful[lfn] = res['Value']
+      else:
+        failed[lfn] = res['Message']
+    return S_OK( {'Successful':successful, 'Failed':failed} )
+
   def addFile( self, fileDicts, force = False, connection = False ):
     """ Add the supplied lfn to the Transformations and to the DataFiles table if it passes the filter
     """
@@ -1438,41 +1462,38 @@ class TransformationDB( DB ):
     failed = {}
     # Determine which files pass the filters and are to be added to transformations
     transFiles = {}
-    filesToAdd = []
     catalog = FileCatalog()
+    res = self.__getQuerySet( catalog )
+    if not res['OK']:
+      return res
+    querySet = res['Value']
 
-    for lfn in fileDicts:
-      gLogger.info( "addFile: Attempting to add file %s" % lfn )
-      res = catalog.getFileUserMetadata( lfn )
-      if not res['OK']:
-        gLogger.error( "Failed to getFileUserMetadata for file", "%s: %s" % ( lfn, res['Message'] ) )
-        failed[lfn] = res['Message']
-        continue
-      else:
-        metadatadict = res['Value']
-      gLogger.info( 'Filter file with metadata', metadatadict )
-      transIDs = self._filterFileByMetadata( metadatadict )
-      gLogger.info( 'Transformations passing the filter: %s' % transIDs )
+    res = self.__getFilesUserMetadata( catalog, fileDicts.keys() )
+    if not res['OK']:
+      return res
+    for lfn, error in res['Value']['Failed'].items():
+      gLogger.error( "Failed to getFileUserMetadata for file", "%s: %s" % ( lfn, error ) )
+      failed[lfn] = error
+
+    for lfn, metadatadict in res['Value']['Successful'].items():
+      transIDs = querySet.getMatchingQueries( metadatadict )
+      gLogger.verbose( 'Transformations passing the filter', '%s: %s' % ( lfn, transIDs ) )
       if not ( transIDs or force ):  # not clear how force should be used for
-        successful[lfn] = False  # True -> False bug fix: otherwise it is set to True even if transIDs is empty.
+        successful[lfn] = False
       else:
-        filesToAdd.append( lfn )
         for trans in transIDs:
-          if trans not in transFiles:
-            transFiles[trans] = []
-          transFiles[trans].append( lfn )
+          transFiles.setdefault( trans, [] ).append( lfn )
 
-      # Add the files to the transformations
-      gLogger.info( 'Files to add to transformations:', filesToAdd )
-      if filesToAdd:
-        for transID, lfns in transFiles.iteritems():
-          res = self.addFilesToTransformation( transID, lfns )
-          if not res['OK']:
-            gLogger.error( "Failed to add files to transformation", "%s %s" % ( transID, res['Message'] ) )
-            return res
-          else:
-            for lfn in lfns:
-              successful[lfn] = True
+    # Add the files to the transformations
+    for transID, lfns in transFiles.iteritems():
+      gLogger.info( 'Adding %d files to transformation %s' % ( len( lfns ), transID ) )
+      res = self.addFilesToTransformation( transID, lfns )
+      if not res['OK']:
+        gLogger.error( "Failed to add files to transformation", "%s %s" % ( transID, res['Message'] ) )
+        return res
+      else:
+        for lfn in lfns:
+          successful[lfn] = True
 
     res = S_OK( {'Successful':successful, 'Failed':failed } )
     return res
@@ -1601,32 +1622,33 @@ class TransformationDB( DB ):
 
   def _filterFileByMetadata( self, metadatadict ):
     """Pass the input metadatadict through those currently active"""
-    transIDs = []
-    queries = self.filters
-    catalog = FileCatalog()
-    gLogger.info( 'Filter file by queries', queries )
-    res = catalog.getMetadataFields()
+    res = self.__getQuerySet( FileCatalog() )
+    if not res['OK']:
+      return res
+    transIDs = res['Value'].getMatchingQueries( metadatadict )
+    gLogger.info( 'Transformations passing the filter with metadata %s: %s' % ( metadatadict, transIDs ) )
+    return transIDs
 
+  def __getQuerySet( self, catalog ):
+    """ Get the input data queries of the transformations compiled for the current metadata fields
+    """
+    res = catalog.getMetadataFields()
     if not res['OK']:
       gLogger.error( "Error in getMetadataFields: %s" % res['Message'] )
       return res
     if not res['Value']:
       gLogger.error( "Error: no metadata fields defined" )
-      return res
+      return S_ERROR( "No metadata fields defined" )
     typeDict = res['Value']['FileMetaFields']
     typeDict.update( res['Value']['DirectoryMetaFields'] )
 
-    for transID, query in queries:
-      mq = MetaQuery( query, typeDict )
-      gLogger.info( "Apply query %s to metadata %s" % ( mq.getMetaQuery(), metadatadict ) )
-      res = mq.applyQuery( metadatadict )
-      if not res['OK']:
-        gLogger.error( "Error in applying query: %s" % res['Message'] )
-        return res
-      elif res['Value']:
-        gLogger.info( "Apply query result is True" )
-        transIDs.append( transID )
-      else:
-        gLogger.info( "Apply query result is False" )
-
-    return transIDs
+    # The version is read before the filters so that a concurrent change triggers a new compilation
+    filtersVersion = self.filtersVersion
+    cached = self.querySet
+    if cached and cached[0] == filtersVersion and cached[1].typeDict == typeDict:
+      return S_OK( cached[1] )
+    querySet = MetaQuerySet( list( self.filters ), typeDict )
+    for transID, error in querySet.errors.items():
+      gLogger.error( "Illegal input data query", "for transformation %s: %s" % ( transID, error ) )
+    self.querySet = ( filtersVersion, querySet )
+    return S_OK( querySet )
@@ -65,6 +65,18 @@ class Matcher( object ):
   def selectJob( self, resourceDescription, credDict ):
     """ Main job selection function to find the highest priority job matching the resource capacity
     """
+    jobList = self.selectJobs( resourceDescription, credDict, 1 )
+    if not jobList:
+      return {}
+    return jobList[0]
+
+  def selectJobs( self, resourceDescription, credDict, maxJobs ):
+    """ Find up to maxJobs of the highest priority jobs matching the resource capacity,
+        for resources that run several jobs at once, like multi-slot pilots.
+        The jobs are reserved in a single match of the TaskQueueDB
+
+        :return: list of dictionaries, one per job, as the one returned by selectJob
+    """
 
     startTime = time.time()
 
@@ -86,16 +98,45 @@ class Matcher( object ):
     gLogger.info( 'Resource description for matching', printDict( toPrintDict ) )
 
     negativeCond = self.limiter.getNegativeCondForSite( resourceDict['Site'] )
-    result = self.tqDB.matchAndGetJob( resourceDict, negativeCond = negativeCond )
+    result = self.tqDB.matchAndGetJobs( resourceDict, maxJobs, negativeCond = negativeCond )
 
     if not result['OK']:
       raise RuntimeError( result['Message'] )
     result = result['Value']
     if not result['matchFound']:
       self.log.info( "No match found" )
-      return {}
+      return []
+
+    jobList = []
+    jobError = None
+    for jobID, _tqID in result['jobs']:
+      # The other jobs are already reserved, one that can not be served must not make them fail
+      try:
+        jobList.append( self._getMatchedJob( resourceDict, jobID ) )
+      except RuntimeError as rte:
+        if len( result['jobs'] ) > 1:
+          self.log.error( "Could not serve matched job", "%s: %s" % ( jobID, rte ) )
+        jobError = rte
+        # It is no longer in the task queues
+        self._rescheduleMatchedJob( jobID )
+    if not jobList:
+      raise jobError
+
+    matchTime = time.time() - startTime
+    self.log.info( "Match time: [%s]" % str( matchTime ) )
+    gMonitor.addMark( "matchTime", matchTime )
+
+    pilotInfoReportedFlag = resourceDict.get( 'PilotInfoReportedFlag', False )
+    if not pilotInfoReportedFlag:
+      self._updatePilotInfo( resourceDict )
+    for resultDict in jobList:
+      self._updatePilotJobMapping( resourceDict, resultDict['JobID'] )
+
+    return jobList
 
-    jobID = result['jobId']
+  def _getMatchedJob( self, resourceDict, jobID ):
+    """ Mark a job taken out of the task queues as matched and get what the resource needs to run it
+    """
     resAtt = self.jobDB.getJobAttributes( jobID, ['OwnerDN', 'OwnerGroup', 'Status'] )
     if not resAtt['OK']:
       raise RuntimeError( 'Could not retrieve job attributes' )
@@ -118,29 +159,15 @@ class Matcher( object ):
     resultDict['JDL'] = result['Value']
     resultDict['JobID'] = jobID
 
-    matchTime = time.time() - startTime
-    self.log.info( "Match time: [%s]" % str( matchTime ) )
-    gMonitor.addMark( "matchTime", matchTime )
-
     # Get some extra stuff into the response returned
     resOpt = self.jobDB.getJobOptParameters( jobID )
     if resOpt['OK']:
       for key, value in resOpt['Value'].items():
         resultDict[key] = value
-    resAtt = self.jobDB.getJobAttributes( jobID, ['OwnerDN', 'OwnerGroup'] )
-    if not resAtt['OK']:
-      raise RuntimeError( 'Could not retrieve job attributes' )
-    if not resAtt['Value']:
-      raise RuntimeError( 'No attributes returned for job' )
 
     if self.opsHelper.getValue( "JobScheduling/CheckMatchingDelay", True ):
       self.limiter.updateDelayCounters( resourceDict['Site'], jobID )
 
-    pilotInfoReportedFlag = resourceDict.get( 'PilotInfoReportedFlag', False )
-    if not pilotInfoReportedFlag:
-      self._updatePilotInfo( resourceDict )
-    self._updatePilotJobMapping( resourceDict, jobID )
-
     resultDict['DN'] = resAtt['Value']['OwnerDN']
     resultDict['Group'] = resAtt['Value']['OwnerGroup']
     resultDict['PilotInfoReportedFlag'] = True
@@ -148,6 +175,23 @@ class Matcher( object ):
     return resultDict
 
 
+  def _rescheduleMatchedJob( self, jobID ):
+    """ Put back a job taken out of the task queues that could not be given to the resource,
+        if it is still waiting for it. Do not fail if errors happen here
+    """
+    result = self.jobDB.getJobAttributes( jobID, ['Status'] )
+    if not result['OK']:
+      self.log.error( "Could not get the status of the job to reschedule", "%s: %s" % ( jobID, result['Message'] ) )
+      return
+    # Jobs removed, or in another state, were taken out of the task queues on purpose
+    if result['Value'].get( 'Status' ) not in ( 'Waiting', 'Matched' ):
+      return
+    result = self.jobDB.rescheduleJob( jobID )
+    if not result['OK']:
+      self.log.error( "Could not reschedule matched job", "%s: %s" % ( jobID, result['Message'] ) )
+      return
+    self.log.info( "Rescheduled matched job that could not be served", str( jobID ) )
+
   def _getResourceDict( self, resourceDescription, credDict ):
     """ from resourceDescription to resourceDict (just various mods)
     """
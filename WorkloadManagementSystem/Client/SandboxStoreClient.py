@@ -6,7 +6,6 @@ __RCSID__ = "$Id$"
 
 import os
 import tarfile
-import hashlib
 import tempfile
 import re
 import StringIO
@@ -20,6 +19,11 @@ from DIRAC.Resources.Storage.StorageElement import StorageElement
 from DIRAC.Core.Utilities.ReturnValues import returnSingleResult
 from DIRAC.Core.Utilities.File import getGlobbedTotalSize
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getVOForGroup
+from DIRAC.WorkloadManagementSystem.Utilities.SandboxManifest import getSandboxManifest, writeSandboxTarball, \
+                                                                     getDataMD5, COMPRESSION_LEVEL
+
+# Sandboxes that can't be described by a manifest are compressed with bz2 up to this size, with gzip beyond
+LARGE_SANDBOX_SIZE = 10 * 1048576
 
 class SandboxStoreClient( object ):
 
@@ -113,20 +117,24 @@ class SandboxStoreClient( object ):
     if errorFiles:
       return S_ERROR( "Failed to locate files: %s" % ", ".join( errorFiles ) )
 
+    result = getSandboxManifest( files2Upload )
+    if not result[ 'OK' ]:
+      return result
+    manifestData = result[ 'Value' ]
+
     try:
       fd, tmpFilePath = tempfile.mkstemp( prefix = "LDSB." )
       os.close( fd )
     except Exception as e:
       return S_ERROR( "Cannot create temporal file: %s" % str( e ) )
 
-    with tarfile.open( name = tmpFilePath, mode = "w|bz2" ) as tf:
-      for sFile in files2Upload:
-        if isinstance( sFile, basestring ):
-          tf.add( os.path.realpath( sFile ), os.path.basename( sFile ), recursive = True )
-        elif isinstance( sFile, StringIO.StringIO ):
-          tarInfo = tarfile.TarInfo( name = 'jobDescription.xml' )
-          tarInfo.size = len( sFile.buf )
-          tf.addfile( tarinfo = tarInfo, fileobj = sFile )
+    if manifestData:
+      manifest, sources = manifestData
+      extension = "tar.gz"
+      with open( tmpFilePath, "wb" ) as tmpFile:
+        writeSandboxTarball( manifest, lambda entry: self.__openSource( sources[ entry[ 'Hash' ] ] ), tmpFile )
+    else:
+      extension = self.__writeTarball( files2Upload, tmpFilePath )
 
     if sizeLimit > 0:
       # Evaluate the compressed size of the sandbox
@@ -135,15 +143,18 @@ class SandboxStoreClient( object ):
         result[ 'SandboxFileName' ] = tmpFilePath
         return result
 
-    oMD5 = hashlib.md5()
     with open( tmpFilePath, "rb" ) as fd:
-      bData = fd.read( 10240 )
-      while bData:
-        oMD5.update( bData )
-        bData = fd.read( 10240 )
-
-    transferClient = self.__getTransferClient()
-    result = transferClient.sendFile( tmpFilePath, ( "%s.tar.bz2" % oMD5.hexdigest(), assignTo ) )
+      sbName = "%s.%s" % ( getDataMD5( fd ), extension )
+
+    # The same sandbox may be in the store already, parametric jobs share their input sandboxes
+    result = self.__getExistingSandbox( sbName, os.path.getsize( tmpFilePath ), assignTo )
+    if not result[ 'OK' ] or not result[ 'Value' ]:
+      result = None
+      if manifestData:
+        result = self.__uploadMissingFiles( sbName, manifest, sources, assignTo )
+      if not result:
+        transferClient = self.__getTransferClient()
+        result = transferClient.sendFile( tmpFilePath, ( sbName, assignTo ) )
     result[ 'SandboxFileName' ] = tmpFilePath
     try:
       if result['OK']:
@@ -152,6 +163,98 @@ class SandboxStoreClient( object ):
       pass
     return result
 
+  @staticmethod
+  def __openSource( source ):
+    """ Open a file of the sandbox, path or StringIO, for reading
+    """
+    if isinstance( source, StringIO.StringIO ):
+      return StringIO.StringIO( source.getvalue() )
+    return open( source, "rb" )
+
+  @staticmethod
+  def __writeTarball( fileList, tarFilePath ):
+    """ Pack the files and directories into a tarball, compressed with gzip if they are big
+
+    :return: extension of the tarball
+    """
+    totalSize = 0
+    for sFile in fileList:
+      if isinstance( sFile, basestring ):
+        totalSize += getGlobbedTotalSize( sFile )
+    if totalSize > LARGE_SANDBOX_SIZE:
+      extension = "tar.gz"
+      tf = tarfile.open( name = tarFilePath, mode = "w:gz", compresslevel = COMPRESSION_LEVEL )
+    else:
+      extension = "tar.bz2"
+      tf = tarfile.open( name = tarFilePath, mode = "w|bz2" )
+    with tf:
+      for sFile in fileList:
+        if isinstance( sFile, basestring ):
+          tf.add( os.path.realpath( sFile ), os.path.basename( sFile ), recursive = True )
+        elif isinstance( sFile, StringIO.StringIO ):
+          tarInfo = tarfile.TarInfo( name = 'jobDescription.xml' )
+          tarInfo.size = len( sFile.buf )
+          tf.addfile( tarinfo = tarInfo, fileobj = sFile )
+    return extension
+
+  def __getExistingSandbox( self, sbName, sbSize, assignTo ):
+    """ Ask the store for a sandbox with this name and size, and assign it if it's there
+
+    :return: S_OK( sandbox URL ) or S_OK( False ) if it has to be uploaded
+    """
+    rpcClient = self.__getRPCClient()
+    result = rpcClient.sandboxExists( sbName, sbSize )
+    if not result[ 'OK' ]:
+      # An old service without the check
+      gLogger.verbose( "Cannot check if the sandbox exists", result[ 'Message' ] )
+      return S_OK( False )
+    sbURL = result[ 'Value' ]
+    if not sbURL:
+      return S_OK( False )
+    gLogger.info( "Sandbox already in the store", sbURL )
+    if assignTo:
+      result = rpcClient.assignSandboxesToEntities( dict( [ ( key, [ ( sbURL, assignTo[ key ] ) ] )
+                                                            for key in assignTo ] ) )
+      if not result[ 'OK' ]:
+        return result
+    return S_OK( sbURL )
+
+  def __uploadMissingFiles( self, sbName, manifest, sources, assignTo ):
+    """ Upload only the files of the manifest the store does not have, packed by hash.
+        The store builds the sandbox out of the manifest.
+
+    :return: the result of the upload, None if the store can't do it
+    """
+    rpcClient = self.__getRPCClient()
+    result = rpcClient.getMissingSandboxFiles( [ entry[ 'Hash' ] for entry in manifest ] )
+    if not result[ 'OK' ]:
+      gLogger.verbose( "Cannot get the missing sandbox files", result[ 'Message' ] )
+      return None
+    missingHashes = set( result[ 'Value' ] )
+    gLogger.verbose( "Uploading %s files of the %s of the sandbox" % ( len( missingHashes ), len( manifest ) ) )
+    try:
+      fd, filesTarPath = tempfile.mkstemp( prefix = "LDSBF." )
+      os.close( fd )
+    except Exception as e:
+      return S_ERROR( "Cannot create temporal file: %s" % str( e ) )
+    try:
+      filesManifest = []
+      for entry in manifest:
+        if entry[ 'Hash' ] in missingHashes:
+          missingHashes.discard( entry[ 'Hash' ] )
+          filesManifest.append( dict( entry, Name = entry[ 'Hash' ] ) )
+      with open( filesTarPath, "wb" ) as filesTar:
+        if filesManifest:
+          writeSandboxTarball( filesManifest, lambda entry: self.__openSource( sources[ entry[ 'Hash' ] ] ),
+                               filesTar )
+      transferClient = self.__getTransferClient()
+      return transferClient.sendFile( filesTarPath, ( sbName, assignTo, manifest ) )
+    finally:
+      try:
+        os.unlink( filesTarPath )
+      except OSError:
+        pass
+
   ##############
   # Download sandbox
 
@@ -10,7 +10,7 @@ import StringIO
 from mock import MagicMock
 
 from DIRAC.DataManagementSystem.Client.test.mock_DM import dm_mock
-from DIRAC import S_OK
+from DIRAC import S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.Client.DownloadInputData import DownloadInputData
 from DIRAC.WorkloadManagementSystem.Client.Matcher import Matcher
 from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient import SandboxStoreClient
@@ -144,6 +144,46 @@ class MatcherTestCase( ClientsTestCase ):
 
     self.assertEqual( res, resExpected )
 
+  def test_selectJobs( self ):
+
+    self.matcher._getResourceDict = MagicMock( return_value = {'Site': 'DIRAC.Jenkins.ch',
+                                                               'Setup': 'LHCb-Certification',
+                                                               'CPUTime': 1080000} )
+    self.matcher.limiter = MagicMock()
+    self.tqDBMock.matchAndGetJobs.return_value = S_OK( {'matchFound': True,
+                                                        'jobs': [( 1, 10 ), ( 2, 10 ), ( 3, 11 )],
+                                                        'tqMatch': {}} )
+    self.jobDBMock.getJobAttributes.side_effect = [S_OK( {'OwnerDN': '/my/DN', 'OwnerGroup': 'myGroup', 'Status': 'Waiting'} ),
+                                                   S_OK( {'OwnerDN': '/my/DN', 'OwnerGroup': 'myGroup', 'Status': 'Killed'} ),
+                                                   S_OK( {'Status': 'Killed'} ),
+                                                   S_OK( {'OwnerDN': '/my/DN', 'OwnerGroup': 'myGroup', 'Status': 'Waiting'} )]
+    self.jobDBMock.getJobJDL.return_value = S_OK( '[]' )
+    self.jobDBMock.getJobOptParameters.return_value = S_OK( {} )
+    self.tqDBMock.deleteJob.return_value = S_OK( False )
+
+    # the job that is not waiting any more is skipped, the others are served
+    res = self.matcher.selectJobs( {}, {}, 3 )
+    self.assertEqual( [jobDict['JobID'] for jobDict in res], [1, 3] )
+    self.assertEqual( res[0]['DN'], '/my/DN' )
+    self.assertEqual( self.tqDBMock.matchAndGetJobs.call_args[0][1], 3 )
+    self.assertFalse( self.jobDBMock.rescheduleJob.called )
+
+    # a job that can not be served is put back
+    self.tqDBMock.matchAndGetJobs.return_value = S_OK( {'matchFound': True,
+                                                        'jobs': [( 1, 10 ), ( 2, 10 )],
+                                                        'tqMatch': {}} )
+    self.jobDBMock.getJobAttributes.side_effect = None
+    self.jobDBMock.getJobAttributes.return_value = S_OK( {'OwnerDN': '/my/DN', 'OwnerGroup': 'myGroup', 'Status': 'Waiting'} )
+    self.jobDBMock.getJobJDL.side_effect = [S_OK( '[]' ), S_ERROR( 'No JDL' )]
+    self.jobDBMock.rescheduleJob.return_value = S_OK( 2 )
+    res = self.matcher.selectJobs( {}, {}, 2 )
+    self.assertEqual( [jobDict['JobID'] for jobDict in res], [1] )
+    self.jobDBMock.rescheduleJob.assert_called_once_with( 2 )
+
+    self.tqDBMock.matchAndGetJobs.return_value = S_OK( {'matchFound': False, 'tqMatch': {}} )
+    self.assertEqual( self.matcher.selectJobs( {}, {}, 3 ), [] )
+    self.assertEqual( self.matcher.selectJob( {}, {} ), {} )
+
 #############################################################################
 
 class SandboxStoreTestCaseSuccess( ClientsTestCase ):
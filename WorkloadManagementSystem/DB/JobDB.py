@@ -84,6 +84,8 @@ class JobDB( DB ):
     self.JOB_STATES = ['Received', 'Checking', 'Staging', 'Waiting', 'Matched',
                        'Running', 'Stalled', 'Done', 'Completed', 'Failed']
     self.JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
+    # States that a heart beat written by the heart beat buffer sets back to Running
+    self.HEART_BEAT_STATES = ['Matched', 'Running', 'Stalled']
     self.jdl2DBParameters = ['JobName', 'JobType', 'JobGroup']
 
     self.log.info( "MaxReschedule:  %s" % self.maxRescheduling )
@@ -692,6 +694,57 @@ class JobDB( DB ):
 
     return S_OK()
 
+#############################################################################
+  def setJobsStatus( self, statusList ):
+    """ Set the status of several jobs in a single transaction. The jobs getting the same
+        status are updated together. As the JobStateUpdate service does for single jobs,
+        EndExecTime is set for jobs reaching a final state and StartExecTime for jobs
+        Running the Application
+
+    :param list statusList: ( jobID, status, minor, application, date ) tuples, empty values
+                            are not changed, date is the time of the change or None for now
+    """
+    groups = {}
+    for jobID, status, minor, application, date in statusList:
+      groups.setdefault( ( status, minor, application, date ), [] ).append( str( int( jobID ) ) )
+
+    cmdList = []
+    for ( status, minor, application, date ), jobIDs in groups.items():
+      attr = []
+      for attrName, value in ( ( 'Status', status ), ( 'MinorStatus', minor ), ( 'ApplicationStatus', application ) ):
+        if value:
+          ret = self._escapeString( value )
+          if not ret['OK']:
+            return ret
+          attr.append( "%s=%s" % ( attrName, ret['Value'] ) )
+      if not attr:
+        continue
+      # Do not update the LastUpdate time stamp if setting the Stalled status
+      if status != "Stalled":
+        attr.append( "LastUpdateTime=UTC_TIMESTAMP()" )
+      e_jobIDs = ','.join( jobIDs )
+      cmdList.append( 'UPDATE Jobs SET %s WHERE JobID IN (%s)' % ( ', '.join( attr ), e_jobIDs ) )
+
+      execTime = 'UTC_TIMESTAMP()'
+      if date:
+        ret = self._escapeString( str( date ) )
+        if not ret['OK']:
+          return ret
+        execTime = ret['Value']
+      if status in ( 'Done', 'Completed', 'Failed' ):
+        cmdList.append( "UPDATE Jobs SET EndExecTime=%s WHERE JobID IN (%s) AND EndExecTime IS NULL" % \
+                        ( execTime, e_jobIDs ) )
+      if status == 'Running' and minor == 'Application':
+        cmdList.append( "UPDATE Jobs SET StartExecTime=%s WHERE JobID IN (%s) AND StartExecTime IS NULL" % \
+                        ( execTime, e_jobIDs ) )
+
+    if not cmdList:
+      return S_OK()
+    result = self._transaction( cmdList )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.setJobsStatus: failed to set the status: %s' % result['Message'] )
+    return S_OK()
+
 #############################################################################
   def setEndExecTime( self, jobID, endDate = None ):
     """ Set EndExecTime time stamp
@@ -1950,6 +2003,71 @@ class JobDB( DB ):
     else:
       return S_ERROR( 'Failed to store some or all the parameters' )
 
+#####################################################################################
+  def setHeartBeatDataBulk( self, heartBeats ):
+    """ Add the heart beat data of several jobs to the database, with one statement per table
+
+    :param list heartBeats: dictionaries with the JobID, its last HeartBeatTime (datetime),
+                            the StaticData dictionary to set as job parameters and the
+                            DynamicData, list of ( datetime, dictionary ) for the heart beat log
+    """
+    if not heartBeats:
+      return S_OK()
+
+    timeCases = []
+    jobIDs = []
+    parameterValues = []
+    loggingValues = []
+    for heartBeat in heartBeats:
+      jobID = int( heartBeat['JobID'] )
+      jobIDs.append( str( jobID ) )
+      timeCases.append( "WHEN %d THEN '%s'" % ( jobID, Time.toString( heartBeat['HeartBeatTime'] ) ) )
+      for name, value in heartBeat['StaticData'].items():
+        ret = self._escapeValues( [str( name ), str( value )] )
+        if not ret['OK']:
+          return ret
+        parameterValues.append( "(%d,%s)" % ( jobID, ','.join( ret['Value'] ) ) )
+      for heartBeatTime, dynamicData in heartBeat['DynamicData']:
+        e_time = "'%s'" % Time.toString( heartBeatTime )
+        for key, value in dynamicData.items():
+          ret = self._escapeValues( [str( key ), str( value )] )
+          if not ret['OK']:
+            self.log.warn( 'Failed to escape heart beat data %s' % key )
+            continue
+          loggingValues.append( "(%d,%s,%s)" % ( jobID, ','.join( ret['Value'] ), e_time ) )
+
+    # The heart beats are written some time after they arrived. A heart beat only sets back to Running
+    # the jobs in a state it may override, and not if the status was changed after the beat arrived.
+    # MySQL assigns from left to right, so the Status expression sees the new HeartBeatTime
+    beatStates = ','.join( [ "'%s'" % status for status in self.HEART_BEAT_STATES ] )
+    req = "UPDATE Jobs SET HeartBeatTime=CASE JobID %s END, " \
+          "Status=IF(Status IN (%s) AND (LastUpdateTime IS NULL OR LastUpdateTime<=HeartBeatTime),'Running',Status) " \
+          "WHERE JobID IN (%s)"
+    result = self._update( req % ( ' '.join( timeCases ), beatStates, ','.join( jobIDs ) ) )
+    if not result['OK']:
+      return S_ERROR( 'Failed to set the heart beat time: ' + result['Message'] )
+
+    ok = True
+    if parameterValues:
+      req = 'REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( parameterValues )
+      result = self._update( req )
+      if not result['OK']:
+        ok = False
+        self.log.warn( result['Message'] )
+
+    if loggingValues:
+      # Beats of a job within the same second share the key, and jobs may be gone meanwhile
+      req = "INSERT IGNORE INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s"
+      result = self._update( req % ','.join( loggingValues ) )
+      if not result['OK']:
+        ok = False
+        self.log.warn( result['Message'] )
+
+    if ok:
+      return S_OK()
+    else:
+      return S_ERROR( 'Failed to store some or all the parameters' )
+
 #####################################################################################
   def getHeartBeatData( self, jobID ):
     """ Retrieve the job's heart beat data
@@ -2,6 +2,7 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
     getJobLoggingInfo()
     getWMSTimeStamps()
 """
@@ -48,6 +49,44 @@ class JobLoggingDB( DB ):
     event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
     self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
 
+    _date, time_order = self.__getStatusTime( date )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
+           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
+
+    return self._update( cmd )
+
+#############################################################################
+  def addLoggingRecords( self, records ):
+    """ Add several entries to the JobLoggingDB table with a single statement
+
+    :param list records: ( jobID, status, minor, application, date, source ) tuples, with
+                         the same meaning as the addLoggingRecord arguments
+    """
+    if not records:
+      return S_OK()
+    self.gLogger.info( "Adding %s logging records" % len( records ) )
+
+    valueList = []
+    for jobID, status, minor, application, date, source in records:
+      _date, time_order = self.__getStatusTime( date )
+      result = self._escapeValues( [ status or 'idem', minor or 'idem', application or 'idem',
+                                     str( _date ), source or 'Unknown' ] )
+      if not result['OK']:
+        return result
+      e_status, e_minor, e_application, e_date, e_source = result['Value']
+      valueList.append( "(%d,%s,%s,%s,%s,%f,%s)" % ( int( jobID ), e_status, e_minor, e_application,
+                                                     e_date, time_order, e_source ) )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ','.join( valueList )
+    return self._update( cmd )
+
+#############################################################################
+  def __getStatusTime( self, date ):
+    """ Get the UTC datetime of a logging record and its float time order
+    """
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -74,12 +113,7 @@ class JobLoggingDB( DB ):
         _date = Time.dateTime()
         epoc = time.mktime( _date.timetuple() ) - MAGIC_EPOC_NUMBER
         time_order = round( epoc, 3 )
-
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
-
-    return self._update( cmd )
+    return _date, time_order
 
 #############################################################################
   def getJobLoggingInfo( self, jobID ):
@@ -313,6 +313,17 @@ class SandboxMetadataDB( DB ):
         return result
     return S_OK()
 
+  def getSandboxSize( self, sbId ):
+    """
+    Get the size in bytes the sandbox was registered with
+    """
+    result = self._query( "SELECT Bytes FROM `sb_SandBoxes` WHERE SBId=%d" % int( sbId ) )
+    if not result[ 'OK' ]:
+      return result
+    if not result[ 'Value' ]:
+      return S_ERROR( "Sandbox %s does not exist" % sbId )
+    return S_OK( result[ 'Value' ][0][0] )
+
   def getSandboxId( self, SEName, SEPFN, requesterName, requesterGroup ):
     """
     Get the sandboxId if it exists
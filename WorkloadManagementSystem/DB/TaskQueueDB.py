@@ -4,6 +4,8 @@
 __RCSID__ = "$Id"
 
 import random
+import threading
+import time
 from DIRAC  import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.private.SharesCorrector import SharesCorrector
 from DIRAC.WorkloadManagementSystem.private.Queues import maxCPUSegments
@@ -42,6 +44,11 @@ class TaskQueueDB( DB ):
     self.__opsHelper = Operations()
     self.__ensureInsertionIsSingle = False
     self.__sharesCorrector = SharesCorrector( self.__opsHelper )
+    self.__tqIndex = None
+    self.__tqIndexLock = threading.Lock()
+    self.__tqIndexFromTQId = 0
+    self.__tqIndexUpdateTime = 0
+    self.__tqIndexRefreshTime = 5
     result = self.__initializeDB()
     if not result[ 'OK' ]:
       raise Exception( "Can't create tables: %s" % result[ 'Message' ] )
@@ -59,6 +66,96 @@ class TaskQueueDB( DB ):
       return result
     return S_OK( [ row[0] for row in result[ 'Value' ] ] )
 
+  def enableTaskQueueIndex( self, refreshTime = 5 ):
+    """ Match the task queues with an in-memory index instead of querying the DB, only the job
+        rows are taken from the DB. Task queues created by other processes are added to the index
+        at most refreshTime seconds later, and syncTaskQueueIndex has to be called periodically to
+        see the deletions and the priorities set by other processes
+    """
+    from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+    self.__tqIndexRefreshTime = refreshTime
+    self.__tqIndex = TaskQueueIndex()
+    return self.syncTaskQueueIndex()
+
+  def syncTaskQueueIndex( self ):
+    """ Load all the task queues from the DB into the index
+    """
+    if not self.__tqIndex:
+      return S_OK( 0 )
+    return self.__updateTaskQueueIndex( fullSync = True )
+
+  def __updateTaskQueueIndex( self, fullSync = False ):
+    """ Load the task queues into the index, all of them or the ones created since the last update.
+        Task queues are immutable once their jobs can be matched, but a new task queue gets its
+        requirements after being inserted: it is only loaded once enabled, when its first job is in
+    """
+    if not self.__tqIndexLock.acquire( fullSync ):
+      # Another thread is updating it
+      return S_OK( 0 )
+    try:
+      if fullSync:
+        fromTQId = 0
+      else:
+        fromTQId = self.__tqIndexFromTQId
+      result = self.__getTaskQueueDefinitions( fromTQId )
+      if not result[ 'OK' ]:
+        self.log.error( "Could not update the task queue index", result[ 'Message' ] )
+        return result
+      tqDefs = {}
+      notReady = []
+      for tqId, tqDef in result[ 'Value' ].items():
+        if tqDef.pop( 'Enabled' ) >= 1 or self.__tqIndex.hasTaskQueue( tqId ):
+          tqDefs[ tqId ] = tqDef
+        else:
+          notReady.append( tqId )
+      if fullSync:
+        self.__tqIndex.setTaskQueues( tqDefs )
+      else:
+        for tqId in tqDefs:
+          self.__tqIndex.addTaskQueue( tqId, tqDefs[ tqId ] )
+      if notReady:
+        self.__tqIndexFromTQId = min( notReady ) - 1
+      else:
+        self.__tqIndexFromTQId = max( [ fromTQId ] + list( tqDefs ) )
+      self.__tqIndexUpdateTime = time.time()
+      return S_OK( len( tqDefs ) )
+    finally:
+      self.__tqIndexLock.release()
+
+  def __getTaskQueueDefinitions( self, fromTQId = 0 ):
+    """ Get the definition of the task queues with an ID greater than fromTQId,
+        as retrieveTaskQueues does but including the empty ones and the Enabled flag
+    """
+    sqlCmd = "SELECT TQId, Priority, Enabled, %s FROM `tq_TaskQueues` WHERE TQId > %d" % ( ", ".join( singleValueDefFields ),
+                                                                                         fromTQId )
+    retVal = self._query( sqlCmd )
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Can't retrieve task queues info: %s" % retVal[ 'Message' ] )
+    tqDefs = {}
+    for record in retVal[ 'Value' ]:
+      tqDefs[ record[0] ] = { 'Priority' : record[1], 'Enabled' : record[2] }
+      for iP in range( len( singleValueDefFields ) ):
+        tqDefs[ record[0] ][ singleValueDefFields[ iP ] ] = record[ 3 + iP ]
+    if not tqDefs:
+      return S_OK( tqDefs )
+    for field in multiValueDefFields:
+      retVal = self._query( "SELECT TQId, Value FROM `tq_TQTo%s` WHERE TQId > %d" % ( field, fromTQId ) )
+      if not retVal[ 'OK' ]:
+        return S_ERROR( "Can't retrieve task queues field %s info: %s" % ( field, retVal[ 'Message' ] ) )
+      for tqId, value in retVal[ 'Value' ]:
+        if tqId in tqDefs:
+          tqDefs[ tqId ].setdefault( field, [] ).append( value )
+    return S_OK( tqDefs )
+
+  def __matchTaskQueuesInIndex( self, tqMatchDict, numQueuesToGet, negativeCond ):
+    """ Match the task queues with the index, updating it first if needed
+
+    :return: S_OK( list of ( tqId, ownerDN, ownerGroup, priority ) )
+    """
+    if time.time() - self.__tqIndexUpdateTime > self.__tqIndexRefreshTime:
+      self.__updateTaskQueueIndex()
+    return S_OK( self.__tqIndex.match( tqMatchDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond ) )
+
   def isSharesCorrectionEnabled( self ):
     return self.__getCSOption( "EnableSharesCorrection", False )
 
@@ -299,6 +396,8 @@ class TaskQueueDB( DB ):
                              conn = connObj )
       if not result[ 'OK' ]:
         return result
+    if self.__tqIndex:
+      self.syncTaskQueueIndex()
     return S_OK()
 
   def __setTaskQueueEnabled( self, tqId, enabled = True, connObj = False ):
@@ -370,6 +469,8 @@ class TaskQueueDB( DB ):
         self.recalculateTQSharesForEntity( tqDefDict[ 'OwnerDN' ], tqDefDict[ 'OwnerGroup' ], connObj = connObj )
     finally:
       self.__setTaskQueueEnabled( tqId, True )
+    if newTQ and self.__tqIndex:
+      self.__updateTaskQueueIndex()
     return S_OK()
 
   def __insertJobInTaskQueue( self, jobId, tqId, jobPriority, checkTQExists = True, connObj = False ):
@@ -470,85 +571,185 @@ class TaskQueueDB( DB ):
     """
     Match a job
     """
+    retVal = self.matchAndGetJobs( tqMatchDict, 1, numJobsPerTry = numJobsPerTry,
+                                   numQueuesPerTry = numQueuesPerTry, negativeCond = negativeCond )
+    if not retVal[ 'OK' ] or not retVal[ 'Value' ][ 'matchFound' ]:
+      return retVal
+    matchDict = retVal[ 'Value' ]
+    matchDict[ 'jobId' ], matchDict[ 'taskQueueId' ] = matchDict.pop( 'jobs' )[0]
+    return S_OK( matchDict )
+
+  def matchAndGetJobs( self, tqMatchDict, maxJobs, numJobsPerTry = 50, numQueuesPerTry = 10, negativeCond = {} ):
+    """
+    Match up to maxJobs jobs, for resources that run several jobs at once
+
+    The jobs are shared among the matching task queues randomly and proportionally to their
+    priority, and each task queue gives its jobs according to their priority, as when matching
+    a single job, the oldest first among the jobs of the same priority. The chosen jobs are taken out of the task queues in a single transaction,
+    the ones another match took meanwhile are replaced in the next try
+
+    :param dict tqMatchDict: resource description
+    :param int maxJobs: maximum number of jobs to match
+    :param int numJobsPerTry: maximum number of jobs taken from a task queue in each try
+    :param int numQueuesPerTry: maximum number of task queues considered in each try
+    :return: S_OK( { 'matchFound' : bool, 'jobs' : [ ( jobId, tqId ), ... ], 'tqMatch' : dict } ) / S_ERROR
+    """
     #Make a copy to avoid modification of original if escaping needs to be done
+    indexMatchDict = tqMatchDict
     tqMatchDict = dict( tqMatchDict )
     retVal = self._checkMatchDefinition( tqMatchDict )
     if not retVal[ 'OK' ]:
       self.log.error( "TQ match request check failed", retVal[ 'Message' ] )
       return retVal
-    retVal = self._getConnection()
-    if not retVal[ 'OK' ]:
-      return S_ERROR( "Can't connect to DB: %s" % retVal[ 'Message' ] )
-    connObj = retVal[ 'Value' ]
-    preJobSQL = "SELECT `tq_Jobs`.JobId, `tq_Jobs`.TQId FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s AND `tq_Jobs`.Priority = %s"
-    prioSQL = "SELECT `tq_Jobs`.Priority FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
-    postJobSQL = " ORDER BY `tq_Jobs`.JobId ASC LIMIT %s" % numJobsPerTry
+    jobCond = ""
+    if 'JobID' in tqMatchDict:
+      # A certain JobID is required by the resource, so all TQ are to be considered
+      jobCond = " AND `tq_Jobs`.JobId = %s" % tqMatchDict['JobID']
+      maxJobs = 1
+    matchedJobs = []
+    noJobsFound = False
     for _ in range( self.__maxMatchRetry ):
-      noJobsFound = False
-      if 'JobID' in tqMatchDict:
-        # A certain JobID is required by the resource, so all TQ are to be considered
-        retVal = self.matchAndGetTaskQueue( tqMatchDict,
-                                            numQueuesToGet = 0,
-                                            skipMatchDictDef = True,
-                                            connObj = connObj )
-        preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % ( preJobSQL, tqMatchDict['JobID'] )
+      if self.__tqIndex and 'JobID' not in tqMatchDict:
+        retVal = self.__matchTaskQueuesInIndex( indexMatchDict, numQueuesPerTry, negativeCond )
       else:
-        retVal = self.matchAndGetTaskQueue( tqMatchDict,
-                                            numQueuesToGet = numQueuesPerTry,
-                                            skipMatchDictDef = True,
-                                            negativeCond = negativeCond,
-                                            connObj = connObj )
+        if 'JobID' in tqMatchDict:
+          retVal = self.__generateTQMatchSQL( tqMatchDict, numQueuesToGet = 0 )
+        else:
+          retVal = self.__generateTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesPerTry, negativeCond = negativeCond )
+        if retVal[ 'OK' ]:
+          retVal = self._query( retVal[ 'Value' ] )
       if not retVal[ 'OK' ]:
         return retVal
       tqList = retVal[ 'Value' ]
       if len( tqList ) == 0:
         self.log.info( "No TQ matches requirements" )
-        return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
-      for tqId, tqOwnerDN, tqOwnerGroup in tqList:
-        self.log.info( "Trying to extract jobs from TQ %s" % tqId )
-        retVal = self._query( prioSQL % tqId, conn = connObj )
-        if not retVal[ 'OK' ]:
-          return S_ERROR( "Can't retrieve winning priority for matching job: %s" % retVal[ 'Message' ] )
-        if len( retVal[ 'Value' ] ) == 0:
-          noJobsFound = True
+        noJobsFound = True
+        break
+      tqSlots = self.__shareSlots( tqList, maxJobs - len( matchedJobs ) )
+      jobTQList = []
+      tqOwners = {}
+      pendingSlots = 0
+      for tqId, tqOwnerDN, tqOwnerGroup, _tqPriority in tqList:
+        # Slots a task queue could not fill are passed to the next one
+        wantedJobs = tqSlots.get( tqId, 0 ) + pendingSlots
+        if wantedJobs == 0:
           continue
-        prio = retVal[ 'Value' ][0][0]
-        retVal = self._query( "%s %s" % ( preJobSQL % ( tqId, prio ), postJobSQL ), conn = connObj )
+        self.log.info( "Trying to extract %s jobs from TQ %s" % ( wantedJobs, tqId ) )
+        retVal = self.__selectJobsInTQ( tqId, min( wantedJobs, numJobsPerTry ), jobCond )
         if not retVal[ 'OK' ]:
-          return S_ERROR( "Can't begin transaction for matching job: %s" % retVal[ 'Message' ] )
-        jobTQList = [ ( row[0], row[1] ) for row in retVal[ 'Value' ] ]
-        if len( jobTQList ) == 0:
+          return S_ERROR( "Can't retrieve jobs to match: %s" % retVal[ 'Message' ] )
+        if len( retVal[ 'Value' ] ) == 0:
           gLogger.info( "Task queue %s seems to be empty, triggering a cleaning" % tqId )
           self.__deleteTQWithDelay.add( tqId, 300, ( tqId, tqOwnerDN, tqOwnerGroup ) )
-        while len( jobTQList ) > 0:
-          jobId, tqId = jobTQList.pop( random.randint( 0, len( jobTQList ) - 1 ) )
-          self.log.info( "Trying to extract job %s from TQ %s" % ( jobId, tqId ) )
-          retVal = self.deleteJob( jobId, connObj = connObj )
-          if not retVal[ 'OK' ]:
-            msgFix = "Could not take job"
-            msgVar = " %s out from the TQ %s: %s" % ( jobId, tqId, retVal[ 'Message' ] )
-            self.log.error( msgFix, msgVar )
-            return S_ERROR( msgFix + msgVar )
-          if retVal['Value']:
-            self.log.info( "Extracted job %s with prio %s from TQ %s" % ( jobId, prio, tqId ) )
-            return S_OK( { 'matchFound' : True, 'jobId' : jobId, 'taskQueueId' : tqId, 'tqMatch' : tqMatchDict } )
-        self.log.info( "No jobs could be extracted from TQ %s" % tqId )
+        pendingSlots = wantedJobs - len( retVal[ 'Value' ] )
+        jobTQList.extend( [ ( jobId, tqId ) for jobId in retVal[ 'Value' ] ] )
+        tqOwners[ tqId ] = ( tqOwnerDN, tqOwnerGroup )
+      noJobsFound = len( jobTQList ) == 0
+      if noJobsFound:
+        continue
+      retVal = self.__takeJobs( jobTQList )
+      if not retVal[ 'OK' ]:
+        self.log.error( "Could not take jobs out from the TQs", retVal[ 'Message' ] )
+        return retVal
+      for jobId, tqId in retVal[ 'Value' ]:
+        self.log.info( "Extracted job %s from TQ %s" % ( jobId, tqId ) )
+        self.__deleteTQWithDelay.add( tqId, 300, ( tqId, ) + tqOwners[ tqId ] )
+      matchedJobs.extend( retVal[ 'Value' ] )
+      if len( matchedJobs ) >= maxJobs:
+        break
+      self.log.info( "Could not extract %s jobs, retrying" % ( maxJobs - len( matchedJobs ) ) )
+    if matchedJobs:
+      return S_OK( { 'matchFound' : True, 'jobs' : matchedJobs, 'tqMatch' : tqMatchDict } )
     if noJobsFound:
       return S_OK( { 'matchFound' : False, 'tqMatch' : tqMatchDict } )
     else:
       self.log.info( "Could not find a match after %s match retries" % self.__maxMatchRetry )
       return S_ERROR( "Could not find a match after %s match retries" % self.__maxMatchRetry )
 
+  def __selectJobsInTQ( self, tqId, numJobs, jobCond = "" ):
+    """ Select jobs of a task queue to match. The priority of each job is chosen randomly with a
+        probability proportional to the real priority of the jobs, as when matching a single job,
+        and the jobs of the same priority are taken in the order they were inserted
+
+    :return: S_OK( list of job IDs ) / S_ERROR
+    """
+    jobSQL = "FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s%s" % ( tqId, jobCond )
+    retVal = self._query( "SELECT `tq_Jobs`.Priority %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT %s" % ( jobSQL,
+                                                                                                                 numJobs ) )
+    if not retVal[ 'OK' ]:
+      return retVal
+    prioJobs = {}
+    for row in retVal[ 'Value' ]:
+      prioJobs[ row[0] ] = prioJobs.get( row[0], 0 ) + 1
+    jobIds = []
+    for prio in sorted( prioJobs, reverse = True ):
+      retVal = self._query( "SELECT `tq_Jobs`.JobId %s AND `tq_Jobs`.Priority = %s ORDER BY `tq_Jobs`.JobId ASC LIMIT %s" % ( jobSQL,
+                                                                                                                             prio,
+                                                                                                                             prioJobs[ prio ] ) )
+      if not retVal[ 'OK' ]:
+        return retVal
+      jobIds.extend( [ row[0] for row in retVal[ 'Value' ] ] )
+    return S_OK( jobIds )
+
+  def __shareSlots( self, tqList, numSlots ):
+    """ Share the slots among the task queues, each one is given to a task queue chosen
+        randomly with a probability proportional to its priority
+
+    :param list tqList: ( tqId, ownerDN, ownerGroup, priority ) of the matching task queues
+    :return: dict with the number of slots of each task queue that got any
+    """
+    totalPriority = sum( [ tqData[3] for tqData in tqList ] )
+    tqSlots = {}
+    for _ in range( numSlots ):
+      point = random.uniform( 0, totalPriority )
+      for tqId, _tqOwnerDN, _tqOwnerGroup, tqPriority in tqList:
+        point -= tqPriority
+        if point <= 0:
+          break
+      tqSlots[ tqId ] = tqSlots.get( tqId, 0 ) + 1
+    return tqSlots
+
+  def __takeJobs( self, jobTQList ):
+    """ Take the jobs that are still in the task queues out of them in a single transaction,
+        the rows of the jobs are locked so no other match can take them at the same time
+
+    :param list jobTQList: ( jobId, tqId ) of the jobs to take
+    :return: S_OK( list of ( jobId, tqId ) of the jobs taken ) / S_ERROR
+    """
+    retVal = self.transactionStart()
+    if not retVal[ 'OK' ]:
+      return S_ERROR( "Can't begin transaction for matching jobs: %s" % retVal[ 'Message' ] )
+    jobString = ",".join( [ str( jobId ) for jobId, _tqId in jobTQList ] )
+    retVal = self._query( "SELECT JobId FROM `tq_Jobs` WHERE JobId IN ( %s ) FOR UPDATE" % jobString )
+    if retVal[ 'OK' ]:
+      jobsLeft = set( [ row[0] for row in retVal[ 'Value' ] ] )
+      if jobsLeft:
+        jobString = ",".join( [ str( jobId ) for jobId in jobsLeft ] )
+        retVal = self._update( "DELETE FROM `tq_Jobs` WHERE JobId IN ( %s )" % jobString )
+    if retVal[ 'OK' ]:
+      retVal = self.transactionCommit()
+    if not retVal[ 'OK' ]:
+      self.transactionRollback()
+      return S_ERROR( "Could not take jobs out from the TQs: %s" % retVal[ 'Message' ] )
+    return S_OK( [ ( jobId, tqId ) for jobId, tqId in jobTQList if jobId in jobsLeft ] )
+
   def matchAndGetTaskQueue( self, tqMatchDict, numQueuesToGet = 1, skipMatchDictDef = False,
                             negativeCond = {}, connObj = False ):
     """ Get a queue that matches the requirements
     """
     #Make a copy to avoid modification of original if escaping needs to be done
+    indexMatchDict = tqMatchDict
     tqMatchDict = dict( tqMatchDict )
     if not skipMatchDictDef:
       retVal = self._checkMatchDefinition( tqMatchDict )
       if not retVal[ 'OK' ]:
         return retVal
+      # The index needs the values not escaped
+      if self.__tqIndex and 'JobID' not in tqMatchDict:
+        retVal = self.__matchTaskQueuesInIndex( indexMatchDict, numQueuesToGet, negativeCond )
+        if not retVal[ 'OK' ]:
+          return retVal
+        return S_OK( [ tqData[:3] for tqData in retVal[ 'Value' ] ] )
     retVal = self.__generateTQMatchSQL( tqMatchDict, numQueuesToGet = numQueuesToGet, negativeCond = negativeCond )
     if not retVal[ 'OK' ]:
       return retVal
@@ -728,7 +929,7 @@ class TaskQueueDB( DB ):
       sqlCondList.append( self.__generateNotSQL( sqlTables, negativeCond ) )
 
     #Generate the final query string
-    tqSqlCmd = "SELECT tq.TQId, tq.OwnerDN, tq.OwnerGroup FROM `tq_TaskQueues` tq WHERE %s" % ( " AND ".join( sqlCondList ) )
+    tqSqlCmd = "SELECT tq.TQId, tq.OwnerDN, tq.OwnerGroup, tq.Priority FROM `tq_TaskQueues` tq WHERE %s" % ( " AND ".join( sqlCondList ) )
 
     #Apply priorities
     tqSqlCmd = "%s ORDER BY RAND() / tq.Priority ASC" % tqSqlCmd
@@ -886,6 +1087,8 @@ class TaskQueueDB( DB ):
         retVal = self._update( "DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % ( mvField, tqId ), conn = connObj )
         if not retVal[ 'OK' ]:
           return retVal
+      if self.__tqIndex:
+        self.__tqIndex.removeTaskQueue( tqId )
       self.recalculateTQSharesForEntity( tqOwnerDN, tqOwnerGroup, connObj = connObj )
       self.log.info( "Deleted empty and enabled TQ %s" % tqId )
       return S_OK( True )
@@ -922,6 +1125,8 @@ class TaskQueueDB( DB ):
       retVal = self._update( "DELETE FROM `tq_TQTo%s` WHERE TQId = %s" % ( field, tqId ), conn = connObj )
       if not retVal[ 'OK' ]:
         return retVal
+    if self.__tqIndex:
+      self.__tqIndex.removeTaskQueue( tqId )
     if delTQ > 0:
       self.recalculateTQSharesForEntity( tqOwnerDN, tqOwnerGroup, connObj = connObj )
       return S_OK( True )
@@ -1170,6 +1375,8 @@ class TaskQueueDB( DB ):
       tqList = ", ".join( [ str( tqId ) for tqId in prioDict[ prio ] ] )
       updateSQL = "UPDATE `tq_TaskQueues` SET Priority=%.4f WHERE TQId in ( %s )" % ( prio, tqList )
       self._update( updateSQL, conn = connObj )
+    if self.__tqIndex:
+      self.__tqIndex.setPriorities( tqDict )
     return S_OK()
 
   def getGroupShares( self ):
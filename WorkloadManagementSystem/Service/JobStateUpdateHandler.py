@@ -9,17 +9,19 @@
 
 # from types import *
 import time
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities import Time
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
 
 __RCSID__ = "$Id$"
 
 # This is a global instance of the JobDB class
 jobDB = False
 logDB = False
+heartBeatBuffer = None
 
 JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
@@ -27,8 +29,16 @@ def initializeJobStateUpdateHandler( serviceInfo ):
 
   global jobDB
   global logDB
+  global heartBeatBuffer
   jobDB = JobDB()
   logDB = JobLoggingDB()
+
+  # Heart beats are written in batches unless the flush interval is 0
+  flushInterval = getServiceOption( serviceInfo, "HeartBeatFlushInterval", 10 )
+  if flushInterval > 0:
+    heartBeatBuffer = HeartBeatBuffer( jobDB.setHeartBeatDataBulk, flushInterval = flushInterval,
+                                       maxBatchSize = getServiceOption( serviceInfo, "HeartBeatBatchSize", 1000 ) )
+    heartBeatBuffer.start()
   return S_OK()
 
 class JobStateUpdateHandler( RequestHandler ):
@@ -84,13 +94,23 @@ class JobStateUpdateHandler( RequestHandler ):
   ###########################################################################
   types_setJobsStatus = [list, basestring, basestring, basestring]
   def export_setJobsStatus( self, jobIDs, status, minorStatus, source = 'Unknown', datetime = None ):
-    """ Set the major and minor status for job specified by its JobId.
+    """ Set the major and minor status for the jobs specified by their JobIds.
         Set optionally the status date and source component which sends the
         status information.
     """
-    for jobID in jobIDs:
-      self.__setJobStatus( int( jobID ), status, minorStatus, source, datetime )
-    return S_OK()
+    jobIDs = [ int( jobID ) for jobID in jobIDs ]
+    result = jobDB.setJobsStatus( [ ( jobID, status, minorStatus, '', datetime ) for jobID in jobIDs ] )
+    if not result['OK']:
+      return result
+
+    # The logging records have the status the jobs got
+    result = jobDB.getAttributesForJobList( jobIDs, ['Status', 'MinorStatus'] )
+    if not result['OK']:
+      return result
+    jobsDict = result['Value']
+    records = [ ( jobID, jobsDict[jobID]['Status'], jobsDict[jobID]['MinorStatus'], 'idem', datetime, source )
+                for jobID in jobIDs if jobID in jobsDict ]
+    return logDB.addLoggingRecords( records )
 
   def __setJobStatus( self, jobID, status, minorStatus, source, datetime ):
     """ update the job status. """
@@ -308,9 +328,12 @@ class JobStateUpdateHandler( RequestHandler ):
     """ Send a heart beat sign of life for a job jobID
     """
 
-    result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
-    if not result['OK']:
-      gLogger.warn( 'Failed to set the heart beat data for job %d ' % int( jobID ) )
+    if heartBeatBuffer:
+      heartBeatBuffer.add( int( jobID ), staticData, dynamicData )
+    else:
+      result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
+      if not result['OK']:
+        gLogger.warn( 'Failed to set the heart beat data for job %d ' % int( jobID ) )
 
     # Restore the Running status if necessary
     # result = jobDB.getJobAttributes(jobID,['Status'])
@@ -9,7 +9,7 @@ __RCSID__ = "$Id$"
 from DIRAC                                               import gLogger, S_OK, S_ERROR
 
 from DIRAC.Core.Utilities.ThreadScheduler                import gThreadScheduler
-from DIRAC.Core.DISET.RequestHandler                     import RequestHandler
+from DIRAC.Core.DISET.RequestHandler                     import RequestHandler, getServiceOption
 
 from DIRAC.FrameworkSystem.Client.MonitoringClient       import gMonitor
 
@@ -49,6 +49,13 @@ def initializeMatcherHandler( serviceInfo ):
   gMonitor.registerActivity( 'numTQs', "Number of Task Queues",
                              'Matching', "tqsk queues" , gMonitor.OP_MEAN, 300 )
 
+  if getServiceOption( serviceInfo, "UseTaskQueueIndex", False ):
+    result = gTaskQueueDB.enableTaskQueueIndex( getServiceOption( serviceInfo, "TaskQueueIndexRefreshTime", 5 ) )
+    if not result[ 'OK' ]:
+      return result
+    gThreadScheduler.addPeriodicTask( getServiceOption( serviceInfo, "TaskQueueIndexSyncTime", 60 ),
+                                      gTaskQueueDB.syncTaskQueueIndex )
+
   gTaskQueueDB.recalculateTQSharesForAll()
   gThreadScheduler.addPeriodicTask( 120, gTaskQueueDB.recalculateTQSharesForAll )
   gThreadScheduler.addPeriodicTask( 60, sendNumTaskQueues )
@@ -100,6 +107,40 @@ class MatcherHandler( RequestHandler ):
       # FIXME: This is correctly interpreted by the JobAgent, but DErrno should be used instead
       return S_ERROR( "No match found" )
 
+##############################################################################
+  types_requestJobs = [ dict, ( int, long ) ]
+  def export_requestJobs( self, resourceDescription, maxJobs ):
+    """ Serve up to maxJobs jobs to an agent that can run several of them at once, like a
+        multi-slot pilot, so that all its slots are filled in one request.
+        The number of jobs is limited by the MaxJobsPerRequest option of the service
+
+        :return: S_OK( list of dictionaries, one per job, as requestJob returns )
+    """
+
+    resourceDescription['Setup'] = self.serviceInfoDict['clientSetup']
+    credDict = self.getRemoteCredentials()
+    maxJobs = max( 1, min( maxJobs, self.srv_getCSOption( "MaxJobsPerRequest", 64 ) ) )
+
+    try:
+      opsHelper = Operations( group = credDict['group'] )
+      matcher = Matcher( pilotAgentsDB = pilotAgentsDB,
+                         jobDB = gJobDB,
+                         tqDB = gTaskQueueDB,
+                         jlDB = jlDB,
+                         opsHelper = opsHelper )
+      result = matcher.selectJobs( resourceDescription, credDict, maxJobs )
+    except RuntimeError as rte:
+      self.log.error( "Error requesting jobs: ", rte )
+      return S_ERROR( "Error requesting jobs" )
+
+    # result can be empty, meaning that no job matched
+    if result:
+      gMonitor.addMark( "matchesDone" )
+      gMonitor.addMark( "matchesOK", len( result ) )
+      return S_OK( result )
+    else:
+      return S_ERROR( "No match found" )
+
 ##############################################################################
   types_getActiveTaskQueues = []
   @staticmethod
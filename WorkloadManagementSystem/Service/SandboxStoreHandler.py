@@ -4,6 +4,8 @@
 
 import os
 import time
+import tarfile
+import hashlib
 import threading
 import tempfile
 
@@ -19,6 +21,8 @@ from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
 from DIRAC.Resources.Storage.StorageElement import StorageElement
 from DIRAC.Core.Security import Properties
+from DIRAC.WorkloadManagementSystem.Utilities.SandboxManifest import checkSandboxManifest, writeSandboxTarball, \
+                                                                     getDataMD5, isValidMD5
 
 __RCSID__ = "$Id$"
 
@@ -67,6 +71,28 @@ class SandboxStoreHandler( RequestHandler ):
     pathItems.extend( [ md5[0:3], md5[3:6], md5 ] )
     return os.path.join( *pathItems )
 
+  def __getSandboxFilePath( self, fileHash = "" ):
+    """ Local path of a sandbox file uploaded through a manifest, or of the directory
+        holding them if no hash is given. Each owner has its own files
+    """
+    credDict = self.getRemoteCredentials()
+    if Properties.JOB_SHARING in credDict[ 'properties' ]:
+      idField = credDict[ 'group' ]
+    else:
+      idField = "%s.%s" % ( credDict[ 'username' ], credDict[ 'group' ] )
+    if not fileHash:
+      return self.__sbToHDPath( os.path.join( "SandBoxFiles", idField ) )
+    return self.__sbToHDPath( os.path.join( "SandBoxFiles", idField, fileHash[0:2], fileHash ) )
+
+  @staticmethod
+  def __splitSandboxName( sbName ):
+    """ Split "<md5>.tar.<compression>" into the hash and the extension
+    """
+    extPos = sbName.find( ".tar" )
+    if extPos > -1:
+      return sbName[ :extPos ], sbName[ extPos + 1: ]
+    return sbName, ""
+
 
   def transfer_fromClient( self, fileId, token, fileSize, fileHelper ):
     """
@@ -77,22 +103,20 @@ class SandboxStoreHandler( RequestHandler ):
       fileHelper.markAsTransferred()
       return S_ERROR( "Sandbox is too big. Please upload it to a grid storage element" )
 
+    manifest = None
     if isinstance( fileId, ( list, tuple ) ):
       if len( fileId ) > 1:
         assignTo = fileId[1]
+        # The files of the sandbox the store did not have, the sandbox is built out of its manifest
+        if len( fileId ) > 2:
+          manifest = fileId[2]
         fileId = fileId[0]
       else:
         return S_ERROR( "File identified tuple has to have length greater than 1" )
     else:
       assignTo = {}
 
-    extPos = fileId.find( ".tar" )
-    if extPos > -1:
-      extension = fileId[ extPos + 1: ]
-      aHash = fileId[ :extPos ]
-    else:
-      extension = ""
-      aHash = fileId
+    aHash, extension = self.__splitSandboxName( fileId )
     gLogger.info( "Upload requested for %s [%s]" % ( aHash, extension ) )
 
     credDict = self.getRemoteCredentials()
@@ -114,6 +138,9 @@ class SandboxStoreHandler( RequestHandler ):
         return result
       return S_OK( sbURL )
 
+    if manifest is not None:
+      return self.__sandboxFromFiles( fileHelper, manifest, assignTo )
+
     if self.__useLocalStorage:
       hdPath = self.__sbToHDPath( sbPath )
     else:
@@ -153,6 +180,106 @@ class SandboxStoreHandler( RequestHandler ):
       return result
     return S_OK( sbURL )
 
+  def __sandboxFromFiles( self, fileHelper, manifest, assignTo ):
+    """ Receive the files of a sandbox the store did not have, packed by hash, and build
+        the sandbox out of its manifest
+    """
+    result = checkSandboxManifest( manifest )
+    if not result[ 'OK' ]:
+      fileHelper.markAsTransferred()
+      return result
+    filesDir = self.__getSandboxFilePath()
+    mkDir( filesDir )
+    try:
+      fd, filesTarPath = tempfile.mkstemp( prefix = "DSBF.", dir = filesDir )
+      os.close( fd )
+    except OSError as e:
+      fileHelper.markAsTransferred()
+      gLogger.error( "Cannot create temporary file", repr( e ).replace( ',)', ')' ) )
+      return S_ERROR( "Cannot create temporary file" )
+    result = self.__networkToFile( fileHelper, filesTarPath )
+    if result[ 'OK' ]:
+      result = self.__storeSandboxFiles( filesTarPath )
+    self.__secureUnlinkFile( filesTarPath )
+    if not result[ 'OK' ]:
+      return result
+
+    missingFiles = [ entry[ 'Name' ] for entry in manifest
+                     if not os.path.isfile( self.__getSandboxFilePath( entry[ 'Hash' ] ) ) ]
+    if missingFiles:
+      return S_ERROR( "Missing sandbox files: %s" % ", ".join( missingFiles ) )
+    try:
+      fd, tmpSBPath = tempfile.mkstemp( prefix = "DSB.", dir = filesDir )
+      with os.fdopen( fd, "wb" ) as sbFile:
+        writeSandboxTarball( manifest, lambda entry: open( self.__getSandboxFilePath( entry[ 'Hash' ] ), "rb" ),
+                             sbFile )
+      with open( tmpSBPath, "rb" ) as sbFile:
+        sbHash = getDataMD5( sbFile )
+      sbSize = os.path.getsize( tmpSBPath )
+    except ( OSError, IOError ) as e:
+      gLogger.error( "Cannot build sandbox from its files", repr( e ).replace( ',)', ')' ) )
+      return S_ERROR( "Cannot build sandbox from its files" )
+
+    credDict = self.getRemoteCredentials()
+    sbPath = self.__getSandboxPath( "%s.tar.gz" % sbHash )
+    result = self.__generateLocation( sbPath )
+    if not result[ 'OK' ]:
+      self.__secureUnlinkFile( tmpSBPath )
+      return result
+    seName, sePFN = result[ 'Value' ]
+    if not sandboxDB.getSandboxId( seName, sePFN, credDict[ 'username' ], credDict[ 'group' ] )[ 'OK' ]:
+      result = self.__moveToFinalLocation( tmpSBPath, sbPath )
+      if not result[ 'OK' ]:
+        self.__secureUnlinkFile( tmpSBPath )
+        return result
+      seName, sePFN = result[ 'Value' ]
+      gLogger.info( "Registering sandbox built from its files", "SB:%s|%s" % ( seName, sePFN ) )
+      result = sandboxDB.registerAndGetSandbox( credDict[ 'username' ], credDict[ 'DN' ], credDict[ 'group' ],
+                                                seName, sePFN, sbSize )
+      if not result[ 'OK' ]:
+        return result
+    if os.path.isfile( tmpSBPath ):
+      self.__secureUnlinkFile( tmpSBPath )
+
+    sbURL = "SB:%s|%s" % ( seName, sePFN )
+    assignTo = dict( [ ( key, [ ( sbURL, assignTo[ key ] ) ] ) for key in assignTo ] )
+    result = self.export_assignSandboxesToEntities( assignTo )
+    if not result[ 'OK' ]:
+      return result
+    return S_OK( sbURL )
+
+  def __storeSandboxFiles( self, filesTarPath ):
+    """ Keep the files of a tarball whose members are named after their MD5
+    """
+    if not os.path.getsize( filesTarPath ):
+      return S_OK()
+    try:
+      with tarfile.open( filesTarPath, "r:gz" ) as filesTar:
+        for tarInfo in filesTar:
+          if not tarInfo.isreg() or not isValidMD5( tarInfo.name ):
+            return S_ERROR( "Invalid sandbox file %s" % tarInfo.name )
+          filePath = self.__getSandboxFilePath( tarInfo.name )
+          if os.path.isfile( filePath ):
+            continue
+          mkDir( os.path.dirname( filePath ) )
+          fd, tmpFilePath = tempfile.mkstemp( prefix = "DSBF.", dir = os.path.dirname( filePath ) )
+          oMD5 = hashlib.md5()
+          with os.fdopen( fd, "wb" ) as tmpFile:
+            dataFile = filesTar.extractfile( tarInfo )
+            data = dataFile.read( 1048576 )
+            while data:
+              oMD5.update( data )
+              tmpFile.write( data )
+              data = dataFile.read( 1048576 )
+          if oMD5.hexdigest() != tarInfo.name:
+            self.__secureUnlinkFile( tmpFilePath )
+            return S_ERROR( "Hash of sandbox file %s does not match" % tarInfo.name )
+          os.rename( tmpFilePath, filePath )
+    except ( tarfile.TarError, IOError, OSError ) as e:
+      gLogger.error( "Cannot store sandbox files", repr( e ).replace( ',)', ')' ) )
+      return S_ERROR( "Cannot store sandbox files" )
+    return S_OK()
+
   def transfer_bulkFromClient( self, fileId, token, fileSize, fileHelper ):
     """ Receive files packed into a tar archive by the fileHelper logic.
         token is used for access rights confirmation.
@@ -303,6 +430,55 @@ class SandboxStoreHandler( RequestHandler ):
       gLogger.error( "Error while moving sandbox to SE", "%s" % repr( e ).replace( ',)', ')' ) )
       return S_ERROR( "Error while moving sandbox to SE" )
 
+  ##################
+  # Checking what is already in the store
+
+  types_sandboxExists = [ basestring, ( int, long ) ]
+  def export_sandboxExists( self, sbName, sbSize ):
+    """ Look for a sandbox of the user with the given name, "<md5>.tar.<compression>", and size
+        so that it does not need to be uploaded again
+
+    :return: S_OK( sandbox URL ) or S_OK( False )
+    """
+    aHash, extension = self.__splitSandboxName( sbName )
+    if not isValidMD5( aHash ):
+      return S_ERROR( "Invalid sandbox name %s" % sbName )
+    sbPath = self.__getSandboxPath( "%s.%s" % ( aHash, extension ) )
+    result = self.__generateLocation( sbPath )
+    if not result[ 'OK' ]:
+      return result
+    seName, sePFN = result[ 'Value' ]
+    credDict = self.getRemoteCredentials()
+    result = sandboxDB.getSandboxId( seName, sePFN, credDict[ 'username' ], credDict[ 'group' ] )
+    if not result[ 'OK' ]:
+      return S_OK( False )
+    sbId = result[ 'Value' ]
+    result = sandboxDB.getSandboxSize( sbId )
+    if not result[ 'OK' ]:
+      return result
+    # Sandboxes registered without size can't be compared
+    if result[ 'Value' ] and result[ 'Value' ] != sbSize:
+      return S_OK( False )
+    if self.__useLocalStorage and not os.path.isfile( self.__sbToHDPath( sbPath ) ):
+      return S_OK( False )
+    sandboxDB.accessedSandboxById( sbId )
+    return S_OK( "SB:%s|%s" % ( seName, sePFN ) )
+
+  types_getMissingSandboxFiles = [ ( list, tuple ) ]
+  def export_getMissingSandboxFiles( self, fileHashes ):
+    """ Which of the files of a sandbox manifest, given by their MD5, have to be uploaded.
+        The ones already there are kept for another SandboxFilesGraceDays
+    """
+    missingHashes = []
+    for fileHash in fileHashes:
+      if not isinstance( fileHash, basestring ) or not isValidMD5( fileHash ):
+        return S_ERROR( "Invalid file hash %s" % str( fileHash ) )
+      try:
+        os.utime( self.__getSandboxFilePath( fileHash ), None )
+      except OSError:
+        missingHashes.append( fileHash )
+    return S_OK( missingHashes )
+
   ##################
   # Assigning sbs to jobs
 
@@ -425,10 +601,27 @@ class SandboxStoreHandler( RequestHandler ):
     gLogger.info( "Got %s sandboxes to purge" % len( sbList ) )
     for sbId, SEName, SEPFN in sbList:
       self.__purgeSandbox( sbId, SEName, SEPFN )
+    self.__purgeSandboxFiles()
 
     SandboxStoreHandler.__purgeWorking = False
     return S_OK()
 
+  def __purgeSandboxFiles( self ):
+    """ Delete the sandbox files that no manifest used for SandboxFilesGraceDays
+    """
+    oldestTime = time.time() - self.getCSOption( "SandboxFilesGraceDays", 30 ) * 86400
+    purged = 0
+    for dirPath, _dirNames, fileNames in os.walk( self.__sbToHDPath( "SandBoxFiles" ) ):
+      for fileName in fileNames:
+        filePath = os.path.join( dirPath, fileName )
+        try:
+          if os.path.getmtime( filePath ) < oldestTime:
+            os.unlink( filePath )
+            purged += 1
+        except OSError as e:
+          gLogger.warn( "Cannot purge sandbox file", "%s: %s" % ( filePath, repr( e ).replace( ',)', ')' ) ) )
+    gLogger.info( "Purged %s sandbox files" % purged )
+
   def __purgeSandbox( self, sbId, SEName, SEPFN ):
     result = self.__deleteSandboxFromBackend( SEName, SEPFN )
     if not result[ 'OK' ]:
@@ -0,0 +1,118 @@
+""" Manifest of the files of a sandbox, used to upload only the files the SandboxStore does not have
+
+    The manifest has an entry per file with its name in the sandbox, MD5, size, mode and
+    modification time. The sandbox tarball is built from the manifest alone, as a gzipped tar
+    without any timestamp of its own, so the client and the SandboxStore build the same bytes
+    out of the same manifest and both know the sandbox hash.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import re
+import gzip
+import stat
+import hashlib
+import tarfile
+import StringIO
+
+from DIRAC import S_OK, S_ERROR
+
+# Name given to the in-memory files of a sandbox
+IN_MEMORY_FILE_NAME = 'jobDescription.xml'
+# gzip is several times faster than bz2 for a slightly bigger result
+COMPRESSION_LEVEL = 6
+
+_md5RE = re.compile( r"^[0-9a-f]{32}$" )
+
+def getDataMD5( fileObj ):
+  """ MD5 of what is left to read in a file object
+  """
+  oMD5 = hashlib.md5()
+  data = fileObj.read( 1048576 )
+  while data:
+    oMD5.update( data )
+    data = fileObj.read( 1048576 )
+  return oMD5.hexdigest()
+
+def getSandboxManifest( fileList ):
+  """ Build the manifest of the files of a sandbox
+
+  :param list fileList: paths of the files and StringIO objects
+  :return: S_OK( ( manifest, dict with the path or StringIO of each MD5 ) ),
+           S_OK( None ) if there are directories, which the manifests do not cover
+  """
+  manifest = []
+  sources = {}
+  for sFile in fileList:
+    if isinstance( sFile, StringIO.StringIO ):
+      data = sFile.getvalue()
+      fileHash = hashlib.md5( data ).hexdigest()
+      manifest.append( { 'Name' : IN_MEMORY_FILE_NAME, 'Hash' : fileHash, 'Size' : len( data ),
+                         'Mode' : 0644, 'MTime' : 0 } )
+      sources[ fileHash ] = sFile
+      continue
+    filePath = os.path.realpath( sFile )
+    try:
+      fileStat = os.stat( filePath )
+    except OSError as e:
+      return S_ERROR( "Cannot stat %s: %s" % ( sFile, str( e ) ) )
+    if not stat.S_ISREG( fileStat.st_mode ):
+      return S_OK( None )
+    try:
+      with open( filePath, "rb" ) as fd:
+        fileHash = getDataMD5( fd )
+    except IOError as e:
+      return S_ERROR( "Cannot read %s: %s" % ( sFile, str( e ) ) )
+    manifest.append( { 'Name' : os.path.basename( sFile ), 'Hash' : fileHash, 'Size' : fileStat.st_size,
+                       'Mode' : stat.S_IMODE( fileStat.st_mode ), 'MTime' : int( fileStat.st_mtime ) } )
+    sources[ fileHash ] = filePath
+  return S_OK( ( manifest, sources ) )
+
+def checkSandboxManifest( manifest ):
+  """ Check a manifest received from a client
+  """
+  if not isinstance( manifest, ( list, tuple ) ) or not manifest:
+    return S_ERROR( "The manifest must be a non empty list" )
+  for entry in manifest:
+    if not isinstance( entry, dict ):
+      return S_ERROR( "Manifest entries must be dictionaries" )
+    for key, keyType in ( ( 'Name', basestring ), ( 'Hash', basestring ), ( 'Size', ( int, long ) ),
+                          ( 'Mode', ( int, long ) ), ( 'MTime', ( int, long ) ) ):
+      if not isinstance( entry.get( key ), keyType ):
+        return S_ERROR( "Invalid %s in manifest entry" % key )
+    if not _md5RE.match( entry[ 'Hash' ] ):
+      return S_ERROR( "Invalid hash %s in manifest" % entry[ 'Hash' ] )
+    if "/" in entry[ 'Name' ] or entry[ 'Name' ] in ( "", ".", ".." ):
+      return S_ERROR( "Invalid file name %s in manifest" % entry[ 'Name' ] )
+  return S_OK()
+
+def isValidMD5( fileHash ):
+  return bool( _md5RE.match( fileHash ) )
+
+def writeSandboxTarball( manifest, openFile, fileObj ):
+  """ Write the sandbox tarball of a manifest
+
+  :param list manifest: manifest of the sandbox
+  :param openFile: function returning a file object with the data of a manifest entry
+  :param fileObj: file object to write the tarball to
+  """
+  gzFile = gzip.GzipFile( filename = "", mode = "wb", compresslevel = COMPRESSION_LEVEL,
+                          fileobj = fileObj, mtime = 0 )
+  try:
+    tarFile = tarfile.open( mode = "w", fileobj = gzFile, format = tarfile.GNU_FORMAT )
+    try:
+      for entry in manifest:
+        tarInfo = tarfile.TarInfo( name = entry[ 'Name' ] )
+        tarInfo.size = entry[ 'Size' ]
+        tarInfo.mode = entry[ 'Mode' ]
+        tarInfo.mtime = entry[ 'MTime' ]
+        dataFile = openFile( entry )
+        try:
+          tarFile.addfile( tarInfo, dataFile )
+        finally:
+          dataFile.close()
+    finally:
+      tarFile.close()
+  finally:
+    gzFile.close()
@@ -0,0 +1,80 @@
+""" Unit tests for the manifests of the sandbox files
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+import unittest
+import StringIO
+
+from DIRAC.WorkloadManagementSystem.Utilities.SandboxManifest import getSandboxManifest, checkSandboxManifest, \
+                                                                     writeSandboxTarball, getDataMD5, \
+                                                                     IN_MEMORY_FILE_NAME
+
+__RCSID__ = "$Id$"
+
+class SandboxManifestTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.testDir = tempfile.mkdtemp()
+    self.files = []
+    for name, data in ( ( 'input.txt', 'some input\n' ), ( 'script.sh', '#!/bin/sh\necho hello\n' ) ):
+      filePath = os.path.join( self.testDir, name )
+      with open( filePath, 'w' ) as fd:
+        fd.write( data )
+      self.files.append( filePath )
+
+  def tearDown( self ):
+    shutil.rmtree( self.testDir )
+
+  def buildTarball( self, manifest, sources ):
+    def openFile( entry ):
+      source = sources[ entry[ 'Hash' ] ]
+      if isinstance( source, StringIO.StringIO ):
+        return StringIO.StringIO( source.getvalue() )
+      return open( source, 'rb' )
+    tarball = StringIO.StringIO()
+    writeSandboxTarball( manifest, openFile, tarball )
+    return tarball.getvalue()
+
+  def test_manifest( self ):
+    result = getSandboxManifest( self.files + [ StringIO.StringIO( '[ Executable = "script.sh"; ]' ) ] )
+    self.assertTrue( result[ 'OK' ] )
+    manifest, sources = result[ 'Value' ]
+    self.assertEqual( [ entry[ 'Name' ] for entry in manifest ], [ 'input.txt', 'script.sh', IN_MEMORY_FILE_NAME ] )
+    with open( self.files[0], 'rb' ) as fd:
+      self.assertEqual( manifest[0][ 'Hash' ], getDataMD5( fd ) )
+    self.assertEqual( manifest[0][ 'Size' ], 11 )
+    self.assertEqual( sorted( sources ), sorted( [ entry[ 'Hash' ] for entry in manifest ] ) )
+    self.assertTrue( checkSandboxManifest( manifest )[ 'OK' ] )
+    # Directories are not covered by manifests
+    self.assertEqual( getSandboxManifest( [ self.testDir ] )[ 'Value' ], None )
+    self.assertFalse( getSandboxManifest( [ os.path.join( self.testDir, 'missing' ) ] )[ 'OK' ] )
+
+  def test_tarball( self ):
+    manifest, sources = getSandboxManifest( self.files )[ 'Value' ]
+    tarball = self.buildTarball( manifest, sources )
+    # The same manifest gives the same bytes, whenever it is built
+    time.sleep( 1 )
+    self.assertEqual( self.buildTarball( manifest, sources ), tarball )
+    tarFile = tarfile.open( fileobj = StringIO.StringIO( tarball ), mode = 'r:gz' )
+    self.assertEqual( tarFile.getnames(), [ 'input.txt', 'script.sh' ] )
+    self.assertEqual( tarFile.extractfile( 'input.txt' ).read(), 'some input\n' )
+    self.assertEqual( tarFile.getmember( 'script.sh' ).mtime, manifest[1][ 'MTime' ] )
+
+  def test_checkManifest( self ):
+    manifest = getSandboxManifest( self.files )[ 'Value' ][0]
+    for key, value in ( ( 'Name', '../input.txt' ), ( 'Name', '..' ), ( 'Hash', 'notAHash' ), ( 'Size', '11' ) ):
+      badManifest = [ dict( manifest[0], **{ key : value } ) ]
+      self.assertFalse( checkSandboxManifest( badManifest )[ 'OK' ] )
+    self.assertFalse( checkSandboxManifest( [] )[ 'OK' ] )
+    self.assertFalse( checkSandboxManifest( 'input.txt' )[ 'OK' ] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( SandboxManifestTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
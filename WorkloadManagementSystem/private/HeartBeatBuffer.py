@@ -0,0 +1,184 @@
+""" Buffer of the job heart beats received by the JobStateUpdate service
+
+    The heart beats are queued in memory and written to the JobDB in batches by a background
+    thread, every flushInterval seconds or as soon as maxBatchSize jobs are waiting, whichever
+    comes first. Heart beats of the same job waiting in the buffer are coalesced:
+
+      * the HeartBeatTime of the job is the time of its last heart beat
+      * the static data are merged, the last value of each parameter wins, and only the
+        parameters whose value changed since they were last written for the job are written
+      * the dynamic data of every heart beat are kept, with the time they were received
+
+    Durability: a heart beat is acknowledged to the job as soon as it is queued, the heart beats
+    waiting in the buffer (at most flushInterval seconds of them) are lost if the service dies.
+    A failed write is not retried, as for the synchronous writes, the next heart beat of the
+    job fixes its HeartBeatTime.
+
+    Ordering: the batches are written in the order they were taken from the buffer, by a single
+    thread, so the HeartBeatTime of a job never goes back. Heart beats of different jobs have
+    no ordering between them. A heart beat is written up to flushInterval seconds after it
+    arrived, possibly after the job status changed. The write always updates the HeartBeatTime
+    and the parameters, but it only sets the job to Running if it is Matched, Running or Stalled
+    and its status did not change after the heart beat arrived. A job that was killed, deleted
+    or finished meanwhile keeps its status.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+
+from DIRAC import gLogger
+from DIRAC.Core.Utilities import Time
+
+class HeartBeatBuffer( object ):
+  """ In-memory queue of heart beats flushed in batches by a writer thread
+  """
+
+  def __init__( self, writeFunction, flushInterval = 10, maxBatchSize = 1000, staticDataLifeTime = 3600 ):
+    """
+    :param writeFunction: function writing a list of heart beats, with the signature of
+                          JobDB.setHeartBeatDataBulk
+    :param flushInterval: maximum seconds a heart beat waits in the buffer
+    :param maxBatchSize: maximum number of jobs written in one batch
+    :param staticDataLifeTime: seconds the static data written for a job are remembered
+                               after its last heart beat
+    """
+    self.__writeFunction = writeFunction
+    self.__flushInterval = flushInterval
+    self.__maxBatchSize = max( 1, maxBatchSize )
+    self.__staticDataLifeTime = staticDataLifeTime
+    self.__log = gLogger.getSubLogger( "HeartBeatBuffer" )
+    self.__condition = threading.Condition()
+    # Heart beats waiting, by job, and the jobs in the order they arrived
+    self.__pending = {}
+    self.__pendingOrder = []
+    # Static data last written for each job, and when the job was last seen
+    self.__writtenStaticData = {}
+    self.__stopped = False
+    self.__writerThread = None
+
+  def start( self ):
+    """ Start the writer thread
+    """
+    if self.__writerThread:
+      return
+    self.__writerThread = threading.Thread( target = self.__writerLoop, name = "HeartBeatWriter" )
+    self.__writerThread.setDaemon( True )
+    self.__writerThread.start()
+
+  def stop( self ):
+    """ Write what is in the buffer and stop the writer thread
+    """
+    self.__condition.acquire()
+    try:
+      self.__stopped = True
+      self.__condition.notify()
+    finally:
+      self.__condition.release()
+    if self.__writerThread:
+      self.__writerThread.join()
+      self.__writerThread = None
+
+  def add( self, jobID, staticData, dynamicData, heartBeatTime = None ):
+    """ Queue the heart beat of a job
+
+    :param int jobID: job ID
+    :param dict staticData: parameters of the job
+    :param dict dynamicData: values to add to the heart beat log of the job
+    :param heartBeatTime: datetime of the heart beat, now by default
+    """
+    if heartBeatTime is None:
+      heartBeatTime = Time.dateTime()
+    self.__condition.acquire()
+    try:
+      heartBeat = self.__pending.get( jobID )
+      if heartBeat is None:
+        heartBeat = { 'JobID' : jobID, 'StaticData' : {}, 'DynamicData' : [] }
+        self.__pending[ jobID ] = heartBeat
+        self.__pendingOrder.append( jobID )
+      heartBeat[ 'HeartBeatTime' ] = heartBeatTime
+      heartBeat[ 'StaticData' ].update( staticData )
+      if dynamicData:
+        heartBeat[ 'DynamicData' ].append( ( heartBeatTime, dict( dynamicData ) ) )
+      if len( self.__pendingOrder ) >= self.__maxBatchSize:
+        self.__condition.notify()
+    finally:
+      self.__condition.release()
+
+  def getNumPending( self ):
+    """ Number of jobs with heart beats waiting in the buffer
+    """
+    return len( self.__pendingOrder )
+
+  def __takeBatch( self ):
+    """ Take the oldest jobs out of the buffer. The condition must be held
+    """
+    batchJobs = self.__pendingOrder[ :self.__maxBatchSize ]
+    del self.__pendingOrder[ :self.__maxBatchSize ]
+    return [ self.__pending.pop( jobID ) for jobID in batchJobs ]
+
+  def __removeWrittenStaticData( self, batch ):
+    """ Keep only the static data that changed since they were written for each job
+    """
+    now = time.time()
+    for heartBeat in batch:
+      written = self.__writtenStaticData.get( heartBeat[ 'JobID' ] )
+      if written:
+        staticData = dict( [ ( name, value ) for name, value in heartBeat[ 'StaticData' ].items()
+                             if written[0].get( name ) != value ] )
+        written[0].update( heartBeat[ 'StaticData' ] )
+        written[1] = now
+        heartBeat[ 'StaticData' ] = staticData
+      else:
+        self.__writtenStaticData[ heartBeat[ 'JobID' ] ] = [ dict( heartBeat[ 'StaticData' ] ), now ]
+
+  def __forgetOldJobs( self ):
+    oldestTime = time.time() - self.__staticDataLifeTime
+    for jobID in [ jobID for jobID, written in self.__writtenStaticData.items() if written[1] < oldestTime ]:
+      del self.__writtenStaticData[ jobID ]
+
+  def flush( self ):
+    """ Write all the heart beats in the buffer. Only to be called directly when the writer
+        thread is not running
+
+    :return: number of jobs written
+    """
+    written = 0
+    while True:
+      self.__condition.acquire()
+      try:
+        batch = self.__takeBatch()
+      finally:
+        self.__condition.release()
+      if not batch:
+        break
+      self.__removeWrittenStaticData( batch )
+      start = time.time()
+      result = self.__writeFunction( batch )
+      if not result[ 'OK' ]:
+        self.__log.error( "Failed to write heart beats", "of %s jobs: %s" % ( len( batch ), result[ 'Message' ] ) )
+        # Write all the static data again next time
+        for heartBeat in batch:
+          self.__writtenStaticData.pop( heartBeat[ 'JobID' ], None )
+      else:
+        self.__log.verbose( "Wrote heart beats of %s jobs in %.3f seconds" % ( len( batch ), time.time() - start ) )
+        written += len( batch )
+    self.__forgetOldJobs()
+    return written
+
+  def __writerLoop( self ):
+    while True:
+      self.__condition.acquire()
+      try:
+        if not self.__stopped and len( self.__pendingOrder ) < self.__maxBatchSize:
+          self.__condition.wait( self.__flushInterval )
+        stopped = self.__stopped
+      finally:
+        self.__condition.release()
+      try:
+        self.flush()
+      except Exception:  # pylint: disable=broad-except
+        self.__log.exception( "Failed to flush the heart beats" )
+      if stopped:
+        return
@@ -0,0 +1,286 @@
+""" In-memory index of the task queues, used by the TaskQueueDB to match them
+
+    For each requirement of the task queues (OwnerDN, Sites, Tags...) the index keeps the set of
+    task queues having each value, as a bitset: a python integer with one bit per task queue.
+    Finding the task queues that match a resource is then a handful of bitset operations instead
+    of the multi-table query of the TaskQueueDB. The conditions are the ones of the SQL query,
+    applied to values that are not escaped for SQL.
+"""
+
+__RCSID__ = "$Id$"
+
+import heapq
+import random
+import threading
+
+from DIRAC.Core.Security import Properties, CS
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import singleValueDefFields, \
+                                                          multiValueDefFields, \
+                                                          multiValueMatchFields, \
+                                                          tagMatchFields, \
+                                                          bannedJobMatchFields, \
+                                                          strictRequireMatchFields
+
+def _toList( value ):
+  if isinstance( value, ( list, tuple ) ):
+    return value
+  return [ value ]
+
+class TaskQueueIndex( object ):
+  """ Definitions of the task queues indexed by each of their requirements
+
+      A task queue definition is a dictionary with the single value fields, the Priority and the
+      multi value fields that have values, as the ones returned by TaskQueueDB.retrieveTaskQueues
+  """
+
+  def __init__( self ):
+    self.__lock = threading.Lock()
+    self.__tqDefs = {}
+    # Bit of each task queue, and task queue of each bit
+    self.__tqBits = {}
+    self.__bitTQs = {}
+    self.__freeBits = []
+    self.__allTQs = 0
+    # field -> value -> bitset of the task queues having the value
+    self.__valueBits = {}
+    # multi value field -> bitset of the task queues having any value for it
+    self.__definedBits = {}
+
+  def __add( self, tqId, tqDef ):
+    """ The lock must be held
+    """
+    if tqId in self.__tqDefs:
+      self.__remove( tqId )
+    if self.__freeBits:
+      bitNumber = self.__freeBits.pop()
+    else:
+      bitNumber = len( self.__tqBits )
+    bit = 1 << bitNumber
+    self.__tqDefs[ tqId ] = tqDef
+    self.__tqBits[ tqId ] = bitNumber
+    self.__bitTQs[ bitNumber ] = tqId
+    self.__allTQs |= bit
+    for field in singleValueDefFields:
+      fieldBits = self.__valueBits.setdefault( field, {} )
+      fieldBits[ tqDef[ field ] ] = fieldBits.get( tqDef[ field ], 0 ) | bit
+    for field in multiValueDefFields:
+      values = [ value for value in tqDef.get( field, [] ) if value.strip() ]
+      if not values:
+        continue
+      self.__definedBits[ field ] = self.__definedBits.get( field, 0 ) | bit
+      fieldBits = self.__valueBits.setdefault( field, {} )
+      for value in values:
+        fieldBits[ value ] = fieldBits.get( value, 0 ) | bit
+
+  def __remove( self, tqId ):
+    """ The lock must be held
+    """
+    tqDef = self.__tqDefs.pop( tqId, None )
+    if tqDef is None:
+      return
+    bitNumber = self.__tqBits.pop( tqId )
+    del self.__bitTQs[ bitNumber ]
+    self.__freeBits.append( bitNumber )
+    bit = 1 << bitNumber
+    self.__allTQs &= ~bit
+    fieldValues = [ ( field, [ tqDef[ field ] ] ) for field in singleValueDefFields ]
+    fieldValues.extend( [ ( field, tqDef.get( field, [] ) ) for field in multiValueDefFields ] )
+    for field, values in fieldValues:
+      fieldBits = self.__valueBits.get( field, {} )
+      for value in values:
+        if value not in fieldBits:
+          continue
+        fieldBits[ value ] &= ~bit
+        if not fieldBits[ value ]:
+          del fieldBits[ value ]
+      if field in self.__definedBits:
+        self.__definedBits[ field ] &= ~bit
+
+  def setTaskQueues( self, tqDefs ):
+    """ Replace the contents of the index
+
+    :param dict tqDefs: task queue definition of each task queue ID
+    """
+    self.__lock.acquire()
+    try:
+      for tqId in list( self.__tqDefs ):
+        if tqId not in tqDefs:
+          self.__remove( tqId )
+      for tqId in tqDefs:
+        if self.__tqDefs.get( tqId ) != tqDefs[ tqId ]:
+          self.__add( tqId, tqDefs[ tqId ] )
+    finally:
+      self.__lock.release()
+
+  def addTaskQueue( self, tqId, tqDef ):
+    """ Add a task queue, replacing the definition it had if it was already there
+    """
+    self.__lock.acquire()
+    try:
+      self.__add( tqId, tqDef )
+    finally:
+      self.__lock.release()
+
+  def removeTaskQueue( self, tqId ):
+    """ Remove a task queue
+    """
+    self.__lock.acquire()
+    try:
+      self.__remove( tqId )
+    finally:
+      self.__lock.release()
+
+  def setPriorities( self, priorities ):
+    """ Update the priority of the task queues
+
+    :param dict priorities: priority of each task queue ID
+    """
+    self.__lock.acquire()
+    try:
+      for tqId in priorities:
+        if tqId in self.__tqDefs:
+          self.__tqDefs[ tqId ][ 'Priority' ] = priorities[ tqId ]
+    finally:
+      self.__lock.release()
+
+  def hasTaskQueue( self, tqId ):
+    return tqId in self.__tqDefs
+
+  def getNumTaskQueues( self ):
+    return len( self.__tqDefs )
+
+  def __bitsForValues( self, field, values ):
+    """ Bitset of the task queues having any of the values in the field
+    """
+    fieldBits = self.__valueBits.get( field, {} )
+    bits = 0
+    for value in _toList( values ):
+      bits |= fieldBits.get( value, 0 )
+    return bits
+
+  def __bitsForNoValues( self, field ):
+    """ Bitset of the task queues without requirements for the field
+    """
+    return self.__allTQs & ~self.__definedBits.get( field, 0 )
+
+  def __bitsForNegativeCond( self, negativeCond ):
+    """ Bitset of the task queues allowed by the negative conditions:
+          - a list of dicts is the OR of the conditions of each dict
+          - in a dict, a task queue is allowed if it does not have all the values
+            of one of the fields, ( not cond1 or not cond2 ... )
+    """
+    if isinstance( negativeCond, ( list, tuple ) ):
+      bits = 0
+      for condDict in negativeCond:
+        bits |= self.__bitsForNegativeCond( condDict )
+      return bits
+    bits = 0
+    conditions = 0
+    for field in negativeCond:
+      if field in multiValueMatchFields:
+        bits |= self.__allTQs & ~self.__bitsForValues( "%ss" % field, negativeCond[ field ] )
+        conditions += 1
+      elif field in singleValueDefFields:
+        for value in negativeCond[ field ]:
+          bits |= self.__allTQs & ~self.__bitsForValues( field, value )
+          conditions += 1
+    if not conditions:
+      return self.__allTQs
+    return bits
+
+  def __match( self, tqMatchDict, negativeCond ):
+    """ Bitset of the task queues that match, the lock must be held
+    """
+    bits = self.__allTQs
+    #If OwnerDN and OwnerGroup are defined only use those combinations that make sense
+    if 'OwnerDN' in tqMatchDict and 'OwnerGroup' in tqMatchDict:
+      dnBits = self.__bitsForValues( 'OwnerDN', tqMatchDict[ 'OwnerDN' ] )
+      ownerBits = 0
+      for group in _toList( tqMatchDict[ 'OwnerGroup' ] ):
+        if Properties.JOB_SHARING in CS.getPropertiesForGroup( group ):
+          ownerBits |= self.__bitsForValues( 'OwnerGroup', group )
+        else:
+          ownerBits |= self.__bitsForValues( 'OwnerGroup', group ) & dnBits
+      bits &= ownerBits
+    else:
+      for field in ( 'OwnerGroup', 'OwnerDN' ):
+        if field in tqMatchDict:
+          bits &= self.__bitsForValues( field, tqMatchDict[ field ] )
+    if 'Setup' in tqMatchDict:
+      bits &= self.__bitsForValues( 'Setup', tqMatchDict[ 'Setup' ] )
+    if 'CPUTime' in tqMatchDict:
+      maxCPUTime = max( _toList( tqMatchDict[ 'CPUTime' ] ) )
+      bits &= self.__bitsForValues( 'CPUTime', [ cpuTime for cpuTime in self.__valueBits.get( 'CPUTime', {} )
+                                                 if cpuTime <= maxCPUTime ] )
+    #Match multi value fields
+    for field in multiValueMatchFields:
+      tqField = "%ss" % field
+      if field in tqMatchDict and tqMatchDict[ field ]:
+        if field in tagMatchFields:
+          fieldBits = self.__allTQs
+          if tqMatchDict[ field ] != 'Any':
+            # All the tags of the task queue have to be in the resource
+            tags = set( _toList( tqMatchDict[ field ] ) )
+            fieldBits &= ~self.__bitsForValues( tqField, [ tag for tag in self.__valueBits.get( tqField, {} )
+                                                           if tag not in tags ] )
+          # And the task queue has to have all the tags required by the resource
+          for requiredTag in _toList( tqMatchDict.get( "Required%s" % field, [] ) ):
+            bits &= self.__bitsForValues( tqField, requiredTag )
+        else:
+          fieldBits = self.__bitsForValues( tqField, tqMatchDict[ field ] )
+        bits &= self.__bitsForNoValues( tqField ) | fieldBits
+        #In case of Site, check it's not in job banned sites
+        if field in bannedJobMatchFields:
+          bannedBits = 0
+          for value in _toList( tqMatchDict[ field ] ):
+            bannedBits |= self.__allTQs & ~self.__bitsForValues( "Banned%s" % tqField, value )
+          bits &= bannedBits
+      #Resource banning
+      bannedField = "Banned%s" % field
+      if bannedField in tqMatchDict and tqMatchDict[ bannedField ]:
+        bannedBits = 0
+        for value in _toList( tqMatchDict[ bannedField ] ):
+          bannedBits |= self.__allTQs & ~self.__bitsForValues( tqField, value )
+        bits &= bannedBits
+    #For certain fields, the requirement is strict. If it is not in the tqMatchDict, the job cannot require it
+    for field in strictRequireMatchFields:
+      if field in tqMatchDict and tqMatchDict[ field ]:
+        continue
+      bits &= self.__bitsForNoValues( "%ss" % field )
+    if negativeCond:
+      bits &= self.__bitsForNegativeCond( negativeCond )
+    return bits
+
+  def match( self, tqMatchDict, numQueuesToGet = 1, negativeCond = {} ):
+    """ Find the task queues that match a resource, in random order weighted by their priority
+
+    :param dict tqMatchDict: match definition, checked but not escaped
+    :param int numQueuesToGet: maximum number of task queues to return, 0 for all
+    :param negativeCond: negative conditions, as for TaskQueueDB.matchAndGetTaskQueue
+    :return: list of ( tqId, ownerDN, ownerGroup, priority )
+    """
+    # Confine the SystemConfig legacy option here, use Platform everywhere else
+    if 'SystemConfig' in tqMatchDict and not "Platform" in tqMatchDict:
+      tqMatchDict = dict( tqMatchDict )
+      tqMatchDict[ 'Platform' ] = tqMatchDict[ 'SystemConfig' ]
+    tqList = []
+    self.__lock.acquire()
+    try:
+      bits = self.__match( tqMatchDict, negativeCond )
+      while bits:
+        lowestBit = bits & -bits
+        bits ^= lowestBit
+        tqId = self.__bitTQs[ lowestBit.bit_length() - 1 ]
+        tqDef = self.__tqDefs[ tqId ]
+        tqList.append( ( tqId, tqDef[ 'OwnerDN' ], tqDef[ 'OwnerGroup' ], tqDef[ 'Priority' ] ) )
+    finally:
+      self.__lock.release()
+
+    # Same ordering as RAND() / Priority in the SQL query
+    def sortKey( tqData ):
+      if tqData[3] > 0:
+        return random.random() / tqData[3]
+      return 0
+    if numQueuesToGet:
+      return heapq.nsmallest( numQueuesToGet, tqList, key = sortKey )
+    return sorted( tqList, key = sortKey )
@@ -0,0 +1,77 @@
+""" Unit tests for the buffer of job heart beats
+"""
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import datetime
+import threading
+import unittest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
+
+__RCSID__ = "$Id$"
+
+class HeartBeatBufferTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.batches = []
+    self.writeResult = S_OK()
+    self.written = threading.Event()
+    self.buffer = HeartBeatBuffer( self.write, flushInterval = 60, maxBatchSize = 2 )
+
+  def write( self, heartBeats ):
+    self.batches.append( heartBeats )
+    self.written.set()
+    return self.writeResult
+
+  def test_coalesce( self ):
+    t1 = datetime.datetime( 2016, 1, 1, 10 )
+    t2 = t1 + datetime.timedelta( minutes = 5 )
+    self.buffer.add( 1, { 'CPUNormalizationFactor' : '10', 'LocalAccount' : 'user' }, { 'Load' : 1.5 }, t1 )
+    self.buffer.add( 2, {}, { 'Load' : 0.5 }, t1 )
+    self.buffer.add( 1, { 'CPUNormalizationFactor' : '10' }, { 'Load' : 2.5 }, t2 )
+    self.buffer.add( 3, { 'LocalAccount' : 'other' }, {}, t2 )
+    self.assertEqual( self.buffer.getNumPending(), 3 )
+    self.assertEqual( self.buffer.flush(), 3 )
+    # Batches of at most 2 jobs, in the order they arrived
+    self.assertEqual( [ [ hb[ 'JobID' ] for hb in batch ] for batch in self.batches ], [ [ 1, 2 ], [ 3 ] ] )
+    heartBeat = self.batches[0][0]
+    self.assertEqual( heartBeat[ 'HeartBeatTime' ], t2 )
+    self.assertEqual( heartBeat[ 'StaticData' ], { 'CPUNormalizationFactor' : '10', 'LocalAccount' : 'user' } )
+    self.assertEqual( heartBeat[ 'DynamicData' ], [ ( t1, { 'Load' : 1.5 } ), ( t2, { 'Load' : 2.5 } ) ] )
+    self.assertEqual( self.buffer.getNumPending(), 0 )
+    self.assertEqual( self.buffer.flush(), 0 )
+
+  def test_staticData( self ):
+    self.buffer.add( 1, { 'LocalAccount' : 'user', 'CPU' : 'Xeon' }, {} )
+    self.buffer.flush()
+    # Only what changed is written again
+    self.buffer.add( 1, { 'LocalAccount' : 'user', 'CPU' : 'Opteron' }, {} )
+    self.buffer.flush()
+    self.assertEqual( self.batches[1][0][ 'StaticData' ], { 'CPU' : 'Opteron' } )
+    # Unless the write failed
+    self.writeResult = S_ERROR( 'No DB' )
+    self.buffer.add( 1, { 'LocalAccount' : 'user2', 'CPU' : 'Opteron' }, {} )
+    self.assertEqual( self.buffer.flush(), 0 )
+    self.writeResult = S_OK()
+    self.buffer.add( 1, { 'LocalAccount' : 'user2', 'CPU' : 'Opteron' }, {} )
+    self.buffer.flush()
+    self.assertEqual( self.batches[3][0][ 'StaticData' ], { 'LocalAccount' : 'user2', 'CPU' : 'Opteron' } )
+
+  def test_writerThread( self ):
+    self.buffer.start()
+    try:
+      # A full batch does not wait for the flush interval
+      self.buffer.add( 1, {}, { 'Load' : 1 } )
+      self.buffer.add( 2, {}, { 'Load' : 1 } )
+      self.assertTrue( self.written.wait( 10 ) )
+      self.buffer.add( 3, {}, { 'Load' : 1 } )
+    finally:
+      self.buffer.stop()
+    # Stopping writes what is left
+    self.assertEqual( sorted( hb[ 'JobID' ] for batch in self.batches for hb in batch ), [ 1, 2, 3 ] )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( HeartBeatBufferTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,81 @@
+""" Unit tests for the in-memory index of task queues
+"""
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+import unittest
+
+from mock import patch
+
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+
+__RCSID__ = "$Id$"
+
+def tqDefinition( **kwargs ):
+  tqDef = { 'OwnerDN' : '/my/DN', 'OwnerGroup' : 'myGroup', 'Setup' : 'aSetup', 'CPUTime' : 86400, 'Priority' : 1.0 }
+  tqDef.update( kwargs )
+  return tqDef
+
+class TaskQueueIndexTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.patcher = patch( 'DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+                          side_effect = lambda group: [ 'JobSharing' ] if group == 'sharingGroup' else [] )
+    self.patcher.start()
+    self.index = TaskQueueIndex()
+    self.index.setTaskQueues( { 1 : tqDefinition(),
+                                2 : tqDefinition( Sites = [ 'Site1' ], CPUTime = 500000 ),
+                                3 : tqDefinition( BannedSites = [ 'Site1' ], Tags = [ 'MultiProcessor' ] ),
+                                4 : tqDefinition( OwnerDN = '/other/DN', OwnerGroup = 'sharingGroup',
+                                                  Platforms = [ 'x86_64-slc6' ], JobTypes = [ 'MCSimulation' ] ) } )
+
+  def tearDown( self ):
+    self.patcher.stop()
+
+  def matchIDs( self, tqMatchDict, negativeCond = {} ):
+    return sorted( [ tqData[0] for tqData in self.index.match( tqMatchDict, numQueuesToGet = 0,
+                                                               negativeCond = negativeCond ) ] )
+
+  def test_match( self ):
+    resource = { 'Setup' : 'aSetup', 'CPUTime' : 100000 }
+    self.assertEqual( self.matchIDs( resource ), [ 1 ] )
+    resource[ 'Site' ] = 'Site1'
+    resource[ 'CPUTime' ] = 1000000
+    self.assertEqual( self.matchIDs( resource ), [ 1, 2 ] )
+    resource[ 'Site' ] = 'Site2'
+    resource[ 'Tag' ] = [ 'MultiProcessor', 'WholeNode' ]
+    self.assertEqual( self.matchIDs( resource ), [ 1, 3 ] )
+    resource[ 'RequiredTag' ] = [ 'MultiProcessor' ]
+    self.assertEqual( self.matchIDs( resource ), [ 3 ] )
+    del resource[ 'RequiredTag' ]
+    resource[ 'BannedSite' ] = [ 'Site1' ]
+    self.assertEqual( self.matchIDs( resource ), [ 1, 3 ] )
+    # Platform is a strict requirement
+    resource[ 'Platform' ] = 'x86_64-slc6'
+    self.assertEqual( self.matchIDs( resource ), [ 1, 3, 4 ] )
+    self.assertEqual( self.matchIDs( resource, negativeCond = { 'JobType' : [ 'MCSimulation' ] } ), [ 1, 3 ] )
+    # The DN does not matter for a job sharing group
+    resource[ 'OwnerDN' ] = '/my/DN'
+    resource[ 'OwnerGroup' ] = [ 'myGroup', 'sharingGroup' ]
+    self.assertEqual( self.matchIDs( resource ), [ 1, 3, 4 ] )
+    resource[ 'OwnerGroup' ] = 'sharingGroup'
+    self.assertEqual( self.matchIDs( resource ), [ 4 ] )
+
+  def test_updates( self ):
+    resource = { 'Setup' : 'aSetup', 'CPUTime' : 1000000, 'Site' : 'Site1' }
+    self.index.removeTaskQueue( 1 )
+    self.assertEqual( self.matchIDs( resource ), [ 2 ] )
+    self.index.addTaskQueue( 5, tqDefinition( Sites = [ 'Site1', 'Site2' ] ) )
+    self.assertEqual( self.matchIDs( resource ), [ 2, 5 ] )
+    self.index.setTaskQueues( { 5 : tqDefinition( Sites = [ 'Site2' ] ) } )
+    self.assertEqual( self.matchIDs( resource ), [] )
+    self.assertEqual( self.index.getNumTaskQueues(), 1 )
+    # Task queues are chosen according to their priority
+    self.index.addTaskQueue( 6, tqDefinition( Priority = 1.0 ) )
+    self.index.setPriorities( { 5 : 1e9, 6 : 1e-9 } )
+    resource[ 'Site' ] = 'Site2'
+    self.assertEqual( self.index.match( resource )[0][0], 5 )
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( TaskQueueIndexTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
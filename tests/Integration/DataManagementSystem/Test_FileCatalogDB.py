@@ -623,6 +623,45 @@ class DirectoryCase( FileCatalogDBTestCase ):
 #     self.assert_( nonExistingDir in result["Value"]["Successful"], "removeDirectory : %s should be in Successful %s" % ( nonExistingDir, result ) )
 #     self.assert_( result["Value"]["Successful"][nonExistingDir], "removeDirectory : %s should be in True %s" % ( nonExistingDir, result ) )
 
+  def test_pagedListing( self ):
+    """
+      Tests listDirectoryPaged and getDirectoryReplicasPaged
+    """
+    result = self.db.createDirectory( testDir, credDict )
+    self.assert_( result['OK'], "createDirectory failed: %s" % result )
+    lfns = [ '%s/pagedfile%d' % ( testDir, i ) for i in xrange( 5 ) ]
+    result = self.db.addFile( dict( ( lfn, { 'PFN' : lfn, 'SE' : 'testSE', 'Size' : 10,
+                                             'GUID' : 'paged%d' % i, 'Checksum' : '0' } )
+                                    for i, lfn in enumerate( lfns ) ), credDict )
+    self.assert_( result['OK'], "addFile failed: %s" % result )
+
+    # Pages of 2 files: 2, 2 and 1
+    listed = []
+    afterFileID = 0
+    for expected in [ 2, 2, 1 ]:
+      result = self.db.listDirectoryPaged( testDir, afterFileID, 2, credDict, verbose = True )
+      self.assert_( result['OK'], "listDirectoryPaged failed: %s" % result )
+      self.assertEqual( len( result['Value']['Files'] ), expected )
+      listed += result['Value']['Files'].keys()
+      afterFileID = result['Value']['LastFileID']
+    self.assertEqual( afterFileID, 0, "The last page should have LastFileID 0" )
+    self.assertEqual( sorted( listed ), [ os.path.basename( lfn ) for lfn in lfns ] )
+
+    result = self.db.listDirectoryPaged( parentDir, 0, 2, credDict )
+    self.assert_( result['OK'], "listDirectoryPaged failed: %s" % result )
+    self.assertEqual( result['Value']['SubDirs'].keys(), [testDir] )
+    result = self.db.listDirectoryPaged( nonExistingDir, 0, 2, credDict )
+    self.assertFalse( result['OK'], "listDirectoryPaged should fail for %s" % nonExistingDir )
+
+    result = self.db.getDirectoryReplicasPaged( testDir, 0, 10, False, credDict )
+    self.assert_( result['OK'], "getDirectoryReplicasPaged failed: %s" % result )
+    self.assertEqual( sorted( result['Value']['Files'] ), [ os.path.basename( lfn ) for lfn in lfns ] )
+    self.assertEqual( result['Value']['Files'][os.path.basename( lfns[0] )].keys(), ['testSE'] )
+    self.assertEqual( result['Value']['LastFileID'], 0 )
+
+    result = self.db.removeFile( lfns, credDict )
+    self.assert_( result['OK'], "removeFile failed: %s" % result )
+
 
 
 
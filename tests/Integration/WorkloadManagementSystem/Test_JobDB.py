@@ -2,6 +2,7 @@
 """
 
 import unittest
+import datetime
 
 from DIRAC.Core.Base.Script import parseCommandLine
 parseCommandLine()
@@ -101,10 +102,97 @@ class CountJobsCase(JobDBTestCase):
     result = self.jobDB.getCounters( 'Jobs', ['Status', 'MinorStatus'], {}, '2007-04-22 00:00:00' )
     self.assert_( result['OK'],'Status after getCounters') 
        
+
+class JobStatusCase( JobDBTestCase ):
+
+  def test_setJobsStatus( self ):
+
+    jobIDs = []
+    for _ in range( 3 ):
+      res = self.jobDB.insertNewJobIntoDB( jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup' )
+      self.assert_( res['OK'] )
+      jobIDs.append( res['JobID'] )
+
+    result = self.jobDB.setJobsStatus( [ ( jobIDs[0], 'Running', 'Application', '', None ),
+                                         ( jobIDs[1], 'Running', 'Application', '', None ),
+                                         ( jobIDs[2], 'Failed', 'Stalled', 'Unknown', None ) ] )
+    self.assert_( result['OK'] )
+    result = self.jobDB.getAttributesForJobList( jobIDs, ['Status', 'MinorStatus', 'StartExecTime', 'EndExecTime'] )
+    self.assert_( result['OK'] )
+    jobsDict = result['Value']
+    self.assertEqual( [ jobsDict[jobID]['Status'] for jobID in jobIDs ], ['Running', 'Running', 'Failed'] )
+    self.assertEqual( jobsDict[jobIDs[2]]['MinorStatus'], 'Stalled' )
+    self.assertNotEqual( jobsDict[jobIDs[0]]['StartExecTime'], 'None' )
+    self.assertNotEqual( jobsDict[jobIDs[2]]['EndExecTime'], 'None' )
+
+
+class HeartBeatCase( JobDBTestCase ):
+
+  def test_setHeartBeatDataBulk( self ):
+
+    res = self.jobDB.insertNewJobIntoDB( jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup' )
+    self.assert_( res['OK'] )
+    jobID = res['JobID']
+    result = self.jobDB.setJobStatus( jobID, 'Matched', 'Assigned' )
+    self.assert_( result['OK'] )
+    now = datetime.datetime.utcnow().replace( microsecond = 0 )
+    result = self.jobDB.setHeartBeatDataBulk( [ { 'JobID' : jobID, 'HeartBeatTime' : now,
+                                                  'StaticData' : { 'LocalAccount' : 'user' },
+                                                  'DynamicData' : [ ( now, { 'LoadAverage' : 1.5 } ) ] } ] )
+    self.assert_( result['OK'] )
+    result = self.jobDB.getJobAttributes( jobID, ['Status', 'HeartBeatTime'] )
+    self.assert_( result['OK'] )
+    self.assertEqual( result['Value']['Status'], 'Running' )
+    self.assertEqual( result['Value']['HeartBeatTime'], str( now ) )
+    result = self.jobDB.getJobParameter( jobID, 'LocalAccount' )
+    self.assert_( result['OK'] )
+    self.assertEqual( result['Value'], 'user' )
+    result = self.jobDB.getHeartBeatData( jobID )
+    self.assert_( result['OK'] )
+    self.assertEqual( len( result['Value'] ), 1 )
+
+    # A buffered heart beat written after the job finished does not set it back to Running
+    result = self.jobDB.setJobStatus( jobID, 'Done', 'Execution Complete' )
+    self.assert_( result['OK'] )
+    later = now + datetime.timedelta( seconds = 10 )
+    result = self.jobDB.setHeartBeatDataBulk( [ { 'JobID' : jobID, 'HeartBeatTime' : later,
+                                                  'StaticData' : {}, 'DynamicData' : [] } ] )
+    self.assert_( result['OK'] )
+    result = self.jobDB.getJobAttributes( jobID, ['Status', 'HeartBeatTime'] )
+    self.assert_( result['OK'] )
+    self.assertEqual( result['Value']['Status'], 'Done' )
+    self.assertEqual( result['Value']['HeartBeatTime'], str( later ) )
+
+  def test_setHeartBeatDataBulkStatus( self ):
+
+    # Neither a killed job nor a status set after the heart beat arrived are overwritten
+    jobIDs = []
+    for status, minorStatus in ( ( 'Killed', 'Marked for termination' ), ( 'Matched', 'Assigned' ) ):
+      res = self.jobDB.insertNewJobIntoDB( jdl, 'owner', '/DN/OF/owner', 'ownerGroup', 'someSetup' )
+      self.assert_( res['OK'] )
+      jobIDs.append( res['JobID'] )
+      result = self.jobDB.setJobStatus( res['JobID'], status, minorStatus )
+      self.assert_( result['OK'] )
+    now = datetime.datetime.utcnow().replace( microsecond = 0 )
+    before = now - datetime.timedelta( hours = 1 )
+    result = self.jobDB.setHeartBeatDataBulk( [ { 'JobID' : jobIDs[0], 'HeartBeatTime' : now,
+                                                  'StaticData' : {}, 'DynamicData' : [] },
+                                                { 'JobID' : jobIDs[1], 'HeartBeatTime' : before,
+                                                  'StaticData' : {}, 'DynamicData' : [] } ] )
+    self.assert_( result['OK'] )
+    result = self.jobDB.getAttributesForJobList( jobIDs, ['Status', 'HeartBeatTime'] )
+    self.assert_( result['OK'] )
+    self.assertEqual( result['Value'][jobIDs[0]]['Status'], 'Killed' )
+    self.assertEqual( result['Value'][jobIDs[0]]['HeartBeatTime'], str( now ) )
+    self.assertEqual( result['Value'][jobIDs[1]]['Status'], 'Matched' )
+    self.assertEqual( result['Value'][jobIDs[1]]['HeartBeatTime'], str( before ) )
+
       
 if __name__ == '__main__':
 
   suite = unittest.defaultTestLoader.loadTestsFromTestCase(JobSubmissionCase)
   suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( JobRescheduleCase ) )
   suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( CountJobsCase ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( JobStatusCase ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( HeartBeatCase ) )
   testResult = unittest.TextTestRunner(verbosity=2).run(suite)
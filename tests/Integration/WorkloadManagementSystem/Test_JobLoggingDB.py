@@ -51,6 +51,19 @@ class JobLoggingCase( JobLoggingDBTestCase ):
 
     self.jlogDB.deleteJob( 1 )
 
+  def test_addLoggingRecords( self ):
+
+    result = self.jlogDB.addLoggingRecords( [ ( 1, 'testing', 'bulk 1', '', '2006-04-25 14:20:17', 'Unittest' ),
+                                              ( 2, 'testing', 'bulk 2', '', None, 'Unittest' ),
+                                              ( 1, 'testing', "it's bulk", '', None, 'Unittest' ) ] )
+    self.assert_( result['OK'] )
+    result = self.jlogDB.getJobLoggingInfo( 1 )
+    self.assert_( result['OK'] )
+    self.assertEqual( [ record[1] for record in result['Value'] ], [ 'bulk 1', "it's bulk" ] )
+
+    self.jlogDB.deleteJob( 1 )
+    self.jlogDB.deleteJob( 2 )
+
 
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobLoggingCase )
@@ -73,6 +73,35 @@ class TQTests( TQDBTestCase ):
     self.assert_( result['OK'] )
 
 
+  def test_matchAndGetJobs( self ):
+    """ several jobs matched at once
+    """
+    tqDefDict = {'OwnerDN': '/my/DN', 'OwnerGroup':'myGroup', 'Setup':'aSetup', 'CPUTime':50000}
+    for jobId in ( 201, 202, 203 ):
+      result = self.tqDB.insertJob( jobId, tqDefDict, 10 )
+      self.assert_( result['OK'] )
+
+    result = self.tqDB.matchAndGetJobs( {'Setup': 'aSetup', 'CPUTime': 300000}, 2 )
+    self.assert_( result['OK'] )
+    self.assert_( result['Value']['matchFound'] )
+    self.assertEqual( len( result['Value']['jobs'] ), 2 )
+    matchedJobs = [ jobId for jobId, _tqId in result['Value']['jobs'] ]
+    tq = result['Value']['jobs'][0][1]
+
+    # only the job left can be matched
+    result = self.tqDB.matchAndGetJobs( {'Setup': 'aSetup', 'CPUTime': 300000}, 2 )
+    self.assert_( result['OK'] )
+    self.assertEqual( len( result['Value']['jobs'] ), 1 )
+    matchedJobs.append( result['Value']['jobs'][0][0] )
+    self.assertEqual( sorted( matchedJobs ), [201L, 202L, 203L] )
+
+    result = self.tqDB.matchAndGetJobs( {'Setup': 'aSetup', 'CPUTime': 300000}, 2 )
+    self.assert_( result['OK'] )
+    self.assertFalse( result['Value']['matchFound'] )
+
+    result = self.tqDB.deleteTaskQueue( tq )
+    self.assert_( result['OK'] )
+
 
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase(TQDBTestCase)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+""" This script measures the rate at which the accounting records of a synthetic one day feed of
+    jobs are inserted in the bucket tables, which is what AccountingDB does with the records
+    loaded from the IN tables.
+
+    It compares writing the buckets of every record with its own upsert and transaction, as it
+    was done, with aggregating the records of a bundle in memory with the BucketAggregator and
+    writing them with one multi-row upsert. The MySQL server is replaced by a SQLite file with
+    the same bucket table and the equivalent upsert, both methods must fill the same buckets.
+
+    Tunable parameters:
+      * numberOfRecords: number of records of the day
+      * recordsPerSlot: number of records of a bundle, the RecordsPerSlot option of the AccountingDB
+      * numberOfUsers, numberOfSites: number of distinct values of the keys of the records
+
+    Usage:
+      insertionPerf.py
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from DIRAC.AccountingSystem.private.BucketAggregator import BucketAggregator, calculateBuckets
+
+numberOfRecords = 20000
+recordsPerSlot = 100
+numberOfUsers = 50
+numberOfSites = 20
+
+keyFields = [ 'User', 'Site', 'JobType', 'FinalMajorStatus' ]
+valueFields = [ 'CPUTime', 'ExecTime', 'DiskSpace', 'ProcessedEvents' ]
+bucketsLength = [ ( 86400 * 8, 3600 ), ( 86400 * 35, 3600 * 4 ), ( 86400 * 30 * 6, 86400 ) ]
+dayStart = 1466640000
+nowEpoch = dayStart + 86400
+
+def generateRecord():
+  """ A job ending during the day, as reported by the JobWrapper
+  """
+  endTime = dayStart + random.randrange( 86400 )
+  execTime = min( int( random.expovariate( 1. / 7200 ) ) + 60, 86400 )
+  # A few production users and big sites run most of the jobs
+  keyValues = [ 'user%d' % min( int( random.paretovariate( 1.5 ) ), numberOfUsers ),
+                'LCG.Site%d.org' % min( int( random.paretovariate( 1 ) ), numberOfSites ),
+                random.choice( [ 'MCSimulation', 'User', 'DataReconstruction' ] ),
+                random.choice( [ 'Done', 'Done', 'Done', 'Failed' ] ) ]
+  values = [ int( execTime * random.uniform( 0.5, 1 ) ), execTime, random.randrange( 10 ** 9 ),
+             random.randrange( 10 ** 4 ) ]
+  return endTime - execTime, endTime, keyValues + values
+
+def createDB( fileName ):
+  conn = sqlite3.connect( fileName )
+  fields = ", ".join( "`%s` INTEGER" % field for field in keyFields )
+  fields += ", " + ", ".join( "`%s` REAL" % field for field in valueFields )
+  conn.execute( "CREATE TABLE type ( %s, startTime INTEGER, endTime INTEGER )" % fields )
+  conn.execute( "CREATE TABLE bucket ( startTime INTEGER, bucketLength INTEGER, entriesInBucket REAL, %s, "
+                "UNIQUE ( startTime, bucketLength, %s ) )" % ( fields, ", ".join( keyFields ) ) )
+  conn.commit()
+  return conn
+
+def getUpsertCmd( valuesGroups ):
+  """ SQLite version of the INSERT ... ON DUPLICATE KEY UPDATE of the AccountingDB
+  """
+  sqlFields = [ 'startTime', 'bucketLength', 'entriesInBucket' ] + keyFields + valueFields
+  sqlUpData = [ "%s=%s+excluded.%s" % ( field, field, field ) for field in [ 'entriesInBucket' ] + valueFields ]
+  return "INSERT INTO bucket ( %s ) VALUES %s ON CONFLICT ( startTime, bucketLength, %s ) DO UPDATE SET %s" % \
+         ( ", ".join( sqlFields ), ", ".join( valuesGroups ), ", ".join( keyFields ), ", ".join( sqlUpData ) )
+
+def getKeyIDs( keysCache, valuesList ):
+  """ Ids of the key values, cached across records in both methods as the AccountingDB does
+  """
+  keyIDs = []
+  for keyPos, keyName in enumerate( keyFields ):
+    keyCache = keysCache.setdefault( keyName, {} )
+    keyIDs.append( keyCache.setdefault( valuesList[ keyPos ], len( keyCache ) + 1 ) )
+  return keyIDs
+
+def getInsertCmd( rows ):
+  return "INSERT INTO type VALUES %s" % ", ".join( "( %s )" % ", ".join( str( value ) for value in row )
+                                                   for row in rows )
+
+def insertPerRecord( conn, records ):
+  """ One insert and one upsert with the buckets of the record in a transaction per record, as done before
+  """
+  keysCache = {}
+  numKeys = len( keyFields )
+  for startTime, endTime, valuesList in records:
+    keyIDs = getKeyIDs( keysCache, valuesList )
+    conn.execute( getInsertCmd( [ keyIDs + valuesList[ numKeys: ] + [ startTime, endTime ] ] ) )
+    conn.commit()
+    valuesGroups = []
+    for bStartTime, bProportion, bLength in calculateBuckets( bucketsLength, startTime, endTime, nowEpoch ):
+      sqlValues = [ bStartTime, bLength, "(1*%s)" % bProportion ] + keyIDs
+      sqlValues += [ "(%s*%s)" % ( value, bProportion ) for value in valuesList[ numKeys: ] ]
+      valuesGroups.append( "( %s )" % ",".join( str( val ) for val in sqlValues ) )
+    conn.execute( getUpsertCmd( valuesGroups ) )
+    conn.commit()
+
+def insertAggregated( conn, records ):
+  """ One insert and one upsert of the aggregated buckets in a transaction per bundle
+  """
+  keysCache = {}
+  numKeys = len( keyFields )
+  bucketRows = 0
+  for start in xrange( 0, len( records ), recordsPerSlot ):
+    aggregator = BucketAggregator( len( valueFields ) )
+    insertRows = []
+    for startTime, endTime, valuesList in records[ start : start + recordsPerSlot ]:
+      keyIDs = getKeyIDs( keysCache, valuesList )
+      insertRows.append( keyIDs + valuesList[ numKeys: ] + [ startTime, endTime ] )
+      aggregator.addRecord( keyIDs, calculateBuckets( bucketsLength, startTime, endTime, nowEpoch ),
+                            valuesList[ numKeys: ] )
+    conn.execute( getInsertCmd( insertRows ) )
+    valuesGroups = []
+    for bStartTime, bLength, bKeyValues, bValues in aggregator.getBuckets():
+      sqlValues = [ str( bStartTime ), str( bLength ), repr( bValues[-1] ) ]
+      sqlValues += [ str( keyValue ) for keyValue in bKeyValues ] + [ repr( value ) for value in bValues[:-1] ]
+      valuesGroups.append( "( %s )" % ",".join( sqlValues ) )
+    conn.execute( getUpsertCmd( valuesGroups ) )
+    conn.commit()
+    bucketRows += len( valuesGroups )
+  return bucketRows
+
+def getBuckets( conn ):
+  return conn.execute( "SELECT * FROM bucket ORDER BY startTime, bucketLength, %s" % ", ".join( keyFields ) ).fetchall()
+
+
+# The records are loaded from the IN tables in their order of arrival
+recordList = sorted( ( generateRecord() for _i in xrange( numberOfRecords ) ), key = lambda record: record[1] )
+workDir = tempfile.mkdtemp()
+try:
+  perRecordConn = createDB( os.path.join( workDir, 'perRecord.db' ) )
+  start = time.time()
+  insertPerRecord( perRecordConn, recordList )
+  perRecordTime = time.time() - start
+
+  aggregatedConn = createDB( os.path.join( workDir, 'aggregated.db' ) )
+  start = time.time()
+  bucketRows = insertAggregated( aggregatedConn, recordList )
+  aggregatedTime = time.time() - start
+
+  perRecordBuckets = getBuckets( perRecordConn )
+  aggregatedBuckets = getBuckets( aggregatedConn )
+  bucketSplits = sum( len( calculateBuckets( bucketsLength, record[0], record[1], nowEpoch ) ) for record in recordList )
+finally:
+  shutil.rmtree( workDir )
+
+for perRecordRow, aggregatedRow in zip( perRecordBuckets, aggregatedBuckets ):
+  if any( abs( x - y ) > 1e-6 * max( 1, abs( x ) ) for x, y in zip( perRecordRow, aggregatedRow ) ):
+    print "ERROR: the aggregated records do not fill the same buckets"
+    break
+if len( perRecordBuckets ) != len( aggregatedBuckets ):
+  print "ERROR: the aggregated records do not fill the same buckets"
+print "%d records, %d records per bundle, %d buckets filled" % ( numberOfRecords, recordsPerSlot,
+                                                                 len( aggregatedBuckets ) )
+print "Method\tTotal(s)\tRecords/s\tBucketRows"
+print "PerRecord\t%.3f\t%.0f\t%d" % ( perRecordTime, numberOfRecords / perRecordTime, bucketSplits )
+print "Aggregated\t%.3f\t%.0f\t%d" % ( aggregatedTime, numberOfRecords / aggregatedTime, bucketRows )
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+""" This script measures the cost of looking up options and sections in the merged
+    configuration, which is what every gConfig.getValue, getOptions and getSections does.
+
+    It compares the indexed lookups of ConfigurationData with walking the CFG objects
+    level by level, which is still what happens when a CFG is given explicitly.
+    The configuration is either a CS dump given as argument (for instance the one written by
+    dirac-configuration-dump-local-cache) or a generated one of production size.
+
+    Tunable parameters:
+      * numberOfSites, numberOfUsers, numberOfSEs, numberOfServices: size of the generated CS
+      * numberOfLookups: number of paths looked up in each measurement
+      * missingFraction: fraction of the looked up paths that do not exist
+
+    Usage:
+      getValuePerf.py [CS dump file]
+"""
+
+import random
+import sys
+import time
+
+from DIRAC.Core.Utilities.CFG import CFG
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+numberOfSites = 500
+numberOfUsers = 3000
+numberOfSEs = 200
+numberOfServices = 300
+numberOfLookups = 200000
+missingFraction = 0.2
+
+def setOption( cfg, path, value ):
+  """ Set an option creating the sections of its path
+  """
+  levelList = path.strip( "/" ).split( "/" )
+  for section in levelList[:-1]:
+    if not cfg.isSection( section ):
+      cfg.createNewSection( section )
+    cfg = cfg[ section ]
+  cfg.setOption( levelList[-1], value )
+
+def generateCFG():
+  cfg = CFG()
+  for siteIndex in xrange( numberOfSites ):
+    sitePath = "/Resources/Sites/LCG/LCG.Site%d.org" % siteIndex
+    setOption( cfg, "%s/Name" % sitePath, "Site%d" % siteIndex )
+    setOption( cfg, "%s/SE" % sitePath, "Site%d-disk, Site%d-tape" % ( siteIndex, siteIndex ) )
+    for ceIndex in xrange( 3 ):
+      cePath = "%s/CEs/ce%d.site%d.org" % ( sitePath, ceIndex, siteIndex )
+      for option in ( "CEType", "OS", "SI00", "Pilot", "MaxRAM" ):
+        setOption( cfg, "%s/%s" % ( cePath, option ), "value" )
+      for queueIndex in xrange( 4 ):
+        for option in ( "maxCPUTime", "SI00", "MaxTotalJobs", "MaxWaitingJobs", "VO" ):
+          setOption( cfg, "%s/Queues/queue%d/%s" % ( cePath, queueIndex, option ), "1000" )
+  for userIndex in xrange( numberOfUsers ):
+    userPath = "/Registry/Users/user%d" % userIndex
+    setOption( cfg, "%s/DN" % userPath, "/DC=org/DC=vo/CN=user%d" % userIndex )
+    setOption( cfg, "%s/CA" % userPath, "/DC=org/DC=vo/CN=Some CA" )
+    setOption( cfg, "%s/Email" % userPath, "user%d@vo.org" % userIndex )
+  for seIndex in xrange( numberOfSEs ):
+    sePath = "/Resources/StorageElements/SE%d" % seIndex
+    setOption( cfg, "%s/BackendType" % sePath, "srm" )
+    for option in ( "Protocol", "Host", "Port", "Path", "SpaceToken", "WSUrl", "Access" ):
+      setOption( cfg, "%s/SRM2/%s" % ( sePath, option ), "value" )
+  for serviceIndex in xrange( numberOfServices ):
+    servicePath = "/Systems/System%d/Production/Services/Service%d" % ( serviceIndex % 20, serviceIndex )
+    for option in ( "Port", "MaxThreads", "Authorization/Default", "Protocol", "LogLevel" ):
+      setOption( cfg, "%s/%s" % ( servicePath, option ), "value" )
+  return cfg
+
+def listPaths( cfg, path = "" ):
+  """ :return: ( option paths, section paths )
+  """
+  options = [ "%s/%s" % ( path, option ) for option in cfg.listOptions() ]
+  sections = []
+  for section in cfg.listSections():
+    sectionPath = "%s/%s" % ( path, section )
+    sections.append( sectionPath )
+    subOptions, subSections = listPaths( cfg[ section ], sectionPath )
+    options.extend( subOptions )
+    sections.extend( subSections )
+  return options, sections
+
+def lookupPaths( paths ):
+  lookups = [ random.choice( paths ) for _i in xrange( numberOfLookups ) ]
+  for index in xrange( int( numberOfLookups * missingFraction ) ):
+    lookups[ index ] += "Missing"
+  random.shuffle( lookups )
+  return lookups
+
+def timeLookups( function, paths, *args ):
+  start = time.time()
+  for path in paths:
+    function( path, *args )
+  return ( time.time() - start ) / len( paths ) * 1e6
+
+
+if len( sys.argv ) > 1:
+  csCFG = CFG()
+  csCFG.loadFromFile( sys.argv[1] )
+else:
+  csCFG = generateCFG()
+
+confData = ConfigurationData( loadDefaultCFG = False )
+start = time.time()
+confData.setRemoteCFG( csCFG )
+syncTime = time.time() - start
+
+optionPaths, sectionPaths = listPaths( confData.mergedCFG )
+optionLookups = lookupPaths( optionPaths )
+sectionLookups = lookupPaths( sectionPaths )
+print "%d options, %d sections, sync in %.3f s" % ( len( optionPaths ), len( sectionPaths ), syncTime )
+print "Lookup\tWalk(us)\tIndexed(us)"
+print "getValue\t%.2f\t%.2f" % ( timeLookups( confData.extractOptionFromCFG, optionLookups, confData.mergedCFG ),
+                                 timeLookups( confData.extractOptionFromCFG, optionLookups ) )
+print "getOptions\t%.2f\t%.2f" % ( timeLookups( confData.getOptionsFromCFG, sectionLookups, confData.mergedCFG ),
+                                   timeLookups( confData.getOptionsFromCFG, sectionLookups ) )
+print "getSections\t%.2f\t%.2f" % ( timeLookups( confData.getSectionsFromCFG, sectionLookups, confData.mergedCFG ),
+                                    timeLookups( confData.getSectionsFromCFG, sectionLookups ) )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+""" This script measures the rate at which the FC_DirectoryUsage table is updated for the
+    registrations of writePerf.py, which is what FileManagerBase._updateDirectoryUsage does
+    after the files of an addFile call are inserted.
+
+    It compares issuing one INSERT ... ON DUPLICATE KEY UPDATE per directory and SE, as it was
+    done, with summing the changes per directory and SE over all the parents in memory and
+    issuing one statement per call. The MySQL server is replaced by a SQLite file with the same
+    table and the equivalent upsert, both methods must give the same usage.
+
+    Tunable parameters:
+      * numberOfCalls: number of addFile calls
+      * maxInsert, writeDepth, storageElements: as in writePerf.py
+
+    Usage:
+      usagePerf.py
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import string
+import tempfile
+import time
+
+numberOfCalls = 5000
+maxInsert = 10
+writeDepth = 13
+storageElements = [ 'se%d' % i for i in xrange( 10 ) ]
+
+def generateCall( dirIDs ):
+  """ The directory and the files of one addFile call of writePerf.py, as the usage dictionary
+      { dirID : { seID : { 'Files' : n, 'Size' : size } } } and the ids of the parents
+  """
+  rndTab = [ random.randint( 0, 3 ) for _i in xrange( writeDepth ) ]
+  rndTab += [ random.choice( string.letters ) for _i in xrange( 3 ) ]
+  parentIDs = []
+  path = ''
+  for name in rndTab:
+    path += '/%s' % name
+    parentIDs.append( dirIDs.setdefault( path, len( dirIDs ) + 1 ) )
+  seDict = {}
+  for _f in xrange( random.randint( 1, maxInsert ) ):
+    seID = random.randrange( len( storageElements ) ) + 1
+    usage = seDict.setdefault( seID, { 'Files' : 0, 'Size' : 0 } )
+    usage['Files'] += 1
+    usage['Size'] += random.randint( 1, 1000 )
+  return { parentIDs[-1] : seDict }, parentIDs
+
+def createDB( fileName ):
+  conn = sqlite3.connect( fileName )
+  conn.execute( "CREATE TABLE FC_DirectoryUsage ( DirID INTEGER, SEID INTEGER, SESize INTEGER, SEFiles INTEGER, "
+                "LastUpdate TEXT, PRIMARY KEY ( DirID, SEID ) )" )
+  conn.commit()
+  return conn
+
+def getUpsertCmd( insertTuples, sizeChange, filesChange ):
+  """ SQLite version of the INSERT ... ON DUPLICATE KEY UPDATE of the FileManagerBase
+  """
+  return "INSERT INTO FC_DirectoryUsage ( DirID, SEID, SESize, SEFiles, LastUpdate ) VALUES %s " \
+         "ON CONFLICT ( DirID, SEID ) DO UPDATE SET SESize=SESize+%s, SEFiles=SEFiles+%s, " \
+         "LastUpdate=datetime('now')" % ( ','.join( insertTuples ), sizeChange, filesChange )
+
+def updatePerDirectorySE( conn, calls ):
+  """ One statement per directory and SE, with the rows of all the parents, as done before
+  """
+  statements = 0
+  for directorySEDict, parentIDs in calls:
+    for dirDict in directorySEDict.values():
+      for seID, seDict in dirDict.items():
+        insertTuples = [ "(%d,%d,%d,%d,datetime('now'))" % ( dirID, seID, seDict['Size'], seDict['Files'] )
+                         for dirID in parentIDs ]
+        conn.execute( getUpsertCmd( insertTuples, seDict['Size'], seDict['Files'] ) )
+        conn.commit()
+        statements += 1
+  return statements
+
+def updateSummed( conn, calls ):
+  """ The changes summed per directory and SE, one sorted statement per call
+  """
+  statements = 0
+  for directorySEDict, parentIDs in calls:
+    usageDict = {}
+    for dirDict in directorySEDict.values():
+      for dirID in parentIDs:
+        for seID, seDict in dirDict.items():
+          usage = usageDict.setdefault( ( dirID, seID ), [ 0, 0 ] )
+          usage[0] += seDict['Size']
+          usage[1] += seDict['Files']
+    insertTuples = [ "(%d,%d,%d,%d,datetime('now'))" % ( dirID, seID, size, files )
+                     for ( dirID, seID ), ( size, files ) in sorted( usageDict.items() ) ]
+    conn.execute( getUpsertCmd( insertTuples, 'excluded.SESize', 'excluded.SEFiles' ) )
+    conn.commit()
+    statements += 1
+  return statements
+
+def getUsage( conn ):
+  return conn.execute( "SELECT DirID, SEID, SESize, SEFiles FROM FC_DirectoryUsage ORDER BY DirID, SEID" ).fetchall()
+
+
+directoryIDs = {}
+callList = [ generateCall( directoryIDs ) for _i in xrange( numberOfCalls ) ]
+numberOfFiles = sum( seDict['Files'] for directorySEDict, _parentIDs in callList
+                     for dirDict in directorySEDict.values() for seDict in dirDict.values() )
+workDir = tempfile.mkdtemp()
+try:
+  perDirSEConn = createDB( os.path.join( workDir, 'perDirectorySE.db' ) )
+  start = time.time()
+  perDirSEStatements = updatePerDirectorySE( perDirSEConn, callList )
+  perDirSETime = time.time() - start
+
+  summedConn = createDB( os.path.join( workDir, 'summed.db' ) )
+  start = time.time()
+  summedStatements = updateSummed( summedConn, callList )
+  summedTime = time.time() - start
+
+  if getUsage( perDirSEConn ) != getUsage( summedConn ):
+    print "ERROR: the two methods do not give the same usage"
+finally:
+  shutil.rmtree( workDir )
+
+print "%d addFile calls, %d files, %d directories" % ( numberOfCalls, numberOfFiles, len( directoryIDs ) )
+print "Method\tTotal(s)\tFiles/s\tStatements"
+print "PerDirectorySE\t%.3f\t%.0f\t%d" % ( perDirSETime, numberOfFiles / perDirSETime, perDirSEStatements )
+print "Summed\t%.3f\t%.0f\t%d" % ( summedTime, numberOfFiles / summedTime, summedStatements )
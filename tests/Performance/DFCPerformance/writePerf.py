@@ -4,6 +4,7 @@
     and hammers it with mixed request (read/write/delete) for a given time.
     It produces two files : time.txt and clock.txt which contain time measurement,
     using time.time and time.clock (see respective doc)
+    At the end, the insertion throughput in files per second is written in throughput.txt
     It assumes that the DB has been filled with the scripts in generateDB
 
     Tunable parameters:
@@ -47,6 +48,9 @@ fl2.write("QueryStart\tQueryEnd\tQueryClock\textra(port %s)\n"%port)
 start = time.time()
 
 done = False
+# Files registered and time spent registering them, for the throughput
+nbInserted = 0
+insertDuration = 0.
 
 while not done:
   # Between 0 and 3 because in generate we have 4 subdirs per dir. Adapt :-)
@@ -78,7 +82,8 @@ while not done:
     extra += res['Message']
   else:
     extra += "%s %s %s"%(len(lfnDict), len(res['Value'].get('Successful', [])), len(res['Value'].get('Failed', [])))
-    pass
+    nbInserted += len(res['Value'].get('Successful', []))
+  insertDuration += queryInsertTime
 
   fl.write("%s\t%s\t%s\t%s\n"%(beforeI, afterI, queryInsertTime, extra))
   fl.flush()
@@ -112,3 +117,8 @@ while not done:
 
 fl.close()
 fl2.close()
+
+fl3 = open('throughput.txt', 'w')
+fl3.write("FilesInserted\tInsertTime\tFilesPerSecond\textra(port %s, maxInsert %s)\n"%(port, maxInsert))
+fl3.write("%s\t%s\t%s\n"%(nbInserted, insertDuration, nbInserted / insertDuration if insertDuration else 0.))
+fl3.close()
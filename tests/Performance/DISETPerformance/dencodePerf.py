@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+""" This script measures the encoding and decoding time and the encoded size of the
+    DEncode codecs over payloads that look like the big responses of DIRAC services:
+
+      * JobDB attribute dictionaries, as returned by getJobsAttributes
+      * FileCatalog replicas, as returned by getReplicas
+
+    Tunable parameters:
+      * numberOfJobs: number of jobs in the attributes payload
+      * numberOfFiles: number of LFNs in the replicas payload
+      * repetitions: each measurement is the best of that many runs
+
+    Usage:
+      dencodePerf.py
+"""
+
+import datetime
+import time
+
+from DIRAC.Core.Utilities import DEncode
+
+numberOfJobs = 20000
+numberOfFiles = 50000
+repetitions = 3
+
+def jobAttributesPayload():
+  now = datetime.datetime.utcnow()
+  jobs = {}
+  for jobID in xrange( 1, numberOfJobs + 1 ):
+    jobs[ jobID ] = { 'JobID' : jobID,
+                      'JobName' : 'Job_%s' % jobID,
+                      'JobGroup' : '00001234',
+                      'JobType' : 'MCSimulation',
+                      'Owner' : 'someuser',
+                      'OwnerDN' : '/DC=ch/DC=cern/OU=Organic Units/OU=Users/CN=someuser/CN=123456/CN=Some User',
+                      'OwnerGroup' : 'dirac_user',
+                      'Site' : 'LCG.CERN.ch',
+                      'Status' : 'Running',
+                      'MinorStatus' : 'Application',
+                      'ApplicationStatus' : 'Running step 2 of 3',
+                      'UserPriority' : 1,
+                      'RescheduleCounter' : 0,
+                      'SystemPriority' : 0,
+                      'CPUTime' : 12345.5,
+                      'SubmissionTime' : now,
+                      'HeartBeatTime' : now,
+                      'LastUpdateTime' : now,
+                      'StartExecTime' : now,
+                      'VerifiedFlag' : True,
+                      'RetrievedFlag' : False,
+                      'AccountedFlag' : False,
+                      'DIRACSetup' : 'Production',
+                      'DeletedFlag' : False }
+  return jobs
+
+def replicasPayload():
+  successful = {}
+  for fileIndex in xrange( numberOfFiles ):
+    lfn = '/vo/data/2017/RAW/FULL/RUN%06d/%08d_%04d.raw' % ( fileIndex / 100, fileIndex / 100, fileIndex % 100 )
+    successful[ lfn ] = { 'CERN-RAW' : 'srm://srm.cern.ch:8443/srm/managerv2?SFN=/castor/cern.ch/grid%s' % lfn,
+                          'CNAF-RAW' : 'srm://storm-fe.cr.cnaf.infn.it:8444/srm/managerv2?SFN=/vo/disk%s' % lfn }
+  return { 'OK' : True, 'Value' : { 'Successful' : successful, 'Failed' : {} } }
+
+def best( function, *args ):
+  elapsed = []
+  for _i in xrange( repetitions ):
+    start = time.time()
+    result = function( *args )
+    elapsed.append( time.time() - start )
+  return min( elapsed ), result
+
+
+print "Payload\tCodec\tEncode(s)\tDecode(s)\tSize(MB)"
+for payloadName, payload in ( ( 'JobAttributes', jobAttributesPayload() ),
+                              ( 'Replicas', replicasPayload() ) ):
+  for codecName in DEncode.getCodecNames():
+    codec = DEncode.getCodec( codecName )
+    encodeTime, encoded = best( codec.encode, payload )
+    decodeTime, decoded = best( codec.decode, encoded )
+    if decoded[0] != payload:
+      print "%s\t%s\tDecoded payload differs" % ( payloadName, codecName )
+      continue
+    print "%s\t%s\t%.3f\t%.3f\t%.1f" % ( payloadName, codecName, encodeTime, decodeTime, len( encoded ) / 1048576. )
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+""" This script measures the throughput of sending a file with the FileHelper through the
+    DISET transports over the loopback interface, as TransferClient.sendFile and the
+    SandboxStore do.
+
+    Each file is sent in chunks (DEncoded messages acknowledged one by one) and as raw
+    blocks, with and without the MD5 checksum. The receiver and the sender are forked for
+    each transfer, the receiver writes the file to /dev/null.
+
+    The SSL transport needs a valid host certificate, as a service would.
+
+    Tunable parameters:
+      * fileSizes: sizes of the file in MB
+      * transports: protocols to test ('dip' is the plain transport, 'dips' the SSL one)
+      * port: port on which the receiver listens
+
+    Usage:
+      fileTransferPerf.py [dip|dips] ...
+"""
+
+from DIRAC.Core.Base.Script import parseCommandLine
+parseCommandLine()
+
+import os
+import sys
+import time
+import tempfile
+
+from DIRAC.Core.DISET.private.Protocols import gProtocolDict
+from DIRAC.Core.DISET.private.FileHelper import FileHelper
+
+fileSizes = [ 10, 200, 1000 ]
+transports = sys.argv[1:] or [ 'dip', 'dips' ]
+port = 9877
+
+def runReceiver( protocol, rawTransfer, checkSum, readPipe ):
+  """ Receive one file and report the time it took
+  """
+  listener = gProtocolDict[ protocol ][ 'transport' ]( ( "", port ), bServerMode = True )
+  result = listener.initAsServer()
+  if not result[ 'OK' ]:
+    os.write( readPipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  os.write( readPipe, "READY\n" )
+  result = listener.acceptConnection()
+  if not result[ 'OK' ]:
+    os.write( readPipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  transport = result[ 'Value' ]
+  transport.handshake()
+  transport.setRawTransfer( rawTransfer )
+  fileHelper = FileHelper( transport, checkSum = checkSum )
+  fileHelper.setDirection( "receive" )
+  dataSink = open( os.devnull, "wb" )
+  start = time.time()
+  result = fileHelper.networkToDataSink( dataSink )
+  elapsed = time.time() - start
+  dataSink.close()
+  transport.sendData( { 'OK' : True, 'Value' : None } )
+  transport.close()
+  listener.close()
+  if not result[ 'OK' ]:
+    os.write( readPipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  os.write( readPipe, "%s\n" % elapsed )
+
+def runSender( protocol, rawTransfer, checkSum, filePath, writePipe ):
+  """ Send one file and report the time it took
+  """
+  transport = gProtocolDict[ protocol ][ 'transport' ]( ( "localhost", port ) )
+  result = transport.initAsClient()
+  if not result[ 'OK' ]:
+    os.write( writePipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  transport.setRawTransfer( rawTransfer )
+  fileHelper = FileHelper( transport, checkSum = checkSum )
+  fileHelper.setDirection( "send" )
+  fd = os.open( filePath, os.O_RDONLY )
+  start = time.time()
+  result = fileHelper.FDToNetwork( fd )
+  elapsed = time.time() - start
+  os.close( fd )
+  transport.receiveData()
+  transport.close()
+  if not result[ 'OK' ]:
+    os.write( writePipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  os.write( writePipe, "%s\n" % elapsed )
+
+def forkAndRun( function, *args ):
+  """ Run the function in a child process and return a pipe to read its report from
+  """
+  readFD, writeFD = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close( readFD )
+    try:
+      function( *( args + ( writeFD, ) ) )
+    finally:
+      os._exit( 0 )
+  os.close( writeFD )
+  return pid, os.fdopen( readFD )
+
+def readReport( pipe ):
+  line = pipe.readline().strip()
+  if not line or line.startswith( "ERROR" ):
+    return None
+  return float( line )
+
+def createFile( sizeMB ):
+  fd, filePath = tempfile.mkstemp()
+  block = os.urandom( 1024 * 1024 )
+  for _ in xrange( sizeMB ):
+    os.write( fd, block )
+  os.close( fd )
+  return filePath
+
+
+print "Transport\tMode\tCheckSum\tSize(MB)\tSend(MB/s)\tReceive(MB/s)"
+for sizeMB in fileSizes:
+  filePath = createFile( sizeMB )
+  try:
+    for protocol in transports:
+      for rawTransfer in ( False, True ):
+        for checkSum in ( True, False ):
+          mode = "raw" if rawTransfer else "chunked"
+          receiverPid, receiverPipe = forkAndRun( runReceiver, protocol, rawTransfer, checkSum )
+          if receiverPipe.readline().strip() != "READY":
+            print "%s\t%s\t%s\t%s\tCannot start receiver" % ( protocol, mode, checkSum, sizeMB )
+            os.waitpid( receiverPid, 0 )
+            continue
+          senderPid, senderPipe = forkAndRun( runSender, protocol, rawTransfer, checkSum, filePath )
+          senderReport = readReport( senderPipe )
+          receiverReport = readReport( receiverPipe )
+          os.waitpid( senderPid, 0 )
+          os.waitpid( receiverPid, 0 )
+          if not senderReport or not receiverReport:
+            print "%s\t%s\t%s\t%s\tFailed" % ( protocol, mode, checkSum, sizeMB )
+            continue
+          print "%s\t%s\t%s\t%s\t%.1f\t%.1f" % ( protocol, mode, checkSum, sizeMB,
+                                                 sizeMB / max( senderReport, 1e-6 ),
+                                                 sizeMB / max( receiverReport, 1e-6 ) )
+  finally:
+    os.unlink( filePath )
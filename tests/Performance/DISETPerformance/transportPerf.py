@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+""" This script measures the throughput and the peak memory of sending one big message
+    through the DISET transports over the loopback interface.
+
+    For each transport and message size, a receiver and a sender process are forked,
+    so that the peak memory (VmHWM) reported for each of them only accounts for one transfer.
+    The message is a dictionary with a string of the given size and a list of small
+    strings, which is what big sandbox listings or replica dictionaries look like.
+
+    The SSL transport needs a valid host certificate, as a service would.
+
+    Tunable parameters:
+      * messageSizes: sizes of the message in MB
+      * transports: protocols to test ('dip' is the plain transport, 'dips' the SSL one)
+      * port: port on which the receiver listens
+
+    Usage:
+      transportPerf.py [dip|dips] ...
+"""
+
+from DIRAC.Core.Base.Script import parseCommandLine
+parseCommandLine()
+
+import os
+import sys
+import time
+
+from DIRAC.Core.Utilities import MemStat
+from DIRAC.Core.DISET.private.Protocols import gProtocolDict
+
+messageSizes = [ 1, 50, 500 ]
+transports = sys.argv[1:] or [ 'dip', 'dips' ]
+port = 9876
+
+def buildMessage( sizeMB ):
+  """ Half of the message is one big string, the rest small strings of 100 bytes
+  """
+  halfSize = sizeMB * 1024 * 1024 / 2
+  return { 'Blob' : 'x' * halfSize,
+           'Entries' : [ 'y' * 100 ] * ( halfSize / 100 ) }
+
+def runReceiver( protocol, readPipe ):
+  """ Receive one message and report the time it took and the peak memory
+  """
+  listener = gProtocolDict[ protocol ][ 'transport' ]( ( "", port ), bServerMode = True )
+  result = listener.initAsServer()
+  if not result[ 'OK' ]:
+    os.write( readPipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  os.write( readPipe, "READY\n" )
+  result = listener.acceptConnection()
+  if not result[ 'OK' ]:
+    os.write( readPipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  transport = result[ 'Value' ]
+  transport.handshake()
+  start = time.time()
+  received = transport.receiveData()
+  elapsed = time.time() - start
+  transport.sendData( { 'OK' : True, 'Value' : None } )
+  transport.close()
+  listener.close()
+  if 'Blob' not in received:
+    os.write( readPipe, "ERROR %s\n" % received.get( 'Message', 'Bad message' ) )
+    return
+  os.write( readPipe, "%s %s\n" % ( elapsed, MemStat.VmB( 'VmHWM:' ) ) )
+
+def runSender( protocol, sizeMB, writePipe ):
+  """ Send one message and report the time it took and the peak memory
+  """
+  message = buildMessage( sizeMB )
+  baseMemory = MemStat.VmB( 'VmRSS:' )
+  transport = gProtocolDict[ protocol ][ 'transport' ]( ( "localhost", port ) )
+  result = transport.initAsClient()
+  if not result[ 'OK' ]:
+    os.write( writePipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  start = time.time()
+  result = transport.sendData( message )
+  elapsed = time.time() - start
+  transport.receiveData()
+  transport.close()
+  if not result[ 'OK' ]:
+    os.write( writePipe, "ERROR %s\n" % result[ 'Message' ] )
+    return
+  os.write( writePipe, "%s %s\n" % ( elapsed, MemStat.VmB( 'VmHWM:' ) - baseMemory ) )
+
+def forkAndRun( function, *args ):
+  """ Run the function in a child process and return a pipe to read its report from
+  """
+  readFD, writeFD = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close( readFD )
+    try:
+      function( *( args + ( writeFD, ) ) )
+    finally:
+      os._exit( 0 )
+  os.close( writeFD )
+  return pid, os.fdopen( readFD )
+
+def readReport( pipe ):
+  line = pipe.readline().strip()
+  if not line or line.startswith( "ERROR" ):
+    return None
+  return [ float( field ) for field in line.split() ]
+
+
+print "Transport\tSize(MB)\tSend(MB/s)\tReceive(MB/s)\tSenderExtraPeakMem(MB)\tReceiverPeakMem(MB)"
+for protocol in transports:
+  for sizeMB in messageSizes:
+    receiverPid, receiverPipe = forkAndRun( runReceiver, protocol )
+    if receiverPipe.readline().strip() != "READY":
+      print "%s\t%s\tCannot start receiver" % ( protocol, sizeMB )
+      os.waitpid( receiverPid, 0 )
+      continue
+    senderPid, senderPipe = forkAndRun( runSender, protocol, sizeMB )
+    senderReport = readReport( senderPipe )
+    receiverReport = readReport( receiverPipe )
+    os.waitpid( senderPid, 0 )
+    os.waitpid( receiverPid, 0 )
+    if not senderReport or not receiverReport:
+      print "%s\t%s\tFailed" % ( protocol, sizeMB )
+      continue
+    mb = 1024. * 1024.
+    print "%s\t%s\t%.1f\t%.1f\t%.1f\t%.1f" % ( protocol, sizeMB,
+                                               sizeMB / max( senderReport[0], 1e-6 ),
+                                               sizeMB / max( receiverReport[0], 1e-6 ),
+                                               senderReport[1] / mb,
+                                               receiverReport[1] / mb )
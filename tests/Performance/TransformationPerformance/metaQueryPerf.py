@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+""" This script measures the cost of filtering new files through the input data queries of
+    the transformations, which is what TransformationDB.addFile does for every file.
+
+    It compares applying each query in turn with MetaQuery, as it was done, with evaluating
+    all of them at once with the compiled MetaQuerySet. Both must select the same files.
+
+    Tunable parameters:
+      * numberOfFiles: number of files filtered
+      * numberOfTransformations: number of transformations with an input data query
+      * numberOfRuns, numberOfTypes: number of distinct values of the metadata of the files
+
+    Usage:
+      metaQueryPerf.py
+"""
+
+import random
+import time
+
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery, MetaQuerySet
+
+numberOfFiles = 10000
+numberOfTransformations = 500
+numberOfRuns = 2000
+numberOfTypes = 20
+
+typeDict = { 'RunNumber' : 'INT', 'DataType' : 'VARCHAR(32)', 'Energy' : 'FLOAT',
+             'Campaign' : 'VARCHAR(32)', 'Version' : 'INT' }
+
+def generateQuery():
+  """ Queries as the production managers write them: a data type, a run range and some conditions
+  """
+  query = { 'DataType' : 'Type%d' % random.randrange( numberOfTypes ) }
+  firstRun = random.randrange( numberOfRuns )
+  if random.random() < 0.7:
+    query['RunNumber'] = { '>=' : firstRun, '<' : firstRun + random.randrange( 1, 200 ) }
+  else:
+    query['RunNumber'] = [ random.randrange( numberOfRuns ) for _i in xrange( 10 ) ]
+  if random.random() < 0.5:
+    query['Energy'] = { 'in' : [ 3.5, 6.5, 7.0 ][:random.randrange( 1, 4 )] }
+  if random.random() < 0.3:
+    query['Campaign'] = { '!=' : 'Test' }
+  if random.random() < 0.2:
+    query['Version'] = 'Missing'
+  return query
+
+def generateMetadata():
+  metaDict = { 'DataType' : 'Type%d' % random.randrange( numberOfTypes ),
+               'RunNumber' : random.randrange( numberOfRuns ),
+               'Energy' : random.choice( [ 3.5, 6.5, 7.0, 13.0 ] ),
+               'Campaign' : random.choice( [ 'Test', 'Prod2015', 'Prod2016' ] ) }
+  if random.random() < 0.5:
+    metaDict['Version'] = random.randrange( 3 )
+  return metaDict
+
+def applyQueries( queries, files ):
+  """ One MetaQuery per file and transformation, as done before
+  """
+  result = []
+  for metaDict in files:
+    transIDs = []
+    for transID, query in queries:
+      res = MetaQuery( query, typeDict ).applyQuery( metaDict )
+      if res['OK'] and res['Value']:
+        transIDs.append( transID )
+    result.append( transIDs )
+  return result
+
+def applyQuerySet( querySet, files ):
+  return [ sorted( querySet.getMatchingQueries( metaDict ) ) for metaDict in files ]
+
+
+queryList = [ ( transID, generateQuery() ) for transID in xrange( 1, numberOfTransformations + 1 ) ]
+fileList = [ generateMetadata() for _i in xrange( numberOfFiles ) ]
+
+start = time.time()
+expected = applyQueries( queryList, fileList )
+applyTime = time.time() - start
+
+start = time.time()
+compiledSet = MetaQuerySet( queryList, typeDict )
+compileTime = time.time() - start
+start = time.time()
+matches = applyQuerySet( compiledSet, fileList )
+matchTime = time.time() - start
+
+if matches != expected:
+  print "ERROR: the compiled queries do not select the same files"
+print "%d files, %d transformations, %d matches" % ( numberOfFiles, numberOfTransformations,
+                                                    sum( len( transIDs ) for transIDs in matches ) )
+print "Method\tTotal(s)\tPerFile(us)"
+print "MetaQuery\t%.3f\t%.1f" % ( applyTime, applyTime / numberOfFiles * 1e6 )
+print "MetaQuerySet\t%.3f\t%.1f\t(compiled in %.3f s)" % ( matchTime, matchTime / numberOfFiles * 1e6, compileTime )